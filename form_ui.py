@@ -6,12 +6,21 @@ from src.core.functions import (
     generate_paper_quote,
     prank_dwight,
 )
-from abstra.forms import TextareaInput, MarkdownOutput, run
+from abstra.forms import TextareaInput, TextInput, MarkdownOutput, run
 from src.core.prompt_config import PromptConfig
 from src.core.function_validator import FunctionValidator
 from src.core.function_intent import detect_function_intent
-
-print("🚀 Iniciando DunderOps Assistant...")
+from src.core.message_builder import MessageBuilder
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded
+from src.core.llm_gateway import governed
+from src.core.model_router import ModelRouter
+from src.core.resilience import DeadlineExceeded, begin_request_deadline, deadline_phase
+from src.core.conversation import SessionMemory
+from src.core.single_flight import SingleFlight
+from src.core.event_log import get_event_logger
+
+log = get_event_logger("form_ui")
+log.info("Iniciando DunderOps Assistant", event="ui.started")
 
 # Load prompt configuration
 prompts = PromptConfig()
@@ -27,22 +36,46 @@ Olá! Eu sou o assistente de operações da Dunder Mifflin Paper Co! Eu posso te
 input_page = [
     MarkdownOutput(welcome_text),
     TextareaInput(label="Como posso te ajudar hoje?", key="textarea_input"),
+    TextInput(label="Código da conversa (opcional, para continuar uma conversa anterior)", key="session_id", required=False),
 ]
 
 # Pegar o input do usuario
 result = run([input_page])
 user_input = result["textarea_input"]
-print(f"💬 Usuário perguntou: {user_input}")
+log.info("Usuário perguntou", event="ui.user_input", user_input=user_input)
+
+# Sessão do usuário: turnos anteriores (compactados) entram entre o system e a pergunta.
+# Só um código emitido pela memória continua uma conversa; vazio ou desconhecido abre uma nova
+session_id = (result.get("session_id") or "").strip()
+memory = SessionMemory.shared(prompts)
+if not memory.exists(session_id):
+    session_id = memory.new_session_id()
+session = memory.load(session_id)
+history = memory.history_messages(session) or None
+
+# Limite agregado de tokens por usuário: a sessão (pelo hash, para o código não ir aos logs)
+tenant_id = f"session:{memory.session_key(session_id)}"
 
 # Configura cliente OpenAI com variável de ambiente 
 openai_api_key = os.environ.get("OPENAI_API_KEY")
 
-client = OpenAI(api_key=openai_api_key)
+# Limites de taxa e concorrência compartilhados por todas as chamadas do processo
+client = governed(OpenAI(api_key=openai_api_key), prompts)
+
+# Modelo de cada fase (cov_configuration.model_routing)
+models = ModelRouter.shared(prompts)
+
+# Prazo total da requisição, dividido entre as fases (primeira e segunda chamada)
+begin_request_deadline(prompts)
 
 # Carrega o manifesto com os schemas
 with open("config/manifest.json") as f:
     manifest = json.load(f)
 
+# Monta mensagens com prefixo estável (system + tools canônicas primeiro)
+# e aplica o orçamento de tokens antes de cada envio
+message_builder = MessageBuilder(prompts, manifest, token_budget=TokenBudget.shared(prompts), tenant_id=tenant_id)
+
 # Mapeia nome → função em functions.py
 LOCAL_FUNCS = {
     "schedule_meeting": schedule_meeting,
@@ -50,70 +83,110 @@ LOCAL_FUNCS = {
     "prank_dwight": prank_dwight,
 }
 
-# Detecta se deve forçar function calling
-tool_choice = detect_function_intent(user_input)
-print(f"🎯 Detecção de intenção: {tool_choice}")
-
-# Envia a mensagem do usuário para o modelo já com os schemas
-print("🤖 Enviando pergunta para a OpenAI...")
-first = client.chat.completions.create(
-    model="gpt-4o-mini",
-    tools=manifest["tools"],
-    tool_choice=tool_choice,
-    messages=[
-        {"role": "system", "content": prompts.system_prompt},
-        {"role": "user", "content": user_input}
-    ]
-)
-
-msg = first.choices[0].message
-
-# Checa se a AI decidiu chamar uma função
-if msg.tool_calls:
-    print("🔧 AI decidiu usar uma função...")
-    call = msg.tool_calls[0]
-    name = call.function.name
-    args = json.loads(call.function.arguments)
-
-    print(f"🔧 Validando função: {name} com argumentos: {args}")
-
-    # Valida se todos os parâmetros necessários estão presentes
-    is_valid, humor_message = validator.validate_function_params(name, args)
-    
-    if not is_valid:
-        print("❌ Parâmetros incompletos - respondendo com humor...")
-        # Se parâmetros estão faltando, usa resposta humorística
-        final_response = humor_message
+def answer():
+    """Executa o pipeline para a pergunta (compartilhado entre requisições idênticas simultâneas)"""
+    tool_calls = []
+
+    # Detecta se deve forçar function calling
+    tool_choice = detect_function_intent(user_input)
+    log.info("Detecção de intenção", event="ui.intent_detected", tool_choice=tool_choice)
+
+    # Envia a mensagem do usuário para o modelo já com os schemas
+    try:
+        first_messages = message_builder.initial_messages(user_input, history)
+    except TokenBudgetExceeded as e:
+        log.warning("Orçamento de tokens excedido", event="ui.token_budget_exceeded", error=str(e))
+        return {"response": prompts.get_error_message("token_budget_exceeded"), "tool_calls": [], "error": True}
+
+    log.info("Enviando pergunta para a OpenAI", event="ui.completion_requested",
+             estimated_input_tokens=message_builder.last_estimated_tokens)
+    try:
+        with deadline_phase("first_completion"), message_builder.settle_on_error():
+            first = client.chat.completions.create(
+                model=models.model_for("first_completion"),
+                tools=message_builder.tools,
+                tool_choice=tool_choice,
+                messages=first_messages
+            )
+        message_builder.settle(first.usage)
+    except DeadlineExceeded as e:
+        log.error("Prazo da requisição esgotado", event="ui.deadline_exceeded", error=str(e))
+        return {"response": prompts.get_error_message("deadline_exceeded"), "tool_calls": [], "error": True}
+
+    msg = first.choices[0].message
+
+    # Checa se a AI decidiu chamar uma função
+    if msg.tool_calls:
+        call = msg.tool_calls[0]
+        name = call.function.name
+        args = json.loads(call.function.arguments)
+
+        log.info("AI decidiu usar uma função", event="ui.tool_call", function=name, arguments=args)
+
+        # Valida se todos os parâmetros necessários estão presentes
+        is_valid, humor_message = validator.validate_function_params(name, args)
+
+        if not is_valid:
+            log.info("Parâmetros incompletos - respondendo com humor", event="ui.validation_failed", function=name)
+            # Se parâmetros estão faltando, usa resposta humorística
+            final_response = humor_message
+        else:
+            # Executa a função
+            function_result = LOCAL_FUNCS[name](**args)
+            log.info("Função executada", event="ui.function_executed", function=name, result=function_result)
+            tool_calls.append({"name": name, "arguments": args, "result": function_result})
+
+            # Devolve o resultado como mensagem "tool" e pede a resposta final
+            try:
+                with deadline_phase("second_completion"), message_builder.settle_on_error():
+                    second = client.chat.completions.create(
+                        model=models.model_for("second_completion"),
+                        messages=message_builder.tool_result_messages(user_input, call, name, function_result, history)
+                    )
+                message_builder.settle(second.usage)
+            except TokenBudgetExceeded as e:
+                log.warning("Orçamento de tokens excedido", event="ui.token_budget_exceeded", error=str(e))
+                return {"response": prompts.get_error_message("token_budget_exceeded"), "tool_calls": [], "error": True}
+            except DeadlineExceeded as e:
+                log.error("Prazo da requisição esgotado", event="ui.deadline_exceeded", error=str(e))
+                return {"response": prompts.get_error_message("deadline_exceeded"), "tool_calls": [], "error": True}
+            final_response = second.choices[0].message.content
     else:
-        print("✅ Parâmetros válidos - executando função...")
-        # Executa a função
-        function_result = LOCAL_FUNCS[name](**args)
-        print(f"✅ Resultado da função: {function_result}")
-
-        # Devolve o resultado como mensagem "tool" e pede a resposta final
-        print("💭 Gerando resposta final...")
-        second = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": prompts.final_system_prompt},
-                {"role": "user", "content": user_input},
-                {"role": "assistant", "content": None, "tool_calls": [call]},
-                {
-                    "role": "tool",
-                    "tool_call_id": call.id,
-                    "name": name,
-                    "content": json.dumps(function_result)
-                }
-            ]
-        )
-        final_response = second.choices[0].message.content
-else:
-    print("💬 AI respondeu diretamente sem usar funções...")
-    # A IA respondeu diretamente sem chamar funções
-    final_response = msg.content
-
-print(f"🎯 Resposta final gerada: {final_response}")
+        log.info("AI respondeu diretamente sem usar funções", event="ui.direct_response")
+        # A IA respondeu diretamente sem chamar funções
+        final_response = msg.content
+
+    return {"response": final_response, "tool_calls": tool_calls, "error": False}
+
+
+# Perguntas idênticas em andamento (mesmo modo, texto e histórico) compartilham uma execução;
+# respostas de erro (orçamento ou prazo do tenant da líder) não: cada uma executa por conta própria
+flight = SingleFlight.shared(prompts)
+try:
+    outcome = flight.do(flight.key("original", user_input, history), answer,
+                        shareable=lambda value: not value["error"])
+    if not outcome.leader:
+        log.info("Resposta compartilhada com requisição idêntica", event="ui.coalesced",
+                 waiters=outcome.waiters, wait_ms=round(outcome.wait_ms, 2))
+    answered = outcome.value
+except DeadlineExceeded as e:
+    # Esgotou o prazo esperando a requisição idêntica
+    log.error("Prazo da requisição esgotado", event="ui.deadline_exceeded", error=str(e))
+    answered = {"response": prompts.get_error_message("deadline_exceeded"), "tool_calls": [], "error": True}
+except Exception as e:
+    log.error("Erro durante execução", event="ui.error", error=str(e))
+    answered = {"response": prompts.get_error_message("api_error"), "tool_calls": [], "error": True}
+final_response = answered["response"]
+
+if not answered["error"]:
+    log.info("Resposta final gerada", event="ui.final_response", response_chars=len(final_response or ""))
+
+# Guarda o turno na sessão (compacta o histórico se passar do orçamento)
+if not answered["error"]:
+    memory.record_turn(session, user_input, final_response, answered["tool_calls"])
 
 # Exibe a resposta final para o usuário
 final_page = [MarkdownOutput(final_response)]
-run([final_page])
\ No newline at end of file
+if session.turns:
+    final_page.append(MarkdownOutput(f"Para continuar esta conversa, informe o código `{session_id}`."))
+run([final_page])
@@ -6,24 +6,38 @@ from src.core.functions import (
     generate_paper_quote,
     prank_dwight,
 )
-from abstra.forms import TextareaInput, MarkdownOutput, run
+from abstra.forms import TextareaInput, TextInput, MarkdownOutput, run
 from src.core.prompt_config import PromptConfig
 from src.core.function_intent import detect_function_intent
 from src.core.function_validator import FunctionValidator
 from src.cov.chain_of_verification import ChainOfVerification, CoVConfiguration
+from src.cov.adaptive_gating import VerificationGate
 from src.core.metrics_tracker import MetricsTracker
+from src.core.message_builder import MessageBuilder, get_cached_tokens
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded
+from src.core.llm_gateway import governed
+from src.core.model_router import ModelRouter
+from src.core.resilience import DeadlineExceeded, begin_request_deadline, deadline_phase
+from src.core.conversation import SessionMemory
+from src.core.single_flight import SingleFlight
+from src.core.event_log import get_event_logger
 
 # DunderOps Assistant com Chain of Verification
 # Versão melhorada que usa auto-crítica para aumentar assertividade das respostas
 
 
-print("🚀 Iniciando DunderOps Assistant com Chain of Verification...")
+log = get_event_logger("form_ui_cov")
+log.info("Iniciando DunderOps Assistant com Chain of Verification", event="ui.started")
 
 # Configuração
 prompts = PromptConfig()
 validator = FunctionValidator(prompts)
 cov_config = CoVConfiguration()
 
+# Gate adaptativo: verifica só quando a chance de correção compensa o custo
+verification_gate = VerificationGate.shared(prompts)
+gate_decision = None
+
 # Welcome message específico desta UI
 welcome_text = """
 # DunderOps Assistant (+CoVe)
@@ -36,12 +50,25 @@ Olá! Eu sou o assistente de operações da Dunder Mifflin Paper Co! Eu posso te
 input_page = [
     MarkdownOutput(welcome_text),
     TextareaInput(label="Como posso te ajudar hoje?", key="textarea_input"),
+    TextInput(label="Código da conversa (opcional, para continuar uma conversa anterior)", key="session_id", required=False),
 ]
 
 # Pegar o input do usuario
 result = run([input_page])
 user_input = result["textarea_input"]
-print(f"💬 Usuário perguntou: {user_input}")
+log.info("Usuário perguntou", event="ui.user_input", user_input=user_input)
+
+# Sessão do usuário: turnos anteriores (compactados) entram entre o system e a pergunta.
+# Só um código emitido pela memória continua uma conversa; vazio ou desconhecido abre uma nova
+session_id = (result.get("session_id") or "").strip()
+memory = SessionMemory.shared(prompts)
+if not memory.exists(session_id):
+    session_id = memory.new_session_id()
+session = memory.load(session_id)
+history = memory.history_messages(session) or None
+
+# Limite agregado de tokens por usuário: a sessão (pelo hash, para o código não ir aos logs)
+tenant_id = f"session:{memory.session_key(session_id)}"
 
 # Configura cliente OpenAI
 openai_api_key = os.environ.get("OPENAI_API_KEY")
@@ -51,47 +78,52 @@ if not openai_api_key:
     run([final_page])
     exit(1)
 
-client = OpenAI(api_key=openai_api_key)
+# Limites de taxa e concorrência compartilhados por todas as chamadas do processo
+client = governed(OpenAI(api_key=openai_api_key), prompts)
+
+# Modelo de cada fase (cov_configuration.model_routing)
+models = ModelRouter.shared(prompts)
+
+# Orçamento de tokens compartilhado pelo processo (limites por requisição e por tenant)
+token_budget = TokenBudget.shared(prompts)
 
 # Inicializa Chain of Verification
-cov = ChainOfVerification(client, prompts)
+cov = ChainOfVerification(client, prompts, token_budget=token_budget, tenant_id=tenant_id)
 
 # Inicializa metrics tracker
 tracker = MetricsTracker("chain_of_verification")
 execution_id = tracker.start_execution(user_input)
 
-try:
-    # Carrega o manifesto com os schemas
-    with open("config/manifest.json") as f:
-        manifest = json.load(f)
+# Prazo total da requisição, dividido entre as fases (chamadas e verificação)
+begin_request_deadline(prompts)
 
-    # Mapeia nome → função em functions.py
-    LOCAL_FUNCS = {
-        "schedule_meeting": schedule_meeting,
-        "generate_paper_quote": generate_paper_quote,
-        "prank_dwight": prank_dwight,
-    }
+def answer():
+    """Executa o pipeline com CoV para a pergunta (compartilhado entre requisições idênticas simultâneas)"""
+    tool_calls = []
 
     # ETAPA 1: Gera resposta inicial
     # Detecta se deve forçar function calling
-    tool_choice = detect_function_intent(user_input)
-    print(f"🎯 Detecção de intenção: {tool_choice}")
+    with tracker.span("intent_detection"):
+        tool_choice = detect_function_intent(user_input)
+    log.info("Detecção de intenção", event="ui.intent_detected", tool_choice=tool_choice)
     
-    print("🤖 Enviando pergunta para a OpenAI (resposta inicial)...")
-    first_response = client.chat.completions.create(
-        model="gpt-4o-mini",
-        tools=manifest["tools"],
-        tool_choice=tool_choice,
-        messages=[
-            {"role": "system", "content": prompts.system_prompt},
-            {"role": "user", "content": user_input}
-        ]
-    )
+    with tracker.span("first_completion"), deadline_phase("first_completion"), \
+            message_builder.settle_on_error():
+        first_response = client.chat.completions.create(
+            model=models.model_for("first_completion"),
+            tools=message_builder.tools,
+            tool_choice=tool_choice,
+            messages=message_builder.initial_messages(user_input, history)
+        )
 
-    # Registra primeira chamada de API
+    # Registra primeira chamada de API (e acerta a reserva do orçamento com o uso real)
+    message_builder.settle(first_response.usage)
     tracker.track_api_call(
         input_tokens=first_response.usage.prompt_tokens,
-        output_tokens=first_response.usage.completion_tokens
+        output_tokens=first_response.usage.completion_tokens,
+        cached_tokens=get_cached_tokens(first_response.usage),
+        estimated_input_tokens=message_builder.last_estimated_tokens,
+        model=models.model_for("first_completion")
     )
 
     msg = first_response.choices[0].message
@@ -101,7 +133,6 @@ try:
 
     # Processa resposta inicial
     if msg.tool_calls:
-        print("🔧 AI decidiu usar uma função...")
         call = msg.tool_calls[0]
         name = call.function.name
         args = json.loads(call.function.arguments)
@@ -112,107 +143,167 @@ try:
             "call_object": call
         }
 
-        print(f"🔧 Validando função: {name} com argumentos: {args}")
+        log.info("AI decidiu usar uma função", event="ui.tool_call", function=name, arguments=args)
 
         # Valida se todos os parâmetros necessários estão presentes
-        is_valid, humor_message = validator.validate_function_params(name, args)
+        with tracker.span("function_validation"):
+            is_valid, humor_message = validator.validate_function_params(name, args)
         
         if not is_valid:
-            print("❌ Parâmetros incompletos - respondendo com humor...")
+            log.info("Parâmetros incompletos - respondendo com humor", event="ui.validation_failed", function=name)
             initial_response = humor_message
             
             # Registra chamada de função (falhou na validação)
             tracker.track_function_call(name, args, None, False)
         else:
-            print("✅ Parâmetros válidos - executando função...")
             # Executa a função
-            function_result = LOCAL_FUNCS[name](**args)
-            print(f"✅ Resultado da função: {function_result}")
+            with tracker.span("function_execution"):
+                function_result = LOCAL_FUNCS[name](**args)
+            log.info("Função executada", event="ui.function_executed", function=name, result=function_result)
+            tool_calls.append({"name": name, "arguments": args, "result": function_result})
 
             # Registra chamada de função (sucesso)
             tracker.track_function_call(name, args, function_result, True)
 
             # Gera resposta final baseada no resultado da função
-            print("💭 Gerando resposta baseada no resultado da função...")
-            final_response_call = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": prompts.final_system_prompt},
-                    {"role": "user", "content": user_input},
-                    {"role": "assistant", "content": None, "tool_calls": [call]},
-                    {
-                        "role": "tool",
-                        "tool_call_id": call.id,
-                        "name": name,
-                        "content": json.dumps(function_result)
-                    }
-                ]
-            )
+            with tracker.span("second_completion"), deadline_phase("second_completion"), \
+                    message_builder.settle_on_error():
+                final_response_call = client.chat.completions.create(
+                    model=models.model_for("second_completion"),
+                    messages=message_builder.tool_result_messages(user_input, call, name, function_result, history)
+                )
             
             # Registra segunda chamada de API
+            message_builder.settle(final_response_call.usage)
             tracker.track_api_call(
                 input_tokens=final_response_call.usage.prompt_tokens,
-                output_tokens=final_response_call.usage.completion_tokens
+                output_tokens=final_response_call.usage.completion_tokens,
+                cached_tokens=get_cached_tokens(final_response_call.usage),
+                estimated_input_tokens=message_builder.last_estimated_tokens,
+                model=models.model_for("second_completion")
             )
             
             initial_response = final_response_call.choices[0].message.content
     else:
-        print("💬 AI respondeu diretamente sem usar funções...")
+        log.info("AI respondeu diretamente sem usar funções", event="ui.direct_response")
         initial_response = msg.content
 
-    print(f"📝 Resposta inicial: {initial_response}")
+    log.debug("Resposta inicial gerada", event="ui.initial_response", response_chars=len(initial_response or ""))
 
     # ETAPA 2: Chain of Verification
-    if cov_config.should_verify(function_call_info.get("name") if function_call_info else None):
-        print("🔍 Aplicando Chain of Verification...")
-        
+    gate_decision = verification_gate.decide(
+        user_input, function_call_info.get("name") if function_call_info else None, tool_choice
+    )
+    if gate_decision.verify:
         # Inicia fase de verificação no tracker
         tracker.start_verification_phase()
         
-        # Executa verificação e possível correção
-        final_response, verification_metadata = cov.process_with_verification(
-            user_input=user_input,
-            initial_response=initial_response,
-            function_call=function_call_info
-        )
+        # Executa verificação e possível correção (spans cov_verification/cov_correction)
+        with tracker.span("verification"), deadline_phase("verification"):
+            final_response, verification_metadata = cov.process_with_verification(
+                user_input=user_input,
+                initial_response=initial_response,
+                function_call=function_call_info,
+                tracker=tracker
+            )
+        
+        # Registra as chamadas de API feitas pelo CoV (verificação e correção)
+        for api_call in verification_metadata.get("api_calls", []):
+            tracker.track_api_call(
+                input_tokens=api_call["input_tokens"],
+                output_tokens=api_call["output_tokens"],
+                cached_tokens=api_call["cached_tokens"],
+                model=api_call["model"]
+            )
         
-        # Simula tokens da verificação (em implementação real, seria calculado)
-        verification_tokens = len(verification_metadata.get("verification_result", {}).get("issues", [])) * 50
+        # Tokens reais da verificação (soma do usage das chamadas do CoV)
+        verification_tokens = verification_metadata.get("verification_tokens_used", 0)
         
         # Finaliza fase de verificação no tracker
         tracker.end_verification_phase(
             verification_tokens=verification_tokens,
             correction_made=verification_metadata.get("correction_applied", False)
         )
-        
-        if verification_metadata.get("correction_applied", False):
-            print("✅ Resposta foi melhorada pelo Chain of Verification")
-        else:
-            print("✅ Resposta inicial aprovada na verificação")
+        verification_gate.record(gate_decision, verification_metadata)
             
     else:
-        print("⏭️ Verificação pulada para este tipo de resposta")
+        log.info("Verificação pulada para este tipo de resposta", event="ui.verification_skipped",
+                 reason=gate_decision.reason, correction_probability=gate_decision.correction_probability)
         final_response = initial_response
 
-    print(f"🎯 Resposta final: {final_response}")
+    return {"response": final_response, "tool_calls": tool_calls, "gate_decision": gate_decision}
+
+
+# Perguntas idênticas em andamento (mesmo modo, texto e histórico) compartilham uma execução;
+# falhas de orçamento ou prazo do tenant da líder não: cada uma executa por conta própria
+flight = SingleFlight.shared(prompts)
+flight_outcome = None
+
+try:
+    # Carrega o manifesto com os schemas
+    with open("config/manifest.json") as f:
+        manifest = json.load(f)
+
+    # Monta mensagens com prefixo estável (system + tools canônicas primeiro)
+    message_builder = MessageBuilder(prompts, manifest, token_budget=token_budget, tenant_id=tenant_id)
+
+    # Mapeia nome → função em functions.py
+    LOCAL_FUNCS = {
+        "schedule_meeting": schedule_meeting,
+        "generate_paper_quote": generate_paper_quote,
+        "prank_dwight": prank_dwight,
+    }
+
+    flight_outcome = flight.do(flight.key("cov", user_input, history), answer)
+    final_response = flight_outcome.value["response"]
+    if flight_outcome.leader:
+        gate_decision = flight_outcome.value["gate_decision"]
+    else:
+        log.info("Resposta compartilhada com requisição idêntica", event="ui.coalesced",
+                 waiters=flight_outcome.waiters, wait_ms=round(flight_outcome.wait_ms, 2))
+
+    log.info("Resposta final gerada", event="ui.final_response", response_chars=len(final_response or ""))
+
+    # Guarda o turno na sessão (compacta o histórico se passar do orçamento)
+    memory.record_turn(session, user_input, final_response, flight_outcome.value["tool_calls"])
+
+except TokenBudgetExceeded as e:
+    log.warning("Orçamento de tokens excedido", event="ui.token_budget_exceeded", error=str(e))
+    tracker.track_error(str(e))
+    final_response = prompts.get_error_message("token_budget_exceeded")
+
+except DeadlineExceeded as e:
+    log.error("Prazo da requisição esgotado", event="ui.deadline_exceeded", error=str(e))
+    tracker.track_error(str(e))
+    final_response = prompts.get_error_message("deadline_exceeded")
 
 except Exception as e:
-    print(f"❌ Erro durante execução: {str(e)}")
+    log.error("Erro durante execução", event="ui.error", error=str(e))
     tracker.track_error(str(e))
     final_response = f"❌ Desculpe, ocorreu um erro: {str(e)}"
 
 finally:
     # Finaliza tracking de métricas
     try:
-        metric_data = tracker.end_execution(final_response)
-        print(f"📊 Métricas coletadas - ID: {metric_data.execution_id}")
-        print(f"   • Tokens totais: {metric_data.total_tokens}")
-        print(f"   • Latência: {metric_data.total_latency_ms:.2f}ms")
-        print(f"   • Verificação usada: {metric_data.verification_used}")
-        print(f"   • Correção aplicada: {metric_data.correction_made}")
+        metadata = {}
+        if gate_decision:
+            metadata["cov_gate"] = gate_decision.to_dict()
+        if flight_outcome:
+            # Líder: quantas requisições idênticas receberam sua resposta; demais: tempo de espera
+            metadata["single_flight"] = flight_outcome.to_dict()
+        metric_data = tracker.end_execution(final_response, additional_metadata=metadata or None)
+        log.info("Métricas coletadas", event="ui.metrics_collected",
+                 execution_id=metric_data.execution_id,
+                 total_tokens=metric_data.total_tokens,
+                 total_latency_ms=round(metric_data.total_latency_ms, 2),
+                 verification_used=metric_data.verification_used,
+                 correction_made=metric_data.correction_made,
+                 phase_latency_ms=metric_data.phase_latency_ms)
     except Exception as e:
-        print(f"⚠️ Erro ao finalizar métricas: {str(e)}")
+        log.warning("Erro ao finalizar métricas", event="ui.metrics_error", error=str(e))
 
 # Exibe a resposta final para o usuário
 final_page = [MarkdownOutput(final_response)]
+if session.turns:
+    final_page.append(MarkdownOutput(f"Para continuar esta conversa, informe o código `{session_id}`."))
 run([final_page])
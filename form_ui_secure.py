@@ -1,6 +1,6 @@
 import json
 import os
-import logging
+import uuid
 from openai import OpenAI
 from src.core.functions import (
     schedule_meeting,
@@ -11,18 +11,23 @@ from abstra.forms import TextareaInput, MarkdownOutput, run
 from src.core.prompt_config import PromptConfig
 from src.security.secure_function_validator import SecureFunctionValidator
 from src.core.function_intent import detect_function_intent
+from src.core.message_builder import MessageBuilder, get_cached_tokens
+from src.core.metrics_tracker import MetricsTracker
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded
+from src.core.llm_gateway import governed
+from src.core.model_router import ModelRouter
+from src.core.resilience import DeadlineExceeded, begin_request_deadline, deadline_phase
+from src.core.single_flight import SingleFlight
+from src.core.event_log import capture_root_logging, get_event_logger
 
 # DunderOps Assistant com proteção contra prompt injection
 # Versão segura com validação e sanitização de entrada
 
-# Configurar logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
+# Configurar logging estruturado (inclui os logs dos módulos de segurança)
+capture_root_logging()
+logger = get_event_logger("form_ui_secure")
 
-print("🔒 Iniciando DunderOps Assistant Seguro...")
+logger.info("Iniciando DunderOps Assistant Seguro", event="ui.started")
 
 # Load prompt configuration
 prompts = PromptConfig()
@@ -30,7 +35,7 @@ secure_validator = SecureFunctionValidator(prompts)
 
 # Estatísticas de segurança para monitoramento
 security_stats = secure_validator.get_security_stats()
-logger.info(f"Configuração de segurança carregada: {security_stats}")
+logger.info("Configuração de segurança carregada", event="security.config_loaded", stats=security_stats)
 
 # Welcome message específico desta UI
 welcome_text = """
@@ -50,11 +55,15 @@ input_page = [
 result = run([input_page])
 user_input = result["textarea_input"]
 
-logger.info(f"Entrada recebida do usuário (tamanho: {len(user_input)})")
+logger.info("Entrada recebida do usuário", event="ui.user_input", input_chars=len(user_input))
+
+# Inicializa metrics tracker (spans por fase, incluindo as validações de segurança)
+tracker = MetricsTracker("secure")
+execution_id = tracker.start_execution(user_input)
 
 # 🔒 VALIDAÇÃO DE SEGURANÇA DA ENTRADA
-print("🔍 Validando entrada do usuário...")
-is_safe, security_error, processed_input = secure_validator.validate_user_input(user_input)
+with tracker.span("security_validation"):
+    is_safe, security_error, processed_input = secure_validator.validate_user_input(user_input)
 
 if not is_safe:
     error_message = f"""
@@ -72,13 +81,14 @@ Por favor, tente novamente com uma mensagem diferente. Evite:
 Obrigado pela compreensão! 🛡️
     """
     
-    logger.warning(f"Entrada rejeitada: {security_error}")
+    logger.warning("Entrada rejeitada", event="security.input_rejected", reason=security_error)
+    tracker.track_error(security_error)
+    tracker.end_execution(error_message)
     final_page = [MarkdownOutput(error_message)]
     run([final_page])
     exit()
 
-print("✅ Entrada validada e processada com segurança")
-logger.info("Entrada do usuário passou na validação de segurança")
+logger.info("Entrada do usuário passou na validação de segurança", event="security.input_accepted")
 
 # Configura cliente OpenAI com variável de ambiente 
 openai_api_key = os.environ.get("OPENAI_API_KEY")
@@ -89,14 +99,26 @@ if not openai_api_key:
     run([final_page])
     exit()
 
-client = OpenAI(api_key=openai_api_key)
+# Limites de taxa e concorrência compartilhados por todas as chamadas do processo
+client = governed(OpenAI(api_key=openai_api_key), prompts)
+
+# Modelo de cada fase (cov_configuration.model_routing)
+models = ModelRouter.shared(prompts)
+
+# Prazo total da requisição, dividido entre as fases (primeira e segunda chamada)
+begin_request_deadline(prompts)
 
 # Carrega o manifesto com os schemas
 try:
     with open("config/manifest.json") as f:
         manifest = json.load(f)
+    # Monta mensagens com prefixo estável (system + tools canônicas primeiro)
+    # e aplica o orçamento de tokens antes de cada envio
+    # Sem identificação do usuário nesta UI: cada execução é o seu próprio tenant
+    message_builder = MessageBuilder(prompts, manifest, token_budget=TokenBudget.shared(prompts),
+                                     tenant_id=f"anonymous:{uuid.uuid4()}")
 except Exception as e:
-    logger.error(f"Erro ao carregar manifest.json: {e}")
+    logger.error("Erro ao carregar manifest.json", event="ui.manifest_error", error=str(e))
     error_msg = "❌ Erro interno do sistema. Tente novamente mais tarde."
     final_page = [MarkdownOutput(error_msg)]
     run([final_page])
@@ -109,102 +131,161 @@ LOCAL_FUNCS = {
     "prank_dwight": prank_dwight,
 }
 
-# Envia a mensagem do usuário (processada de forma segura) para o modelo
-# Detecta se deve forçar function calling
-tool_choice = detect_function_intent(processed_input)
-print(f"🎯 Detecção de intenção: {tool_choice}")
+def answer():
+    """Executa o pipeline para a entrada validada (compartilhado entre requisições idênticas simultâneas)"""
+    # Envia a mensagem do usuário (processada de forma segura) para o modelo
+    # Detecta se deve forçar function calling
+    with tracker.span("intent_detection"):
+        tool_choice = detect_function_intent(processed_input)
+    logger.info("Detecção de intenção", event="ui.intent_detected", tool_choice=tool_choice)
+
+    try:
+        with tracker.span("first_completion"), deadline_phase("first_completion"), \
+                message_builder.settle_on_error():
+            first = client.chat.completions.create(
+                model=models.model_for("first_completion"),
+                tools=message_builder.tools,
+                tool_choice=tool_choice,
+                messages=message_builder.initial_messages(processed_input)  # Usa entrada processada
+            )
+        message_builder.settle(first.usage)
+        tracker.track_api_call(
+            input_tokens=first.usage.prompt_tokens,
+            output_tokens=first.usage.completion_tokens,
+            cached_tokens=get_cached_tokens(first.usage),
+            estimated_input_tokens=message_builder.last_estimated_tokens,
+            model=models.model_for("first_completion")
+        )
+    except TokenBudgetExceeded as e:
+        logger.warning("Orçamento de tokens excedido", event="ui.token_budget_exceeded", error=str(e))
+        return {"response": prompts.get_error_message("token_budget_exceeded"), "error": True, "function_called": False}
+    except DeadlineExceeded as e:
+        logger.error("Prazo da requisição esgotado", event="ui.deadline_exceeded", error=str(e))
+        return {"response": prompts.get_error_message("deadline_exceeded"), "error": True, "function_called": False}
+    except Exception as e:
+        logger.error("Erro na chamada da OpenAI", event="ui.api_error", error=str(e))
+        return {"response": prompts.get_error_message("api_error"), "error": True, "function_called": False}
+
+    msg = first.choices[0].message
+
+    # Checa se a AI decidiu chamar uma função
+    if msg.tool_calls:
+        call = msg.tool_calls[0]
+        function_name = call.function.name
+        raw_arguments = call.function.arguments
+
+        logger.info("Validando chamada de função", event="ui.tool_call", function=function_name)
+
+        # 🔒 VALIDAÇÃO SEGURA DA FUNÇÃO
+        with tracker.span("function_validation"):
+            is_valid, response_or_error, validated_args = secure_validator.validate_function_call(
+                function_name, raw_arguments
+            )
 
-print("🤖 Enviando pergunta segura para a OpenAI...")
-try:
-    first = client.chat.completions.create(
-        model="gpt-4o-mini",
-        tools=manifest["tools"],
-        tool_choice=tool_choice,
-        messages=[
-            {"role": "system", "content": prompts.system_prompt},
-            {"role": "user", "content": processed_input}  # Usa entrada processada
-        ]
-    )
-except Exception as e:
-    logger.error(f"Erro na chamada da OpenAI: {e}")
-    error_msg = prompts.get_error_message("api_error")
-    final_page = [MarkdownOutput(error_msg)]
-    run([final_page])
-    exit()
+        if not is_valid:
+            logger.warning("Função rejeitada ou parâmetros incompletos", event="security.function_rejected",
+                           function=function_name, reason=response_or_error)
+
+            # Pode ser erro de segurança ou parâmetros faltantes (com humor)
+            tracker.track_function_call(function_name, validated_args or {}, None, False)
+            final_response = response_or_error
+        else:
+            logger.info("Executando função com parâmetros validados", event="ui.function_started",
+                        function=function_name)
+
+            try:
+                # Executa a função com argumentos validados
+                with tracker.span("function_execution"):
+                    function_result = LOCAL_FUNCS[function_name](**validated_args)
+                tracker.track_function_call(function_name, validated_args, function_result, True)
+                logger.info("Função executada", event="ui.function_executed",
+                            function=function_name, result=function_result)
+
+                # Gera resposta final
+                with tracker.span("second_completion"), deadline_phase("second_completion"), \
+                        message_builder.settle_on_error():
+                    second = client.chat.completions.create(
+                        model=models.model_for("second_completion"),
+                        messages=message_builder.tool_result_messages(
+                            processed_input, call, function_name, function_result
+                        )
+                    )
+                message_builder.settle(second.usage)
+                tracker.track_api_call(
+                    input_tokens=second.usage.prompt_tokens,
+                    output_tokens=second.usage.completion_tokens,
+                    cached_tokens=get_cached_tokens(second.usage),
+                    estimated_input_tokens=message_builder.last_estimated_tokens,
+                    model=models.model_for("second_completion")
+                )
+                final_response = second.choices[0].message.content
+
+            except Exception as e:
+                logger.error("Erro na execução da função", event="ui.function_error",
+                             function=function_name, error=str(e))
+                error_template = prompts.get_error_message("function_error")
+                final_response = error_template.format(function_name=function_name)
+    else:
+        logger.info("AI respondeu diretamente sem usar funções", event="ui.direct_response")
+        final_response = msg.content
 
-msg = first.choices[0].message
+    # 🔒 VALIDAÇÃO E SANITIZAÇÃO DA RESPOSTA
+    with tracker.span("security_validation"):
+        is_response_safe, sanitized_response = secure_validator.validate_and_sanitize_response(final_response)
 
-# Checa se a AI decidiu chamar uma função
-if msg.tool_calls:
-    print("🔧 AI decidiu usar uma função...")
-    call = msg.tool_calls[0]
-    function_name = call.function.name
-    raw_arguments = call.function.arguments
+    if not is_response_safe:
+        logger.error("Resposta rejeitada", event="security.response_rejected", reason=sanitized_response)
+        final_response = "❌ Erro na geração da resposta. Tente reformular sua pergunta."
+    else:
+        final_response = sanitized_response
 
-    print(f"🔒 Validando função: {function_name}")
-    logger.info(f"Validando chamada de função: {function_name}")
+    return {"response": final_response, "error": False, "function_called": bool(msg.tool_calls)}
 
-    # 🔒 VALIDAÇÃO SEGURA DA FUNÇÃO
-    is_valid, response_or_error, validated_args = secure_validator.validate_function_call(
-        function_name, raw_arguments
-    )
-    
-    if not is_valid:
-        print("❌ Função rejeitada ou parâmetros incompletos")
-        logger.warning(f"Função {function_name} rejeitada: {response_or_error}")
-        
-        # Pode ser erro de segurança ou parâmetros faltantes (com humor)
-        final_response = response_or_error
+
+# Entradas validadas idênticas em andamento compartilham uma execução;
+# respostas de erro (orçamento ou prazo do tenant da líder) não: cada uma executa por conta própria
+flight = SingleFlight.shared(prompts)
+outcome = None
+
+try:
+    outcome = flight.do(flight.key("secure", processed_input), answer,
+                        shareable=lambda value: not value["error"])
+    if not outcome.leader:
+        logger.info("Resposta compartilhada com requisição idêntica", event="ui.coalesced",
+                    waiters=outcome.waiters, wait_ms=round(outcome.wait_ms, 2))
+    final_response = outcome.value["response"]
+
+    if outcome.value["error"]:
+        tracker.track_error(final_response)
     else:
-        print("✅ Função validada - executando...")
-        logger.info(f"Executando função {function_name} com parâmetros validados")
-        
-        try:
-            # Executa a função com argumentos validados
-            function_result = LOCAL_FUNCS[function_name](**validated_args)
-            print(f"✅ Resultado da função: {function_result}")
-
-            # Gera resposta final
-            print("💭 Gerando resposta final...")
-            second = client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {"role": "system", "content": prompts.final_system_prompt},
-                    {"role": "user", "content": processed_input},
-                    {"role": "assistant", "content": None, "tool_calls": [call]},
-                    {
-                        "role": "tool",
-                        "tool_call_id": call.id,
-                        "name": function_name,
-                        "content": json.dumps(function_result)
-                    }
-                ]
-            )
-            final_response = second.choices[0].message.content
-            
-        except Exception as e:
-            logger.error(f"Erro na execução da função {function_name}: {e}")
-            error_template = prompts.get_error_message("function_error")
-            final_response = error_template.format(function_name=function_name)
-else:
-    print("💬 AI respondeu diretamente sem usar funções...")
-    final_response = msg.content
-
-# 🔒 VALIDAÇÃO E SANITIZAÇÃO DA RESPOSTA
-print("🔍 Validando resposta antes de exibir...")
-is_response_safe, sanitized_response = secure_validator.validate_and_sanitize_response(final_response)
-
-if not is_response_safe:
-    logger.error(f"Resposta rejeitada: {sanitized_response}")
-    final_response = "❌ Erro na geração da resposta. Tente reformular sua pergunta."
-else:
-    final_response = sanitized_response
-
-print("🎯 Resposta final segura gerada")
-logger.info("Resposta validada e pronta para exibição")
-
-# Log de estatísticas de segurança para monitoramento
-logger.info(f"Sessão concluída com sucesso. Stats: entrada_processada=True, função_chamada={bool(msg.tool_calls)}")
+        # Log de estatísticas de segurança para monitoramento
+        logger.info("Sessão concluída com sucesso", event="ui.final_response",
+                    input_processed=True, function_called=outcome.value["function_called"],
+                    response_chars=len(final_response or ""))
+
+except DeadlineExceeded as e:
+    # Esgotou o prazo esperando a requisição idêntica
+    logger.error("Prazo da requisição esgotado", event="ui.deadline_exceeded", error=str(e))
+    tracker.track_error(str(e))
+    final_response = prompts.get_error_message("deadline_exceeded")
+
+except Exception as e:
+    logger.error("Erro durante execução", event="ui.error", error=str(e))
+    tracker.track_error(str(e))
+    final_response = prompts.get_error_message("api_error")
+
+finally:
+    # Finaliza tracking de métricas
+    try:
+        metadata = {"single_flight": outcome.to_dict()} if outcome else None
+        metric_data = tracker.end_execution(final_response, additional_metadata=metadata)
+        logger.info("Métricas coletadas", event="ui.metrics_collected",
+                    execution_id=metric_data.execution_id,
+                    total_tokens=metric_data.total_tokens,
+                    total_latency_ms=round(metric_data.total_latency_ms, 2),
+                    phase_latency_ms=metric_data.phase_latency_ms)
+    except Exception as e:
+        logger.warning("Erro ao finalizar métricas", event="ui.metrics_error", error=str(e))
 
 # Exibe a resposta final para o usuário
 final_page = [MarkdownOutput(final_response)]
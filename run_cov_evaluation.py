@@ -4,14 +4,21 @@ Script dedicado para avaliar o impacto do Chain of Verification (CoV)
 Executa testes focados nas áreas onde CoV deve mostrar maior benefício
 """
 
+import argparse
 import json
 import time
 import sys
-from tests.automated_test_runner import AutomatedTestRunner
+from tests.automated_test_runner import AutomatedTestRunner, serialize_test_result
 
 def main():
     """Executa avaliação focada do CoV"""
     
+    parser = argparse.ArgumentParser(description="Avaliação focada do Chain of Verification")
+    parser.add_argument("--batch-verification", choices=["local", "openai"], default=None,
+                        help="Verifica as respostas do CoV em lote (local: chamadas em paralelo; "
+                             "openai: Batch API, assíncrona)")
+    args = parser.parse_args()
+    
     print("🔬 AVALIAÇÃO ESPECÍFICA DO CHAIN OF VERIFICATION (CoV)")
     print("=" * 60)
     print("Este script avalia especificamente o impacto do CoV em:")
@@ -24,7 +31,7 @@ def main():
     
     try:
         # Inicializa o runner
-        runner = AutomatedTestRunner()
+        runner = AutomatedTestRunner(batch_verification=args.batch_verification)
         
         # Executa testes focados em CoV
         results = runner.run_cov_focused_tests()
@@ -40,23 +47,15 @@ def main():
                 serializable_results[impl] = {}
                 for category, test_list in results[impl].items():
                     serializable_results[impl][category] = [
-                        {
-                            "test_id": t.test_id,
-                            "success": t.success,
-                            "quality_score": t.quality_score,
-                            "execution_time_ms": t.execution_time_ms,
-                            "tokens_used": t.tokens_used,
-                            "notes": t.notes,
-                            "function_called": t.function_called,
-                            "validation_passed": t.validation_passed,
-                            "category": t.test_category
-                        } for t in test_list
+                        {**serialize_test_result(t), "category": t.test_category} for t in test_list
                     ]
         
         serializable_results["summary"] = results["summary"]
         serializable_results["cov_analysis"] = results["cov_analysis"]
         serializable_results["evaluation_timestamp"] = timestamp
+        serializable_results["rubric_hash"] = runner.rubric_hash
         serializable_results["test_focus"] = "Chain of Verification Impact Assessment"
+        serializable_results["batch_verification"] = args.batch_verification
         
         with open(cov_results_file, "w", encoding="utf-8") as f:
             json.dump(serializable_results, f, indent=2, ensure_ascii=False)
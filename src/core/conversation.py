@@ -0,0 +1,329 @@
+"""
+Sessões de conversa com memória e compactação do histórico
+
+Os pipelines montavam as mensagens só com o system prompt e a pergunta atual;
+um follow-up como "e para 1000 folhas?" exigia repetir tudo. O
+SessionMemory guarda os turnos de cada usuário (pergunta, resposta, funções
+chamadas com argumentos e resultado) e devolve o histórico para entrar entre
+o system prompt e a pergunta nova (MessageBuilder, parâmetro `history`).
+
+Custo e cache de prompt:
+    - cada turno é renderizado uma única vez, ao ser gravado, com o resultado
+      das funções podado (max_tool_payload_chars); o histórico só cresce no
+      final, então o prefixo (system + tools + histórico anterior) se repete
+      byte a byte entre turnos e é servido pelo cache do provedor;
+    - quando o histórico passa de history_token_budget, os turnos mais
+      antigos (exceto os keep_recent_turns últimos) viram um resumo até o
+      histórico cair para compact_to_ratio do orçamento; a folga faz o
+      prefixo ficar estável por vários turnos até a próxima compactação.
+
+Sessões são identificadas por um código aleatório emitido por new_session_id()
+(não por um nome digitado, que qualquer um poderia repetir); códigos
+desconhecidos não abrem sessão. Cache e arquivo usam o mesmo hash do código.
+
+Uso:
+    memory = SessionMemory.shared(prompts)
+    if not memory.exists(session_id):
+        session_id = memory.new_session_id()
+    session = memory.load(session_id)
+    messages = message_builder.initial_messages(user_input, memory.history_messages(session))
+    ...
+    memory.record_turn(session, user_input, final_response, tool_calls=[{"name": ..., "arguments": ..., "result": ...}])
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, Any, Callable, List, Optional
+
+from .prompt_config import PromptConfig
+from .message_builder import canonical_json
+from .token_budget import TokenEstimator
+from .event_log import get_event_logger
+
+log = get_event_logger("conversation")
+
+SUMMARY_HEADER = "Resumo da conversa anterior com este usuário:"
+
+# Gera o novo resumo a partir do anterior e dos turnos que saem do histórico
+Summarizer = Callable[[str, List["Turn"]], str]
+
+
+@dataclass
+class Turn:
+    """Um turno da conversa, já renderizado para o prompt"""
+    user: str
+    assistant: str
+    tool_calls: List[Dict[str, Any]] = field(default_factory=list)  # name, arguments, result (podado)
+    timestamp: float = 0.0
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """Mensagens do turno no histórico (funções como nota no início da resposta)"""
+        notes = [
+            f"[função {call['name']}({canonical_json(call.get('arguments', {}))}) → {call.get('result', '')}]"
+            for call in self.tool_calls
+        ]
+        return [
+            {"role": "user", "content": self.user},
+            {"role": "assistant", "content": "\n".join(notes + [self.assistant or ""]).strip()},
+        ]
+
+
+@dataclass
+class ConversationSession:
+    """Histórico de um usuário: resumo dos turnos compactados + turnos recentes"""
+    session_id: str
+    summary: str = ""
+    turns: List[Turn] = field(default_factory=list)
+    summarized_turns: int = 0
+    updated_at: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationSession":
+        return cls(
+            session_id=data["session_id"],
+            summary=data.get("summary", ""),
+            turns=[Turn(**turn) for turn in data.get("turns", [])],
+            summarized_turns=data.get("summarized_turns", 0),
+            updated_at=data.get("updated_at", 0.0),
+        )
+
+
+def _clip(text: Optional[str], max_chars: int) -> str:
+    """Corta o texto em max_chars, marcando o corte"""
+    text = " ".join((text or "").split())
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + "…"
+
+
+def extractive_summary(previous: str, turns: List[Turn]) -> str:
+    """Resumo sem LLM: uma linha por turno (pergunta, funções com argumentos e início da resposta)"""
+    lines = [line for line in previous.splitlines() if line.strip()]
+    for turn in turns:
+        parts = [f"Usuário: {_clip(turn.user, 160)}"]
+        parts.extend(f"{call['name']}({canonical_json(call.get('arguments', {}))})" for call in turn.tool_calls)
+        parts.append(f"Assistente: {_clip(turn.assistant, 160)}")
+        lines.append("- " + " | ".join(parts))
+    return "\n".join(lines)
+
+
+class SessionMemory:
+    """Guarda, compacta e persiste as sessões de conversa"""
+
+    _shared: Dict[str, "SessionMemory"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, directory: Optional[str] = "experiments/sessions", history_token_budget: int = 1200,
+                 compact_to_ratio: float = 0.5, keep_recent_turns: int = 2, summary_token_budget: int = 300,
+                 max_tool_payload_chars: int = 400, estimator: Optional[TokenEstimator] = None,
+                 summarizer: Optional[Summarizer] = None, max_cached_sessions: int = 256):
+        """
+        Args:
+            directory: Pasta dos arquivos de sessão (None = só em memória)
+            history_token_budget: Tokens do histórico (resumo + turnos) que disparam a compactação
+            compact_to_ratio: Fração do orçamento a que a compactação reduz o histórico
+            keep_recent_turns: Turnos mais recentes que nunca são resumidos
+            summary_token_budget: Tamanho máximo do resumo (as linhas mais antigas saem primeiro)
+            max_tool_payload_chars: Tamanho máximo do resultado de função guardado no turno
+            estimator: Estimador de tokens (um padrão é criado se omitido)
+            summarizer: Função (resumo anterior, turnos) → resumo novo (padrão: extractive_summary)
+            max_cached_sessions: Sessões mantidas em memória (LRU); as demais são relidas do
+                disco quando voltarem (sem directory, a sessão descartada se perde)
+        """
+        if not 0 < compact_to_ratio <= 1:
+            raise ValueError("compact_to_ratio deve estar entre 0 e 1")
+        if max_cached_sessions < 1:
+            raise ValueError("max_cached_sessions deve ser pelo menos 1")
+        self.directory = Path(directory) if directory else None
+        self.history_token_budget = history_token_budget
+        self.compact_to_ratio = compact_to_ratio
+        self.keep_recent_turns = keep_recent_turns
+        self.summary_token_budget = summary_token_budget
+        self.max_tool_payload_chars = max_tool_payload_chars
+        self.estimator = estimator or TokenEstimator()
+        self.summarizer = summarizer or extractive_summary
+        self.max_cached_sessions = max_cached_sessions
+        # Cache LRU: cada formulário sem código cria uma sessão nova, então o cache precisa de limite
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "SessionMemory":
+        """Cria a memória a partir da seção `sessions` do prompts.json"""
+        config = prompts.get_sessions_config()
+        return cls(
+            directory=config.get("directory", "experiments/sessions"),
+            history_token_budget=config.get("history_token_budget", 1200),
+            compact_to_ratio=config.get("compact_to_ratio", 0.5),
+            keep_recent_turns=config.get("keep_recent_turns", 2),
+            summary_token_budget=config.get("summary_token_budget", 300),
+            max_tool_payload_chars=config.get("max_tool_payload_chars", 400),
+            max_cached_sessions=config.get("max_cached_sessions", 256),
+            estimator=TokenEstimator(prompts.get_token_budget_config().get("model", "gpt-4o-mini")),
+        )
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "SessionMemory":
+        """Retorna a memória compartilhada pelo processo"""
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    @staticmethod
+    def new_session_id() -> str:
+        """Código de uma sessão nova (aleatório; quem tem o código continua a conversa)"""
+        return secrets.token_urlsafe(16)
+
+    @staticmethod
+    def session_key(session_id: str) -> str:
+        """Hash do código: chave do cache e nome do arquivo (e o que vai para logs e tenants)"""
+        return hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def exists(self, session_id: str) -> bool:
+        """Se a sessão já foi criada (no cache ou no disco)"""
+        if not session_id:
+            return False
+        key = self.session_key(session_id)
+        with self._lock:
+            if key in self._sessions:
+                return True
+        return self.directory is not None and self._path(key).exists()
+
+    def load(self, session_id: str) -> ConversationSession:
+        """Sessão do usuário (do cache, do disco ou nova)"""
+        key = self.session_key(session_id)
+        with self._lock:
+            session = self._sessions.get(key)
+            if session is not None:
+                self._sessions.move_to_end(key)
+                return session
+            session = ConversationSession(session_id)
+            if self.directory is not None:
+                path = self._path(key)
+                try:
+                    with open(path, encoding="utf-8") as f:
+                        session = ConversationSession.from_dict(json.load(f))
+                except FileNotFoundError:
+                    pass
+                except (json.JSONDecodeError, KeyError, TypeError) as e:
+                    log.warning("Sessão corrompida, começando do zero", event="conversation.load_error",
+                                session_key=key, error=str(e))
+            self._cache(key, session)
+            return session
+
+    def _cache(self, key: str, session: ConversationSession):
+        """Guarda a sessão como a mais recente e descarta as menos usadas; chamado com o lock adquirido"""
+        self._sessions[key] = session
+        self._sessions.move_to_end(key)
+        while len(self._sessions) > self.max_cached_sessions:
+            self._sessions.popitem(last=False)
+
+    def save(self, session: ConversationSession):
+        """Grava a sessão (escrita atômica: arquivo temporário + rename)"""
+        with self._lock:
+            self._write(session)
+
+    def _write(self, session: ConversationSession):
+        """Grava a sessão; chamado com o lock adquirido, para não gravar um turno pela metade"""
+        if self.directory is None:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(self.session_key(session.session_id))
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(session.to_dict(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
+
+    def forget(self, session_id: str):
+        """Apaga a sessão (cache e arquivo)"""
+        key = self.session_key(session_id)
+        with self._lock:
+            self._sessions.pop(key, None)
+            if self.directory is not None:
+                try:
+                    self._path(key).unlink()
+                except FileNotFoundError:
+                    pass
+
+    def history_messages(self, session: ConversationSession) -> List[Dict[str, Any]]:
+        """Mensagens do histórico, para entrar logo após o system prompt"""
+        messages: List[Dict[str, Any]] = []
+        if session.summary:
+            messages.append({"role": "system", "content": f"{SUMMARY_HEADER}\n{session.summary}"})
+        for turn in session.turns:
+            messages.extend(turn.messages())
+        return messages
+
+    def history_tokens(self, session: ConversationSession) -> int:
+        """Tokens estimados do histórico"""
+        return self.estimator.count_messages(self.history_messages(session))
+
+    def record_turn(self, session: ConversationSession, user_input: str, response: str,
+                    tool_calls: Optional[List[Dict[str, Any]]] = None):
+        """
+        Grava um turno, compacta se o histórico passar do orçamento e persiste
+
+        Args:
+            session: Sessão carregada com load()
+            user_input: Pergunta do usuário
+            response: Resposta final entregue
+            tool_calls: Funções chamadas no turno (name, arguments, result)
+        """
+        calls = [
+            {
+                "name": call["name"],
+                "arguments": call.get("arguments", {}),
+                "result": _clip(canonical_json(call.get("result")), self.max_tool_payload_chars),
+            }
+            for call in tool_calls or []
+        ]
+        with self._lock:
+            session.turns.append(Turn(user_input, response or "", calls, time.time()))
+            session.updated_at = time.time()
+            self._compact(session)
+            self._write(session)
+            self._cache(self.session_key(session.session_id), session)
+
+    def _compact(self, session: ConversationSession):
+        """Resume os turnos mais antigos até o histórico voltar a compact_to_ratio do orçamento"""
+        tokens = self.history_tokens(session)
+        if tokens <= self.history_token_budget:
+            return
+        target = self.history_token_budget * self.compact_to_ratio
+        foldable = max(0, len(session.turns) - self.keep_recent_turns)
+        folded = 0
+        while folded < foldable and self.estimator.count_messages(
+                [turn_message for turn in session.turns[folded:] for turn_message in turn.messages()]
+        ) + self.summary_token_budget > target:
+            folded += 1
+        if folded == 0:
+            return
+
+        summary = self.summarizer(session.summary, session.turns[:folded])
+        session.summary = self._fit_summary(summary)
+        session.turns = session.turns[folded:]
+        session.summarized_turns += folded
+        log.info("Histórico compactado", event="conversation.compacted", session_key=self.session_key(session.session_id),
+                 folded_turns=folded, tokens_before=tokens, tokens_after=self.history_tokens(session))
+
+    def _fit_summary(self, summary: str) -> str:
+        """Limita o resumo a summary_token_budget, descartando as linhas mais antigas"""
+        lines = summary.splitlines()
+        while len(lines) > 1 and self.estimator.count_text("\n".join(lines)) > self.summary_token_budget:
+            lines.pop(0)
+        text = "\n".join(lines)
+        if self.estimator.count_text(text) > self.summary_token_budget:
+            text = self.estimator.truncate_text(text, self.summary_token_budget)
+        return text
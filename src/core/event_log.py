@@ -0,0 +1,256 @@
+"""
+Logging estruturado de eventos com escrita em background
+
+Substitui os `print` decorados com emoji dos caminhos de requisição. Cada
+evento vira uma linha JSON (nível, nome do evento, mensagem e campos) e é
+colocado numa fila; a serialização e a escrita acontecem numa thread de
+background (QueueListener), fora do caminho da requisição.
+
+Configuração por variáveis de ambiente (ou configure_event_logging):
+    DUNDEROPS_LOG_LEVEL        Nível mínimo (padrão: INFO)
+    DUNDEROPS_LOG_FILE         Arquivo de saída (padrão: stderr)
+    DUNDEROPS_LOG_SAMPLE_RATE  Fração de eventos DEBUG/INFO mantidos (padrão: 1.0)
+"""
+
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Any, Optional, TextIO
+
+ROOT_LOGGER_NAME = "dunderops"
+
+_config_lock = threading.RLock()
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional["_DroppingQueueHandler"] = None
+_root_captured = False
+
+
+class JsonLineFormatter(logging.Formatter):
+    """Formata cada registro como uma linha JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None) or record.name,
+            "message": record.getMessage(),
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            payload.update(fields)
+        if record.exc_text:
+            payload["exception"] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Amostra eventos DEBUG/INFO para reduzir volume sob carga
+
+    WARNING e acima nunca são descartados.
+    """
+
+    def __init__(self, default_rate: float = 1.0, sample_rates: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            default_rate: Fração de eventos mantidos quando o evento não tem taxa própria
+            sample_rates: Taxas por nome de evento (ex: {"metrics.api_call": 0.1})
+        """
+        super().__init__()
+        self.default_rate = default_rate
+        self.sample_rates = sample_rates or {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.sample_rates.get(getattr(record, "event", None), self.default_rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+class _DroppingQueueHandler(QueueHandler):
+    """QueueHandler que descarta (e conta) eventos quando a fila está cheia"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Só resolve a mensagem; a formatação JSON fica para a thread de escrita
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class EventLogger:
+    """Fachada para emitir eventos estruturados: log.info("mensagem", event="x.y", campo=valor)"""
+
+    def __init__(self, logger: logging.Logger):
+        self._logger = logger
+
+    def log(self, level: int, message: str, event: Optional[str] = None, **fields: Any):
+        """
+        Emite um evento
+
+        Os campos são serializados na thread de escrita; não passe objetos que
+        serão modificados logo após a chamada.
+
+        Args:
+            level: Nível do logging (logging.INFO, ...)
+            message: Mensagem legível
+            event: Nome estável do evento (ex: "metrics.api_call")
+            **fields: Campos estruturados do evento
+        """
+        if not self._logger.isEnabledFor(level):
+            return
+        self._logger.log(level, message, extra={"event": event, "fields": fields})
+
+    def debug(self, message: str, event: Optional[str] = None, **fields: Any):
+        self.log(logging.DEBUG, message, event, **fields)
+
+    def info(self, message: str, event: Optional[str] = None, **fields: Any):
+        self.log(logging.INFO, message, event, **fields)
+
+    def warning(self, message: str, event: Optional[str] = None, **fields: Any):
+        self.log(logging.WARNING, message, event, **fields)
+
+    def error(self, message: str, event: Optional[str] = None, **fields: Any):
+        self.log(logging.ERROR, message, event, **fields)
+
+
+def configure_event_logging(level: Optional[str] = None,
+                            path: Optional[str] = None,
+                            stream: Optional[TextIO] = None,
+                            default_sample_rate: Optional[float] = None,
+                            sample_rates: Optional[Dict[str, float]] = None,
+                            capture_root: bool = False,
+                            queue_size: int = 10000) -> QueueListener:
+    """
+    Configura (ou reconfigura) o sink de eventos
+
+    Args:
+        level: Nível mínimo (padrão: DUNDEROPS_LOG_LEVEL ou INFO)
+        path: Arquivo JSONL de saída (padrão: DUNDEROPS_LOG_FILE ou stream)
+        stream: Stream de saída quando não há arquivo (padrão: stderr)
+        default_sample_rate: Fração de eventos DEBUG/INFO mantidos
+        sample_rates: Taxas de amostragem por nome de evento
+        capture_root: Também envia os logs do logger raiz (ex: src.security) para o sink
+        queue_size: Tamanho máximo da fila; eventos excedentes são descartados
+
+    Returns:
+        QueueListener em execução
+    """
+    global _listener, _queue_handler, _root_captured
+
+    level = (level or os.environ.get("DUNDEROPS_LOG_LEVEL", "INFO")).upper()
+    path = path or os.environ.get("DUNDEROPS_LOG_FILE")
+    if default_sample_rate is None:
+        default_sample_rate = float(os.environ.get("DUNDEROPS_LOG_SAMPLE_RATE", "1.0"))
+
+    with _config_lock:
+        # Reconfigurar mantém a captura do logger raiz, se já estava ativa
+        capture_root = capture_root or _root_captured
+        _shutdown_locked()
+
+        if path:
+            writer: logging.Handler = logging.FileHandler(path, encoding="utf-8")
+        else:
+            writer = logging.StreamHandler(stream or sys.stderr)
+        writer.setFormatter(JsonLineFormatter())
+
+        _queue_handler = _DroppingQueueHandler(queue.Queue(maxsize=queue_size))
+        _queue_handler.addFilter(SamplingFilter(default_sample_rate, sample_rates))
+
+        logger = logging.getLogger(ROOT_LOGGER_NAME)
+        logger.setLevel(level)
+        logger.propagate = False
+        logger.addHandler(_queue_handler)
+
+        if capture_root:
+            root = logging.getLogger()
+            root.setLevel(level)
+            root.addHandler(_queue_handler)
+            _root_captured = True
+
+        _listener = QueueListener(_queue_handler.queue, writer, respect_handler_level=True)
+        _listener.start()
+        return _listener
+
+
+def _shutdown_locked():
+    """Para o listener atual e remove o handler (chamar com _config_lock adquirido)"""
+    global _listener, _queue_handler, _root_captured
+
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+    if _queue_handler is not None:
+        logging.getLogger(ROOT_LOGGER_NAME).removeHandler(_queue_handler)
+        if _root_captured:
+            logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    _root_captured = False
+
+
+def capture_root_logging():
+    """Envia também os logs do logger raiz (ex: src.security) para o sink de eventos"""
+    global _root_captured
+
+    with _config_lock:
+        if _listener is None:
+            configure_event_logging(capture_root=True)
+        elif not _root_captured:
+            root = logging.getLogger()
+            root.setLevel(logging.getLogger(ROOT_LOGGER_NAME).level)
+            root.addHandler(_queue_handler)
+            _root_captured = True
+
+
+def shutdown_event_logging():
+    """Esvazia a fila e para a thread de escrita"""
+    with _config_lock:
+        _shutdown_locked()
+
+
+def dropped_events() -> int:
+    """Quantidade de eventos descartados por fila cheia desde a última configuração"""
+    return _queue_handler.dropped if _queue_handler else 0
+
+
+def get_event_logger(name: str) -> EventLogger:
+    """
+    Retorna o logger de eventos de um componente
+
+    Configura o sink com os valores padrão na primeira chamada.
+
+    Args:
+        name: Nome do componente (ex: "metrics_tracker", "cov")
+    """
+    if _listener is None:
+        with _config_lock:
+            if _listener is None:
+                configure_event_logging()
+    return EventLogger(logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}"))
+
+
+atexit.register(shutdown_event_logging)
@@ -0,0 +1,558 @@
+"""
+Catálogo indexado de experimentos (SQLite embutido)
+
+Guarda experimentos, runs (uma implementação dentro de um experimento) e as
+métricas de cada execução em tabelas indexadas por implementação, categoria,
+função, data e hash de configuração. Perguntas como "p95 de latência do CoV em
+orçamentos na última semana" viram uma consulta indexada, sem abrir nenhum
+arquivo JSON.
+
+Uso pela linha de comando:
+    python -m src.core.experiment_catalog index
+    python -m src.core.experiment_catalog query --implementation cov \\
+        --function generate_paper_quote --since 7d --quantiles 0.5 0.95
+"""
+
+import json
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from .jsonl_segments import read_jsonl, segment_paths
+from .percentile_sketch import DEFAULT_QUANTILES, quantile_label
+
+TimeSpec = Union[None, float, int, str, datetime]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS experiments (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created_at REAL NOT NULL,
+    config_hash TEXT
+);
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    experiment_id INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    implementation TEXT NOT NULL,
+    source TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    config_hash TEXT,
+    UNIQUE (experiment_id, implementation, source)
+);
+CREATE TABLE IF NOT EXISTS executions (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    experiment_id INTEGER NOT NULL,
+    implementation TEXT NOT NULL,
+    category TEXT,
+    function_called TEXT,
+    ts REAL NOT NULL,
+    config_hash TEXT,
+    success INTEGER,
+    latency_ms REAL,
+    total_tokens INTEGER,
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    quality_score REAL
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    experiment_id INTEGER NOT NULL REFERENCES experiments(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE
+);
+CREATE INDEX IF NOT EXISTS idx_exec_impl_ts ON executions (implementation, ts);
+CREATE INDEX IF NOT EXISTS idx_exec_category_ts ON executions (category, ts);
+CREATE INDEX IF NOT EXISTS idx_exec_function_ts ON executions (function_called, ts);
+CREATE INDEX IF NOT EXISTS idx_exec_config ON executions (config_hash);
+CREATE INDEX IF NOT EXISTS idx_exec_run ON executions (run_id);
+CREATE INDEX IF NOT EXISTS idx_exec_experiment ON executions (experiment_id);
+CREATE INDEX IF NOT EXISTS idx_experiments_created ON experiments (created_at);
+"""
+
+EXECUTION_COLUMNS = ("category", "function_called", "ts", "success", "latency_ms",
+                     "total_tokens", "input_tokens", "output_tokens", "quality_score")
+
+METRIC_COLUMNS = ("latency_ms", "total_tokens", "input_tokens", "output_tokens", "quality_score")
+
+# Agrupamentos permitidos → expressão SQL (whitelist, nunca interpolar entrada do usuário)
+GROUP_BY = {
+    "implementation": "e.implementation",
+    "category": "e.category",
+    "function": "e.function_called",
+    "config_hash": "e.config_hash",
+    "experiment": "x.name",
+    "day": "date(e.ts, 'unixepoch', 'localtime')",
+}
+
+_RELATIVE_TIME = re.compile(r"^(\d+(?:\.\d+)?)([smhdw])$")
+_RAW_METRICS_NAME = re.compile(r"^(?P<experiment>.+)_(?P<implementation>[^_]+)_metrics"
+                               r"(?:\.\d{5}\.jsonl(?:\.gz|\.zst)?|\.json|\.mseg)$")
+
+
+def parse_time(value: TimeSpec) -> Optional[float]:
+    """
+    Converte uma referência de tempo em epoch (segundos)
+
+    Aceita epoch, datetime, data/hora ISO ("2024-01-15", "2024-01-15T14:00")
+    ou tempo relativo ao agora ("30m", "24h", "7d", "2w").
+    """
+    if value is None or isinstance(value, (int, float)):
+        return value
+    if isinstance(value, datetime):
+        return value.timestamp()
+    match = _RELATIVE_TIME.match(value.strip())
+    if match:
+        amount, unit = float(match.group(1)), match.group(2)
+        seconds = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}[unit]
+        return time.time() - amount * seconds
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        raise ValueError(f"Referência de tempo inválida: {value!r}")
+
+
+def _epoch(timestamp: Any, default: float) -> float:
+    if isinstance(timestamp, (int, float)):
+        return float(timestamp)
+    try:
+        return datetime.fromisoformat(timestamp).timestamp()
+    except (TypeError, ValueError):
+        return default
+
+
+def metric_row(metric: Union[Dict[str, Any], Any], default_ts: float,
+               category: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Linha de execução a partir de um MetricData (ou do seu to_dict())
+
+    A categoria vem de additional_metadata["test_category"], gravada pelos
+    runners que executam casos de teste; execuções fora de um caso de teste
+    (formulários, demos) ficam com `category` (padrão None).
+    """
+    data = metric if isinstance(metric, dict) else metric.to_dict()
+    metadata = data.get("additional_metadata") or {}
+    return {
+        "category": metadata.get("test_category", category),
+        "function_called": data.get("function_called"),
+        "ts": _epoch(data.get("timestamp"), default_ts),
+        # Mesmo critério de sucesso do MetricStore e da análise estatística (respostas diretas contam)
+        "success": int(not data.get("error_occurred", False) and data.get("response_complete", True)),
+        "latency_ms": data.get("total_latency_ms"),
+        "total_tokens": data.get("total_tokens"),
+        "input_tokens": data.get("total_input_tokens"),
+        "output_tokens": data.get("total_output_tokens"),
+        "quality_score": None,
+    }
+
+
+def result_row(result: Union[Dict[str, Any], Any], ts: float,
+               category: Optional[str] = None) -> Dict[str, Any]:
+    """Linha de execução a partir de um TestResult (ou do seu dicionário salvo)"""
+    data = result if isinstance(result, dict) else vars(result)
+    return {
+        "category": data.get("test_category", category),
+        "function_called": data.get("function_called"),
+        "ts": ts,
+        "success": int(bool(data.get("success"))),
+        "latency_ms": data.get("execution_time_ms"),
+        "total_tokens": data.get("tokens_used"),
+        "input_tokens": None,
+        "output_tokens": None,
+        "quality_score": data.get("quality_score"),
+    }
+
+
+class ExperimentCatalog:
+    """
+    Catálogo SQLite de experimentos, runs e execuções
+
+    Cada operação abre sua própria conexão (modo WAL), então o catálogo pode
+    ser usado por várias threads e processos ao mesmo tempo.
+    """
+
+    def __init__(self, path: Union[str, Path] = "experiments/catalog.sqlite"):
+        """
+        Args:
+            path: Arquivo do banco SQLite (criado se não existir)
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(str(self.path), timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys=ON")
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    # ------------------------------------------------------------------
+    # Registro
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _experiment_id(conn: sqlite3.Connection, name: str, created_at: Optional[float],
+                       config_hash: Optional[str]) -> int:
+        conn.execute(
+            "INSERT OR IGNORE INTO experiments (name, created_at, config_hash) VALUES (?, ?, ?)",
+            (name, created_at if created_at is not None else time.time(), config_hash)
+        )
+        if config_hash:
+            conn.execute("UPDATE experiments SET config_hash = ? WHERE name = ? AND config_hash IS NULL",
+                         (config_hash, name))
+        return conn.execute("SELECT id FROM experiments WHERE name = ?", (name,)).fetchone()[0]
+
+    def register_experiment(self, name: str, config_hash: Optional[str] = None,
+                            created_at: Optional[float] = None) -> int:
+        """Registra um experimento (idempotente) e retorna seu id"""
+        with self._connect() as conn:
+            return self._experiment_id(conn, name, created_at, config_hash)
+
+    def register_run(self, experiment: str, implementation: str, source: str,
+                     rows: Iterable[Dict[str, Any]], config_hash: Optional[str] = None,
+                     started_at: Optional[float] = None) -> int:
+        """
+        Registra (ou substitui) as execuções de uma implementação em um experimento
+
+        Args:
+            experiment: Nome do experimento
+            implementation: Implementação ("original", "cov", ...)
+            source: Arquivo ou caminho base de onde vieram os dados
+            rows: Linhas de execução (ver metric_row / result_row)
+            config_hash: Hash da configuração usada (PromptConfig.config_hash)
+            started_at: Início do run em epoch (padrão: agora)
+
+        Returns:
+            Número de execuções registradas
+        """
+        started_at = started_at if started_at is not None else time.time()
+        with self._connect() as conn:
+            experiment_id = self._experiment_id(conn, experiment, started_at, config_hash)
+            conn.execute("DELETE FROM runs WHERE experiment_id = ? AND implementation = ? AND source = ?",
+                         (experiment_id, implementation, source))
+            run_id = conn.execute(
+                "INSERT INTO runs (experiment_id, implementation, source, started_at, config_hash) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (experiment_id, implementation, source, started_at, config_hash)
+            ).lastrowid
+            placeholders = ", ".join("?" * (len(EXECUTION_COLUMNS) + 4))
+            cursor = conn.executemany(
+                f"INSERT INTO executions (run_id, experiment_id, implementation, config_hash, "
+                f"{', '.join(EXECUTION_COLUMNS)}) VALUES ({placeholders})",
+                ((run_id, experiment_id, implementation, config_hash,
+                  *(row[column] for column in EXECUTION_COLUMNS)) for row in rows)
+            )
+            return cursor.rowcount
+
+    def add_metrics(self, experiment: str, implementation: str, metrics: Iterable[Any],
+                    source: str, config_hash: Optional[str] = None, category: Optional[str] = None) -> int:
+        """Registra MetricData (lista, MetricStore ou iterador) de uma implementação"""
+        now = time.time()
+        return self.register_run(experiment, implementation, source,
+                                 (metric_row(metric, now, category) for metric in metrics),
+                                 config_hash=config_hash)
+
+    def add_test_results(self, experiment: str, implementation: str,
+                         results: Dict[str, List[Any]], source: str, timestamp: float,
+                         config_hash: Optional[str] = None) -> int:
+        """Registra os TestResult de um run do AutomatedTestRunner (por categoria)"""
+        rows = (result_row(result, timestamp, category)
+                for category, tests in results.items() if isinstance(tests, list)
+                for result in tests)
+        return self.register_run(experiment, implementation, source, rows,
+                                 config_hash=config_hash, started_at=timestamp)
+
+    def add_artifact(self, experiment: str, kind: str, path: Union[str, Path]):
+        """Associa um arquivo (comparação, relatório, trace, dados brutos) ao experimento"""
+        with self._connect() as conn:
+            experiment_id = self._experiment_id(conn, experiment, None, None)
+            conn.execute("INSERT OR REPLACE INTO artifacts (experiment_id, kind, path) VALUES (?, ?, ?)",
+                         (experiment_id, kind, str(path)))
+
+    # ------------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _where(implementation: Optional[str] = None, category: Optional[str] = None,
+               function: Optional[str] = None, since: TimeSpec = None, until: TimeSpec = None,
+               config_hash: Optional[str] = None, experiment: Optional[str] = None,
+               success: Optional[bool] = None) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for column, value in (("e.implementation", implementation), ("e.category", category),
+                              ("e.function_called", function), ("e.config_hash", config_hash),
+                              ("x.name", experiment)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if success is not None:
+            clauses.append("e.success = ?")
+            params.append(int(success))
+        if since is not None:
+            clauses.append("e.ts >= ?")
+            params.append(parse_time(since))
+        if until is not None:
+            clauses.append("e.ts < ?")
+            params.append(parse_time(until))
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def executions(self, limit: Optional[int] = None, **filters) -> List[Dict[str, Any]]:
+        """
+        Lista execuções filtradas (mais recentes primeiro)
+
+        Filtros: implementation, category, function, since, until, config_hash,
+        experiment, success.
+        """
+        where, params = self._where(**filters)
+        sql = (f"SELECT x.name AS experiment, e.implementation, e.config_hash, "
+               f"{', '.join('e.' + column for column in EXECUTION_COLUMNS)} "
+               f"FROM executions e JOIN experiments x ON x.id = e.experiment_id{where} "
+               f"ORDER BY e.ts DESC")
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def aggregate(self, group_by: Union[None, str, List[str]] = None, metric: str = "latency_ms",
+                  quantiles: Tuple[float, ...] = DEFAULT_QUANTILES, **filters) -> List[Dict[str, Any]]:
+        """
+        Agregados por grupo: contagem, taxa de sucesso, médias e percentis exatos
+
+        Args:
+            group_by: Um ou mais de implementation, category, function,
+                config_hash, experiment, day
+            metric: Coluna usada nos percentis (latency_ms, total_tokens, ...)
+            quantiles: Quantis a calcular (0.95 → p95)
+            **filters: Mesmos filtros de executions()
+
+        Returns:
+            Uma linha por grupo, ordenada pelas chaves do agrupamento
+        """
+        if metric not in METRIC_COLUMNS:
+            raise ValueError(f"Métrica desconhecida: {metric}")
+        groups = [group_by] if isinstance(group_by, str) else list(group_by or [])
+        unknown = [group for group in groups if group not in GROUP_BY]
+        if unknown:
+            raise ValueError(f"Agrupamento desconhecido: {', '.join(unknown)}")
+        where, params = self._where(**filters)
+        keys = [f"{GROUP_BY[group]} AS {group}" for group in groups]
+        sql = (f"SELECT {', '.join(keys + ['e.success', 'e.latency_ms', 'e.total_tokens', f'e.{metric} AS value'])} "
+               f"FROM executions e JOIN experiments x ON x.id = e.experiment_id{where}")
+        if groups:
+            sql += f" ORDER BY {', '.join(GROUP_BY[group] for group in groups)}"
+
+        buckets: Dict[Tuple[Any, ...], List[Tuple[Any, ...]]] = {}
+        with self._connect() as conn:
+            for row in conn.execute(sql, params):
+                buckets.setdefault(tuple(row[group] for group in groups), []).append(tuple(row)[len(groups):])
+
+        result = []
+        for key, rows in buckets.items():
+            success, latency, tokens, values = (np.array(column, dtype=float) for column in zip(*rows))
+            values = values[~np.isnan(values)]
+            entry = dict(zip(groups, key))
+            entry.update({
+                "count": len(rows),
+                "success_rate": float(np.nanmean(success) * 100) if len(rows) else 0.0,
+                "avg_latency_ms": float(np.nanmean(latency)) if not np.isnan(latency).all() else 0.0,
+                "avg_tokens": float(np.nanmean(tokens)) if not np.isnan(tokens).all() else 0.0,
+            })
+            for q in quantiles:
+                entry[f"{metric}_{quantile_label(q)}"] = float(np.quantile(values, q)) if len(values) else 0.0
+            result.append(entry)
+        return result
+
+    def experiments(self, before: TimeSpec = None) -> List[Dict[str, Any]]:
+        """Lista experimentos com contagem de runs e execuções (mais recentes primeiro)"""
+        sql = ("SELECT x.name, x.created_at, x.config_hash, "
+               "(SELECT COUNT(*) FROM runs r WHERE r.experiment_id = x.id) AS runs, "
+               "(SELECT COUNT(*) FROM executions e WHERE e.experiment_id = x.id) AS executions "
+               "FROM experiments x")
+        params: List[Any] = []
+        if before is not None:
+            sql += " WHERE x.created_at < ?"
+            params.append(parse_time(before))
+        sql += " ORDER BY x.created_at DESC"
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(sql, params)]
+
+    def artifacts(self, experiment: Optional[str] = None, kind: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Lista arquivos associados aos experimentos"""
+        clauses, params = [], []
+        if experiment is not None:
+            clauses.append("x.name = ?")
+            params.append(experiment)
+        if kind is not None:
+            clauses.append("a.kind = ?")
+            params.append(kind)
+        where = (" WHERE " + " AND ".join(clauses)) if clauses else ""
+        with self._connect() as conn:
+            return [dict(row) for row in conn.execute(
+                f"SELECT x.name AS experiment, a.kind, a.path FROM artifacts a "
+                f"JOIN experiments x ON x.id = a.experiment_id{where} ORDER BY a.path", params)]
+
+    def stats(self) -> Dict[str, int]:
+        """Totais do catálogo"""
+        with self._connect() as conn:
+            return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                    for table in ("experiments", "runs", "executions", "artifacts")}
+
+    def remove_experiment(self, name: str) -> List[str]:
+        """
+        Remove um experimento do catálogo
+
+        Returns:
+            Caminhos dos artefatos que estavam associados a ele
+        """
+        paths = [artifact["path"] for artifact in self.artifacts(experiment=name)]
+        with self._connect() as conn:
+            conn.execute("DELETE FROM experiments WHERE name = ?", (name,))
+        return paths
+
+    # ------------------------------------------------------------------
+    # Indexação de arquivos já existentes
+    # ------------------------------------------------------------------
+
+    def index_directory(self, experiments_dir: Union[str, Path] = "experiments") -> Dict[str, int]:
+        """
+        Indexa os arquivos de um diretório de experimentos já existente
+
+        Lê test_results_*.json, raw_data/ (JSONL e JSON antigo), comparisons/,
+        reports/ e traces/. Pode ser executado de novo: runs já indexados são
+        substituídos.
+
+        Returns:
+            Contagem de runs e artefatos indexados
+        """
+        experiments_dir = Path(experiments_dir)
+        counts = {"runs": 0, "artifacts": 0}
+
+        for path in sorted(experiments_dir.glob("test_results_*.json")):
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if "_metadata" in data:
+                # Um run: {categoria: [resultados], "_metadata": {...}}
+                metadata = data["_metadata"]
+                runs = {metadata.get("implementation", "unknown"): data}
+                timestamp = metadata.get("timestamp", path.stat().st_mtime)
+            else:
+                # Comparação: {implementação: {categoria: [resultados]}, "summary": {...}}
+                runs = {implementation: categories for implementation, categories in data.items()
+                        if isinstance(categories, dict)
+                        and any(isinstance(tests, list) for tests in categories.values())}
+                timestamp = path.stat().st_mtime
+            for implementation, results in runs.items():
+                self.add_test_results(path.stem, implementation, results, str(path), timestamp)
+                counts["runs"] += 1
+            self.add_artifact(path.stem, "test_results", path)
+            counts["artifacts"] += 1
+
+        raw_dir = experiments_dir / "raw_data"
+        raw_runs: Dict[Tuple[str, str], List[Path]] = {}
+        for path in sorted(raw_dir.glob("*_metrics*")):
+            match = _RAW_METRICS_NAME.match(path.name)
+            if match and path.suffix == ".mseg":
+                # Snapshot binário do mesmo run: só o arquivo é associado
+                self.add_artifact(match["experiment"], "metric_segment", path)
+                counts["artifacts"] += 1
+            elif match:
+                raw_runs.setdefault((match["experiment"], match["implementation"]), []).append(path)
+        for (experiment, implementation), paths in raw_runs.items():
+            for path in paths:
+                self.add_artifact(experiment, "raw_metrics", path)
+                counts["artifacts"] += 1
+                if path.suffix == ".json":
+                    # Formato antigo: um documento JSON por run
+                    with open(path, "r", encoding="utf-8") as f:
+                        self.add_metrics(experiment, implementation, json.load(f)["metrics"], str(path))
+                    counts["runs"] += 1
+            if any(path.suffix != ".json" for path in paths):
+                # Segmentos JSONL formam um único run, identificado pelo caminho base
+                base = raw_dir / f"{experiment}_{implementation}_metrics"
+                records = (record for segment in segment_paths(base) for record in read_jsonl(segment))
+                self.add_metrics(experiment, implementation, records, str(base))
+                counts["runs"] += 1
+
+        for directory, kind, suffix in (("comparisons", "comparison", ".json"),
+                                        ("reports", "report", "_report.txt"),
+                                        ("traces", "trace", ".trace.json")):
+            for path in sorted((experiments_dir / directory).glob(f"*{suffix}")):
+                self.add_artifact(path.name[:-len(suffix)], kind, path)
+                counts["artifacts"] += 1
+
+        return counts
+
+
+def format_aggregates(rows: List[Dict[str, Any]]) -> str:
+    """Formata o resultado de aggregate() como tabela de texto"""
+    if not rows:
+        return "Nenhuma execução encontrada para os filtros informados."
+    columns = list(rows[0].keys())
+    cells = [[f"{row[c]:.2f}" if isinstance(row[c], float) else str(row[c]) for c in columns] for row in rows]
+    widths = [max(len(c), *(len(line[i]) for line in cells)) for i, c in enumerate(columns)]
+    lines = ["  ".join(c.ljust(w) for c, w in zip(columns, widths)),
+             "  ".join("-" * w for w in widths)]
+    lines.extend("  ".join(v.ljust(w) for v, w in zip(line, widths)) for line in cells)
+    return "\n".join(lines)
+
+
+def main():
+    """Linha de comando do catálogo"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Catálogo de experimentos DunderOps")
+    parser.add_argument("--db", default="experiments/catalog.sqlite", help="Arquivo do catálogo")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    index_cmd = commands.add_parser("index", help="Indexa os arquivos de um diretório de experimentos")
+    index_cmd.add_argument("--dir", default="experiments", help="Diretório de experimentos")
+
+    commands.add_parser("list", help="Lista experimentos catalogados")
+
+    query_cmd = commands.add_parser("query", help="Agregados filtrados (contagem, sucesso, percentis)")
+    query_cmd.add_argument("--implementation", help="original, cov, secure, ...")
+    query_cmd.add_argument("--category", help="Categoria do caso de teste")
+    query_cmd.add_argument("--function", help="Função chamada (ex: generate_paper_quote)")
+    query_cmd.add_argument("--experiment", help="Nome do experimento")
+    query_cmd.add_argument("--config-hash", help="Hash da configuração de prompts")
+    query_cmd.add_argument("--since", help="Início: ISO (2024-01-15) ou relativo (7d, 24h)")
+    query_cmd.add_argument("--until", help="Fim: ISO ou relativo")
+    query_cmd.add_argument("--group-by", nargs="*", default=[], choices=sorted(GROUP_BY))
+    query_cmd.add_argument("--metric", default="latency_ms", choices=METRIC_COLUMNS)
+    query_cmd.add_argument("--quantiles", nargs="*", type=float, default=list(DEFAULT_QUANTILES))
+    query_cmd.add_argument("--json", action="store_true", help="Saída em JSON")
+
+    args = parser.parse_args()
+    catalog = ExperimentCatalog(args.db)
+
+    if args.command == "index":
+        counts = catalog.index_directory(args.dir)
+        print(f"📚 Indexados: {counts['runs']} runs, {counts['artifacts']} artefatos")
+    elif args.command == "list":
+        for experiment in catalog.experiments():
+            created = datetime.fromtimestamp(experiment["created_at"]).strftime("%Y-%m-%d %H:%M")
+            print(f"{created}  {experiment['name']}  runs={experiment['runs']}  "
+                  f"execuções={experiment['executions']}  config={experiment['config_hash'] or '-'}")
+    else:
+        rows = catalog.aggregate(
+            group_by=args.group_by, metric=args.metric, quantiles=tuple(args.quantiles),
+            implementation=args.implementation, category=args.category, function=args.function,
+            experiment=args.experiment, config_hash=args.config_hash,
+            since=args.since, until=args.until
+        )
+        print(json.dumps(rows, indent=2, ensure_ascii=False) if args.json else format_aggregates(rows))
+
+
+if __name__ == "__main__":
+    main()
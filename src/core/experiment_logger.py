@@ -2,12 +2,20 @@
 Sistema de logging para experimentos de comparação entre implementações
 """
 
+import itertools
 import json
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Union
 
 from .metrics_tracker import MetricData, MetricsAnalyzer
+from .percentile_sketch import MetricsAggregator
+from .metric_store import MetricStore, SEGMENT_SUFFIX
+from .experiment_catalog import ExperimentCatalog
+from .jsonl_segments import JsonlSegmentWriter, read_jsonl, read_segments, segment_paths
+from .event_log import get_event_logger
+
+log = get_event_logger("experiment_logger")
 
 
 class ExperimentLogger:
@@ -27,77 +35,239 @@ class ExperimentLogger:
         (self.experiments_dir / "raw_data").mkdir(exist_ok=True)
         (self.experiments_dir / "comparisons").mkdir(exist_ok=True)
         (self.experiments_dir / "reports").mkdir(exist_ok=True)
+        (self.experiments_dir / "traces").mkdir(exist_ok=True)
+        
+        # Catálogo indexado (SQLite) de experimentos, runs e execuções
+        self.catalog = ExperimentCatalog(self.experiments_dir / "catalog.sqlite")
         
-        print(f"📁 [ExperimentLogger] Diretório configurado: {self.experiments_dir}")
+        log.debug("Diretório configurado", event="experiments.dir_configured",
+                  path=str(self.experiments_dir))
     
-    def save_metrics(self, metrics: List[MetricData], 
+    def _metrics_base_path(self, experiment_name: str, implementation_type: str) -> Path:
+        return self.experiments_dir / "raw_data" / f"{experiment_name}_{implementation_type}_metrics"
+
+    def open_metrics_writer(self, experiment_name: str, implementation_type: str,
+                            compression: Optional[str] = None,
+                            max_segment_bytes: Optional[int] = None) -> JsonlSegmentWriter:
+        """
+        Abre um writer append-only para as métricas de uma implementação
+        
+        Cada chamada é um run novo: reexecutar um experimento com o mesmo nome
+        substitui os segmentos do run anterior (e, no catálogo, suas execuções).
+        
+        Args:
+            experiment_name: Nome do experimento
+            implementation_type: Tipo da implementação ("original" ou "cov")
+            compression: None, "gzip" ou "zstd"
+            max_segment_bytes: Tamanho para rotacionar o segmento (opcional)
+            
+        Returns:
+            JsonlSegmentWriter gravando em raw_data/<experimento>_<impl>_metrics.*.jsonl
+        """
+        return JsonlSegmentWriter(
+            self._metrics_base_path(experiment_name, implementation_type),
+            compression=compression, max_segment_bytes=max_segment_bytes
+        )
+    
+    def save_metrics(self, metrics: Union[List[MetricData], MetricStore], 
                     implementation_type: str, 
-                    experiment_name: Optional[str] = None) -> str:
+                    experiment_name: Optional[str] = None,
+                    compression: Optional[str] = None,
+                    config_hash: Optional[str] = None) -> str:
         """
-        Salva métricas brutas de uma implementação
+        Salva métricas brutas de uma implementação (uma linha JSONL por execução)
         
         Args:
-            metrics: Lista de métricas coletadas
+            metrics: Métricas coletadas (lista ou MetricStore)
             implementation_type: Tipo da implementação ("original" ou "cov")
             experiment_name: Nome do experimento (opcional)
+            compression: None, "gzip" ou "zstd"
+            config_hash: Hash da configuração usada (registrado no catálogo)
             
         Returns:
-            Caminho do arquivo salvo
+            Caminho do primeiro segmento salvo
         """
         if not experiment_name:
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             experiment_name = f"experiment_{timestamp}"
         
-        filename = f"{experiment_name}_{implementation_type}_metrics.json"
-        filepath = self.experiments_dir / "raw_data" / filename
+        with self.open_metrics_writer(experiment_name, implementation_type, compression) as writer:
+            for metric in metrics:
+                writer.write(metric.to_dict())
         
-        # Converte métricas para dicionário serializável
-        data = {
-            "experiment_name": experiment_name,
-            "implementation_type": implementation_type,
-            "timestamp": datetime.now().isoformat(),
-            "total_executions": len(metrics),
-            "metrics": [metric.to_dict() for metric in metrics]
-        }
+        base_path = self._metrics_base_path(experiment_name, implementation_type)
+        self.register_run(experiment_name, implementation_type, base_path, config_hash)
         
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+        filepath = writer.segments[0] if writer.segments else base_path
+        log.info("Métricas salvas", event="experiments.metrics_saved",
+                 path=str(filepath), count=writer.records_written)
+        return str(filepath)
+
+    def register_run(self, experiment_name: str, implementation_type: str,
+                     base_path: Path, config_hash: Optional[str] = None) -> int:
+        """
+        Registra no catálogo as métricas gravadas nos segmentos de um run
         
-        print(f"💾 [ExperimentLogger] Métricas salvas: {filepath}")
+        Args:
+            experiment_name: Nome do experimento
+            implementation_type: Tipo da implementação
+            base_path: Caminho base dos segmentos JSONL
+            config_hash: Hash da configuração usada (opcional)
+            
+        Returns:
+            Número de execuções registradas
+        """
+        count = self.catalog.add_metrics(
+            experiment_name, implementation_type,
+            self.iter_metrics(str(base_path)), str(base_path), config_hash
+        )
+        for segment in segment_paths(base_path):
+            self.catalog.add_artifact(experiment_name, "raw_metrics", segment)
+        return count
+
+    def save_trace(self, metrics: Iterable[MetricData], experiment_name: str) -> str:
+        """
+        Salva os spans das execuções no formato Chrome Trace (chrome://tracing, Perfetto)
+
+        Args:
+            metrics: Métricas com spans (lista, MetricStore ou iterador)
+            experiment_name: Nome do experimento
+
+        Returns:
+            Caminho do arquivo de trace salvo
+        """
+        filepath = self.experiments_dir / "traces" / f"{experiment_name}.trace.json"
+
+        with open(filepath, 'w', encoding='utf-8') as f:
+            json.dump(MetricsAnalyzer.to_chrome_trace(metrics), f, ensure_ascii=False)
+        self.catalog.add_artifact(experiment_name, "trace", filepath)
+
+        log.info("Trace salvo", event="experiments.trace_saved", path=str(filepath))
         return str(filepath)
+
+    def iter_metrics(self, filepath: str) -> Iterator[MetricData]:
+        """
+        Lê métricas em streaming, sem carregar o arquivo inteiro
+        
+        Args:
+            filepath: Segmento JSONL, caminho base dos segmentos, segmento
+                binário (.mseg) ou JSON antigo
+            
+        Returns:
+            Iterador de MetricData
+        """
+        path = Path(filepath)
+        if path.suffix == SEGMENT_SUFFIX:
+            with MetricStore.open(path) as store:
+                yield from store
+            return
+        if path.suffix == ".json":
+            # Formato antigo: um único documento JSON com a lista "metrics"
+            with open(path, 'r', encoding='utf-8') as f:
+                records = json.load(f)["metrics"]
+        elif ".jsonl" in path.name:
+            records = read_jsonl(path)
+        else:
+            records = read_segments(path)
+        for metric_dict in records:
+            # Reconstrói o objeto MetricData
+            yield MetricData(**metric_dict)
     
     def load_metrics(self, filepath: str) -> List[MetricData]:
         """
         Carrega métricas de um arquivo
         
         Args:
-            filepath: Caminho do arquivo
+            filepath: Segmento JSONL, caminho base dos segmentos ou JSON antigo
             
         Returns:
             Lista de métricas carregadas
         """
-        with open(filepath, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        metrics = list(self.iter_metrics(filepath))
+        log.info("Métricas carregadas", event="experiments.metrics_loaded", count=len(metrics))
+        return metrics
+    
+    def load_store(self, filepath: str) -> MetricStore:
+        """
+        Carrega métricas como MetricStore (para agregados e dashboards)
         
-        metrics = []
-        for metric_dict in data["metrics"]:
-            # Reconstrói o objeto MetricData
-            metric = MetricData(**metric_dict)
-            metrics.append(metric)
+        Segmentos binários (.mseg) são abertos via mmap, sem parse nem cópia
+        (feche com close() ou use como context manager antes de mover ou
+        apagar o arquivo); os demais formatos são lidos em streaming.
         
-        print(f"📂 [ExperimentLogger] Métricas carregadas: {len(metrics)} execuções")
-        return metrics
+        Args:
+            filepath: Segmento binário, segmento JSONL, caminho base ou JSON antigo
+            
+        Returns:
+            MetricStore com as métricas
+        """
+        if Path(filepath).suffix == SEGMENT_SUFFIX:
+            return MetricStore.open(filepath)
+        return MetricStore.from_metrics(self.iter_metrics(filepath))
     
-    def save_comparison(self, original_metrics: List[MetricData], 
-                       cov_metrics: List[MetricData],
-                       experiment_name: Optional[str] = None) -> str:
+    def convert_to_segment(self, filepath: str, output: Optional[str] = None) -> str:
+        """
+        Converte métricas em JSON/JSONL para um segmento binário colunar
+        
+        Args:
+            filepath: JSON antigo, segmento JSONL ou caminho base dos segmentos
+            output: Arquivo .mseg de destino (padrão: ao lado da origem)
+            
+        Returns:
+            Caminho do segmento binário gravado
+        """
+        path = Path(filepath)
+        if output is None:
+            base = path.name.split(".")[0]
+            output = str(path.with_name(base + SEGMENT_SUFFIX))
+        store = MetricStore.from_metrics(self.iter_metrics(filepath))
+        segment = store.save(output, {"source": str(path)})
+        log.info("Segmento binário gravado", event="experiments.segment_saved",
+                 path=segment, count=len(store))
+        return segment
+    
+    def export_segment_json(self, segment_path: str, output: Optional[str] = None) -> str:
+        """
+        Converte um segmento binário de volta para o formato JSON original
+        
+        Args:
+            segment_path: Arquivo .mseg
+            output: Arquivo JSON de destino (padrão: mesmo nome com .json)
+            
+        Returns:
+            Caminho do JSON gravado
+        """
+        output = output or str(Path(segment_path).with_suffix(".json"))
+        with MetricStore.open(segment_path) as store:
+            data = {
+                "experiment_name": store.metadata.get("experiment_name"),
+                "implementation_type": store.metadata.get("implementation_type"),
+                "timestamp": datetime.now().isoformat(),
+                "total_executions": len(store),
+                "metrics": [metric.to_dict() for metric in store]
+            }
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        return output
+    
+    def save_comparison(self, original_metrics: Union[List[MetricData], MetricStore], 
+                       cov_metrics: Union[List[MetricData], MetricStore],
+                       experiment_name: Optional[str] = None,
+                       aggregator: Optional[MetricsAggregator] = None,
+                       raw_data_files: Optional[Dict[str, List[str]]] = None) -> str:
         """
         Salva uma comparação completa entre implementações
         
+        Os dados brutos não são embutidos na comparação: ficam nos segmentos
+        JSONL de raw_data/, referenciados em "raw_data_files".
+        
         Args:
             original_metrics: Métricas da implementação original
             cov_metrics: Métricas da implementação CoV
             experiment_name: Nome do experimento
+            aggregator: Sketches de percentis alimentados em streaming (opcional)
+            raw_data_files: Segmentos já gravados por implementação (se omitido,
+                as métricas são salvas agora)
             
         Returns:
             Caminho do arquivo de comparação salvo
@@ -107,17 +277,20 @@ class ExperimentLogger:
             experiment_name = f"comparison_{timestamp}"
         
         # Gera comparação usando o analyzer
-        comparison = MetricsAnalyzer.compare_implementations(original_metrics, cov_metrics)
+        comparison = MetricsAnalyzer.compare_implementations(original_metrics, cov_metrics, aggregator)
+        
+        # Referencia os dados brutos em vez de duplicá-los na comparação
+        if raw_data_files is None:
+            raw_data_files = {
+                "original": [self.save_metrics(original_metrics, "original", experiment_name)],
+                "cov": [self.save_metrics(cov_metrics, "cov", experiment_name)],
+            }
         
-        # Adiciona dados brutos
         comparison_data = {
             "experiment_name": experiment_name,
             "timestamp": datetime.now().isoformat(),
             "comparison": comparison,
-            "raw_data": {
-                "original_metrics": [m.to_dict() for m in original_metrics],
-                "cov_metrics": [m.to_dict() for m in cov_metrics]
-            }
+            "raw_data_files": raw_data_files
         }
         
         # Salva comparação
@@ -131,8 +304,11 @@ class ExperimentLogger:
         with open(report_file, 'w', encoding='utf-8') as f:
             f.write(report)
         
-        print(f"📊 [ExperimentLogger] Comparação salva: {comparison_file}")
-        print(f"📄 [ExperimentLogger] Relatório salvo: {report_file}")
+        self.catalog.add_artifact(experiment_name, "comparison", comparison_file)
+        self.catalog.add_artifact(experiment_name, "report", report_file)
+        
+        log.info("Comparação e relatório salvos", event="experiments.comparison_saved",
+                 comparison_path=str(comparison_file), report_path=str(report_file))
         
         return str(comparison_file)
     
@@ -165,7 +341,9 @@ class ExperimentLogger:
         # Lista métricas brutas
         raw_dir = self.experiments_dir / "raw_data"
         if raw_dir.exists():
-            result["raw_metrics"] = [f.name for f in raw_dir.glob("*.json")]
+            result["raw_metrics"] = sorted(
+                f.name for f in raw_dir.iterdir() if f.name.endswith(".json") or ".jsonl" in f.name
+            )
         
         # Lista comparações
         comp_dir = self.experiments_dir / "comparisons"
@@ -181,25 +359,27 @@ class ExperimentLogger:
     
     def get_experiment_summary(self) -> str:
         """
-        Gera um resumo de todos os experimentos
+        Gera um resumo de todos os experimentos (a partir do catálogo)
         
         Returns:
             String com resumo dos experimentos
         """
-        experiments = self.list_experiments()
+        stats = self.catalog.stats()
+        comparisons = self.catalog.artifacts(kind="comparison")
         
         summary = []
         summary.append("📚 RESUMO DOS EXPERIMENTOS")
         summary.append("=" * 40)
-        summary.append(f"📊 Métricas brutas: {len(experiments['raw_metrics'])}")
-        summary.append(f"⚖️ Comparações: {len(experiments['comparisons'])}")
-        summary.append(f"📄 Relatórios: {len(experiments['reports'])}")
+        summary.append(f"🧪 Experimentos: {stats['experiments']}")
+        summary.append(f"📊 Runs: {stats['runs']} ({stats['executions']} execuções)")
+        summary.append(f"⚖️ Comparações: {len(comparisons)}")
+        summary.append(f"📄 Relatórios: {len(self.catalog.artifacts(kind='report'))}")
         summary.append("")
         
-        if experiments["comparisons"]:
+        if comparisons:
             summary.append("🔍 COMPARAÇÕES DISPONÍVEIS:")
-            for comp in sorted(experiments["comparisons"]):
-                summary.append(f"   • {comp}")
+            for comp in comparisons:
+                summary.append(f"   • {Path(comp['path']).name}")
         
         return "\n".join(summary)
     
@@ -207,60 +387,85 @@ class ExperimentLogger:
         """
         Remove experimentos antigos
         
+        Usa o catálogo para achar os experimentos criados antes do corte e
+        apaga os arquivos associados a eles. Arquivos de antes do catálogo
+        podem ser indexados com `python -m src.core.experiment_catalog index`.
+        
         Args:
             days_old: Idade em dias para considerar "antigo"
             
         Returns:
             Número de arquivos removidos
         """
-        import time
-        
-        cutoff_time = time.time() - (days_old * 24 * 60 * 60)
         removed_count = 0
         
-        for directory in [self.experiments_dir / "raw_data", 
-                         self.experiments_dir / "comparisons",
-                         self.experiments_dir / "reports"]:
-            if directory.exists():
-                for file_path in directory.glob("*"):
-                    if file_path.stat().st_mtime < cutoff_time:
-                        file_path.unlink()
-                        removed_count += 1
+        for experiment in self.catalog.experiments(before=f"{days_old}d"):
+            for path in self.catalog.remove_experiment(experiment["name"]):
+                file_path = Path(path)
+                if file_path.exists():
+                    file_path.unlink()
+                    removed_count += 1
         
-        print(f"🧹 [ExperimentLogger] Removidos {removed_count} arquivos antigos")
+        log.info("Arquivos antigos removidos", event="experiments.cleanup", removed=removed_count)
         return removed_count
 
 
 class ExperimentSession:
     """Classe para gerenciar uma sessão de experimento completa"""
     
-    def __init__(self, experiment_name: str, logger: ExperimentLogger):
+    IMPLEMENTATIONS = ("original", "cov")
+    
+    def __init__(self, experiment_name: str, logger: ExperimentLogger,
+                 compression: Optional[str] = None, config_hash: Optional[str] = None):
         """
         Inicializa uma sessão de experimento
         
+        Cada métrica é gravada no seu segmento JSONL assim que chega; a sessão
+        guarda só contagens e sketches, então a memória não cresce com o número
+        de execuções e uma interrupção não perde o que já foi coletado.
+        
         Args:
             experiment_name: Nome do experimento
             logger: Instance do ExperimentLogger
+            compression: Compressão dos segmentos (None, "gzip" ou "zstd")
+            config_hash: Hash da configuração (PromptConfig.config_hash) para o catálogo
         """
         self.experiment_name = experiment_name
         self.logger = logger
-        self.original_metrics: List[MetricData] = []
-        self.cov_metrics: List[MetricData] = []
+        self.config_hash = config_hash
+        self.writers = {
+            implementation: logger.open_metrics_writer(experiment_name, implementation, compression)
+            for implementation in self.IMPLEMENTATIONS
+        }
+        self.aggregator = MetricsAggregator()
         self.start_time = datetime.now()
         
-        print(f"🎯 [ExperimentSession] Iniciando experimento: {experiment_name}")
+        log.info("Iniciando experimento", event="experiments.session_started",
+                 experiment=experiment_name, compression=compression)
+    
+    def _add_metric(self, implementation: str, metric: MetricData):
+        writer = self.writers[implementation]
+        writer.write(metric.to_dict())
+        self.aggregator.add(metric)
+        log.debug("Métrica adicionada", event="experiments.metric_added",
+                  experiment=self.experiment_name, implementation=implementation,
+                  total=writer.records_written)
     
     def add_original_metric(self, metric: MetricData):
         """Adiciona uma métrica da implementação original"""
-        self.original_metrics.append(metric)
-        print(f"📈 [ExperimentSession] Métrica original adicionada "
-              f"({len(self.original_metrics)} total)")
+        self._add_metric("original", metric)
     
     def add_cov_metric(self, metric: MetricData):
         """Adiciona uma métrica da implementação CoV"""
-        self.cov_metrics.append(metric)
-        print(f"🔍 [ExperimentSession] Métrica CoV adicionada "
-              f"({len(self.cov_metrics)} total)")
+        self._add_metric("cov", metric)
+    
+    def count(self, implementation: str) -> int:
+        """Número de métricas já gravadas para uma implementação"""
+        return self.writers[implementation].records_written
+    
+    def load_store(self, implementation: str) -> MetricStore:
+        """Lê em streaming os segmentos de uma implementação para um MetricStore"""
+        return self.logger.load_store(str(self.writers[implementation].base_path))
     
     def finalize_experiment(self) -> str:
         """
@@ -270,32 +475,57 @@ class ExperimentSession:
             Caminho do arquivo de comparação gerado
         """
         duration = datetime.now() - self.start_time
-        
-        print(f"🏁 [ExperimentSession] Finalizando experimento {self.experiment_name}")
-        print(f"   • Duração: {duration}")
-        print(f"   • Métricas originais: {len(self.original_metrics)}")
-        print(f"   • Métricas CoV: {len(self.cov_metrics)}")
-        
-        # Salva métricas brutas
-        if self.original_metrics:
-            self.logger.save_metrics(
-                self.original_metrics, "original", self.experiment_name
-            )
-        
-        if self.cov_metrics:
-            self.logger.save_metrics(
-                self.cov_metrics, "cov", self.experiment_name
-            )
+        for writer in self.writers.values():
+            writer.close()
+        
+        original_count, cov_count = self.count("original"), self.count("cov")
+        log.info("Finalizando experimento", event="experiments.session_finished",
+                 experiment=self.experiment_name, duration_s=duration.total_seconds(),
+                 original_metrics=original_count, cov_metrics=cov_count)
+        
+        if not (original_count or cov_count):
+            log.warning("Não foi possível gerar comparação - dados insuficientes",
+                        event="experiments.comparison_skipped", experiment=self.experiment_name)
+            return ""
+        
+        # Registra no catálogo os runs que receberam métricas
+        for implementation, writer in self.writers.items():
+            if writer.records_written:
+                self.logger.register_run(self.experiment_name, implementation,
+                                         writer.base_path, self.config_hash)
+        
+        original_metrics = self.load_store("original")
+        cov_metrics = self.load_store("cov")
+        
+        # Snapshot binário colunar de cada run para recarga rápida (mmap)
+        for implementation, store in (("original", original_metrics), ("cov", cov_metrics)):
+            if len(store):
+                base_path = self.writers[implementation].base_path
+                segment = store.save(base_path.with_name(base_path.name + SEGMENT_SUFFIX), {
+                    "experiment_name": self.experiment_name,
+                    "implementation_type": implementation,
+                })
+                self.logger.catalog.add_artifact(self.experiment_name, "metric_segment", segment)
+        
+        # Salva os spans de todas as execuções em um único trace
+        self.logger.save_trace(
+            itertools.chain(original_metrics, cov_metrics), self.experiment_name
+        )
         
         # Salva comparação se ambas existem
-        if self.original_metrics and self.cov_metrics:
+        if original_count and cov_count:
+            raw_data_files = {
+                implementation: [str(path) for path in segment_paths(writer.base_path)]
+                for implementation, writer in self.writers.items()
+            }
             comparison_file = self.logger.save_comparison(
-                self.original_metrics, self.cov_metrics, self.experiment_name
+                original_metrics, cov_metrics, self.experiment_name,
+                aggregator=self.aggregator, raw_data_files=raw_data_files
             )
             return comparison_file
         
-        print("⚠️ [ExperimentSession] Não foi possível gerar comparação - "
-              "dados insuficientes")
+        log.warning("Não foi possível gerar comparação - dados insuficientes",
+                    event="experiments.comparison_skipped", experiment=self.experiment_name)
         return ""
     
     def get_current_status(self) -> str:
@@ -304,5 +534,5 @@ class ExperimentSession:
         
         return (f"🎯 Experimento: {self.experiment_name}\n"
                 f"⏱️ Duração: {duration}\n"
-                f"📊 Original: {len(self.original_metrics)} execuções\n"
-                f"🔍 CoV: {len(self.cov_metrics)} execuções")
+                f"📊 Original: {self.count('original')} execuções\n"
+                f"🔍 CoV: {self.count('cov')} execuções")
@@ -0,0 +1,206 @@
+"""
+Escrita append-only de registros em segmentos JSONL
+
+Cada execução vira uma linha JSON compacta, gravada (e descarregada para o
+sistema operacional) assim que acontece. Nada fica acumulado em memória e uma
+execução interrompida deixa no disco todos os registros completos até ali.
+Os segmentos podem ser comprimidos com gzip (stdlib) ou zstd (pacote
+`zstandard`, opcional).
+"""
+
+import gzip
+import io
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Union
+
+# zstandard é opcional: sem ele só há JSONL puro e gzip
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+COMPRESSION_SUFFIXES = {None: "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def _compression_from_path(path: Path) -> Optional[str]:
+    for compression, suffix in COMPRESSION_SUFFIXES.items():
+        if suffix and path.name.endswith(suffix):
+            return compression
+    return None
+
+
+class JsonlSegmentWriter:
+    """
+    Escreve registros JSON, um por linha, em segmentos append-only
+
+    Ao atingir `max_segment_bytes` o segmento atual é fechado e um novo é
+    aberto (<base>.00000.jsonl, <base>.00001.jsonl, ...). Cada writer é um run
+    novo: os segmentos existentes do mesmo caminho base são descartados ao
+    criá-lo. Só com append=True (retomada explícita) os registros continuam
+    no último segmento existente.
+    """
+
+    def __init__(self, base_path: Union[str, Path], compression: Optional[str] = None,
+                 max_segment_bytes: Optional[int] = None, fsync: bool = False, append: bool = False):
+        """
+        Args:
+            base_path: Caminho base sem extensão (ex: experiments/raw_data/exp_cov)
+            compression: None, "gzip" ou "zstd"
+            max_segment_bytes: Tamanho (não comprimido) para rotacionar o segmento
+            fsync: Força fsync a cada registro (sobrevive também a queda de energia)
+            append: Continua os segmentos existentes em vez de começar um run novo
+        """
+        if compression not in COMPRESSION_SUFFIXES:
+            raise ValueError(f"Compressão não suportada: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("Compressão zstd requer o pacote 'zstandard' (pip install zstandard)")
+        self.base_path = Path(base_path)
+        self.compression = compression
+        self.max_segment_bytes = max_segment_bytes
+        self.fsync = fsync
+        self.append = append
+        self.records_written = 0
+        self._segment_index = 0
+        self._segment_bytes = 0
+        self._raw = None
+        self._stream = None
+        self.segments: List[Path] = []
+
+        existing = segment_paths(self.base_path)
+        if append and existing:
+            self._segment_index = len(existing) - 1
+        else:
+            # Run novo: um rerun com o mesmo nome não pode misturar registros do anterior
+            for path in existing:
+                path.unlink()
+
+    def _segment_path(self) -> Path:
+        name = (f"{self.base_path.name}.{self._segment_index:05d}.jsonl"
+                f"{COMPRESSION_SUFFIXES[self.compression]}")
+        return self.base_path.with_name(name)
+
+    def _open_segment(self):
+        path = self._segment_path()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Reaberturas acrescentam (cada uma gera um novo membro gzip; o módulo gzip lê membros concatenados)
+        mode = "ab" if self.append or path in self.segments else "wb"
+        self._raw = open(path, mode)
+        if self.compression == "gzip":
+            self._stream = gzip.GzipFile(fileobj=self._raw, mode=mode)
+        elif self.compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self._segment_bytes = 0
+        if path not in self.segments:
+            self.segments.append(path)
+
+    def write(self, record: Dict[str, Any]):
+        """Acrescenta um registro e o descarrega para o disco"""
+        if self._stream is None:
+            self._open_segment()
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+        self._stream.write(line)
+        self._flush()
+        self._segment_bytes += len(line)
+        self.records_written += 1
+        if self.max_segment_bytes and self._segment_bytes >= self.max_segment_bytes:
+            self._close_segment()
+            self._segment_index += 1
+
+    def _flush(self):
+        if self.compression == "zstd":
+            self._stream.flush(zstandard.FLUSH_BLOCK)
+        else:
+            self._stream.flush()
+        self._raw.flush()
+        if self.fsync:
+            os.fsync(self._raw.fileno())
+
+    def _close_segment(self):
+        if self._stream is None:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+        self._stream = None
+        self._raw = None
+
+    def close(self):
+        """Fecha o segmento atual (registros já gravados não dependem disso)"""
+        self._close_segment()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
+
+
+def segment_paths(base_path: Union[str, Path]) -> List[Path]:
+    """Lista, em ordem, os segmentos existentes de um caminho base"""
+    base_path = Path(base_path)
+    if not base_path.parent.exists():
+        return []
+    return sorted(
+        path for path in base_path.parent.glob(f"{base_path.name}*.jsonl*")
+        if path.name[len(base_path.name)] == "."
+    )
+
+
+def _open_text(path: Path) -> io.TextIOBase:
+    compression = _compression_from_path(path)
+    if compression == "gzip":
+        return io.TextIOWrapper(gzip.open(path, "rb"), encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("Leitura de segmentos zstd requer o pacote 'zstandard'")
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def read_jsonl(path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """
+    Lê os registros de um segmento, tolerando um final truncado
+
+    Um processo interrompido pode deixar a última linha incompleta (ou um
+    membro gzip sem trailer); os registros completos são devolvidos e o
+    restante é ignorado.
+    """
+    path = Path(path)
+    stream = _open_text(path)
+    try:
+        while True:
+            try:
+                line = stream.readline()
+            except (EOFError, OSError):
+                return  # membro gzip sem trailer / arquivo truncado
+            except Exception as e:
+                if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                    return
+                raise
+            if not line:
+                return
+            if not line.endswith("\n"):
+                return  # linha parcial no fim do arquivo
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                return
+    finally:
+        stream.close()
+
+
+def read_segments(base_path: Union[str, Path]) -> Iterator[Dict[str, Any]]:
+    """Lê em sequência os registros de todos os segmentos de um caminho base"""
+    for path in segment_paths(base_path):
+        yield from read_jsonl(path)
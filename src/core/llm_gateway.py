@@ -0,0 +1,450 @@
+"""
+Controle de taxa e de concorrência das chamadas ao LLM
+
+Todas as chamadas a `client.chat.completions.create` passam por um
+GovernedClient, que compartilha com os demais clientes do processo:
+    - um limitador de taxa com dois token buckets (requisições/minuto e
+      tokens/minuto); cada chamada reserva o que precisa e espera a sua vez,
+      em ordem de chegada, e o consumo real (usage) corrige a estimativa;
+    - um controle de concorrência adaptativo (AIMD): o limite de chamadas
+      simultâneas cresce aos poucos enquanto a latência está estável e cai
+      pela metade a cada 429, ou 10% quando a latência recente dispara.
+
+Com isso o processo roda perto do limite do provedor sem tempestade de retries:
+um 429 pausa todas as chamadas pelo retry-after em vez de cada thread
+insistir por conta própria. As duas esperas respeitam o prazo ativo da
+requisição: se a vez não chegar antes dele, a chamada falha com
+DeadlineExceeded sem dormir além do prazo. Retries e hedging de cada chamada
+ficam no ResilientCaller (resilience.py), que envolve o governador.
+"""
+
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+import openai
+
+from .prompt_config import PromptConfig
+from .token_budget import TokenEstimator
+from .resilience import Deadline, DeadlineExceeded, ResilientCaller, current_deadline
+from .event_log import get_event_logger
+
+log = get_event_logger("llm_gateway")
+
+# Limites padrão do gpt-4o-mini no tier 1 da OpenAI
+DEFAULT_REQUESTS_PER_MINUTE = 500
+DEFAULT_TOKENS_PER_MINUTE = 200000
+DEFAULT_RETRY_AFTER_S = 1.0
+
+
+class TokenBucket:
+    """Balde de fichas com reposição contínua; o saldo pode ficar negativo (reservas)"""
+
+    def __init__(self, per_minute: float, burst_seconds: float = 10.0):
+        """
+        Args:
+            per_minute: Fichas repostas por minuto
+            burst_seconds: Capacidade do balde em segundos de reposição
+        """
+        if per_minute <= 0:
+            raise ValueError("per_minute deve ser positivo")
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """Debita `amount` e retorna quantos segundos esperar até o saldo cobrir a reserva"""
+        self._refill(now)
+        self.level -= amount
+        return max(0.0, -self.level / self.rate)
+
+    def adjust(self, amount: float, now: float):
+        """Corrige uma reserva (positivo devolve fichas, negativo cobra a diferença)"""
+        self._refill(now)
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """Limita requisições/minuto e tokens/minuto com espera em ordem de chegada"""
+
+    def __init__(self, requests_per_minute: Optional[float] = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: Optional[float] = DEFAULT_TOKENS_PER_MINUTE,
+                 burst_seconds: float = 10.0):
+        """
+        Args:
+            requests_per_minute: Limite de requisições (None = sem limite)
+            tokens_per_minute: Limite de tokens de input + saída (None = sem limite)
+            burst_seconds: Rajada permitida, em segundos de limite
+        """
+        self.requests = TokenBucket(requests_per_minute, burst_seconds) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute, burst_seconds) if tokens_per_minute else None
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+        self.waited_s = 0.0
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> float:
+        """
+        Reserva uma requisição de `tokens` tokens e bloqueia até ela caber nos limites
+
+        Args:
+            tokens: Tokens reservados (input estimado + saída máxima)
+            timeout: Espera máxima em segundos (None = sem limite)
+
+        Returns:
+            Segundos esperados
+
+        Raises:
+            DeadlineExceeded: Se a vez da requisição só chegaria depois de `timeout` (a reserva é devolvida)
+        """
+        with self._lock:
+            now = time.monotonic()
+            wait = max(0.0, self._paused_until - now)
+            if self.requests is not None:
+                wait = max(wait, self.requests.reserve(1, now))
+            if self.tokens is not None:
+                wait = max(wait, self.tokens.reserve(tokens, now))
+            if timeout is not None and wait > timeout:
+                self._release(tokens, now)
+                raise DeadlineExceeded(f"Espera do limite de taxa ({wait:.2f}s) passa do prazo ({timeout:.2f}s)")
+            self.waited_s += wait
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def _release(self, tokens: int, now: float):
+        if self.requests is not None:
+            self.requests.adjust(1, now)
+        if self.tokens is not None:
+            self.tokens.adjust(tokens, now)
+
+    def release(self, tokens: int):
+        """Devolve a reserva de uma requisição que não chegou a ser enviada"""
+        with self._lock:
+            self._release(tokens, time.monotonic())
+
+    def settle(self, reserved_tokens: int, actual_tokens: int):
+        """Ajusta o bucket de tokens com o consumo real informado pela API"""
+        if self.tokens is not None and actual_tokens:
+            with self._lock:
+                self.tokens.adjust(reserved_tokens - actual_tokens, time.monotonic())
+
+    def pause(self, seconds: float):
+        """Suspende novas reservas (ex: retry-after de um 429)"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+class AdaptiveConcurrency:
+    """
+    Limite de chamadas simultâneas ajustado por AIMD
+
+    Aumento aditivo (+1 a cada `limit` sucessos) enquanto a latência recente
+    (EWMA rápida) fica abaixo de `latency_tolerance` × a latência de referência
+    (EWMA lenta); redução multiplicativa em sobrecarga, no máximo uma vez por
+    `decrease_interval_s` para que uma rajada de erros conte como um só sinal.
+    """
+
+    def __init__(self, initial: int = 8, minimum: int = 1, maximum: int = 64,
+                 backoff: float = 0.5, latency_tolerance: float = 2.0,
+                 decrease_interval_s: float = 1.0):
+        """
+        Args:
+            initial: Limite inicial
+            minimum: Limite mínimo
+            maximum: Limite máximo
+            backoff: Fator aplicado ao limite em cada 429
+            latency_tolerance: Razão latência recente / referência que indica fila no provedor
+            decrease_interval_s: Intervalo mínimo entre reduções
+        """
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError("Limites de concorrência devem satisfazer 1 <= minimum <= initial <= maximum")
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_tolerance = latency_tolerance
+        self.decrease_interval_s = decrease_interval_s
+        self.in_flight = 0
+        self.recent_latency_ms: Optional[float] = None
+        self.baseline_latency_ms: Optional[float] = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Ocupa uma vaga de chamada simultânea (espera se o limite foi atingido)
+
+        Args:
+            timeout: Espera máxima em segundos (None = sem limite)
+
+        Raises:
+            DeadlineExceeded: Se nenhuma vaga abrir dentro de `timeout`
+        """
+        with self._condition:
+            expires_at = None if timeout is None else time.monotonic() + timeout
+            while self.in_flight >= int(self.limit):
+                remaining = None if expires_at is None else expires_at - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    raise DeadlineExceeded(f"Nenhuma vaga de chamada simultânea em {timeout:.2f}s")
+                self._condition.wait(remaining)
+            self.in_flight += 1
+
+    def release(self):
+        """Libera a vaga ocupada por acquire()"""
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def _decrease(self, factor: float, reason: str):
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_interval_s:
+            return
+        self._last_decrease = now
+        previous = self.limit
+        self.limit = max(float(self.minimum), self.limit * factor)
+        log.info("Limite de concorrência reduzido", event="llm_gateway.concurrency_decreased",
+                 reason=reason, previous=round(previous, 2), limit=round(self.limit, 2))
+
+    def on_success(self, latency_ms: float):
+        """Registra uma chamada bem-sucedida e ajusta o limite"""
+        with self._condition:
+            if self.baseline_latency_ms is None:
+                self.recent_latency_ms = self.baseline_latency_ms = latency_ms
+            else:
+                self.recent_latency_ms += 0.3 * (latency_ms - self.recent_latency_ms)
+                self.baseline_latency_ms += 0.02 * (latency_ms - self.baseline_latency_ms)
+            if self.recent_latency_ms > self.baseline_latency_ms * self.latency_tolerance:
+                self._decrease(0.9, "latency")
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+    def on_overload(self):
+        """Registra um 429 (ou sobrecarga do provedor)"""
+        with self._condition:
+            self._decrease(self.backoff, "rate_limited")
+
+
+def _retry_after(error: Exception) -> float:
+    """Segundos indicados pelo provedor no header retry-after (ou o padrão)"""
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else DEFAULT_RETRY_AFTER_S
+    except ValueError:
+        return DEFAULT_RETRY_AFTER_S
+
+
+class RateGovernor:
+    """Limitador de taxa + concorrência adaptativa compartilhados pelo processo"""
+
+    _shared: Dict[str, "RateGovernor"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, limiter: Optional[RateLimiter] = None,
+                 concurrency: Optional[AdaptiveConcurrency] = None,
+                 estimator: Optional[TokenEstimator] = None,
+                 reserved_output_tokens: int = 800):
+        """
+        Args:
+            limiter: Limitador de requisições/tokens por minuto
+            concurrency: Controle de chamadas simultâneas
+            estimator: Estimador dos tokens de input de cada chamada
+            reserved_output_tokens: Tokens de saída reservados quando a chamada não define max_tokens
+        """
+        self.limiter = limiter or RateLimiter()
+        self.concurrency = concurrency or AdaptiveConcurrency()
+        self.estimator = estimator or TokenEstimator()
+        self.reserved_output_tokens = reserved_output_tokens
+        self.calls = 0
+        self.rate_limited = 0
+        self.deadline_exceeded = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "RateGovernor":
+        """Cria o governador a partir da seção `rate_limits` do prompts.json"""
+        config = prompts.get_rate_limit_config()
+        budget = prompts.get_token_budget_config()
+        return cls(
+            limiter=RateLimiter(
+                requests_per_minute=config.get("requests_per_minute", DEFAULT_REQUESTS_PER_MINUTE),
+                tokens_per_minute=config.get("tokens_per_minute", DEFAULT_TOKENS_PER_MINUTE),
+                burst_seconds=config.get("burst_seconds", 10.0)
+            ),
+            concurrency=AdaptiveConcurrency(
+                initial=config.get("initial_concurrency", 8),
+                minimum=config.get("min_concurrency", 1),
+                maximum=config.get("max_concurrency", 64),
+                latency_tolerance=config.get("latency_tolerance", 2.0)
+            ),
+            estimator=TokenEstimator(budget.get("model", "gpt-4o-mini")),
+            reserved_output_tokens=budget.get("reserved_output_tokens", 800)
+        )
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "RateGovernor":
+        """
+        Retorna o governador compartilhado pelo processo
+
+        Os limites do provedor valem para a chave de API inteira, então todas as
+        UIs, o CoV e as reproduções de teste do processo usam a mesma instância.
+        """
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    def estimate(self, request: Dict[str, Any]) -> int:
+        """Tokens reservados para uma chamada (input estimado + saída máxima)"""
+        output_tokens = request.get("max_tokens") or request.get("max_completion_tokens") \
+            or self.reserved_output_tokens
+        return self.estimator.count_messages(request.get("messages", []), request.get("tools")) + output_tokens
+
+    def _wait_deadline(self, deadline: Optional[Deadline], reserved: int, stage: str, error: DeadlineExceeded):
+        with self._lock:
+            self.deadline_exceeded += 1
+        log.warning("Prazo esgotado esperando a vez da chamada", event="llm_gateway.deadline_exceeded",
+                    stage=stage, phase=deadline.name if deadline else None, reserved_tokens=reserved)
+        raise DeadlineExceeded(f"Prazo da fase '{deadline.name}' esgotado: {error}") from error
+
+    def call(self, create: Any, request: Dict[str, Any], deadline: Optional[Deadline] = None,
+             start: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> Any:
+        """
+        Executa `create(**request)` respeitando os limites
+
+        Args:
+            create: Função de envio (ex.: chat.completions.create do cliente original)
+            request: Argumentos da chamada
+            deadline: Prazo da fase; limita as esperas pela taxa e por uma vaga (None = sem limite)
+            start: Chamado com a vaga já ocupada, logo antes do envio; retorna a
+                requisição a enviar (o ResilientCaller define aí o timeout da tentativa)
+
+        Raises:
+            DeadlineExceeded: Se a vez da chamada não chegar antes do prazo
+            openai.RateLimitError: Repassado após pausar o limitador pelo retry-after
+        """
+        reserved = self.estimate(request)
+        try:
+            self.limiter.acquire(reserved, deadline.remaining() if deadline is not None else None)
+        except DeadlineExceeded as e:
+            self._wait_deadline(deadline, reserved, "rate_limit", e)
+        try:
+            self.concurrency.acquire(deadline.remaining() if deadline is not None else None)
+        except DeadlineExceeded as e:
+            self.limiter.release(reserved)
+            self._wait_deadline(deadline, reserved, "concurrency", e)
+        try:
+            if start is not None:
+                try:
+                    request = start(request)
+                except DeadlineExceeded:
+                    # A fila consumiu o prazo: a chamada não chega a ser enviada
+                    self.limiter.release(reserved)
+                    with self._lock:
+                        self.deadline_exceeded += 1
+                    raise
+            started = time.perf_counter()
+            try:
+                response = create(**request)
+            except openai.RateLimitError as e:
+                retry_after = _retry_after(e)
+                with self._lock:
+                    self.rate_limited += 1
+                self.limiter.pause(retry_after)
+                self.concurrency.on_overload()
+                log.warning("Limite do provedor atingido", event="llm_gateway.rate_limited",
+                            retry_after_s=retry_after, concurrency_limit=round(self.concurrency.limit, 2))
+                raise
+            latency_ms = (time.perf_counter() - started) * 1000
+        finally:
+            self.concurrency.release()
+
+        with self._lock:
+            self.calls += 1
+        self.concurrency.on_success(latency_ms)
+        usage = getattr(response, "usage", None)
+        self.limiter.settle(reserved, getattr(usage, "total_tokens", 0) or 0)
+        return response
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores e estado atual (para logs e relatórios de carga)"""
+        return {
+            "calls": self.calls,
+            "rate_limited": self.rate_limited,
+            "deadline_exceeded": self.deadline_exceeded,
+            "limiter_wait_s": round(self.limiter.waited_s, 3),
+            "concurrency_limit": round(self.concurrency.limit, 2),
+            "in_flight": self.concurrency.in_flight,
+            "recent_latency_ms": self.concurrency.recent_latency_ms,
+            "baseline_latency_ms": self.concurrency.baseline_latency_ms,
+        }
+
+
+class _GovernedCompletions:
+    def __init__(self, completions: Any, governor: RateGovernor, resilience: Optional[ResilientCaller]):
+        self._completions = completions
+        self._governor = governor
+        self._resilience = resilience
+
+    def _send(self, request: Dict[str, Any], start: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None) -> Any:
+        return self._governor.call(self._completions.create, request, current_deadline(), start)
+
+    def create(self, **kwargs) -> Any:
+        if self._resilience is None:
+            return self._send(kwargs)
+        return self._resilience.call(self._send, kwargs)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._completions, name)
+
+
+class _GovernedChat:
+    def __init__(self, chat: Any, governor: RateGovernor, resilience: Optional[ResilientCaller]):
+        self.completions = _GovernedCompletions(chat.completions, governor, resilience)
+        self._chat = chat
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._chat, name)
+
+
+class GovernedClient:
+    """
+    Cliente OpenAI (ou compatível) com chat.completions.create governado
+
+    Os demais atributos são repassados ao cliente original.
+    """
+
+    def __init__(self, client: Any, governor: RateGovernor, resilience: Optional[ResilientCaller] = None):
+        """
+        Args:
+            client: Cliente original
+            governor: Limites de taxa e concorrência
+            resilience: Prazo, retries e hedging (None = uma tentativa, sem timeout próprio)
+        """
+        self.client = client
+        self.governor = governor
+        self.resilience = resilience
+        self.chat = _GovernedChat(client.chat, governor, resilience)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.client, name)
+
+
+def governed(client: Any, prompts: PromptConfig) -> Any:
+    """
+    Envolve o cliente com o governador e a política de retries compartilhados (idempotente)
+
+    Os retries internos do SDK são desligados: quem tenta de novo é o
+    ResilientCaller, que respeita o prazo da requisição.
+    """
+    if isinstance(client, GovernedClient):
+        return client
+    if hasattr(client, "with_options"):
+        client = client.with_options(max_retries=0)
+    return GovernedClient(client, RateGovernor.shared(prompts), ResilientCaller.shared(prompts))
@@ -0,0 +1,184 @@
+"""
+Montagem de mensagens com prefixo estável para aproveitar o cache de prompt do provedor
+
+O cache de prompt da OpenAI reaproveita o maior prefixo idêntico (byte a byte)
+entre chamadas. Por isso todo conteúdo estático (system prompt, instruções de
+verificação, schemas das tools) vem primeiro e em ordem canônica, e todo
+conteúdo variável (input do usuário, respostas, resultados de funções) vem por
+último.
+"""
+
+import json
+from contextlib import contextmanager
+from typing import Dict, Any, List, Optional
+
+from .prompt_config import PromptConfig
+
+
+def canonical_json(obj: Any) -> str:
+    """Serializa um objeto em JSON canônico (chaves ordenadas, sem espaços extras)"""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+
+def canonicalize_tools(tools: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Normaliza a lista de tools para uma forma byte-estável
+
+    As tools são ordenadas pelo nome da função e cada dicionário é reconstruído
+    com as chaves em ordem alfabética, de modo que a serialização feita pelo
+    cliente OpenAI seja sempre idêntica entre chamadas e processos.
+
+    Args:
+        tools: Lista de tools no formato do manifest
+
+    Returns:
+        Nova lista de tools em forma canônica
+    """
+    ordered = sorted(tools, key=lambda tool: tool.get("function", {}).get("name", ""))
+    return [json.loads(canonical_json(tool)) for tool in ordered]
+
+
+def get_cached_tokens(usage: Any) -> int:
+    """
+    Extrai a quantidade de tokens de input servidos pelo cache do provedor
+
+    Versões antigas do SDK não expõem `prompt_tokens_details`; nesse caso
+    retorna 0.
+    """
+    if usage is None:
+        return 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is None and isinstance(usage, dict):
+        details = usage.get("prompt_tokens_details")
+    if details is None:
+        return 0
+    if isinstance(details, dict):
+        return details.get("cached_tokens", 0) or 0
+    return getattr(details, "cached_tokens", 0) or 0
+
+
+class MessageBuilder:
+    """Monta as listas de mensagens das chamadas com conteúdo estático primeiro"""
+
+    def __init__(self, prompts: PromptConfig, manifest: Optional[Dict[str, Any]] = None,
+                 token_budget: Optional[Any] = None, tenant_id: str = "default"):
+        """
+        Inicializa o montador de mensagens
+
+        Args:
+            prompts: Configuração de prompts
+            manifest: Manifest com os schemas das tools (opcional)
+            token_budget: TokenBudget aplicado antes de cada envio (opcional)
+            tenant_id: Tenant usado no limite agregado do orçamento
+        """
+        self.prompts = prompts
+        self._tools = canonicalize_tools(manifest.get("tools", [])) if manifest else []
+        self.token_budget = token_budget
+        self.tenant_id = tenant_id
+        self.last_estimated_tokens = 0
+        self.last_reservation = None
+
+    def _apply_budget(self, messages: List[Dict[str, Any]],
+                      tools: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """Conta os tokens e aplica o orçamento (se configurado) antes do envio"""
+        if self.token_budget is None:
+            return messages
+        messages, self.last_estimated_tokens, self.last_reservation = self.token_budget.enforce(
+            messages, tools, self.tenant_id
+        )
+        return messages
+
+    def settle(self, usage: Any):
+        """Acerta a reserva de tokens da última requisição montada com o uso real da resposta"""
+        if self.token_budget is not None:
+            self.token_budget.settle(self.last_reservation, usage)
+            self.last_reservation = None
+
+    @contextmanager
+    def settle_on_error(self):
+        """
+        Envolve a chamada ao modelo: se ela falhar (prazo, erro da API depois dos
+        retries), devolve a reserva inteira ao tenant com settle(None) em vez de
+        deixá-la cobrada até o fim da janela
+        """
+        try:
+            yield
+        except BaseException:
+            self.settle(None)
+            raise
+
+    @property
+    def tools(self) -> List[Dict[str, Any]]:
+        """Tools em forma canônica, prontas para enviar ao modelo"""
+        return self._tools
+
+    def initial_messages(self, user_input: str,
+                         history: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Mensagens da primeira chamada: system prompt seguido do input do usuário
+
+        Args:
+            user_input: Input do usuário
+            history: Histórico da sessão (SessionMemory.history_messages), entre o system e o input
+
+        Raises:
+            TokenBudgetExceeded: Se a requisição não couber no orçamento
+        """
+        return self._apply_budget([
+            {"role": "system", "content": self.prompts.system_prompt},
+            *(history or []),
+            {"role": "user", "content": user_input}
+        ], self._tools)
+
+    def tool_result_messages(self, user_input: str, call: Any, name: str, function_result: Any,
+                             history: Optional[List[Dict[str, Any]]] = None) -> List[Dict[str, Any]]:
+        """
+        Mensagens da segunda chamada, devolvendo o resultado da função ao modelo
+
+        Args:
+            user_input: Input do usuário
+            call: Objeto tool_call retornado pela primeira chamada
+            name: Nome da função executada
+            function_result: Resultado da função local
+            history: Histórico da sessão, entre o system e o input (opcional)
+
+        Returns:
+            Lista de mensagens com o final_system_prompt como prefixo estável
+
+        Raises:
+            TokenBudgetExceeded: Se a requisição não couber no orçamento
+        """
+        return self._apply_budget([
+            {"role": "system", "content": self.prompts.final_system_prompt},
+            *(history or []),
+            {"role": "user", "content": user_input},
+            {"role": "assistant", "content": None, "tool_calls": [call]},
+            {
+                "role": "tool",
+                "tool_call_id": call.id,
+                "name": name,
+                "content": canonical_json(function_result)
+            }
+        ])
+
+    @staticmethod
+    def static_first_messages(static_system: str, static_instructions: str,
+                              variable_context: str) -> List[Dict[str, Any]]:
+        """
+        Mensagens com instruções estáticas no system e contexto variável no final
+
+        Usado pelas chamadas de verificação e correção do Chain of Verification,
+        que antes colocavam o input do usuário antes das instruções fixas.
+
+        Args:
+            static_system: Papel/persona do modelo (estático)
+            static_instructions: Instruções e formato de saída (estático)
+            variable_context: Input, resposta e demais dados da execução
+
+        Returns:
+            Lista de mensagens [system estático, user variável]
+        """
+        return [
+            {"role": "system", "content": f"{static_system}\n\n{static_instructions.strip()}"},
+            {"role": "user", "content": variable_context.strip()}
+        ]
@@ -0,0 +1,555 @@
+"""
+Armazenamento colunar de métricas apoiado em NumPy
+
+Uma lista de MetricData guarda ~25 atributos Python por execução. O MetricStore
+guarda cada campo numa coluna contígua: arrays NumPy tipados para números e
+booleanos, códigos inteiros para textos repetidos (implementação, função) e
+buffers UTF-8 com offsets para textos livres e campos JSON. Os agregados do
+MetricsAnalyzer são calculados direto sobre as colunas.
+
+Um store pode ser salvo num segmento binário (.mseg) e reaberto via mmap: as
+colunas viram views NumPy diretamente sobre o arquivo, sem parse nem cópia.
+"""
+
+import json
+import mmap
+import os
+import struct
+from dataclasses import fields
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Tuple, Union
+
+import numpy as np
+
+from .metrics_tracker import MetricData
+from .event_log import get_event_logger
+
+log = get_event_logger("metric_store")
+
+
+class _NumericColumn:
+    """Coluna numérica com crescimento amortizado (dobra a capacidade)"""
+
+    __slots__ = ("dtype", "_data", "_size")
+
+    def __init__(self, dtype, capacity: int = 64):
+        self.dtype = np.dtype(dtype)
+        self._data = np.empty(capacity, dtype=self.dtype)
+        self._size = 0
+
+    @classmethod
+    def wrap(cls, array: np.ndarray) -> "_NumericColumn":
+        """Usa um array existente (ex: view sobre mmap) sem copiar"""
+        column = cls.__new__(cls)
+        column.dtype = array.dtype
+        column._data = array
+        column._size = len(array)
+        return column
+
+    def _reserve(self, size: int):
+        # Arrays somente leitura (mmap) são copiados no primeiro append
+        if size > len(self._data) or not self._data.flags.writeable:
+            grown = np.empty(max(size, len(self._data) * 2), dtype=self.dtype)
+            grown[:self._size] = self._data[:self._size]
+            self._data = grown
+
+    def append(self, value):
+        self._reserve(self._size + 1)
+        self._data[self._size] = value
+        self._size += 1
+
+    def fill(self, value, count: int):
+        """Acrescenta `count` cópias de um valor (ex: NaN para fases novas)"""
+        self._reserve(self._size + count)
+        self._data[self._size:self._size + count] = value
+        self._size += count
+
+    def values(self) -> np.ndarray:
+        """View somente leitura dos valores (sem cópia)"""
+        view = self._data[:self._size]
+        view.flags.writeable = False
+        return view
+
+    def __len__(self):
+        return self._size
+
+
+class _CategoricalColumn:
+    """Coluna de textos repetidos: cada valor distinto é guardado uma vez (None = -1)"""
+
+    __slots__ = ("codes", "categories", "_index")
+
+    def __init__(self):
+        self.codes = _NumericColumn(np.int32)
+        self.categories: List[str] = []
+        self._index: Dict[str, int] = {}
+
+    @classmethod
+    def wrap(cls, codes: np.ndarray, categories: List[str]) -> "_CategoricalColumn":
+        column = cls.__new__(cls)
+        column.codes = _NumericColumn.wrap(codes)
+        column.categories = list(categories)
+        column._index = {value: code for code, value in enumerate(column.categories)}
+        return column
+
+    def code_of(self, value: Optional[str]) -> int:
+        """Código de um valor (-2 se o valor nunca apareceu)"""
+        if value is None:
+            return -1
+        return self._index.get(value, -2)
+
+    def append(self, value: Optional[str]):
+        if value is None:
+            self.codes.append(-1)
+            return
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def get(self, row: int) -> Optional[str]:
+        code = self.codes.values()[row]
+        return None if code < 0 else self.categories[code]
+
+
+class _TextColumn:
+    """Textos livres concatenados num buffer UTF-8 com offsets (None permitido)"""
+
+    __slots__ = ("_buffer", "_offsets", "_valid")
+
+    def __init__(self):
+        self._buffer = bytearray()
+        self._offsets = _NumericColumn(np.int64)
+        self._offsets.append(0)
+        self._valid = _NumericColumn(np.bool_)
+
+    @classmethod
+    def wrap(cls, buffer, offsets: np.ndarray, valid: np.ndarray) -> "_TextColumn":
+        """Usa buffers existentes (ex: memoryview sobre mmap) sem copiar"""
+        column = cls.__new__(cls)
+        column._buffer = buffer
+        column._offsets = _NumericColumn.wrap(offsets)
+        column._valid = _NumericColumn.wrap(valid)
+        return column
+
+    def buffers(self) -> Tuple[bytes, np.ndarray, np.ndarray]:
+        """Heap UTF-8, offsets e máscara de válidos (para serialização)"""
+        return self._buffer, self._offsets.values(), self._valid.values()
+
+    def append(self, value: Optional[str]):
+        if not isinstance(self._buffer, bytearray):
+            self._buffer = bytearray(self._buffer)
+        if value is not None:
+            self._buffer += value.encode("utf-8")
+        self._offsets.append(len(self._buffer))
+        self._valid.append(value is not None)
+
+    def get(self, row: int) -> Optional[str]:
+        if not self._valid.values()[row]:
+            return None
+        offsets = self._offsets.values()
+        return str(self._buffer[offsets[row]:offsets[row + 1]], "utf-8")
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._buffer)
+
+
+class _JsonColumn(_TextColumn):
+    """Campos estruturados (dicts, listas) serializados em JSON compacto"""
+
+    __slots__ = ()
+
+    def append(self, value: Any):
+        super().append(None if value is None else
+                       json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str))
+
+    def get(self, row: int) -> Any:
+        text = super().get(row)
+        return None if text is None else json.loads(text)
+
+    def fill_none(self, count: int):
+        """Acrescenta `count` valores None"""
+        self._offsets.fill(len(self._buffer), count)
+        self._valid.fill(False, count)
+
+
+# Esquema: campo do MetricData → tipo de coluna
+FLOAT_FIELDS = ("total_latency_ms", "verification_latency_ms")
+INT_FIELDS = ("api_calls_count", "total_input_tokens", "total_output_tokens", "total_tokens",
+              "total_cached_tokens", "estimated_input_tokens", "verification_tokens")
+BOOL_FIELDS = ("validation_passed", "has_function_call", "response_complete",
+               "verification_used", "correction_made", "error_occurred")
+CATEGORICAL_FIELDS = ("implementation_type", "function_called")
+TEXT_FIELDS = ("execution_id", "timestamp", "user_input", "final_response", "error_message")
+JSON_FIELDS = ("function_params", "function_result", "additional_metadata", "spans", "model_usage")
+
+_METRIC_FIELDS = [field.name for field in fields(MetricData)]
+
+# Segmento binário: magic | tamanho do cabeçalho (uint64 LE) | cabeçalho JSON | dados
+SEGMENT_MAGIC = b"DMSTORE1"
+SEGMENT_SUFFIX = ".mseg"
+_SEGMENT_ALIGNMENT = 64
+
+
+def _align(offset: int) -> int:
+    return -(-offset // _SEGMENT_ALIGNMENT) * _SEGMENT_ALIGNMENT
+
+
+class MetricStore:
+    """
+    Armazenamento colunar de MetricData com append e agregados vetorizados
+
+    Uso:
+        store = MetricStore.from_metrics(metrics)
+        store.mean("total_latency_ms", store.mask(function_called="generate_paper_quote"))
+    """
+
+    def __init__(self):
+        self._size = 0
+        self._numeric: Dict[str, _NumericColumn] = {}
+        for name in FLOAT_FIELDS:
+            self._numeric[name] = _NumericColumn(np.float64)
+        for name in INT_FIELDS:
+            self._numeric[name] = _NumericColumn(np.int64)
+        for name in BOOL_FIELDS:
+            self._numeric[name] = _NumericColumn(np.bool_)
+        # Timestamp em segundos (epoch) para filtros por data
+        self._numeric["timestamp_s"] = _NumericColumn(np.float64)
+        self._categorical = {name: _CategoricalColumn() for name in CATEGORICAL_FIELDS}
+        self._text = {name: _TextColumn() for name in TEXT_FIELDS}
+        self._json = {name: _JsonColumn() for name in JSON_FIELDS}
+        # Latência por fase: uma coluna float64 por fase, NaN quando a execução não teve a fase
+        self._phases: Dict[str, _NumericColumn] = {}
+        # Metadados livres (experimento, implementação...) gravados no segmento
+        self.metadata: Dict[str, Any] = {}
+        self._mmap: Optional[mmap.mmap] = None
+
+    @classmethod
+    def from_metrics(cls, metrics: Iterable[MetricData]) -> "MetricStore":
+        """Cria um store a partir de um iterável de MetricData"""
+        store = cls()
+        store.extend(metrics)
+        return store
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, metric: MetricData):
+        """Acrescenta uma execução"""
+        for name in FLOAT_FIELDS + INT_FIELDS + BOOL_FIELDS:
+            self._numeric[name].append(getattr(metric, name))
+        self._numeric["timestamp_s"].append(self._epoch(metric.timestamp))
+        for name, column in self._categorical.items():
+            column.append(getattr(metric, name))
+        for name, column in self._text.items():
+            column.append(getattr(metric, name))
+        for name, column in self._json.items():
+            column.append(getattr(metric, name))
+
+        phase_latency = metric.phase_latency_ms or {}
+        for phase in phase_latency:
+            if phase not in self._phases:
+                column = self._phases[phase] = _NumericColumn(np.float64)
+                column.fill(np.nan, self._size)
+        for phase, column in self._phases.items():
+            column.append(phase_latency.get(phase, np.nan))
+        self._size += 1
+
+    def extend(self, metrics: Iterable[MetricData]):
+        for metric in metrics:
+            self.append(metric)
+
+    @staticmethod
+    def _epoch(timestamp: str) -> float:
+        try:
+            return datetime.fromisoformat(timestamp).timestamp()
+        except (TypeError, ValueError):
+            return np.nan
+
+    # ------------------------------------------------------------------
+    # Acesso às colunas
+    # ------------------------------------------------------------------
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Retorna uma coluna como array NumPy
+
+        Colunas numéricas/booleanas são views sem cópia; colunas de texto
+        viram arrays de objetos (materializados).
+        """
+        if name in self._numeric:
+            return self._numeric[name].values()
+        if name in self._categorical:
+            column = self._categorical[name]
+            lookup = np.array(column.categories + [None], dtype=object)
+            return lookup[column.codes.values()]  # -1 cai no None do final
+        if name in self._text or name in self._json:
+            source = self._text.get(name) or self._json[name]
+            return np.array([source.get(row) for row in range(self._size)], dtype=object)
+        raise KeyError(f"Coluna desconhecida: {name}")
+
+    def codes(self, name: str) -> Tuple[np.ndarray, List[str]]:
+        """Códigos e categorias de uma coluna categórica (sem materializar textos)"""
+        column = self._categorical[name]
+        return column.codes.values(), list(column.categories)
+
+    def phases(self) -> List[str]:
+        return list(self._phases)
+
+    def phase_column(self, phase: str) -> np.ndarray:
+        """Latência (ms) da fase por execução; NaN onde a fase não ocorreu"""
+        return self._phases[phase].values()
+
+    def mask(self, **equals: Any) -> np.ndarray:
+        """
+        Máscara booleana de igualdade (ex: mask(implementation_type="cov", error_occurred=False))
+        """
+        result = np.ones(self._size, dtype=bool)
+        for name, value in equals.items():
+            if name in self._categorical:
+                result &= self._categorical[name].codes.values() == self._categorical[name].code_of(value)
+            elif name in self._numeric:
+                result &= self._numeric[name].values() == value
+            else:
+                raise KeyError(f"Filtro não suportado para a coluna: {name}")
+        return result
+
+    # ------------------------------------------------------------------
+    # Agregados vetorizados
+    # ------------------------------------------------------------------
+
+    def _select(self, name: str, mask: Optional[np.ndarray]) -> np.ndarray:
+        values = self._numeric[name].values()
+        return values if mask is None else values[mask]
+
+    def mean(self, name: str, mask: Optional[np.ndarray] = None) -> float:
+        values = self._select(name, mask)
+        return float(values.mean()) if len(values) else 0.0
+
+    def sum(self, name: str, mask: Optional[np.ndarray] = None) -> float:
+        return float(self._select(name, mask).sum())
+
+    def rate(self, name: str, mask: Optional[np.ndarray] = None) -> float:
+        """Percentual (0-100) de execuções com a coluna booleana verdadeira"""
+        return self.mean(name, mask) * 100
+
+    def success_rate(self, mask: Optional[np.ndarray] = None) -> float:
+        """Percentual de execuções sem erro e com resposta completa"""
+        ok = ~self._numeric["error_occurred"].values() & self._numeric["response_complete"].values()
+        if mask is not None:
+            ok = ok[mask]
+        return float(ok.mean()) * 100 if len(ok) else 0.0
+
+    def percentile(self, name: str, q, mask: Optional[np.ndarray] = None):
+        """Percentil exato (numpy) de uma coluna numérica; q em 0-100"""
+        values = self._select(name, mask)
+        return np.percentile(values, q) if len(values) else np.zeros_like(np.asarray(q, dtype=float))
+
+    def phase_means(self, mask: Optional[np.ndarray] = None) -> Dict[str, float]:
+        """Latência média por fase, considerando só as execuções que tiveram a fase"""
+        result = {}
+        for phase, column in self._phases.items():
+            values = column.values() if mask is None else column.values()[mask]
+            present = values[~np.isnan(values)]
+            if len(present):
+                result[phase] = float(present.mean())
+        return result
+
+    def model_usage(self, mask: Optional[np.ndarray] = None) -> Dict[str, Dict[str, int]]:
+        """Chamadas e tokens somados por modelo (decodifica a coluna model_usage)"""
+        column = self._json["model_usage"]
+        rows = range(self._size) if mask is None else np.flatnonzero(mask)
+        totals: Dict[str, Dict[str, int]] = {}
+        for index in rows:
+            for model, usage in (column.get(int(index)) or {}).items():
+                entry = totals.setdefault(model, {})
+                for name, value in usage.items():
+                    entry[name] = entry.get(name, 0) + value
+        return totals
+
+    # ------------------------------------------------------------------
+    # Materialização
+    # ------------------------------------------------------------------
+
+    def row(self, index: int) -> MetricData:
+        """Reconstrói o MetricData de uma linha"""
+        if not 0 <= index < self._size:
+            raise IndexError(index)
+        data: Dict[str, Any] = {}
+        for name in FLOAT_FIELDS:
+            data[name] = float(self._numeric[name].values()[index])
+        for name in INT_FIELDS:
+            data[name] = int(self._numeric[name].values()[index])
+        for name in BOOL_FIELDS:
+            data[name] = bool(self._numeric[name].values()[index])
+        for name, column in self._categorical.items():
+            data[name] = column.get(index)
+        for name, column in self._text.items():
+            data[name] = column.get(index)
+        for name, column in self._json.items():
+            data[name] = column.get(index)
+        phase_latency = {
+            phase: float(column.values()[index]) for phase, column in self._phases.items()
+            if not np.isnan(column.values()[index])
+        }
+        data["phase_latency_ms"] = phase_latency if data["spans"] is not None else None
+        data["final_response"] = data["final_response"] or ""
+        return MetricData(**{name: data[name] for name in _METRIC_FIELDS})
+
+    def __iter__(self) -> Iterator[MetricData]:
+        for index in range(self._size):
+            yield self.row(index)
+
+    def to_metrics(self) -> List[MetricData]:
+        return list(self)
+
+    # ------------------------------------------------------------------
+    # Segmento binário (mmap)
+    # ------------------------------------------------------------------
+
+    def save(self, path: Union[str, Path], metadata: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Grava o store num segmento binário colunar
+
+        Cada coluna é um bloco contíguo alinhado em 64 bytes; o cabeçalho JSON
+        descreve dtype, offset e tamanho de cada bloco. A escrita é atômica
+        (arquivo temporário + os.replace).
+
+        Args:
+            path: Arquivo de destino (extensão .mseg por convenção)
+            metadata: Metadados livres guardados no cabeçalho
+
+        Returns:
+            Caminho do segmento gravado
+        """
+        blobs: List[Tuple[int, bytes]] = []
+        position = 0
+
+        def block(data) -> Dict[str, Any]:
+            nonlocal position
+            raw = data.tobytes() if isinstance(data, np.ndarray) else bytes(data)
+            position = _align(position)
+            ref = {"offset": position, "nbytes": len(raw)}
+            if isinstance(data, np.ndarray):
+                ref.update(dtype=data.dtype.str, count=len(data))
+            blobs.append((position, raw))
+            position += len(raw)
+            return ref
+
+        def text_block(column: _TextColumn) -> Dict[str, Any]:
+            heap, offsets, valid = column.buffers()
+            return {"heap": block(heap), "offsets": block(offsets), "valid": block(valid)}
+
+        header = {
+            "version": 1,
+            "rows": self._size,
+            "metadata": {**self.metadata, **(metadata or {})},
+            "numeric": {name: block(column.values()) for name, column in self._numeric.items()},
+            "phases": {name: block(column.values()) for name, column in self._phases.items()},
+            "categorical": {name: {"codes": block(column.codes.values()), "categories": column.categories}
+                            for name, column in self._categorical.items()},
+            "text": {name: text_block(column) for name, column in self._text.items()},
+            "json": {name: text_block(column) for name, column in self._json.items()},
+        }
+        header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        data_start = _align(len(SEGMENT_MAGIC) + 8 + len(header_bytes))
+
+        path = Path(path)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(SEGMENT_MAGIC)
+            f.write(struct.pack("<Q", len(header_bytes)))
+            f.write(header_bytes)
+            for offset, raw in blobs:
+                f.seek(data_start + offset)
+                f.write(raw)
+            f.truncate(data_start + position)
+        os.replace(tmp_path, path)
+        return str(path)
+
+    @classmethod
+    def open(cls, path: Union[str, Path]) -> "MetricStore":
+        """
+        Abre um segmento binário via mmap, sem copiar os dados
+
+        As colunas numéricas, categóricas e de fase são views NumPy somente
+        leitura sobre o arquivo; textos e JSON são decodificados só quando a
+        linha é acessada. Um append posterior copia a coluna para a memória.
+        """
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(SEGMENT_MAGIC)] != SEGMENT_MAGIC:
+            mapped.close()
+            raise ValueError(f"Arquivo não é um segmento de métricas: {path}")
+        header_start = len(SEGMENT_MAGIC) + 8
+        (header_size,) = struct.unpack_from("<Q", mapped, len(SEGMENT_MAGIC))
+        header = json.loads(mapped[header_start:header_start + header_size].decode("utf-8"))
+        data_start = _align(header_start + header_size)
+        raw = memoryview(mapped)
+
+        def array(ref: Dict[str, Any]) -> np.ndarray:
+            return np.frombuffer(mapped, dtype=np.dtype(ref["dtype"]), count=ref["count"],
+                                 offset=data_start + ref["offset"])
+
+        def text(refs: Dict[str, Any], column_type) -> _TextColumn:
+            heap = refs["heap"]
+            start = data_start + heap["offset"]
+            return column_type.wrap(raw[start:start + heap["nbytes"]],
+                                    array(refs["offsets"]), array(refs["valid"]))
+
+        store = cls()
+        store._size = header["rows"]
+        store.metadata = header.get("metadata", {})
+        store._numeric.update({name: _NumericColumn.wrap(array(ref))
+                               for name, ref in header["numeric"].items()})
+        store._phases = {name: _NumericColumn.wrap(array(ref)) for name, ref in header["phases"].items()}
+        store._categorical.update({name: _CategoricalColumn.wrap(array(ref["codes"]), ref["categories"])
+                                   for name, ref in header["categorical"].items()})
+        store._text.update({name: text(refs, _TextColumn) for name, refs in header["text"].items()})
+        store._json.update({name: text(refs, _JsonColumn) for name, refs in header["json"].items()})
+        for name in JSON_FIELDS:
+            if name not in header["json"]:
+                # Segmento gravado antes de o campo existir
+                store._json[name].fill_none(store._size)
+        store._mmap = mapped
+        return store
+
+    def close(self):
+        """
+        Libera o mmap de um store aberto com open()
+
+        Enquanto o arquivo está mapeado, o Windows não deixa substituí-lo nem
+        apagá-lo. As colunas são descartadas junto (o store fica vazio); stores
+        criados em memória não são afetados.
+        """
+        mapped, self._mmap = self._mmap, None
+        if mapped is None:
+            return
+        metadata = self.metadata
+        self.__init__()
+        self.metadata = metadata
+        try:
+            mapped.close()
+        except BufferError:
+            # Algum array devolvido por values() ainda aponta para o arquivo: o
+            # mapeamento é liberado quando a última referência sair de uso
+            log.warning("Segmento ainda referenciado, mmap liberado só depois",
+                        event="metric_store.close_deferred")
+
+    def __enter__(self) -> "MetricStore":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @property
+    def nbytes(self) -> int:
+        """Memória aproximada ocupada pelos dados das colunas"""
+        total = sum(column.values().nbytes for column in self._numeric.values())
+        total += sum(column.values().nbytes for column in self._phases.values())
+        total += sum(column.codes.values().nbytes for column in self._categorical.values())
+        total += sum(column.nbytes for column in list(self._text.values()) + list(self._json.values()))
+        return total
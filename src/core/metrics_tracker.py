@@ -2,12 +2,27 @@
 Sistema de rastreamento de métricas para comparação de implementações
 """
 
+import threading
 import time
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 from dataclasses import dataclass, asdict
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Union, TYPE_CHECKING
 from datetime import datetime
 
+from .event_log import get_event_logger
+from .percentile_sketch import MetricsAggregator
+from .statistical_analysis import compare_stores
+
+if TYPE_CHECKING:
+    from .metric_store import MetricStore
+
+log = get_event_logger("metrics_tracker")
+
+# Contadores de MetricData.model_usage (por modelo)
+MODEL_USAGE_FIELDS = ("calls", "input_tokens", "output_tokens", "cached_tokens")
+
 
 @dataclass
 class MetricData:
@@ -31,6 +46,8 @@ class MetricData:
     total_input_tokens: int = 0
     total_output_tokens: int = 0
     total_tokens: int = 0
+    total_cached_tokens: int = 0  # Tokens de input servidos pelo cache de prompt
+    estimated_input_tokens: int = 0  # Tokens de input estimados localmente antes do envio
     
     # Métricas de Qualidade
     validation_passed: bool = False
@@ -47,67 +64,292 @@ class MetricData:
     error_occurred: bool = False
     error_message: Optional[str] = None
     additional_metadata: Optional[Dict[str, Any]] = None
+    
+    # Spans de tempo por fase (security_validation, first_completion, ...)
+    spans: Optional[List[Dict[str, Any]]] = None
+    phase_latency_ms: Optional[Dict[str, float]] = None
+    
+    # Chamadas e tokens por modelo (com roteamento, cada fase pode usar um modelo)
+    model_usage: Optional[Dict[str, Dict[str, int]]] = None
 
     def to_dict(self) -> Dict[str, Any]:
         """Converte para dicionário para serialização"""
         return asdict(self)
 
 
+class _NullSpan:
+    """Span vazio usado quando não há execução ativa"""
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _ExecutionState:
+    """Estado de uma execução em andamento (cada execução tem seu próprio lock)"""
+    
+    __slots__ = ("metric", "start_time", "start_ns", "verification_start_time",
+                 "span_stack", "span_records", "lock")
+    
+    def __init__(self, metric: MetricData):
+        self.metric = metric
+        self.start_time = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.verification_start_time: Optional[float] = None
+        self.span_stack: List["_Span"] = []
+        self.span_records: List[tuple] = []
+        self.lock = threading.Lock()
+
+
+class _Span:
+    """Span de tempo de uma fase, medido com perf_counter_ns"""
+    
+    __slots__ = ("_state", "name", "start_ns", "parent", "depth")
+    
+    def __init__(self, state: _ExecutionState, name: str):
+        self._state = state
+        self.name = name
+    
+    def __enter__(self):
+        state = self._state
+        with state.lock:
+            stack = state.span_stack
+            self.parent = stack[-1].name if stack else None
+            self.depth = len(stack)
+            stack.append(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.perf_counter_ns()
+        state = self._state
+        with state.lock:
+            # Spans de tarefas concorrentes podem fechar fora de ordem
+            if state.span_stack and state.span_stack[-1] is self:
+                state.span_stack.pop()
+            elif self in state.span_stack:
+                state.span_stack.remove(self)
+            # Tupla crua; a conversão para dicionário só acontece no end_execution
+            state.span_records.append(
+                (self.name, self.start_ns - state.start_ns, end_ns - self.start_ns,
+                 self.depth, self.parent, exc_type is not None)
+            )
+        return False
+
+
 class MetricsTracker:
-    """Classe para rastrear métricas durante execuções"""
+    """
+    Classe para rastrear métricas durante execuções
+    
+    Suporta várias execuções simultâneas no mesmo tracker. Cada execução é
+    identificada pelo execution_id e guarda seu estado (e seu lock) separado,
+    então execuções concorrentes nunca disputam o mesmo contador.
+    
+    Os métodos de rastreamento resolvem a execução nesta ordem:
+    1. `execution_id` passado explicitamente;
+    2. a execução ativa no contexto atual (contextvars), definida por
+       start_execution ou activate() e herdada por tasks do asyncio;
+    3. a única execução ativa, se houver exatamente uma.
+    
+    Sem nenhuma delas, o registro é descartado com um aviso (em threads, use
+    activate()). Execuções que nunca chegam ao end_execution (ex.: uma thread
+    que morreu) são descartadas depois de `stale_after_s`, ou as mais antigas
+    quando há mais de `max_active_executions` em andamento.
+    """
     
-    def __init__(self, implementation_type: str):
+    def __init__(self, implementation_type: str, aggregator: Optional[MetricsAggregator] = None,
+                 max_active_executions: int = 1000, stale_after_s: float = 3600.0):
+        """
+        Args:
+            implementation_type: Nome da implementação rastreada
+            aggregator: Agregador de percentis alimentado a cada execução finalizada (opcional)
+            max_active_executions: Execuções em andamento guardadas (as mais antigas saem primeiro)
+            stale_after_s: Idade a partir da qual uma execução não finalizada é descartada
+        """
         self.implementation_type = implementation_type
-        self.current_metric: Optional[MetricData] = None
-        self.start_time: Optional[float] = None
+        self.aggregator = aggregator
+        self.max_active_executions = max_active_executions
+        self.stale_after_s = stale_after_s
+        self.evicted = 0
+        self._executions: Dict[str, _ExecutionState] = {}
+        self._lock = threading.Lock()
+        self._current: ContextVar[Optional[str]] = ContextVar(
+            f"metrics_tracker_{implementation_type}_{id(self)}", default=None
+        )
+    
+    def _state(self, execution_id: Optional[str] = None) -> Optional[_ExecutionState]:
+        """Resolve o estado da execução (explícita, do contexto atual ou a única ativa)"""
+        if execution_id is None:
+            execution_id = self._current.get()
+        with self._lock:
+            if execution_id is not None:
+                return self._executions.get(execution_id)
+            if len(self._executions) == 1:
+                return next(iter(self._executions.values()))
+        return None
+    
+    def _tracked_state(self, execution_id: Optional[str], operation: str) -> Optional[_ExecutionState]:
+        """Como _state, mas avisa quando o registro vai ser descartado"""
+        state = self._state(execution_id)
+        if state is None:
+            log.warning("Nenhuma execução ativa; registro descartado (em outra thread, use tracker.activate)",
+                        event="metrics.no_active_execution", implementation=self.implementation_type,
+                        operation=operation, execution_id=execution_id or self._current.get(),
+                        active_executions=len(self._executions))
+        return state
+    
+    def _evict_stale(self):
+        """Descarta execuções abandonadas (chamado com self._lock adquirido)"""
+        now_ns = time.perf_counter_ns()
+        stale = [execution_id for execution_id, state in self._executions.items()
+                 if (now_ns - state.start_ns) / 1e9 > self.stale_after_s]
+        # Ordem de inserção: as primeiras são as mais antigas
+        overflow = len(self._executions) - len(stale) - self.max_active_executions + 1
+        if overflow > 0:
+            stale += [execution_id for execution_id in self._executions if execution_id not in stale][:overflow]
+        for execution_id in stale:
+            del self._executions[execution_id]
+            self.evicted += 1
+            log.warning("Execução não finalizada descartada", event="metrics.execution_evicted",
+                        execution_id=execution_id, implementation=self.implementation_type)
+    
+    @property
+    def current_metric(self) -> Optional[MetricData]:
+        """Métricas da execução ativa no contexto atual"""
+        state = self._state()
+        return state.metric if state else None
+    
+    @property
+    def start_time(self) -> Optional[float]:
+        """Início (time.time) da execução ativa no contexto atual"""
+        state = self._state()
+        return state.start_time if state else None
+    
+    def active_executions(self) -> List[str]:
+        """IDs das execuções em andamento"""
+        with self._lock:
+            return list(self._executions)
+    
+    @contextmanager
+    def activate(self, execution_id: str):
+        """
+        Torna uma execução a ativa no contexto atual
+        
+        Threads não herdam contextvars; use dentro da função executada na
+        thread (ou submeta com contextvars.copy_context().run):
         
-    def start_execution(self, user_input: str) -> str:
+            with tracker.activate(execution_id):
+                tracker.track_api_call(...)
+        
+        Args:
+            execution_id: ID retornado por start_execution
+        """
+        token = self._current.set(execution_id)
+        try:
+            yield
+        finally:
+            self._current.reset(token)
+        
+    def start_execution(self, user_input: str, execution_id: Optional[str] = None) -> str:
         """
         Inicia o rastreamento de uma nova execução
         
         Args:
             user_input: Input do usuário
+            execution_id: ID a usar (opcional, um UUID é gerado se omitido)
             
         Returns:
             execution_id: ID único da execução
         """
-        execution_id = str(uuid.uuid4())
+        execution_id = execution_id or str(uuid.uuid4())
         timestamp = datetime.now().isoformat()
         
-        self.current_metric = MetricData(
+        state = _ExecutionState(MetricData(
             execution_id=execution_id,
             timestamp=timestamp,
             implementation_type=self.implementation_type,
             user_input=user_input
-        )
+        ))
         
-        self.start_time = time.time()
+        with self._lock:
+            if execution_id in self._executions:
+                raise ValueError(f"Execução {execution_id} já está ativa")
+            self._evict_stale()
+            self._executions[execution_id] = state
+        self._current.set(execution_id)
         
-        print(f"📊 [MetricsTracker] Iniciando rastreamento - ID: {execution_id}")
+        log.info("Iniciando rastreamento", event="metrics.execution_started",
+                 execution_id=execution_id, implementation=self.implementation_type)
         return execution_id
     
-    def track_api_call(self, input_tokens: int, output_tokens: int):
+    def span(self, name: str, execution_id: Optional[str] = None):
+        """
+        Mede o tempo de uma fase da execução (pode ser aninhado)
+        
+        Uso:
+            with tracker.span("first_completion"):
+                client.chat.completions.create(...)
+        
+        Args:
+            name: Nome da fase
+            execution_id: Execução alvo (opcional)
+            
+        Returns:
+            Context manager que registra o span ao sair
+        """
+        state = self._tracked_state(execution_id, "span")
+        if not state:
+            return _NULL_SPAN
+        return _Span(state, name)
+    
+    def track_api_call(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0,
+                       estimated_input_tokens: int = 0, model: Optional[str] = None,
+                       execution_id: Optional[str] = None):
         """
         Registra uma chamada de API
         
         Args:
             input_tokens: Tokens de entrada
             output_tokens: Tokens de saída
+            cached_tokens: Tokens de entrada servidos pelo cache de prompt
+            estimated_input_tokens: Estimativa local de tokens de entrada feita antes do envio
+            model: Modelo usado na chamada (para o uso por modelo)
+            execution_id: Execução alvo (opcional)
         """
-        if not self.current_metric:
-            print("⚠️ [MetricsTracker] Nenhuma execução ativa para rastrear API call")
+        state = self._tracked_state(execution_id, "api_call")
+        if not state:
             return
-            
-        self.current_metric.api_calls_count += 1
-        self.current_metric.total_input_tokens += input_tokens
-        self.current_metric.total_output_tokens += output_tokens
-        self.current_metric.total_tokens += (input_tokens + output_tokens)
         
-        print(f"📞 [MetricsTracker] API call #{self.current_metric.api_calls_count} - "
-              f"Tokens: {input_tokens} in / {output_tokens} out")
+        metric = state.metric
+        with state.lock:
+            metric.api_calls_count += 1
+            metric.total_input_tokens += input_tokens
+            metric.total_output_tokens += output_tokens
+            metric.total_tokens += (input_tokens + output_tokens)
+            metric.total_cached_tokens += cached_tokens
+            metric.estimated_input_tokens += estimated_input_tokens
+            call_number = metric.api_calls_count
+            if model:
+                if metric.model_usage is None:
+                    metric.model_usage = {}
+                usage = metric.model_usage.setdefault(model, dict.fromkeys(MODEL_USAGE_FIELDS, 0))
+                usage["calls"] += 1
+                usage["input_tokens"] += input_tokens
+                usage["output_tokens"] += output_tokens
+                usage["cached_tokens"] += cached_tokens
+        
+        log.info("API call registrada", event="metrics.api_call",
+                 execution_id=metric.execution_id, call_number=call_number, model=model,
+                 input_tokens=input_tokens, cached_tokens=cached_tokens, output_tokens=output_tokens)
     
     def track_function_call(self, function_name: str, params: Dict[str, Any], 
-                           result: Any, validation_passed: bool):
+                           result: Any, validation_passed: bool,
+                           execution_id: Optional[str] = None):
         """
         Registra uma chamada de função
         
@@ -116,158 +358,208 @@ class MetricsTracker:
             params: Parâmetros da função
             result: Resultado da função
             validation_passed: Se a validação passou
+            execution_id: Execução alvo (opcional)
         """
-        if not self.current_metric:
-            print("⚠️ [MetricsTracker] Nenhuma execução ativa para rastrear function call")
+        state = self._tracked_state(execution_id, "function_call")
+        if not state:
             return
-            
-        self.current_metric.function_called = function_name
-        self.current_metric.function_params = params
-        self.current_metric.function_result = result
-        self.current_metric.validation_passed = validation_passed
-        self.current_metric.has_function_call = True
         
-        print(f"🔧 [MetricsTracker] Função chamada: {function_name} - "
-              f"Validação: {'✅' if validation_passed else '❌'}")
+        metric = state.metric
+        with state.lock:
+            metric.function_called = function_name
+            metric.function_params = params
+            metric.function_result = result
+            metric.validation_passed = validation_passed
+            metric.has_function_call = True
+        
+        log.info("Função chamada", event="metrics.function_call",
+                 execution_id=metric.execution_id, function=function_name,
+                 validation_passed=validation_passed)
     
-    def start_verification_phase(self):
+    def start_verification_phase(self, execution_id: Optional[str] = None):
         """Marca o início da fase de verificação (Chain of Verification)"""
-        if not self.current_metric:
+        state = self._tracked_state(execution_id, "verification_started")
+        if not state:
             return
-            
-        self.current_metric.verification_used = True
-        self.verification_start_time = time.time()
-        print("🔍 [MetricsTracker] Iniciando fase de verificação")
+        
+        with state.lock:
+            state.metric.verification_used = True
+            state.verification_start_time = time.time()
+        log.info("Iniciando fase de verificação", event="metrics.verification_started",
+                 execution_id=state.metric.execution_id)
     
-    def end_verification_phase(self, verification_tokens: int, correction_made: bool):
+    def end_verification_phase(self, verification_tokens: int, correction_made: bool,
+                               execution_id: Optional[str] = None):
         """
         Marca o fim da fase de verificação
         
         Args:
             verification_tokens: Tokens usados na verificação
             correction_made: Se uma correção foi feita
+            execution_id: Execução alvo (opcional)
         """
-        if not self.current_metric or not hasattr(self, 'verification_start_time'):
+        state = self._tracked_state(execution_id, "verification_finished")
+        if not state or state.verification_start_time is None:
             return
-            
-        verification_time = time.time() - self.verification_start_time
-        self.current_metric.verification_latency_ms = verification_time * 1000
-        self.current_metric.verification_tokens = verification_tokens
-        self.current_metric.correction_made = correction_made
         
-        print(f"✅ [MetricsTracker] Verificação concluída - "
-              f"Tempo: {verification_time*1000:.2f}ms - "
-              f"Correção: {'✅' if correction_made else '❌'}")
+        verification_time = time.time() - state.verification_start_time
+        with state.lock:
+            state.metric.verification_latency_ms = verification_time * 1000
+            state.metric.verification_tokens = verification_tokens
+            state.metric.correction_made = correction_made
+        
+        log.info("Verificação concluída", event="metrics.verification_finished",
+                 execution_id=state.metric.execution_id,
+                 verification_latency_ms=round(verification_time * 1000, 2),
+                 correction_made=correction_made)
     
-    def track_error(self, error_message: str):
+    def track_error(self, error_message: str, execution_id: Optional[str] = None):
         """
         Registra um erro durante a execução
         
         Args:
             error_message: Mensagem de erro
+            execution_id: Execução alvo (opcional)
         """
-        if not self.current_metric:
+        state = self._tracked_state(execution_id, "error")
+        if not state:
             return
-            
-        self.current_metric.error_occurred = True
-        self.current_metric.error_message = error_message
-        self.current_metric.response_complete = False
         
-        print(f"❌ [MetricsTracker] Erro registrado: {error_message}")
+        with state.lock:
+            state.metric.error_occurred = True
+            state.metric.error_message = error_message
+            state.metric.response_complete = False
+        
+        log.error("Erro registrado", event="metrics.error",
+                  execution_id=state.metric.execution_id, error=error_message)
     
     def end_execution(self, final_response: str, 
-                     additional_metadata: Optional[Dict[str, Any]] = None) -> MetricData:
+                     additional_metadata: Optional[Dict[str, Any]] = None,
+                     execution_id: Optional[str] = None) -> MetricData:
         """
         Finaliza o rastreamento e retorna os dados coletados
         
         Args:
             final_response: Resposta final gerada
             additional_metadata: Metadados adicionais
+            execution_id: Execução alvo (opcional)
             
         Returns:
             MetricData: Dados coletados da execução
         """
-        if not self.current_metric or not self.start_time:
+        state = self._state(execution_id)
+        if not state:
             raise ValueError("Nenhuma execução ativa para finalizar")
-            
-        # Calcula latência total
-        total_time = time.time() - self.start_time
-        self.current_metric.total_latency_ms = total_time * 1000
-        
-        # Armazena resposta final e metadados
-        self.current_metric.final_response = final_response
-        self.current_metric.additional_metadata = additional_metadata or {}
         
-        # Verifica se a resposta está completa (heurística simples)
-        if len(final_response.strip()) < 10:
-            self.current_metric.response_complete = False
-        
-        print(f"🏁 [MetricsTracker] Execução finalizada - "
-              f"Tempo total: {total_time*1000:.2f}ms - "
-              f"Tokens: {self.current_metric.total_tokens}")
+        execution_id = state.metric.execution_id
+        with self._lock:
+            if self._executions.pop(execution_id, None) is None:
+                raise ValueError(f"Execução {execution_id} já foi finalizada")
+        if self._current.get() == execution_id:
+            self._current.set(None)
+        
+        metric = state.metric
+        with state.lock:
+            # Calcula latência total
+            total_time = time.time() - state.start_time
+            metric.total_latency_ms = total_time * 1000
+            
+            # Armazena resposta final e metadados
+            metric.final_response = final_response
+            metric.additional_metadata = additional_metadata or {}
+            
+            # Verifica se a resposta está completa (heurística simples)
+            if len(final_response.strip()) < 10:
+                metric.response_complete = False
+            
+            # Converte os spans registrados e agrega o tempo por fase
+            self._finalize_spans(state)
         
-        # Retorna uma cópia dos dados
-        result = MetricData(**asdict(self.current_metric))
+        log.info("Execução finalizada", event="metrics.execution_finished",
+                 execution_id=execution_id, implementation=self.implementation_type,
+                 total_latency_ms=round(total_time * 1000, 2), total_tokens=metric.total_tokens)
         
-        # Reset para próxima execução
-        self.current_metric = None
-        self.start_time = None
+        if self.aggregator is not None:
+            self.aggregator.add(metric)
         
-        return result
+        # O estado já foi removido do tracker, então o objeto pode ser devolvido sem cópia
+        return metric
+    
+    @staticmethod
+    def _finalize_spans(state: _ExecutionState):
+        """Converte os spans crus em dicionários e agrega a latência por fase"""
+        spans = []
+        phase_latency_ms: Dict[str, float] = {}
+        for name, start_ns, duration_ns, depth, parent, failed in sorted(
+                state.span_records, key=lambda record: record[1]):
+            spans.append({
+                "name": name,
+                "start_us": start_ns / 1000,
+                "duration_us": duration_ns / 1000,
+                "depth": depth,
+                "parent": parent,
+                "error": failed
+            })
+            phase_latency_ms[name] = phase_latency_ms.get(name, 0.0) + duration_ns / 1_000_000
+        state.metric.spans = spans
+        state.metric.phase_latency_ms = phase_latency_ms
     
-    def get_current_metrics(self) -> Optional[Dict[str, Any]]:
+    def get_current_metrics(self, execution_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
         """Retorna as métricas atuais (para debug)"""
-        if not self.current_metric:
+        state = self._state(execution_id)
+        if not state:
             return None
-        return self.current_metric.to_dict()
+        with state.lock:
+            return state.metric.to_dict()
 
 
 class MetricsAnalyzer:
     """Classe para analisar e comparar métricas coletadas"""
     
     @staticmethod
-    def compare_implementations(original_metrics: List[MetricData], 
-                              cov_metrics: List[MetricData]) -> Dict[str, Any]:
+    def compare_implementations(original_metrics: Union[List[MetricData], "MetricStore"], 
+                              cov_metrics: Union[List[MetricData], "MetricStore"],
+                              aggregator: Optional[MetricsAggregator] = None) -> Dict[str, Any]:
         """
         Compara métricas entre implementações
         
+        Os agregados são calculados de forma vetorizada sobre um MetricStore;
+        listas de MetricData são convertidas automaticamente.
+        
         Args:
-            original_metrics: Métricas da implementação original
-            cov_metrics: Métricas da implementação com Chain of Verification
+            original_metrics: Métricas da implementação original (lista ou MetricStore)
+            cov_metrics: Métricas da implementação com Chain of Verification (lista ou MetricStore)
+            aggregator: Sketches de percentis já alimentados em streaming (opcional;
+                se omitido, são calculados a partir das métricas)
             
         Returns:
             Relatório de comparação
         """
-        def calculate_avg(metrics: List[MetricData], field: str) -> float:
-            values = [getattr(m, field) for m in metrics if hasattr(m, field)]
-            return sum(values) / len(values) if values else 0.0
-        
-        def calculate_success_rate(metrics: List[MetricData]) -> float:
-            if not metrics:
-                return 0.0
-            successful = sum(1 for m in metrics if not m.error_occurred and m.response_complete)
-            return (successful / len(metrics)) * 100
+        original = MetricsAnalyzer._as_store(original_metrics)
+        cov = MetricsAnalyzer._as_store(cov_metrics)
         
         comparison = {
             "summary": {
-                "original_executions": len(original_metrics),
-                "cov_executions": len(cov_metrics),
+                "original_executions": len(original),
+                "cov_executions": len(cov),
                 "timestamp": datetime.now().isoformat()
             },
             "latency": {
-                "original_avg_ms": calculate_avg(original_metrics, "total_latency_ms"),
-                "cov_avg_ms": calculate_avg(cov_metrics, "total_latency_ms"),
+                "original_avg_ms": original.mean("total_latency_ms"),
+                "cov_avg_ms": cov.mean("total_latency_ms"),
                 "improvement_factor": None
             },
             "tokens": {
-                "original_avg_total": calculate_avg(original_metrics, "total_tokens"),
-                "cov_avg_total": calculate_avg(cov_metrics, "total_tokens"),
-                "cov_avg_verification": calculate_avg(cov_metrics, "verification_tokens"),
+                "original_avg_total": original.mean("total_tokens"),
+                "cov_avg_total": cov.mean("total_tokens"),
+                "cov_avg_verification": cov.mean("verification_tokens"),
+                "original_avg_cached": original.mean("total_cached_tokens"),
+                "cov_avg_cached": cov.mean("total_cached_tokens"),
                 "efficiency_ratio": None
             },
             "quality": {
-                "original_success_rate": calculate_success_rate(original_metrics),
-                "cov_success_rate": calculate_success_rate(cov_metrics),
+                "original_success_rate": original.success_rate(),
+                "cov_success_rate": cov.success_rate(),
                 "cov_correction_rate": None
             }
         }
@@ -283,12 +575,103 @@ class MetricsAnalyzer:
                 comparison["tokens"]["cov_avg_total"] / comparison["tokens"]["original_avg_total"]
             )
         
-        if cov_metrics:
-            corrections_made = sum(1 for m in cov_metrics if m.correction_made)
-            comparison["quality"]["cov_correction_rate"] = (corrections_made / len(cov_metrics)) * 100
+        if len(cov):
+            comparison["quality"]["cov_correction_rate"] = cov.rate("correction_made")
+        
+        comparison["phases"] = {
+            "original_avg_ms": original.phase_means(),
+            "cov_avg_ms": cov.phase_means()
+        }
+        
+        # Chamadas e tokens por modelo (roteamento por fase)
+        comparison["models"] = {
+            "original": original.model_usage(),
+            "cov": cov.model_usage()
+        }
+        
+        # Percentis (p50/p90/p99/p999) por implementação, função e fase
+        if aggregator is None:
+            aggregator = MetricsAggregator().add_store(original).add_store(cov)
+        comparison["tails"] = aggregator.summarize()
+        
+        # Intervalos de confiança (bootstrap) e testes de permutação
+        comparison["statistics"] = compare_stores(original, cov)
         
         return comparison
     
+    @staticmethod
+    def _as_store(metrics: Union[List[MetricData], "MetricStore"]) -> "MetricStore":
+        """Converte uma lista de MetricData em MetricStore (stores são usados direto)"""
+        # Import local: metric_store depende de MetricData, definido neste módulo
+        from .metric_store import MetricStore
+        if isinstance(metrics, MetricStore):
+            return metrics
+        return MetricStore.from_metrics(metrics)
+    
+    @staticmethod
+    def average_phase_latency(metrics: Union[List[MetricData], "MetricStore"]) -> Dict[str, float]:
+        """
+        Calcula a latência média por fase (sobre as execuções que tiveram a fase)
+        
+        Args:
+            metrics: Métricas com phase_latency_ms preenchido (lista ou MetricStore)
+            
+        Returns:
+            Dicionário fase → latência média em ms
+        """
+        return MetricsAnalyzer._as_store(metrics).phase_means()
+    
+    @staticmethod
+    def to_chrome_trace(metrics: List[MetricData]) -> Dict[str, Any]:
+        """
+        Converte os spans das execuções para o formato Chrome Trace Event
+        
+        O JSON gerado abre em chrome://tracing, Perfetto (ui.perfetto.dev) ou
+        speedscope. Cada implementação vira um processo e cada execução uma
+        thread, com um span raiz "execution" cobrindo a latência total.
+        
+        Args:
+            metrics: Lista de métricas coletadas
+            
+        Returns:
+            Dicionário no formato {"traceEvents": [...]}
+        """
+        events: List[Dict[str, Any]] = []
+        pids: Dict[str, int] = {}
+        
+        for tid, metric in enumerate(metrics, 1):
+            pid = pids.setdefault(metric.implementation_type, len(pids) + 1)
+            base_us = datetime.fromisoformat(metric.timestamp).timestamp() * 1_000_000
+            
+            events.append({
+                "name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+                "args": {"name": metric.execution_id}
+            })
+            events.append({
+                "name": "execution", "cat": metric.implementation_type, "ph": "X",
+                "ts": base_us, "dur": metric.total_latency_ms * 1000, "pid": pid, "tid": tid,
+                "args": {
+                    "user_input": metric.user_input[:200],
+                    "function_called": metric.function_called,
+                    "total_tokens": metric.total_tokens
+                }
+            })
+            for span in metric.spans or []:
+                events.append({
+                    "name": span["name"], "cat": metric.implementation_type, "ph": "X",
+                    "ts": base_us + span["start_us"], "dur": span["duration_us"],
+                    "pid": pid, "tid": tid,
+                    "args": {"parent": span["parent"], "error": span["error"]}
+                })
+        
+        for implementation_type, pid in pids.items():
+            events.append({
+                "name": "process_name", "ph": "M", "pid": pid, "tid": 0,
+                "args": {"name": implementation_type}
+            })
+        
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+    
     @staticmethod
     def generate_report(comparison: Dict[str, Any]) -> str:
         """Gera um relatório legível da comparação"""
@@ -313,12 +696,39 @@ class MetricsAnalyzer:
             change = "mais lenta" if factor > 1 else "mais rápida"
             report.append(f"   • CoV é {abs(factor-1)*100:.1f}% {change}")
         
+        # Significância estatística
+        statistics = comparison.get("statistics", {})
+        if "latency_ms" in statistics:
+            level = f"IC {statistics['confidence'] * 100:.0f}%"
+            pairing = "pareado" if statistics["paired"] else "não pareado"
+            report.append(f"\n📐 SIGNIFICÂNCIA (CoV − Original, bootstrap {pairing}):")
+            for label, key, unit in (("Latência", "latency_ms", "ms"), ("Tokens", "total_tokens", "")):
+                entry = statistics[key]
+                report.append(f"   • {label}: {MetricsAnalyzer._format_interval(entry, unit, level)}")
+            rates = statistics["success_rate"]
+            verdict = "significativa" if rates["significant"] else "não significativa"
+            report.append(f"   • Taxa de sucesso: {rates['difference_pp']:+.1f} p.p. "
+                          f"(p={rates['p_value']:.3f}, {verdict})")
+            guidance = [
+                f"{label} precisa de ~{statistics[key]['sample_size']['required_n']} execuções"
+                for label, key in (("latência", "latency_ms"), ("tokens", "total_tokens"),
+                                   ("taxa de sucesso", "success_rate"))
+                if not statistics[key]["significant"] and statistics[key]["sample_size"]["required_n"]
+            ]
+            if guidance:
+                report.append(f"   • Amostra atual: {statistics['latency_ms']['sample_size']['n']} por "
+                              f"implementação; para confirmar a diferença observada, "
+                              f"{', '.join(guidance)} por implementação")
+        
         # Tokens
         tokens = comparison["tokens"]
         report.append("\n🔤 TOKENS:")
         report.append(f"   • Original (média): {tokens['original_avg_total']:.0f}")
         report.append(f"   • CoV (média): {tokens['cov_avg_total']:.0f}")
         report.append(f"   • CoV verificação: {tokens['cov_avg_verification']:.0f}")
+        if "original_avg_cached" in tokens:
+            report.append(f"   • Cache de prompt (média): Original {tokens['original_avg_cached']:.0f} / "
+                          f"CoV {tokens['cov_avg_cached']:.0f}")
         if tokens["efficiency_ratio"]:
             ratio = tokens["efficiency_ratio"]
             report.append(f"   • CoV usa {ratio:.2f}x mais tokens")
@@ -331,4 +741,67 @@ class MetricsAnalyzer:
         if quality["cov_correction_rate"] is not None:
             report.append(f"   • CoV fez correções: {quality['cov_correction_rate']:.1f}%")
         
+        # Tempo por fase
+        phases = comparison.get("phases", {})
+        if phases.get("original_avg_ms") or phases.get("cov_avg_ms"):
+            report.append("\n🧭 TEMPO POR FASE (média):")
+            all_phases = list(dict.fromkeys(
+                list(phases.get("original_avg_ms", {})) + list(phases.get("cov_avg_ms", {}))
+            ))
+            for phase in all_phases:
+                original_ms = phases.get("original_avg_ms", {}).get(phase)
+                cov_ms = phases.get("cov_avg_ms", {}).get(phase)
+                original_text = f"{original_ms:.2f}ms" if original_ms is not None else "-"
+                cov_text = f"{cov_ms:.2f}ms" if cov_ms is not None else "-"
+                report.append(f"   • {phase}: Original {original_text} / CoV {cov_text}")
+        
+        # Uso por modelo
+        models = comparison.get("models", {})
+        if any(models.values()):
+            report.append("\n🤖 USO POR MODELO:")
+            for implementation, usage in models.items():
+                for model, counts in usage.items():
+                    report.append(f"   • {implementation} / {model}: {counts.get('calls', 0)} chamadas, "
+                                  f"{counts.get('input_tokens', 0)} tokens de input, "
+                                  f"{counts.get('output_tokens', 0)} de saída")
+        
+        # Caudas
+        tails = comparison.get("tails", {})
+        if tails:
+            report.append("\n📉 CAUDAS (p50 / p90 / p99 / p999):")
+            for implementation, entry in tails.items():
+                report.append(f"   🏷️ {implementation}:")
+                latency = entry["overall"].get("latency_ms")
+                if latency:
+                    report.append(f"      • Latência: {MetricsAnalyzer._format_tail(latency, 'ms')}")
+                tokens = entry["overall"].get("total_tokens")
+                if tokens:
+                    report.append(f"      • Tokens: {MetricsAnalyzer._format_tail(tokens)}")
+                for function_name, function_entry in entry["functions"].items():
+                    report.append(f"      • Latência [{function_name}]: "
+                                  f"{MetricsAnalyzer._format_tail(function_entry['latency_ms'], 'ms')}")
+                for phase, phase_summary in entry["phases"].items():
+                    report.append(f"      • Fase {phase}: {MetricsAnalyzer._format_tail(phase_summary, 'ms')}")
+        
         return "\n".join(report)
+    
+    @staticmethod
+    def _format_interval(entry: Dict[str, Any], unit: str, level: str) -> str:
+        """Formata a diferença de médias com seu intervalo de confiança"""
+        decimals = 2 if unit == "ms" else 0
+        text = (f"{entry['difference']:+.{decimals}f}{unit} "
+                f"[{level}: {entry['ci_low']:+.{decimals}f} a {entry['ci_high']:+.{decimals}f}]")
+        if entry["relative_pct"] is not None:
+            text += (f" ({entry['relative_pct']:+.1f}%, "
+                     f"{entry['relative_ci_low_pct']:+.1f}% a {entry['relative_ci_high_pct']:+.1f}%)")
+        verdict = "significativa" if entry["significant"] else "não significativa"
+        return f"{text} — {verdict}"
+    
+    @staticmethod
+    def _format_tail(summary: Dict[str, float], unit: str = "") -> str:
+        """Formata p50/p90/p99/p999 de um resumo de sketch"""
+        decimals = 2 if unit == "ms" else 0
+        values = " / ".join(
+            f"{summary[label]:.{decimals}f}{unit}" for label in ("p50", "p90", "p99", "p999")
+        )
+        return f"{values} (n={summary['count']})"
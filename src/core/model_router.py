@@ -0,0 +1,60 @@
+"""
+Roteamento de modelo por fase do pipeline
+
+Cada chamada ao LLM pede o modelo da sua fase (first_completion,
+second_completion, cov_verification, cov_correction) em vez de fixar
+"gpt-4o-mini" no código. A verificação do CoV é uma classificação em JSON e
+pode usar um modelo pequeno e rápido; só a correção, que gera texto, precisa
+de um modelo maior.
+
+Configuração em cov_configuration.model_routing do prompts.json:
+    "model_routing": {
+        "default": "gpt-4o-mini",
+        "phases": {"cov_verification": "gpt-4o-mini", "cov_correction": "gpt-4o"}
+    }
+"""
+
+import threading
+from typing import Dict, Optional
+
+from .prompt_config import PromptConfig
+
+DEFAULT_MODEL = "gpt-4o-mini"
+
+
+class ModelRouter:
+    """Escolhe o modelo de cada fase"""
+
+    _shared: Dict[str, "ModelRouter"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, default_model: str = DEFAULT_MODEL, phase_models: Optional[Dict[str, str]] = None):
+        """
+        Args:
+            default_model: Modelo das fases sem rota configurada
+            phase_models: Modelo por fase
+        """
+        self.default_model = default_model
+        self.phase_models = dict(phase_models or {})
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "ModelRouter":
+        """Cria o roteador a partir de cov_configuration.model_routing"""
+        config = prompts.get_model_routing_config()
+        return cls(config.get("default", DEFAULT_MODEL), config.get("phases", {}))
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "ModelRouter":
+        """Retorna o roteador compartilhado pelo processo"""
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    def model_for(self, phase: str) -> str:
+        """Modelo usado na fase `phase`"""
+        return self.phase_models.get(phase, self.default_model)
+
+    def models(self) -> Dict[str, str]:
+        """Rotas configuradas (fase → modelo), incluindo o padrão em "default\""""
+        return {"default": self.default_model, **self.phase_models}
@@ -0,0 +1,284 @@
+"""
+Sketches de percentis para agregação de métricas em streaming
+
+Médias escondem a cauda. Este módulo mantém histogramas logarítmicos
+(no estilo HDR Histogram / DDSketch) com erro relativo garantido, memória
+constante e merge exato entre workers, permitindo reportar p50/p90/p99/p999 de
+latência e tokens sem guardar a lista completa de MetricData.
+"""
+
+import math
+import threading
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .metrics_tracker import MetricData
+    from .metric_store import MetricStore
+
+DEFAULT_QUANTILES: Tuple[float, ...] = (0.5, 0.9, 0.99, 0.999)
+
+
+def quantile_label(q: float) -> str:
+    """Converte um quantil no rótulo usual (0.5 → p50, 0.999 → p999)"""
+    digits = f"{q:.6f}".split(".")[1].rstrip("0")
+    return f"p{digits.ljust(2, '0')}"
+
+
+class LogHistogram:
+    """
+    Histograma de buckets logarítmicos com erro relativo limitado
+
+    Um valor v > 0 cai no bucket ceil(log_gamma(v)), com
+    gamma = (1 + alpha) / (1 - alpha); qualquer quantil é devolvido com erro
+    relativo de no máximo `relative_accuracy`. Se o número de buckets passar
+    de `max_buckets`, os buckets mais baixos são fundidos (a cauda alta, que é a
+    que interessa, continua exata dentro do erro relativo).
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        """
+        Args:
+            relative_accuracy: Erro relativo máximo dos quantis (0.01 = 1%)
+            max_buckets: Limite de buckets (memória constante)
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy deve estar entre 0 e 1")
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float, count: int = 1):
+        """Registra um valor (negativos são tratados como zero)"""
+        if count <= 0:
+            return
+        self.count += count
+        self.sum += value * count
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if value <= 0:
+            self.zero_count += count
+            return
+        index = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[index] = self._buckets.get(index, 0) + count
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self):
+        """Funde os buckets mais baixos até respeitar max_buckets"""
+        indexes = sorted(self._buckets)
+        excess = len(indexes) - self.max_buckets
+        target = indexes[excess]
+        merged = sum(self._buckets.pop(index) for index in indexes[:excess])
+        self._buckets[target] += merged
+
+    def merge(self, other: "LogHistogram"):
+        """Incorpora outro histograma (precisa ter a mesma precisão)"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Não é possível mesclar histogramas com precisões diferentes")
+        for index, bucket_count in other._buckets.items():
+            self._buckets[index] = self._buckets.get(index, 0) + bucket_count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def quantile(self, q: float) -> float:
+        """
+        Retorna o valor aproximado do quantil q (0 ≤ q ≤ 1)
+
+        Returns:
+            Valor do quantil, ou 0.0 se o histograma estiver vazio
+        """
+        if not 0 <= q <= 1:
+            raise ValueError("O quantil deve estar entre 0 e 1")
+        if self.count == 0:
+            return 0.0
+        rank = q * (self.count - 1)
+        if rank < self.zero_count:
+            return max(self.min, 0.0)
+        seen = self.zero_count
+        for index in sorted(self._buckets):
+            seen += self._buckets[index]
+            if seen > rank:
+                value = 2 * self._gamma ** index / (self._gamma + 1)
+                # Nunca extrapola além dos extremos observados
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def percentiles(self, quantiles: Tuple[float, ...] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        """Retorna os quantis pedidos com rótulos p50/p90/..."""
+        return {quantile_label(q): self.quantile(q) for q in quantiles}
+
+    def summary(self, quantiles: Tuple[float, ...] = DEFAULT_QUANTILES) -> Dict[str, float]:
+        """Resumo com contagem, média, extremos e quantis"""
+        result = {
+            "count": self.count,
+            "mean": self.mean,
+            "min": self.min if self.count else 0.0,
+            "max": self.max if self.count else 0.0,
+        }
+        result.update(self.percentiles(quantiles))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializa o histograma (para enviar entre workers ou salvar)"""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "buckets": {str(index): count for index, count in self._buckets.items()},
+            "zero_count": self.zero_count,
+            "count": self.count,
+            "sum": self.sum,
+            "min": self.min if self.count else None,
+            "max": self.max if self.count else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LogHistogram":
+        """Reconstrói um histograma serializado com to_dict"""
+        histogram = cls(data["relative_accuracy"], data.get("max_buckets", 2048))
+        histogram._buckets = {int(index): count for index, count in data["buckets"].items()}
+        histogram.zero_count = data["zero_count"]
+        histogram.count = data["count"]
+        histogram.sum = data["sum"]
+        if histogram.count:
+            histogram.min = data["min"]
+            histogram.max = data["max"]
+        return histogram
+
+
+class MetricsAggregator:
+    """
+    Agrega MetricData em streaming por implementação, função e fase
+
+    Cada combinação (implementação, escopo, nome, métrica) tem seu próprio
+    LogHistogram. Escopos:
+        "overall"  - todas as execuções da implementação (nome "all")
+        "function" - por função chamada (nome "none" se não houve chamada)
+        "phase"    - por fase medida nos spans (só a métrica latency_ms)
+    """
+
+    EXECUTION_FIELDS = {
+        "latency_ms": "total_latency_ms",
+        "total_tokens": "total_tokens",
+        "input_tokens": "total_input_tokens",
+        "output_tokens": "total_output_tokens",
+    }
+
+    def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._sketches: Dict[Tuple[str, str, str, str], LogHistogram] = {}
+        self._lock = threading.Lock()
+
+    def _sketch(self, key: Tuple[str, str, str, str]) -> LogHistogram:
+        sketch = self._sketches.get(key)
+        if sketch is None:
+            sketch = self._sketches[key] = LogHistogram(self.relative_accuracy, self.max_buckets)
+        return sketch
+
+    def add(self, metric: "MetricData"):
+        """Registra uma execução (seguro para trackers em várias threads)"""
+        implementation = metric.implementation_type
+        function_name = metric.function_called or "none"
+        with self._lock:
+            for metric_name, field in self.EXECUTION_FIELDS.items():
+                value = getattr(metric, field)
+                self._sketch((implementation, "overall", "all", metric_name)).add(value)
+                self._sketch((implementation, "function", function_name, metric_name)).add(value)
+            for phase, latency_ms in (metric.phase_latency_ms or {}).items():
+                self._sketch((implementation, "phase", phase, "latency_ms")).add(latency_ms)
+
+    def add_all(self, metrics: List["MetricData"]) -> "MetricsAggregator":
+        for metric in metrics:
+            self.add(metric)
+        return self
+
+    def add_store(self, store: "MetricStore") -> "MetricsAggregator":
+        """Registra todas as execuções de um MetricStore lendo direto das colunas"""
+        implementation_codes, implementations = store.codes("implementation_type")
+        function_codes, functions = store.codes("function_called")
+        columns = {name: store.column(field).tolist() for name, field in self.EXECUTION_FIELDS.items()}
+        phases = {phase: store.phase_column(phase).tolist() for phase in store.phases()}
+        with self._lock:
+            for row, (implementation_code, function_code) in enumerate(
+                    zip(implementation_codes.tolist(), function_codes.tolist())):
+                implementation = implementations[implementation_code]
+                function_name = functions[function_code] if function_code >= 0 else "none"
+                for metric_name, values in columns.items():
+                    self._sketch((implementation, "overall", "all", metric_name)).add(values[row])
+                    self._sketch((implementation, "function", function_name, metric_name)).add(values[row])
+                for phase, values in phases.items():
+                    if values[row] == values[row]:  # ignora NaN (fase ausente)
+                        self._sketch((implementation, "phase", phase, "latency_ms")).add(values[row])
+        return self
+
+    def merge(self, other: "MetricsAggregator"):
+        """Incorpora os sketches de outro agregador (ex: de outro worker)"""
+        with self._lock:
+            for key, sketch in other._sketches.items():
+                self._sketch(key).merge(sketch)
+
+    def get(self, implementation: str, metric_name: str = "latency_ms",
+            scope: str = "overall", name: str = "all") -> Optional[LogHistogram]:
+        """Retorna o sketch de uma combinação, se existir"""
+        return self._sketches.get((implementation, scope, name, metric_name))
+
+    def implementations(self) -> List[str]:
+        return list(dict.fromkeys(key[0] for key in self._sketches))
+
+    def summarize(self, quantiles: Tuple[float, ...] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+        """
+        Resumo de todos os sketches
+
+        Returns:
+            {implementação: {"overall": {métrica: resumo},
+                             "functions": {função: {métrica: resumo}},
+                             "phases": {fase: resumo}}}
+        """
+        result: Dict[str, Any] = {}
+        with self._lock:
+            items = list(self._sketches.items())
+        for (implementation, scope, name, metric_name), sketch in items:
+            entry = result.setdefault(implementation, {"overall": {}, "functions": {}, "phases": {}})
+            summary = sketch.summary(quantiles)
+            if scope == "overall":
+                entry["overall"][metric_name] = summary
+            elif scope == "function":
+                entry["functions"].setdefault(name, {})[metric_name] = summary
+            else:
+                entry["phases"][name] = summary
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Serializa todos os sketches"""
+        with self._lock:
+            return {
+                "relative_accuracy": self.relative_accuracy,
+                "max_buckets": self.max_buckets,
+                "sketches": [
+                    {"key": list(key), "sketch": sketch.to_dict()}
+                    for key, sketch in self._sketches.items()
+                ]
+            }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "MetricsAggregator":
+        aggregator = cls(data["relative_accuracy"], data.get("max_buckets", 2048))
+        for item in data["sketches"]:
+            aggregator._sketches[tuple(item["key"])] = LogHistogram.from_dict(item["sketch"])
+        return aggregator
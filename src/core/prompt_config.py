@@ -1,6 +1,7 @@
 """
 Prompt configuration loader for DunderOps Assistant
 """
+import hashlib
 import json
 from typing import Dict, Any
 
@@ -90,6 +91,47 @@ class PromptConfig:
         key = humor_key_map.get(function_name, "incomplete_meeting")
         return self.get_random_humor_response(key)
     
+    def get_token_budget_config(self) -> dict:
+        """Get the token budget limits (per request and per tenant)"""
+        return self._config.get("token_budget", {})
+    
+    def get_rate_limit_config(self) -> dict:
+        """Get the provider rate limits and concurrency settings for LLM calls"""
+        return self._config.get("rate_limits", {})
+    
+    def get_cov_gating_config(self) -> dict:
+        """Get the adaptive verification gating settings (cov_configuration.adaptive_gating)"""
+        return self._config.get("cov_configuration", {}).get("adaptive_gating", {})
+    
+    def get_cov_streaming_config(self) -> dict:
+        """Get the streaming critic settings (cov_configuration.streaming_verification)"""
+        return self._config.get("cov_configuration", {}).get("streaming_verification", {})
+    
+    def get_batch_verification_config(self) -> dict:
+        """Get the offline batch verification settings (cov_configuration.batch_verification)"""
+        return self._config.get("cov_configuration", {}).get("batch_verification", {})
+    
+    def get_model_routing_config(self) -> dict:
+        """Get the per-phase model routes (cov_configuration.model_routing)"""
+        return self._config.get("cov_configuration", {}).get("model_routing", {})
+    
+    def get_sessions_config(self) -> dict:
+        """Get the conversation session memory settings"""
+        return self._config.get("sessions", {})
+    
+    def get_single_flight_config(self) -> dict:
+        """Get the coalescing settings for identical concurrent requests"""
+        return self._config.get("single_flight", {})
+    
+    def get_resilience_config(self) -> dict:
+        """Get the deadline, retry and hedging settings for LLM calls"""
+        return self._config.get("resilience", {})
+    
+    def config_hash(self) -> str:
+        """Short stable hash of the loaded configuration (identifies experiment runs)"""
+        canonical = json.dumps(self._config, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+    
     def reload(self) -> None:
         """Reload configuration from file"""
         self._config = self._load_config()
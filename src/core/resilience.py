@@ -0,0 +1,426 @@
+"""
+Prazos, retries e requisições duplicadas (hedging) das chamadas ao LLM
+
+A latência de cauda vem quase sempre de uma única chamada lenta ao provedor.
+Este módulo dá a cada requisição do usuário um prazo total, dividido entre
+as fases do pipeline (primeira chamada, segunda chamada, verificação do CoV),
+e envolve cada chamada com:
+    - timeout por tentativa limitado ao tempo restante do prazo da fase,
+      calculado quando a tentativa sai da fila do governador (llm_gateway);
+    - retries com backoff exponencial e jitter completo apenas para erros
+      transitórios (429, timeout, conexão, 5xx);
+    - opcionalmente, uma requisição duplicada quando a original passa do
+      percentil configurado (p95) da latência observada; vale a primeira que
+      responder. As duplicadas são limitadas a uma fração das chamadas. A
+      latência conta a partir do envio ao provedor, não do tempo na fila.
+
+O prazo fica em um ContextVar, como a execução ativa do MetricsTracker:
+    begin_request_deadline(prompts)
+    with tracker.span("first_completion"), deadline_phase("first_completion"):
+        client.chat.completions.create(...)
+"""
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from contextlib import contextmanager
+from contextvars import ContextVar, copy_context
+from typing import Dict, Any, Callable, Iterator, Optional
+
+import openai
+
+from .prompt_config import PromptConfig
+from .percentile_sketch import LogHistogram
+from .event_log import get_event_logger
+
+log = get_event_logger("resilience")
+
+DEFAULT_REQUEST_DEADLINE_S = 60.0
+
+# Erros transitórios: vale tentar de novo (os demais são repassados na hora)
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APIConnectionError,  # inclui APITimeoutError
+    openai.InternalServerError,
+)
+RETRYABLE_STATUS_CODES = (408, 409)
+
+
+class DeadlineExceeded(TimeoutError):
+    """Prazo da requisição (ou da fase) esgotado antes de obter resposta"""
+
+
+class Deadline:
+    """Prazo absoluto de uma requisição ou de uma de suas fases"""
+
+    def __init__(self, seconds: float, phase_shares: Optional[Dict[str, float]] = None,
+                 name: str = "request", request_total_s: Optional[float] = None):
+        """
+        Args:
+            seconds: Tempo disponível a partir de agora
+            phase_shares: Fração do prazo total da requisição reservada para cada fase
+            name: Nome da requisição ou fase (para mensagens e logs)
+            request_total_s: Prazo total da requisição (padrão: `seconds`)
+        """
+        self.name = name
+        self.expires_at = time.monotonic() + seconds
+        self.phase_shares = phase_shares or {}
+        self.request_total_s = request_total_s if request_total_s is not None else seconds
+
+    def remaining(self) -> float:
+        """Segundos restantes (0 quando esgotado)"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def phase(self, name: str) -> "Deadline":
+        """
+        Prazo de uma fase: a fração configurada do prazo total, sem passar do
+        que resta do prazo atual (fases sem fração configurada herdam o restante)
+        """
+        remaining = self.remaining()
+        share = self.phase_shares.get(name)
+        seconds = remaining if share is None else min(remaining, self.request_total_s * share)
+        return Deadline(seconds, self.phase_shares, name, self.request_total_s)
+
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("llm_deadline", default=None)
+
+
+def current_deadline() -> Optional[Deadline]:
+    """Prazo ativo no contexto atual (None se nenhuma requisição definiu prazo)"""
+    return _current_deadline.get()
+
+
+def begin_request_deadline(prompts: PromptConfig, seconds: Optional[float] = None) -> Deadline:
+    """
+    Inicia o prazo de uma nova requisição do usuário no contexto atual
+
+    Args:
+        prompts: Configuração com a seção `resilience`
+        seconds: Prazo total (padrão: request_deadline_s da configuração)
+
+    Returns:
+        O prazo criado (substitui o de uma requisição anterior no mesmo contexto)
+    """
+    config = prompts.get_resilience_config()
+    deadline = Deadline(seconds if seconds is not None else config.get("request_deadline_s", DEFAULT_REQUEST_DEADLINE_S),
+                        config.get("phase_shares", {}))
+    _current_deadline.set(deadline)
+    return deadline
+
+
+@contextmanager
+def deadline_phase(name: str) -> Iterator[Optional[Deadline]]:
+    """
+    Restringe as chamadas do bloco ao prazo da fase `name`
+
+    Sem prazo ativo, não faz nada (as chamadas usam só o timeout por tentativa).
+    """
+    parent = _current_deadline.get()
+    if parent is None:
+        yield None
+        return
+    phase = parent.phase(name)
+    token = _current_deadline.set(phase)
+    try:
+        yield phase
+    finally:
+        _current_deadline.reset(token)
+
+
+class RetryPolicy:
+    """Retries com backoff exponencial e jitter completo"""
+
+    def __init__(self, max_attempts: int = 3, backoff_base_s: float = 0.5,
+                 backoff_cap_s: float = 8.0, attempt_timeout_s: float = 30.0,
+                 rng: Optional[random.Random] = None):
+        """
+        Args:
+            max_attempts: Tentativas no total (1 = sem retry)
+            backoff_base_s: Espera máxima antes do primeiro retry
+            backoff_cap_s: Teto da espera entre tentativas
+            attempt_timeout_s: Timeout de cada tentativa
+            rng: Gerador aleatório do jitter (para resultados reprodutíveis)
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts deve ser pelo menos 1")
+        self.max_attempts = max_attempts
+        self.backoff_base_s = backoff_base_s
+        self.backoff_cap_s = backoff_cap_s
+        self.attempt_timeout_s = attempt_timeout_s
+        self._rng = rng or random.Random()
+        self._rng_lock = threading.Lock()
+
+    def backoff(self, attempt: int) -> float:
+        """Espera antes da tentativa `attempt + 1`: uniforme em [0, min(teto, base × 2^(attempt-1))]"""
+        ceiling = min(self.backoff_cap_s, self.backoff_base_s * 2 ** (attempt - 1))
+        with self._rng_lock:
+            return self._rng.uniform(0, ceiling)
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        """Erros transitórios do provedor (429, timeout, conexão, 408/409, 5xx)"""
+        return isinstance(error, RETRYABLE_ERRORS) or \
+            getattr(error, "status_code", None) in RETRYABLE_STATUS_CODES
+
+
+class Hedger:
+    """
+    Decide quando disparar uma requisição duplicada
+
+    Guarda a latência das chamadas bem-sucedidas por modelo; depois de
+    `min_samples` chamadas, uma tentativa que passa do quantil `quantile`
+    ganha uma duplicata, desde que as duplicatas não passem de `max_ratio`
+    das chamadas.
+    """
+
+    def __init__(self, quantile: float = 0.95, min_samples: int = 20,
+                 max_ratio: float = 0.05, enabled: bool = True):
+        """
+        Args:
+            quantile: Percentil de latência a partir do qual duplicar
+            min_samples: Amostras necessárias antes de duplicar
+            max_ratio: Fração máxima de chamadas com duplicata
+            enabled: Liga/desliga o hedging
+        """
+        if not 0 < quantile < 1:
+            raise ValueError("quantile deve estar entre 0 e 1")
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.max_ratio = max_ratio
+        self.enabled = enabled
+        self.latencies: Dict[str, LogHistogram] = {}
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency_s: float):
+        """Registra a latência de uma chamada bem-sucedida"""
+        with self._lock:
+            self.latencies.setdefault(model, LogHistogram()).add(latency_s)
+
+    def threshold_s(self, model: str) -> Optional[float]:
+        """Latência a partir da qual duplicar (None = ainda não duplica)"""
+        if not self.enabled:
+            return None
+        with self._lock:
+            histogram = self.latencies.get(model)
+            if histogram is None or histogram.count < self.min_samples:
+                return None
+            return histogram.quantile(self.quantile)
+
+    def note_call(self):
+        with self._lock:
+            self.calls += 1
+
+    def try_hedge(self) -> bool:
+        """Reserva uma duplicata se o orçamento (max_ratio das chamadas) permitir"""
+        with self._lock:
+            if self.hedged + 1 > self.max_ratio * self.calls:
+                return False
+            self.hedged += 1
+            return True
+
+    def note_win(self):
+        with self._lock:
+            self.hedge_wins += 1
+
+    def latency_summary(self) -> Dict[str, Dict[str, float]]:
+        """Latência observada por modelo (chamadas, p50 e p95 em ms)"""
+        with self._lock:
+            return {
+                model: {"count": histogram.count,
+                        "p50_ms": round(histogram.quantile(0.5) * 1000, 1),
+                        "p95_ms": round(histogram.quantile(0.95) * 1000, 1)}
+                for model, histogram in self.latencies.items()
+            }
+
+
+class _AttemptClock:
+    """Momento em que uma tentativa saiu da fila e foi enviada ao provedor"""
+
+    def __init__(self):
+        self.sent_at: Optional[float] = None
+
+    def mark(self):
+        self.sent_at = time.perf_counter()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.sent_at
+
+
+class ResilientCaller:
+    """Aplica prazo, retries e hedging a uma função de envio"""
+
+    _shared: Dict[str, "ResilientCaller"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, policy: Optional[RetryPolicy] = None, hedger: Optional[Hedger] = None,
+                 max_workers: int = 128):
+        """
+        Args:
+            policy: Política de retry e timeout por tentativa
+            hedger: Controle das requisições duplicadas (None = sem hedging)
+            max_workers: Threads para as tentativas quando o hedging está ativo
+        """
+        self.policy = policy or RetryPolicy()
+        self.hedger = hedger
+        self.max_workers = max_workers
+        self.retries = 0
+        self.deadline_exceeded = 0
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "ResilientCaller":
+        """Cria a partir da seção `resilience` do prompts.json"""
+        config = prompts.get_resilience_config()
+        hedging = config.get("hedging", {})
+        return cls(
+            policy=RetryPolicy(
+                max_attempts=config.get("max_attempts", 3),
+                backoff_base_s=config.get("backoff_base_s", 0.5),
+                backoff_cap_s=config.get("backoff_cap_s", 8.0),
+                attempt_timeout_s=config.get("attempt_timeout_s", 30.0)
+            ),
+            hedger=Hedger(
+                quantile=hedging.get("quantile", 0.95),
+                min_samples=hedging.get("min_samples", 20),
+                max_ratio=hedging.get("max_ratio", 0.05),
+                enabled=hedging.get("enabled", True)
+            )
+        )
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "ResilientCaller":
+        """Retorna a instância compartilhada pelo processo (histograma de latência único)"""
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    def _timeout(self, deadline: Optional[Deadline], request: Dict[str, Any]) -> float:
+        """Timeout da tentativa: o configurado, limitado pelo prazo e pelo timeout do chamador"""
+        timeout = self.policy.attempt_timeout_s
+        if isinstance(request.get("timeout"), (int, float)):
+            timeout = min(timeout, request["timeout"])
+        if deadline is not None:
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                with self._lock:
+                    self.deadline_exceeded += 1
+                raise DeadlineExceeded(f"Prazo da fase '{deadline.name}' esgotado")
+            timeout = min(timeout, remaining)
+        return timeout
+
+    def _timed(self, send: Callable[..., Any], deadline: Optional[Deadline]) -> Callable[..., Any]:
+        """Envolve `send` para calcular o timeout na hora do envio e medir a latência"""
+        def attempt(clock: _AttemptClock, request: Dict[str, Any]) -> Any:
+            # Prazo já esgotado: nem entra na fila do governador
+            self._timeout(deadline, request)
+
+            def start(queued: Dict[str, Any]) -> Dict[str, Any]:
+                # Chamado por `send` depois da fila: o tempo esperado lá sai do timeout
+                timeout = self._timeout(deadline, queued)
+                clock.mark()
+                return {**queued, "timeout": timeout}
+
+            response = send(request, start)
+            if self.hedger is not None and not request.get("stream") and clock.sent_at is not None:
+                # Com stream, a chamada retorna no primeiro byte: não entra no histograma
+                self.hedger.record(str(request.get("model")), clock.elapsed())
+            return response
+        return attempt
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="llm-hedge")
+            return self._pool
+
+    def _attempt(self, attempt: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        """Uma tentativa, com duplicata se passar do limiar de latência"""
+        threshold = None
+        if self.hedger is not None and not request.get("stream"):
+            # Streams não são duplicados: o stream perdedor ficaria aberto
+            self.hedger.note_call()
+            threshold = self.hedger.threshold_s(str(request.get("model")))
+        if threshold is None:
+            return attempt(_AttemptClock(), request)
+
+        # Cada thread roda numa cópia do contexto (prazo e execução do tracker)
+        pool = self._executor()
+        clock = _AttemptClock()
+        primary = pool.submit(copy_context().run, attempt, clock, request)
+        done, _ = wait([primary], timeout=threshold)
+        # O limiar conta a partir do envio: espera na fila do governador não é lentidão do provedor
+        while not done and clock.sent_at is not None and clock.elapsed() < threshold:
+            done, _ = wait([primary], timeout=threshold - clock.elapsed())
+        # Ainda na fila: uma duplicata entraria na mesma fila, então só espera a original
+        if done or clock.sent_at is None or not self.hedger.try_hedge():
+            return primary.result()
+
+        log.info("Disparando requisição duplicada", event="resilience.hedge",
+                 model=request.get("model"), threshold_ms=round(threshold * 1000, 1))
+        hedge = pool.submit(copy_context().run, attempt, _AttemptClock(), request)
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    # A perdedora não é cancelada (o SDK é síncrono); termina em segundo plano
+                    if future is hedge:
+                        self.hedger.note_win()
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, send: Callable[..., Any], request: Dict[str, Any]) -> Any:
+        """
+        Executa `send(request, start)` com prazo, retries e hedging
+
+        Args:
+            send: Envia a requisição; deve chamar `start(request)` logo antes de
+                chegar ao provedor (depois de filas) e enviar a requisição que
+                ele retorna, com o timeout da tentativa
+            request: Argumentos da chamada
+
+        Raises:
+            DeadlineExceeded: Prazo da fase esgotado antes de uma resposta
+            openai.APIError: Erro não transitório, ou transitório após a última tentativa
+        """
+        deadline = current_deadline()
+        attempt = self._timed(send, deadline)
+        for number in range(1, self.policy.max_attempts + 1):
+            try:
+                return self._attempt(attempt, request)
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                if not self.policy.is_retryable(e) or number == self.policy.max_attempts:
+                    raise
+                delay = self.policy.backoff(number)
+                if deadline is not None and delay >= deadline.remaining():
+                    with self._lock:
+                        self.deadline_exceeded += 1
+                    raise DeadlineExceeded(f"Prazo da fase '{deadline.name}' esgotado após {number} tentativas") from e
+                with self._lock:
+                    self.retries += 1
+                log.warning("Erro transitório, tentando novamente", event="resilience.retry",
+                            attempt=number, error_type=type(e).__name__, delay_s=round(delay, 3),
+                            phase=deadline.name if deadline else None)
+                time.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores de retries, prazos esgotados e duplicatas, e latência por modelo"""
+        stats = {"retries": self.retries, "deadline_exceeded": self.deadline_exceeded}
+        if self.hedger is not None:
+            stats.update(calls=self.hedger.calls, hedged=self.hedger.hedged, hedge_wins=self.hedger.hedge_wins,
+                         latency_by_model=self.hedger.latency_summary())
+        return stats
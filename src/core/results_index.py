@@ -0,0 +1,197 @@
+"""
+Índice de resultados append-only e seguro para execuções concorrentes
+
+Cada registro é acrescentado a um log JSONL sob lock de arquivo, com custo
+constante por escrita. Periodicamente o log é compactado num snapshot JSON
+(mesmo formato do antigo results_index.json), gravado via arquivo temporário
++ os.replace, de modo que leitores nunca veem um snapshot parcial.
+"""
+
+import json
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+
+# Lock de arquivo: fcntl (Unix) ou msvcrt (Windows)
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    try:
+        import msvcrt
+    except ImportError:
+        msvcrt = None
+
+from .event_log import get_event_logger
+
+log = get_event_logger("results_index")
+
+
+@contextmanager
+def file_lock(path: Union[str, Path], shared: bool = False) -> Iterator[None]:
+    """
+    Lock consultivo entre processos sobre um arquivo de lock dedicado
+
+    Args:
+        path: Arquivo de lock (criado se não existir)
+        shared: Lock compartilhado (leitura) em vez de exclusivo; no Windows
+            o lock é sempre exclusivo
+    """
+    with open(path, "a+b") as handle:
+        if fcntl is not None:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        elif msvcrt is not None:
+            handle.seek(0)
+            msvcrt.locking(handle.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+            elif msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ResultsIndex:
+    """
+    Índice histórico de resultados de teste
+
+    Arquivos (para results_index.json):
+        results_index.json        - snapshot compactado {"results": [...], "last_updated": ...}
+        results_index.log.jsonl   - registros acrescentados desde a última compactação
+        results_index.lock        - lock compartilhado entre processos
+    """
+
+    def __init__(self, path: Union[str, Path] = "experiments/results_index.json",
+                 compact_bytes: int = 256 * 1024):
+        """
+        Args:
+            path: Caminho do snapshot JSON
+            compact_bytes: Tamanho do log que dispara a compactação automática
+        """
+        self.path = Path(path)
+        self.log_path = self.path.with_name(self.path.stem + ".log.jsonl")
+        self.lock_path = self.path.with_name(self.path.stem + ".lock")
+        self.compact_bytes = compact_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def _key(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+        return entry.get("filename"), entry.get("implementation"), entry.get("timestamp")
+
+    def append(self, entry: Dict[str, Any]) -> None:
+        """
+        Registra um resultado (custo constante; compacta quando o log cresce)
+
+        Args:
+            entry: Registro com pelo menos filename, implementation e timestamp
+        """
+        line = (json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with file_lock(self.lock_path):
+            with open(self.log_path, "a+b") as f:
+                self._drop_partial_line(f)
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+                log_size = f.tell()
+            if self.compact_bytes and log_size >= self.compact_bytes:
+                self._compact_locked()
+
+    @staticmethod
+    def _drop_partial_line(f) -> None:
+        """
+        Trunca o log até a última linha completa
+
+        Uma escrita interrompida deixa uma linha sem "\n"; sem o corte, o
+        próximo registro seria colado nela e os dois se perderiam na leitura.
+        """
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - 4096)
+            f.seek(start)
+            block = f.read(position - start)
+            if position == end and block.endswith(b"\n"):
+                return
+            newline = block.rfind(b"\n")
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            position = start
+        f.truncate(0)
+
+    def _read_snapshot(self) -> Dict[str, Any]:
+        if not self.path.exists():
+            return {"results": [], "last_updated": None}
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _read_log(self) -> List[Dict[str, Any]]:
+        if not self.log_path.exists():
+            return []
+        entries = []
+        with open(self.log_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.endswith("\n"):
+                    break  # escrita interrompida: ignora a linha parcial
+                try:
+                    entries.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+        return entries
+
+    def _merged(self) -> Dict[str, Any]:
+        snapshot = self._read_snapshot()
+        # Mesma chave no snapshot e no log (compactação interrompida) vale uma vez
+        entries = {self._key(entry): entry for entry in snapshot.get("results", [])}
+        for entry in self._read_log():
+            entries[self._key(entry)] = entry
+        results = sorted(entries.values(), key=lambda entry: entry.get("timestamp") or 0, reverse=True)
+        return {
+            "results": results,
+            "last_updated": max((entry.get("timestamp") or 0 for entry in results), default=None),
+        }
+
+    def load(self) -> Dict[str, Any]:
+        """
+        Retorna o índice completo (snapshot + log), mais recentes primeiro
+
+        Returns:
+            {"results": [...], "last_updated": timestamp}
+        """
+        with file_lock(self.lock_path, shared=True):
+            return self._merged()
+
+    def compact(self) -> int:
+        """
+        Incorpora o log ao snapshot (troca atômica) e esvazia o log
+
+        Returns:
+            Número de registros no snapshot
+        """
+        with file_lock(self.lock_path):
+            return self._compact_locked()
+
+    def _compact_locked(self) -> int:
+        index = self._merged()
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        # Só depois do snapshot estar no lugar o log é esvaziado
+        with open(self.log_path, "wb"):
+            pass
+        log.info("Índice de resultados compactado", event="results_index.compacted",
+                 path=str(self.path), entries=len(index["results"]))
+        return len(index["results"])
+
+    def latest(self, implementation: Optional[str] = None, limit: int = 10) -> List[Dict[str, Any]]:
+        """Registros mais recentes (opcionalmente de uma implementação)"""
+        results = self.load()["results"]
+        if implementation is not None:
+            results = [entry for entry in results if entry.get("implementation") == implementation]
+        return results[:limit]
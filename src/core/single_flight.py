@@ -0,0 +1,226 @@
+"""
+Coalescência de requisições idênticas simultâneas (single-flight)
+
+Quando uma pergunta popular chega de muitos usuários ao mesmo tempo (por
+exemplo, logo depois de um comunicado para a empresa toda), cada formulário
+disparava sua própria cadeia de chamadas ao LLM. Com o SingleFlight, a
+primeira requisição de uma chave (modo + input normalizado + histórico) vira
+a líder e executa o pipeline; as que chegam enquanto ela está em andamento
+esperam (no máximo até o prazo da própria requisição) e recebem o mesmo
+resultado, ou uma cópia da exceção da líder. Nada é guardado
+depois que a líder termina: não é um cache, só evita trabalho duplicado em
+voo.
+
+A chave não inclui o tenant, então o resultado da líder só é repassado se não
+depender de quem o pediu: se a líder falhar por orçamento do tenant
+(TokenBudgetExceeded) ou pelo próprio prazo (DeadlineExceeded), ou se o valor
+não for compartilhável (ex.: uma resposta de erro), cada requisição que
+esperava executa fn por conta própria. Quem recebe a resposta compartilhada
+não é cobrado no orçamento do seu tenant: o limite por tenant controla os
+tokens que cada um faz o LLM consumir, e a resposta compartilhada não consumiu
+nenhum token a mais (o tenant da líder pagou a execução).
+
+Uso:
+    flight = SingleFlight.shared(prompts)
+    key = flight.key("cov", user_input, history)
+    outcome = flight.do(key, lambda: run_pipeline(user_input))
+    outcome.value, outcome.leader, outcome.waiters
+"""
+
+import hashlib
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, List, Optional
+
+from .prompt_config import PromptConfig
+from .message_builder import canonical_json
+from .resilience import Deadline, DeadlineExceeded, current_deadline
+from .token_budget import TokenBudgetExceeded
+from .event_log import get_event_logger
+
+log = get_event_logger("single_flight")
+
+# Falhas que dependem do tenant ou do prazo da líder: não valem para quem esperava
+TENANT_SCOPED_ERRORS = (TokenBudgetExceeded, DeadlineExceeded)
+
+
+class SingleFlightError(RuntimeError):
+    """Falha da execução compartilhada cuja exceção não pôde ser recriada para quem esperava"""
+
+
+def _waiter_error(error: BaseException) -> BaseException:
+    """
+    Exceção nova para cada requisição que esperava
+
+    Relançar o mesmo objeto em várias threads mistura os tracebacks (cada raise
+    acrescenta frames a ele); a cópia tem o mesmo tipo, para os mesmos except
+    tratarem, e aponta para a original em __cause__.
+    """
+    try:
+        copy = type(error)(*error.args)
+    except Exception:
+        # Exceções com argumentos só nomeados (ex.: erros de status do SDK da OpenAI)
+        copy = SingleFlightError(f"Execução compartilhada falhou: {type(error).__name__}: {error}")
+    copy.__cause__ = error
+    return copy
+
+
+@dataclass
+class FlightOutcome:
+    """Resultado de SingleFlight.do para uma requisição"""
+    value: Any
+    leader: bool  # Esta requisição executou o pipeline
+    waiters: int  # Requisições que receberam o resultado da líder (sem contar ela)
+    wait_ms: float = 0.0  # Tempo esperando a líder (0 para a líder)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"leader": self.leader, "waiters": self.waiters, "wait_ms": round(self.wait_ms, 2)}
+
+
+class _Flight:
+    """Execução em andamento de uma chave"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.waiters = 0
+        self.shared = False  # Quem esperava pode usar o resultado (decidido pela líder)
+
+
+class SingleFlight:
+    """Compartilha uma execução em andamento entre requisições com a mesma chave"""
+
+    _shared: Dict[str, "SingleFlight"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, enabled: bool = True, case_sensitive: bool = False):
+        """
+        Args:
+            enabled: Desligado, do() sempre executa a função (cada requisição é líder)
+            case_sensitive: Se False, maiúsculas/minúsculas não diferenciam as chaves
+        """
+        self.enabled = enabled
+        self.case_sensitive = case_sensitive
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+        self.max_waiters = 0
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "SingleFlight":
+        """Cria a partir da seção `single_flight` do prompts.json"""
+        config = prompts.get_single_flight_config()
+        return cls(enabled=config.get("enabled", True), case_sensitive=config.get("case_sensitive", False))
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "SingleFlight":
+        """Retorna a instância compartilhada pelo processo"""
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    def key(self, mode: str, user_input: str, history: Optional[List[Dict[str, Any]]] = None) -> str:
+        """
+        Chave de coalescência
+
+        Args:
+            mode: Pipeline ("original", "cov", "secure")
+            user_input: Pergunta (espaços normalizados; caixa conforme case_sensitive)
+            history: Histórico da sessão; conversas com contextos diferentes não se juntam
+
+        Returns:
+            Hash hexadecimal da chave
+        """
+        text = " ".join((user_input or "").split())
+        if not self.case_sensitive:
+            text = text.casefold()
+        raw = canonical_json({"mode": mode, "input": text, "history": history or []})
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def do(self, key: str, fn: Callable[[], Any], deadline: Optional[Deadline] = None,
+           shareable: Optional[Callable[[Any], bool]] = None) -> FlightOutcome:
+        """
+        Executa fn, ou espera a execução em andamento da mesma chave
+
+        Args:
+            key: Chave retornada por key()
+            fn: Pipeline a executar (sem argumentos)
+            deadline: Prazo de quem espera (padrão: o prazo ativo da requisição; sem prazo, espera a líder)
+            shareable: Decide se o valor da líder serve para quem esperava (padrão: sempre);
+                se não servir, cada uma executa fn por conta própria
+
+        Returns:
+            FlightOutcome com o valor de fn (leader=True também para quem esperava e executou fn)
+
+        Raises:
+            DeadlineExceeded: Se o prazo acabar antes de a líder terminar (só para quem espera)
+            Exception: A exceção levantada por fn na líder; quem esperava recebe uma
+                cópia do mesmo tipo (ou SingleFlightError) com a original em __cause__,
+                exceto para TENANT_SCOPED_ERRORS, em que executa fn por conta própria
+        """
+        if not self.enabled:
+            return FlightOutcome(fn(), leader=True, waiters=0)
+
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self.leaders += 1
+            else:
+                flight.waiters += 1
+                self.coalesced += 1
+
+        if not leader:
+            started = time.perf_counter()
+            log.info("Requisição idêntica em andamento, aguardando", event="single_flight.coalesced",
+                     key=key[:12], waiters=flight.waiters)
+            deadline = deadline or current_deadline()
+            if not flight.done.wait(deadline.remaining() if deadline is not None else None):
+                with self._lock:
+                    flight.waiters -= 1
+                log.warning("Prazo esgotado esperando a requisição idêntica", event="single_flight.deadline_exceeded",
+                            key=key[:12], phase=deadline.name)
+                raise DeadlineExceeded(f"Prazo da fase '{deadline.name}' esgotado esperando a requisição idêntica")
+            wait_ms = (time.perf_counter() - started) * 1000
+            if not flight.shared:
+                log.info("Resultado da requisição idêntica não compartilhável, executando",
+                         event="single_flight.not_shared", key=key[:12],
+                         error=type(flight.error).__name__ if flight.error else None)
+                return FlightOutcome(fn(), leader=True, waiters=0, wait_ms=wait_ms)
+            if flight.error is not None:
+                raise _waiter_error(flight.error) from flight.error
+            return FlightOutcome(flight.value, leader=False, waiters=flight.waiters, wait_ms=wait_ms)
+
+        try:
+            flight.value = fn()
+            flight.shared = shareable is None or bool(shareable(flight.value))
+        except BaseException as e:
+            flight.error = e
+            flight.shared = not isinstance(e, TENANT_SCOPED_ERRORS)
+            raise
+        finally:
+            # Remove antes de liberar: quem chegar depois executa de novo em vez de ler um resultado antigo
+            with self._lock:
+                del self._flights[key]
+                self.max_waiters = max(self.max_waiters, flight.waiters)
+            flight.done.set()
+            if flight.waiters and flight.shared:
+                log.info("Resultado compartilhado", event="single_flight.shared", key=key[:12],
+                         waiters=flight.waiters, error=type(flight.error).__name__ if flight.error else None)
+        return FlightOutcome(flight.value, leader=True, waiters=flight.waiters if flight.shared else 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores (para logs e relatórios de carga)"""
+        with self._lock:
+            in_flight = len(self._flights)
+        return {
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "max_waiters": self.max_waiters,
+            "in_flight": in_flight,
+        }
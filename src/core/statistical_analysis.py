@@ -0,0 +1,281 @@
+"""
+Comparação estatística entre implementações (NumPy vetorizado)
+
+Uma média isolada não diz se "CoV é 30% mais lenta" é efeito real ou ruído de
+poucas amostras. Este módulo calcula:
+    - intervalos de confiança por bootstrap (pareado quando as execuções
+      correspondem às mesmas entradas) para diferenças de latência, tokens e
+      qualidade, inclusive a variação relativa;
+    - testes de permutação para diferenças de taxa de sucesso;
+    - orientação de tamanho de amostra (efeito mínimo detectável e n
+      necessário para detectar o efeito observado).
+
+As reamostragens são feitas em blocos de matrizes de contagens
+(reamostragens × amostras) e as médias saem de produtos de matrizes, então
+históricos grandes são processados em segundos.
+"""
+
+from statistics import NormalDist
+from typing import Dict, Any, Optional, Sequence, TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from .metric_store import MetricStore
+
+DEFAULT_RESAMPLES = 10000
+DEFAULT_CONFIDENCE = 0.95
+MIN_RESAMPLES = 1000
+# Limite de elementos por bloco de reamostragem (~40 MB de índices int64)
+_MAX_BLOCK_ELEMENTS = 5_000_000
+# Total de sorteios por comparação: acima disso o número de reamostragens cai
+# (até MIN_RESAMPLES), mantendo históricos grandes na casa dos segundos
+_RESAMPLE_BUDGET = 200_000_000
+
+
+def _rng(seed: Optional[int]) -> np.random.Generator:
+    return np.random.default_rng(seed)
+
+
+def _bootstrap_means(columns: np.ndarray, n_resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Médias de `n_resamples` reamostragens com reposição das linhas de `columns`
+
+    Cada reamostragem vira um vetor de contagens (quantas vezes cada linha foi
+    sorteada); as médias de todas as colunas saem de um único produto de
+    matrizes, e as colunas compartilham os mesmos sorteios (bootstrap pareado).
+
+    Args:
+        columns: Array (n, k) de amostras
+        n_resamples: Número de reamostragens
+
+    Returns:
+        Array (n_resamples, k) de médias
+    """
+    n = len(columns)
+    block = max(1, _MAX_BLOCK_ELEMENTS // n)
+    means = np.empty((n_resamples, columns.shape[1]))
+    for start in range(0, n_resamples, block):
+        stop = min(start + block, n_resamples)
+        size = stop - start
+        indexes = rng.integers(0, n, size=(size, n))
+        indexes += (np.arange(size) * n)[:, None]
+        counts = np.bincount(indexes.ravel(), minlength=size * n).reshape(size, n)
+        means[start:stop] = counts @ columns / n
+    return means
+
+
+def effective_resamples(n_resamples: int, n: int) -> int:
+    """Limita as reamostragens em amostras muito grandes (mantendo pelo menos MIN_RESAMPLES)"""
+    return int(min(n_resamples, max(MIN_RESAMPLES, _RESAMPLE_BUDGET // max(n, 1))))
+
+
+def bootstrap_mean_difference(baseline: Sequence[float], candidate: Sequence[float],
+                              paired: bool = False, n_resamples: int = DEFAULT_RESAMPLES,
+                              confidence: float = DEFAULT_CONFIDENCE,
+                              seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    IC bootstrap (percentil) da diferença de médias candidate - baseline
+
+    Args:
+        baseline: Amostras da implementação de referência
+        candidate: Amostras da implementação avaliada
+        paired: Se as amostras são pareadas (mesma entrada na mesma posição)
+        n_resamples: Número de reamostragens (reduzido em amostras muito grandes)
+        confidence: Nível de confiança (0.95 = IC 95%)
+        seed: Semente para resultados reprodutíveis
+
+    Returns:
+        Diferença e variação relativa (%) com seus intervalos, e se o
+        intervalo da diferença exclui zero
+    """
+    a = np.asarray(baseline, dtype=float)
+    b = np.asarray(candidate, dtype=float)
+    if paired and len(a) != len(b):
+        raise ValueError("Amostras pareadas precisam ter o mesmo tamanho")
+    if len(a) < 2 or len(b) < 2:
+        raise ValueError("São necessárias pelo menos 2 amostras por implementação")
+
+    rng = _rng(seed)
+    n_resamples = effective_resamples(n_resamples, max(len(a), len(b)))
+    if paired:
+        means_a, means_b = _bootstrap_means(np.column_stack([a, b]), n_resamples, rng).T
+    else:
+        means_a = _bootstrap_means(a[:, None], n_resamples, rng)[:, 0]
+        means_b = _bootstrap_means(b[:, None], n_resamples, rng)[:, 0]
+
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(means_b - means_a, [tail, 100 - tail])
+    result = {
+        "baseline_mean": float(a.mean()),
+        "candidate_mean": float(b.mean()),
+        "difference": float(b.mean() - a.mean()),
+        "ci_low": float(low),
+        "ci_high": float(high),
+        "confidence": confidence,
+        "paired": paired,
+        "n_resamples": n_resamples,
+        "significant": bool(low > 0 or high < 0),
+        "relative_pct": None,
+        "relative_ci_low_pct": None,
+        "relative_ci_high_pct": None,
+    }
+    if a.mean() != 0 and np.all(means_a != 0):
+        relative = (means_b / means_a - 1) * 100
+        rel_low, rel_high = np.percentile(relative, [tail, 100 - tail])
+        result.update(relative_pct=float((b.mean() / a.mean() - 1) * 100),
+                      relative_ci_low_pct=float(rel_low), relative_ci_high_pct=float(rel_high))
+    return result
+
+
+def permutation_test_proportions(baseline: Sequence[bool], candidate: Sequence[bool],
+                                 n_permutations: int = DEFAULT_RESAMPLES,
+                                 seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Teste de permutação (bicaudal) para diferença de taxas de sucesso
+
+    Para dados binários, o número de sucessos que cai no grupo candidato em
+    uma permutação segue uma hipergeométrica; sortear dela equivale a permutar
+    os rótulos e custa O(n_permutations), independente do tamanho das amostras.
+
+    Returns:
+        Taxas (%), diferença em pontos percentuais e p-valor
+    """
+    a = np.asarray(baseline, dtype=bool)
+    b = np.asarray(candidate, dtype=bool)
+    if len(a) == 0 or len(b) == 0:
+        raise ValueError("São necessárias amostras nas duas implementações")
+
+    successes = int(a.sum() + b.sum())
+    total = len(a) + len(b)
+    observed = b.mean() - a.mean()
+    candidate_successes = _rng(seed).hypergeometric(successes, total - successes, len(b), size=n_permutations)
+    permuted = candidate_successes / len(b) - (successes - candidate_successes) / len(a)
+    extreme = np.count_nonzero(np.abs(permuted) >= abs(observed) - 1e-12)
+    return {
+        "baseline_rate": float(a.mean() * 100),
+        "candidate_rate": float(b.mean() * 100),
+        "difference_pp": float(observed * 100),
+        "p_value": float((extreme + 1) / (n_permutations + 1)),
+        "n_permutations": n_permutations,
+    }
+
+
+def _z(probability: float) -> float:
+    return NormalDist().inv_cdf(probability)
+
+
+def sample_size_for_means(std: float, effect: float, alpha: float = 0.05, power: float = 0.8,
+                          paired: bool = False) -> Optional[int]:
+    """
+    n por implementação para detectar uma diferença de médias `effect`
+
+    Args:
+        std: Desvio padrão (das diferenças, se pareado; combinado, se não)
+        effect: Diferença absoluta que se quer detectar
+        alpha: Nível de significância bicaudal
+        power: Poder desejado
+
+    Returns:
+        Tamanho de amostra, ou None se o efeito for zero
+    """
+    if effect == 0:
+        return None
+    z = _z(1 - alpha / 2) + _z(power)
+    factor = 1 if paired else 2
+    return int(np.ceil(factor * (z * std / effect) ** 2))
+
+
+def sample_size_for_proportions(p_baseline: float, p_candidate: float,
+                                alpha: float = 0.05, power: float = 0.8) -> Optional[int]:
+    """n por implementação para detectar a diferença entre duas taxas (0-1)"""
+    if p_baseline == p_candidate:
+        return None
+    z_alpha, z_power = _z(1 - alpha / 2), _z(power)
+    pooled = (p_baseline + p_candidate) / 2
+    numerator = (z_alpha * np.sqrt(2 * pooled * (1 - pooled))
+                 + z_power * np.sqrt(p_baseline * (1 - p_baseline) + p_candidate * (1 - p_candidate)))
+    return int(np.ceil((numerator / (p_candidate - p_baseline)) ** 2))
+
+
+def minimum_detectable_effect(std: float, n: int, alpha: float = 0.05, power: float = 0.8,
+                              paired: bool = False) -> float:
+    """Menor diferença de médias detectável com n amostras por implementação"""
+    if n <= 0:
+        return float("inf")
+    factor = 1 if paired else 2
+    return float((_z(1 - alpha / 2) + _z(power)) * std * np.sqrt(factor / n))
+
+
+def compare_samples(baseline: Sequence[float], candidate: Sequence[float], paired: bool = False,
+                    n_resamples: int = DEFAULT_RESAMPLES, confidence: float = DEFAULT_CONFIDENCE,
+                    seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    IC bootstrap da diferença de médias + orientação de tamanho de amostra
+
+    Returns:
+        Resultado de bootstrap_mean_difference acrescido de "sample_size"
+        (efeito mínimo detectável com o n atual e n necessário para o efeito observado)
+    """
+    a = np.asarray(baseline, dtype=float)
+    b = np.asarray(candidate, dtype=float)
+    result = bootstrap_mean_difference(a, b, paired, n_resamples, confidence, seed)
+    if paired:
+        std = float(np.std(b - a, ddof=1))
+    else:
+        std = float(np.sqrt((np.var(a, ddof=1) + np.var(b, ddof=1)) / 2))
+    n = min(len(a), len(b))
+    alpha = 1 - confidence
+    result["sample_size"] = {
+        "n": n,
+        "minimum_detectable_effect": minimum_detectable_effect(std, n, alpha, paired=paired),
+        "required_n": sample_size_for_means(std, result["difference"], alpha, paired=paired),
+    }
+    return result
+
+
+def compare_rates(baseline: Sequence[bool], candidate: Sequence[bool],
+                  n_permutations: int = DEFAULT_RESAMPLES, alpha: float = 1 - DEFAULT_CONFIDENCE,
+                  seed: Optional[int] = None) -> Dict[str, Any]:
+    """Teste de permutação de taxas de sucesso + n necessário para a diferença observada"""
+    result = permutation_test_proportions(baseline, candidate, n_permutations, seed)
+    result["significant"] = result["p_value"] < alpha
+    result["sample_size"] = {
+        "n": min(len(baseline), len(candidate)),
+        "required_n": sample_size_for_proportions(result["baseline_rate"] / 100,
+                                                  result["candidate_rate"] / 100, alpha),
+    }
+    return result
+
+
+def _paired_inputs(original: "MetricStore", cov: "MetricStore") -> bool:
+    """As execuções são pareadas se as duas implementações rodaram as mesmas entradas na mesma ordem"""
+    if len(original) != len(cov):
+        return False
+    return bool(np.array_equal(original.column("user_input"), cov.column("user_input")))
+
+
+def compare_stores(original: "MetricStore", cov: "MetricStore",
+                   n_resamples: int = DEFAULT_RESAMPLES, confidence: float = DEFAULT_CONFIDENCE,
+                   seed: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Análise estatística completa entre dois MetricStore
+
+    Returns:
+        {"paired": bool, "latency_ms": {...}, "total_tokens": {...},
+         "success_rate": {...}} — métricas sem amostras suficientes são omitidas
+    """
+    paired = _paired_inputs(original, cov)
+    result: Dict[str, Any] = {"paired": paired, "confidence": confidence}
+    if len(original) < 2 or len(cov) < 2:
+        return result
+    for name, column in (("latency_ms", "total_latency_ms"), ("total_tokens", "total_tokens")):
+        result[name] = compare_samples(original.column(column), cov.column(column),
+                                       paired, n_resamples, confidence, seed)
+
+    def succeeded(store: "MetricStore") -> np.ndarray:
+        return ~store.column("error_occurred") & store.column("response_complete")
+
+    result["success_rate"] = compare_rates(succeeded(original), succeeded(cov),
+                                           n_resamples, 1 - confidence, seed)
+    return result
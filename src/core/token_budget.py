@@ -0,0 +1,368 @@
+"""
+Estimativa de tokens e controle de orçamento antes de enviar requisições ao LLM
+
+O MetricsTracker só conhece o consumo real depois da chamada. Este módulo conta
+os tokens de cada lista de mensagens ANTES do envio, aplica limites por
+requisição e por tenant e, quando o limite por requisição é excedido, reduz o
+conteúdo variável (input colado, resultados de funções) preservando o prefixo
+estático montado pelo MessageBuilder.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from typing import Dict, Any, List, Optional, Tuple
+
+from .prompt_config import PromptConfig
+from .message_builder import canonical_json
+
+# tiktoken é opcional: sem ele usamos uma heurística baseada em bytes
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+
+TRUNCATION_MARKER = "\n[... conteúdo truncado para caber no orçamento de tokens ...]\n"
+
+# Overheads do formato de chat da OpenAI (tokens por mensagem e priming da resposta)
+TOKENS_PER_MESSAGE = 3
+TOKENS_REPLY_PRIMING = 3
+
+# A cada quantas reservas os tenants sem consumo na janela são esquecidos
+SWEEP_EVERY = 256
+
+
+def _field(obj: Any, key: str) -> Any:
+    """Lê um campo de dicionário ou de objeto do SDK (tool_calls vêm nos dois formatos)"""
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+class TokenBudgetExceeded(ValueError):
+    """Erro levantado quando uma requisição não cabe no orçamento configurado"""
+
+
+class TokenReservation:
+    """Tokens reservados por uma chamada na janela do tenant (ajustados pelo uso real em settle)"""
+
+    __slots__ = ("tenant_id", "timestamp", "tokens", "settled")
+
+    def __init__(self, tenant_id: str, timestamp: float, tokens: int):
+        self.tenant_id = tenant_id
+        self.timestamp = timestamp
+        self.tokens = tokens
+        self.settled = False
+
+
+class TokenEstimator:
+    """Conta tokens localmente usando tiktoken (se disponível) ou uma heurística"""
+
+    def __init__(self, model: str = "gpt-4o-mini", bytes_per_token: float = 4.0):
+        """
+        Inicializa o estimador
+
+        Args:
+            model: Modelo usado para escolher o encoding do tiktoken
+            bytes_per_token: Razão usada pela heurística quando não há tiktoken
+        """
+        self.model = model
+        self.bytes_per_token = bytes_per_token
+        self._encoding = self._load_encoding(model)
+
+    @staticmethod
+    def _load_encoding(model: str):
+        """Carrega o encoding do tiktoken, se instalado"""
+        if tiktoken is None:
+            return None
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+        except Exception:
+            # Sem acesso ao cache/arquivo de encoding: cai para a heurística
+            return None
+
+    @property
+    def exact(self) -> bool:
+        """Indica se a contagem é exata (tiktoken) ou aproximada"""
+        return self._encoding is not None
+
+    def count_text(self, text: Optional[str]) -> int:
+        """Conta os tokens de um texto"""
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text))
+        return math.ceil(len(text.encode("utf-8")) / self.bytes_per_token)
+
+    def truncate_text(self, text: str, max_tokens: int) -> str:
+        """
+        Reduz um texto para no máximo `max_tokens`, mantendo início e fim
+
+        O início (2/3 do orçamento) costuma conter o pedido e o fim (1/3) o
+        fechamento do texto colado; o meio é substituído por um marcador.
+        """
+        if self.count_text(text) <= max_tokens:
+            return text
+        available = max_tokens - self.count_text(TRUNCATION_MARKER)
+        if available <= 0:
+            return ""
+        head_tokens = (available * 2) // 3
+        tail_tokens = available - head_tokens
+
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text)
+            head = self._encoding.decode(tokens[:head_tokens])
+            tail = self._encoding.decode(tokens[len(tokens) - tail_tokens:]) if tail_tokens else ""
+        else:
+            # A heurística conta bytes UTF-8, então o corte também é feito em bytes
+            raw = text.encode("utf-8")
+            head_bytes = int(head_tokens * self.bytes_per_token)
+            tail_bytes = max(0, int((tail_tokens - 1) * self.bytes_per_token))
+            head = raw[:head_bytes].decode("utf-8", errors="ignore")
+            tail = raw[len(raw) - tail_bytes:].decode("utf-8", errors="ignore") if tail_bytes else ""
+        return f"{head}{TRUNCATION_MARKER}{tail}"
+
+    def count_messages(self, messages: List[Dict[str, Any]],
+                       tools: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        Conta os tokens de input de uma lista de mensagens (e tools, se houver)
+
+        Args:
+            messages: Mensagens no formato do chat completions
+            tools: Schemas das tools enviados junto com a requisição
+
+        Returns:
+            Número estimado de tokens de input
+        """
+        total = TOKENS_REPLY_PRIMING
+        for message in messages:
+            total += TOKENS_PER_MESSAGE
+            content = message.get("content")
+            if isinstance(content, str):
+                total += self.count_text(content)
+            for key in ("name", "tool_call_id"):
+                if message.get(key):
+                    total += self.count_text(str(message[key]))
+            for call in message.get("tool_calls") or []:
+                function = _field(call, "function") or {}
+                total += self.count_text(_field(function, "name")) + self.count_text(_field(function, "arguments"))
+        if tools:
+            total += self.count_text(canonical_json(tools))
+        return total
+
+
+def _check_tool_pairs(messages: List[Dict[str, Any]]):
+    """
+    Confere que cada mensagem "tool" responde a um tool_call de um assistente anterior
+
+    Raises:
+        ValueError: Se houver um resultado de tool sem a chamada correspondente
+    """
+    call_ids = set()
+    for message in messages:
+        for call in message.get("tool_calls") or []:
+            call_ids.add(_field(call, "id"))
+        if message.get("role") == "tool" and message.get("tool_call_id") not in call_ids:
+            raise ValueError(f"Resultado de tool sem a chamada correspondente: {message.get('tool_call_id')}")
+
+
+class TokenBudget:
+    """Aplica limites de tokens por requisição e por tenant (janela deslizante)"""
+
+    _shared: Dict[str, "TokenBudget"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_request_tokens: int = 4000,
+                 max_tenant_tokens: Optional[int] = None,
+                 tenant_window_seconds: int = 3600,
+                 reserved_output_tokens: int = 800,
+                 min_variable_tokens: int = 32,
+                 estimator: Optional[TokenEstimator] = None):
+        """
+        Inicializa o orçamento
+
+        Args:
+            max_request_tokens: Máximo de tokens de input por requisição
+            max_tenant_tokens: Máximo de tokens por tenant na janela (None = sem limite)
+            tenant_window_seconds: Duração da janela deslizante do tenant
+            reserved_output_tokens: Tokens de saída reservados por requisição
+            min_variable_tokens: Mínimo de tokens a manter no conteúdo variável
+            estimator: Estimador de tokens (um padrão é criado se omitido)
+        """
+        self.max_request_tokens = max_request_tokens
+        self.max_tenant_tokens = max_tenant_tokens
+        self.tenant_window_seconds = tenant_window_seconds
+        self.reserved_output_tokens = reserved_output_tokens
+        self.min_variable_tokens = min_variable_tokens
+        self.estimator = estimator or TokenEstimator()
+        self._tenant_usage: Dict[str, "deque[TokenReservation]"] = {}
+        self._reservations = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "TokenBudget":
+        """Cria um orçamento a partir da seção `token_budget` do prompts.json"""
+        config = prompts.get_token_budget_config()
+        return cls(
+            max_request_tokens=config.get("max_request_tokens", 4000),
+            max_tenant_tokens=config.get("max_tenant_tokens_per_window"),
+            tenant_window_seconds=config.get("tenant_window_seconds", 3600),
+            reserved_output_tokens=config.get("reserved_output_tokens", 800),
+            min_variable_tokens=config.get("min_variable_tokens", 32),
+            estimator=TokenEstimator(config.get("model", "gpt-4o-mini"))
+        )
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "TokenBudget":
+        """
+        Retorna um orçamento compartilhado pelo processo
+
+        Os form UIs são reexecutados a cada sessão; um orçamento por execução
+        nunca acumularia consumo de tenant, então ele fica em nível de módulo.
+        """
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    def tenant_usage(self, tenant_id: str) -> int:
+        """Tokens consumidos pelo tenant dentro da janela atual"""
+        with self._lock:
+            return sum(reservation.tokens for reservation in self._prune(tenant_id))
+
+    def _prune(self, tenant_id: str) -> deque:
+        """Remove registros fora da janela (chamar com o lock adquirido)"""
+        entries = self._tenant_usage.setdefault(tenant_id, deque())
+        cutoff = time.monotonic() - self.tenant_window_seconds
+        while entries and entries[0].timestamp < cutoff:
+            entries.popleft()
+        return entries
+
+    def fit_messages(self, messages: List[Dict[str, Any]],
+                     tools: Optional[List[Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Garante que as mensagens caibam no limite por requisição
+
+        O primeiro system prompt (prefixo estático) nunca é alterado; o maior
+        conteúdo variável é truncado até a requisição caber. Mensagens nunca
+        são removidas: a mensagem do assistente com tool_calls fica intacta e a
+        resposta da tool só tem o conteúdo reduzido, então cada par chamada/
+        resultado continua completo (a API rejeita um resultado sem a chamada).
+
+        Returns:
+            Tuple[List, int]: (mensagens possivelmente compactadas, tokens estimados)
+
+        Raises:
+            TokenBudgetExceeded: Se nem o prefixo estático cabe no limite
+            ValueError: Se algum resultado de tool não tiver a chamada correspondente
+        """
+        _check_tool_pairs(messages)
+        estimated = self.estimator.count_messages(messages, tools)
+        if estimated <= self.max_request_tokens:
+            return messages, estimated
+
+        fitted = [dict(message) for message in messages]
+        originals = {
+            i: message["content"] for i, message in enumerate(fitted)
+            if i > 0 and isinstance(message.get("content"), str) and message["content"]
+            and not message.get("tool_calls")
+        }
+        variable_indexes = list(originals)
+        while estimated > self.max_request_tokens and variable_indexes:
+            largest = max(variable_indexes, key=lambda i: len(fitted[i]["content"]))
+            current = self.estimator.count_text(fitted[largest]["content"])
+            excess = estimated - self.max_request_tokens
+            target = max(self.min_variable_tokens, current - excess)
+            if target >= current:
+                variable_indexes.remove(largest)
+                continue
+            # Sempre trunca a partir do original para não acumular marcadores
+            fitted[largest]["content"] = self.estimator.truncate_text(originals[largest], target)
+            if self.estimator.count_text(fitted[largest]["content"]) >= current:
+                variable_indexes.remove(largest)
+            estimated = self.estimator.count_messages(fitted, tools)
+
+        if estimated > self.max_request_tokens:
+            raise TokenBudgetExceeded(
+                f"Requisição estimada em {estimated} tokens excede o limite de "
+                f"{self.max_request_tokens} mesmo após compactação"
+            )
+        return fitted, estimated
+
+    def reserve(self, tenant_id: str, input_tokens: int) -> TokenReservation:
+        """
+        Reserva tokens (input estimado + saída reservada) na janela do tenant
+
+        Returns:
+            TokenReservation a acertar com settle() quando a chamada terminar
+
+        Raises:
+            TokenBudgetExceeded: Se o tenant excederia seu limite na janela
+        """
+        charge = input_tokens + self.reserved_output_tokens
+        with self._lock:
+            entries = self._prune(tenant_id)
+            if self.max_tenant_tokens is not None:
+                used = sum(reservation.tokens for reservation in entries)
+                if used + charge > self.max_tenant_tokens:
+                    raise TokenBudgetExceeded(
+                        f"Tenant '{tenant_id}' excederia o limite de {self.max_tenant_tokens} "
+                        f"tokens na janela ({used} já usados, requisição de {charge})"
+                    )
+            reservation = TokenReservation(tenant_id, time.monotonic(), charge)
+            entries.append(reservation)
+            self._reservations += 1
+            if self._reservations % SWEEP_EVERY == 0:
+                self._sweep()
+        return reservation
+
+    def _sweep(self):
+        """Esquece tenants sem consumo na janela (chamar com o lock adquirido)"""
+        for tenant_id in list(self._tenant_usage):
+            if not self._prune(tenant_id):
+                del self._tenant_usage[tenant_id]
+
+    def settle(self, reservation: Optional[TokenReservation], usage: Any = None):
+        """
+        Troca a reserva pelo consumo real da chamada
+
+        A reserva cobre o pior caso (input estimado + reserved_output_tokens);
+        sem o acerto, cada chamada consumiria a janela do tenant pelo valor
+        reservado e os limites estourariam muito antes do consumo real.
+
+        Args:
+            reservation: Reserva devolvida por reserve/enforce (None é ignorado)
+            usage: `usage` da resposta (objeto do SDK ou dicionário com prompt_tokens e
+                completion_tokens); None devolve a reserva inteira (chamada falhou antes do envio)
+        """
+        if reservation is None:
+            return
+        used = 0
+        if usage is not None:
+            used = (_field(usage, "prompt_tokens") or 0) + (_field(usage, "completion_tokens") or 0)
+        with self._lock:
+            reservation.tokens = used
+            reservation.settled = True
+
+    def enforce(self, messages: List[Dict[str, Any]],
+                tools: Optional[List[Dict[str, Any]]] = None,
+                tenant_id: str = "default") -> Tuple[List[Dict[str, Any]], int, TokenReservation]:
+        """
+        Aplica os limites por requisição e por tenant antes do envio
+
+        Args:
+            messages: Mensagens montadas para a chamada
+            tools: Tools enviadas na chamada (contam como input)
+            tenant_id: Identificador do tenant para o limite agregado
+
+        Returns:
+            Tuple[List, int, TokenReservation]: (mensagens a enviar, tokens de input estimados,
+            reserva a acertar com settle() após a chamada)
+        """
+        fitted, estimated = self.fit_messages(messages, tools)
+        reservation = self.reserve(tenant_id, estimated)
+        return fitted, estimated, reservation
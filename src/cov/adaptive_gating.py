@@ -0,0 +1,356 @@
+"""
+Gating adaptativo do Chain of Verification
+
+A verificação praticamente dobra as chamadas ao LLM, mas raramente leva a
+uma correção. O VerificationGate mantém estatísticas online (com decaimento)
+da taxa de correção e do custo da verificação por função, intenção e
+características do input, e só verifica quando o benefício esperado
+(probabilidade de correção × valor da correção × peso da prioridade) supera o
+custo esperado em tokens e latência. Uma fração de exploração verifica
+mesmo quando o gate diria não, para as estatísticas não envelhecerem.
+
+Uso:
+    gate = VerificationGate.shared(prompts)
+    decision = gate.decide(user_input, function_name, tool_choice)
+    if decision.verify:
+        final_response, metadata = cov.process_with_verification(...)
+        gate.record(decision, metadata)
+
+Com state_file, as estatísticas são gravadas no máximo a cada
+save_interval_s (e no encerramento do processo), não a cada verificação.
+"""
+
+import atexit
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass, asdict, field
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, TYPE_CHECKING
+
+from src.core.prompt_config import PromptConfig
+from src.core.function_intent import detect_function_intent
+from src.core.event_log import get_event_logger
+
+if TYPE_CHECKING:
+    from src.core.metrics_tracker import MetricData
+    from .chain_of_verification import CoVConfiguration
+
+log = get_event_logger("cov_gate")
+
+# Peso do valor de uma correção conforme a prioridade configurada da função
+DEFAULT_PRIORITY_WEIGHTS = {"high": 1.0, "medium": 0.5, "low": 0.0}
+
+
+def request_features(user_input: str, function_name: Optional[str], tool_choice: str) -> Dict[str, str]:
+    """
+    Características de uma requisição usadas para agrupar as estatísticas
+
+    Returns:
+        function (nome ou "direct"), intent ("forced"/"auto"), length
+        ("short"/"medium"/"long") e numbers ("digits"/"no_digits")
+    """
+    words = len(user_input.split())
+    return {
+        "function": function_name or "direct",
+        "intent": "forced" if tool_choice == "required" else "auto",
+        "length": "short" if words <= 8 else "medium" if words <= 30 else "long",
+        "numbers": "digits" if any(char.isdigit() for char in user_input) else "no_digits",
+    }
+
+
+def feature_keys(features: Dict[str, str]) -> List[str]:
+    """Chaves de estatística da mais específica para a mais geral"""
+    function, intent = features["function"], features["intent"]
+    return [
+        f"{function}|{intent}|{features['length']}|{features['numbers']}",
+        f"{function}|{intent}",
+        function,
+        "*",
+    ]
+
+
+@dataclass
+class GateStats:
+    """Contagens com decaimento exponencial de um grupo de requisições verificadas"""
+    verifications: float = 0.0
+    corrections: float = 0.0
+    tokens: float = 0.0
+    latency_ms: float = 0.0
+
+    def update(self, corrected: bool, tokens: int, latency_ms: float, decay: float):
+        self.verifications = self.verifications * decay + 1
+        self.corrections = self.corrections * decay + (1 if corrected else 0)
+        self.tokens = self.tokens * decay + tokens
+        self.latency_ms = self.latency_ms * decay + latency_ms
+
+
+@dataclass
+class GateDecision:
+    """Decisão do gate para uma requisição"""
+    verify: bool
+    reason: str  # "disabled", "priority", "cold_start", "benefit", "explore", "skip"
+    features: Dict[str, str] = field(default_factory=dict)
+    stats_key: Optional[str] = None
+    correction_probability: float = 0.0
+    expected_benefit: float = 0.0
+    expected_cost: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+class VerificationGate:
+    """Decide, por requisição, se a verificação do CoV compensa"""
+
+    _shared: Dict[str, "VerificationGate"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, cov_config: Optional["CoVConfiguration"] = None,
+                 correction_value: float = 1.0, token_cost_per_1k: float = 0.05,
+                 latency_cost_per_s: float = 0.02, exploration_rate: float = 0.1,
+                 min_samples: int = 20, prior_correction_rate: float = 0.3,
+                 prior_strength: float = 5.0, decay: float = 0.995,
+                 default_latency_ms: float = 2500.0,
+                 priority_weights: Optional[Dict[str, float]] = None,
+                 state_file: Optional[str] = None, save_interval_s: float = 30.0,
+                 enabled: bool = True, seed: Optional[int] = None):
+        """
+        Args:
+            cov_config: Configuração estática do CoV (prioridade por função)
+            correction_value: Valor de uma correção, na mesma unidade dos custos
+            token_cost_per_1k: Custo de 1000 tokens de verificação
+            latency_cost_per_s: Custo de 1 segundo de latência adicional
+            exploration_rate: Fração das requisições recusadas que é verificada mesmo assim
+            min_samples: Verificações (com decaimento) para confiar em um grupo
+            prior_correction_rate: Taxa de correção assumida sem dados
+            prior_strength: Peso do prior, em verificações equivalentes
+            decay: Fator aplicado às contagens a cada nova observação do grupo
+            default_latency_ms: Latência registrada quando os metadados não a informam
+            priority_weights: Peso do valor da correção por prioridade da função
+            state_file: JSON onde as estatísticas são persistidas (None = só em memória)
+            save_interval_s: Intervalo mínimo entre gravações do state_file
+            enabled: Desligado, verifica tudo que a configuração estática permitir
+            seed: Semente da exploração (resultados reprodutíveis)
+        """
+        if cov_config is None:
+            from .chain_of_verification import CoVConfiguration
+            cov_config = CoVConfiguration()
+        if not 0 <= exploration_rate <= 1:
+            raise ValueError("exploration_rate deve estar entre 0 e 1")
+        if not 0 < decay <= 1:
+            raise ValueError("decay deve estar em (0, 1]")
+        self.cov_config = cov_config
+        self.correction_value = correction_value
+        self.token_cost_per_1k = token_cost_per_1k
+        self.latency_cost_per_s = latency_cost_per_s
+        self.exploration_rate = exploration_rate
+        self.min_samples = min_samples
+        self.prior_correction_rate = prior_correction_rate
+        self.prior_strength = prior_strength
+        self.decay = decay
+        self.default_latency_ms = default_latency_ms
+        self.priority_weights = priority_weights or DEFAULT_PRIORITY_WEIGHTS
+        self.state_file = state_file
+        self.save_interval_s = save_interval_s
+        self.enabled = enabled
+        self.stats: Dict[str, GateStats] = {}
+        self.decisions: Dict[str, int] = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        self._last_save = time.monotonic()
+        if state_file:
+            if Path(state_file).exists():
+                self.load(state_file)
+            # Observações desde a última gravação não se perdem no encerramento
+            atexit.register(self.flush)
+
+    @classmethod
+    def from_config(cls, prompts: PromptConfig) -> "VerificationGate":
+        """Cria o gate a partir de cov_configuration.adaptive_gating do prompts.json"""
+        config = prompts.get_cov_gating_config()
+        return cls(
+            correction_value=config.get("correction_value", 1.0),
+            token_cost_per_1k=config.get("token_cost_per_1k", 0.05),
+            latency_cost_per_s=config.get("latency_cost_per_s", 0.02),
+            exploration_rate=config.get("exploration_rate", 0.1),
+            min_samples=config.get("min_samples", 20),
+            prior_correction_rate=config.get("prior_correction_rate", 0.3),
+            prior_strength=config.get("prior_strength", 5.0),
+            decay=config.get("decay", 0.995),
+            default_latency_ms=config.get("default_latency_ms", 2500.0),
+            priority_weights=config.get("priority_weights"),
+            state_file=config.get("state_file"),
+            save_interval_s=config.get("save_interval_s", 30.0),
+            enabled=config.get("enabled", True)
+        )
+
+    @classmethod
+    def shared(cls, prompts: PromptConfig) -> "VerificationGate":
+        """Retorna o gate compartilhado pelo processo (estatísticas únicas)"""
+        with cls._shared_lock:
+            if prompts.config_file not in cls._shared:
+                cls._shared[prompts.config_file] = cls.from_config(prompts)
+            return cls._shared[prompts.config_file]
+
+    def _priority(self, function_name: Optional[str]) -> str:
+        if function_name:
+            return self.cov_config.get_function_config(function_name).get("correction_priority", "medium")
+        return self.cov_config.get_direct_response_config().get("correction_priority", "medium")
+
+    def _count(self, reason: str):
+        self.decisions[reason] = self.decisions.get(reason, 0) + 1
+
+    def decide(self, user_input: str, function_name: Optional[str] = None,
+               tool_choice: str = "auto") -> GateDecision:
+        """
+        Decide se a resposta desta requisição deve passar pela verificação
+
+        Args:
+            user_input: Input do usuário
+            function_name: Função chamada (None = resposta direta)
+            tool_choice: tool_choice usado na primeira chamada ("required"/"auto")
+
+        Returns:
+            GateDecision com o motivo e as estimativas usadas
+        """
+        features = request_features(user_input, function_name, tool_choice)
+        if not self.cov_config.should_verify(function_name):
+            decision = GateDecision(False, "priority", features)
+        elif not self.enabled:
+            decision = GateDecision(True, "disabled", features)
+        else:
+            decision = self._estimate(features, self._priority(function_name))
+
+        with self._lock:
+            self._count(decision.reason)
+        log.debug("Decisão do gate de verificação", event="cov_gate.decision", **{
+            key: value for key, value in decision.to_dict().items() if key != "features"
+        }, **features)
+        return decision
+
+    def _estimate(self, features: Dict[str, str], priority: str) -> GateDecision:
+        with self._lock:
+            key = next((key for key in feature_keys(features)
+                        if key in self.stats and self.stats[key].verifications >= self.min_samples), None)
+            if key is None:
+                # Sem dados suficientes em nenhum nível: verifica para aprender
+                return GateDecision(True, "cold_start", features)
+            stats = self.stats[key]
+            explore = self._rng.random() < self.exploration_rate
+
+        probability = (stats.corrections + self.prior_correction_rate * self.prior_strength) / \
+            (stats.verifications + self.prior_strength)
+        tokens = stats.tokens / stats.verifications
+        latency_ms = stats.latency_ms / stats.verifications
+        benefit = probability * self.correction_value * self.priority_weights.get(priority, 1.0)
+        cost = tokens / 1000 * self.token_cost_per_1k + latency_ms / 1000 * self.latency_cost_per_s
+
+        if benefit >= cost:
+            verify, reason = True, "benefit"
+        elif explore:
+            verify, reason = True, "explore"
+        else:
+            verify, reason = False, "skip"
+        return GateDecision(verify, reason, features, key, round(probability, 4),
+                            round(benefit, 4), round(cost, 4))
+
+    def observe(self, features: Dict[str, str], corrected: bool, tokens: int, latency_ms: float):
+        """Atualiza as estatísticas de todos os níveis com uma verificação realizada"""
+        with self._lock:
+            for key in feature_keys(features):
+                self.stats.setdefault(key, GateStats()).update(corrected, tokens, latency_ms, self.decay)
+            self._unsaved += 1
+
+    def record(self, decision: GateDecision, verification_metadata: Dict[str, Any]):
+        """
+        Registra o resultado de uma verificação feita por decisão do gate
+
+        Args:
+            decision: Decisão retornada por decide()
+            verification_metadata: Metadados de ChainOfVerification.process_with_verification
+        """
+        if not decision.verify or verification_metadata.get("verification_result", {}).get("error") \
+                or verification_metadata.get("correction_failed"):
+            # Verificação ou correção que falhou não diz nada sobre a taxa de correção
+            return
+        self.observe(decision.features,
+                     corrected=verification_metadata.get("correction_applied", False),
+                     tokens=verification_metadata.get("verification_tokens_used", 0),
+                     latency_ms=verification_metadata.get("verification_latency_ms", self.default_latency_ms))
+        if self.state_file and time.monotonic() - self._last_save >= self.save_interval_s:
+            self.flush()
+
+    def flush(self):
+        """Grava o state_file se houver observações ainda não gravadas"""
+        if not self.state_file or not self._unsaved:
+            return
+        try:
+            self.save(self.state_file)
+        except OSError as e:
+            log.warning("Falha ao gravar o estado do gate", event="cov_gate.state_error",
+                        path=self.state_file, error=str(e))
+
+    def warm_start(self, metrics: Iterable["MetricData"]) -> int:
+        """
+        Alimenta as estatísticas com execuções já registradas (ex: raw_data/ dos experimentos)
+
+        Returns:
+            Número de execuções com verificação aproveitadas
+        """
+        used = 0
+        for metric in metrics:
+            if not metric.verification_used:
+                continue
+            features = request_features(metric.user_input, metric.function_called,
+                                        detect_function_intent(metric.user_input))
+            self.observe(features, metric.correction_made, metric.verification_tokens,
+                         metric.verification_latency_ms)
+            used += 1
+        return used
+
+    def summary(self) -> Dict[str, Any]:
+        """Decisões por motivo e taxa de correção observada por grupo"""
+        with self._lock:
+            return {
+                "decisions": dict(self.decisions),
+                "groups": {
+                    key: {
+                        "verifications": round(stats.verifications, 2),
+                        "correction_rate": round(stats.corrections / stats.verifications, 4)
+                        if stats.verifications else 0.0,
+                        "avg_tokens": round(stats.tokens / stats.verifications, 1) if stats.verifications else 0.0,
+                        "avg_latency_ms": round(stats.latency_ms / stats.verifications, 1)
+                        if stats.verifications else 0.0,
+                    }
+                    for key, stats in sorted(self.stats.items())
+                },
+            }
+
+    def save(self, path: str):
+        """Grava as estatísticas (escrita atômica)"""
+        with self._lock:
+            data = {key: asdict(stats) for key, stats in self.stats.items()}
+            self._unsaved = 0
+            self._last_save = time.monotonic()
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"stats": data}, f, indent=2)
+        os.replace(tmp_path, path)
+
+    def load(self, path: str):
+        """Carrega estatísticas gravadas por save() (substitui as atuais)"""
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            stats = {key: GateStats(**values) for key, values in data.get("stats", {}).items()}
+        except (OSError, ValueError, TypeError) as e:
+            log.warning("Estado do gate ignorado", event="cov_gate.state_error", path=str(path), error=str(e))
+            return
+        with self._lock:
+            self.stats = stats
@@ -0,0 +1,292 @@
+"""
+Verificação do CoV em lote para avaliação offline
+
+Na avaliação offline (run_cov_focused_tests) cada caso fazia sua verificação
+como uma chamada separada, em série. O BatchVerifier junta as verificações de
+vários casos (input, resposta inicial, chamada de função), envia tudo de uma
+vez e devolve um veredito por caso, que segue para a decisão de correção de
+process_with_verification (verification_result=...).
+
+Backends:
+    - "local": envia as chamadas em paralelo pelo chat.completions.create do
+      cliente (API real ou StubChatClient), passando pelo governador de taxa;
+    - "openai": Batch API da OpenAI (arquivo JSONL + /v1/batches), mais barata
+      e sem consumir o limite de requisições online, mas com conclusão
+      assíncrona (até completion_window).
+
+Uso:
+    verifier = BatchVerifier.from_config(cov, prompts)
+    verdicts = verifier.verify([VerificationItem("1", user_input, initial_response, function_call)])
+    final_response, metadata = cov.process_with_verification(
+        ..., verification_result=verdicts["1"].result, verification_usage=verdicts["1"].usage
+    )
+"""
+
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, Callable, List, Optional
+
+from openai.types.chat import ChatCompletion
+
+from src.core.prompt_config import PromptConfig
+from src.core.event_log import get_event_logger
+from src.cov.chain_of_verification import ChainOfVerification
+
+log = get_event_logger("cov_batch")
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_BATCH_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+@dataclass
+class VerificationItem:
+    """Uma verificação a incluir no lote"""
+    custom_id: str
+    user_input: str
+    initial_response: str
+    function_call: Optional[Dict[str, Any]] = None
+
+
+@dataclass
+class BatchOutcome:
+    """Resposta (ou erro) de uma requisição do lote, como devolvida pelo backend"""
+    response: Optional[Any] = None
+    error: Optional[str] = None
+    latency_ms: float = 0.0  # Latência da própria chamada (0 quando o backend não mede)
+
+
+@dataclass
+class BatchVerdict:
+    """Veredito de uma verificação do lote, pronto para process_with_verification"""
+    custom_id: str
+    result: Dict[str, Any]
+    usage: Optional[Dict[str, Any]] = None  # Entrada de api_calls da verificação
+    latency_ms: float = 0.0
+
+
+class LocalBatchBackend:
+    """Executa as requisições do lote em paralelo pelo chat.completions.create do cliente"""
+
+    name = "local"
+
+    def __init__(self, client: Any, max_workers: int = 16):
+        """
+        Args:
+            client: Cliente (governado) usado nas chamadas
+            max_workers: Chamadas simultâneas
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers deve ser pelo menos 1")
+        self.client = client
+        self.max_workers = max_workers
+
+    def _send(self, body: Dict[str, Any]) -> BatchOutcome:
+        started = time.perf_counter()
+        try:
+            response = self.client.chat.completions.create(**body)
+        except Exception as e:
+            return BatchOutcome(error=f"{type(e).__name__}: {e}",
+                                latency_ms=(time.perf_counter() - started) * 1000)
+        return BatchOutcome(response=response, latency_ms=(time.perf_counter() - started) * 1000)
+
+    def run(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, BatchOutcome]:
+        """
+        Args:
+            requests: custom_id → argumentos de chat.completions.create
+
+        Returns:
+            custom_id → resultado
+        """
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, max(1, len(requests)))) as executor:
+            futures = {custom_id: executor.submit(self._send, body) for custom_id, body in requests.items()}
+            return {custom_id: future.result() for custom_id, future in futures.items()}
+
+
+class OpenAIBatchBackend:
+    """Envia o lote pela Batch API da OpenAI e aguarda a conclusão"""
+
+    name = "openai"
+
+    def __init__(self, client: Any, completion_window: str = "24h", poll_interval_s: float = 30.0,
+                 timeout_s: Optional[float] = None, sleep: Callable[[float], None] = time.sleep):
+        """
+        Args:
+            client: Cliente OpenAI (precisa de files e batches)
+            completion_window: Janela de conclusão pedida à API
+            poll_interval_s: Intervalo entre consultas ao status do lote
+            timeout_s: Espera máxima; ao estourar, o lote é cancelado (None = sem limite)
+            sleep: Função de espera (substituível em experimentos)
+        """
+        self.client = client
+        self.completion_window = completion_window
+        self.poll_interval_s = poll_interval_s
+        self.timeout_s = timeout_s
+        self.sleep = sleep
+
+    @staticmethod
+    def _jsonl(requests: Dict[str, Dict[str, Any]]) -> bytes:
+        lines = [
+            json.dumps({"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body},
+                       ensure_ascii=False)
+            for custom_id, body in requests.items()
+        ]
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def _wait(self, batch: Any) -> Any:
+        started = time.monotonic()
+        while batch.status not in TERMINAL_BATCH_STATUSES:
+            if self.timeout_s is not None and time.monotonic() - started > self.timeout_s:
+                self.client.batches.cancel(batch.id)
+                raise TimeoutError(f"Lote {batch.id} não concluiu em {self.timeout_s:.0f}s (status {batch.status})")
+            self.sleep(self.poll_interval_s)
+            batch = self.client.batches.retrieve(batch.id)
+            log.debug("Status do lote", event="cov.batch_polled", batch_id=batch.id, status=batch.status)
+        return batch
+
+    def _read_lines(self, file_id: Optional[str], outcomes: Dict[str, BatchOutcome]):
+        """Lê o arquivo de saída (ou de erros) do lote para `outcomes`"""
+        if not file_id:
+            return
+        for line in self.client.files.content(file_id).text.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            custom_id = record.get("custom_id")
+            response = record.get("response") or {}
+            if response.get("status_code") == 200:
+                outcomes[custom_id] = BatchOutcome(response=ChatCompletion.construct(**response["body"]))
+            else:
+                error = record.get("error") or response.get("body", {}).get("error") or {}
+                message = error.get("message") if isinstance(error, dict) else str(error)
+                outcomes[custom_id] = BatchOutcome(
+                    error=f"status {response.get('status_code')}: {message or 'erro sem mensagem'}"
+                )
+
+    def run(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, BatchOutcome]:
+        """
+        Args:
+            requests: custom_id → corpo da requisição para /v1/chat/completions
+
+        Returns:
+            custom_id → resultado (requisições sem resultado voltam como erro)
+        """
+        input_file = self.client.files.create(file=("cov_verification.jsonl", self._jsonl(requests)),
+                                              purpose="batch")
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT,
+                                           completion_window=self.completion_window)
+        log.info("Lote enviado", event="cov.batch_submitted", batch_id=batch.id, requests=len(requests))
+        batch = self._wait(batch)
+
+        outcomes: Dict[str, BatchOutcome] = {}
+        self._read_lines(batch.output_file_id, outcomes)
+        self._read_lines(batch.error_file_id, outcomes)
+        for custom_id in requests:
+            outcomes.setdefault(custom_id, BatchOutcome(error=f"sem resultado no lote (status {batch.status})"))
+        return outcomes
+
+
+class BatchVerifier:
+    """Monta, envia e interpreta verificações do CoV em lote"""
+
+    def __init__(self, cov: ChainOfVerification, backend: Any, max_batch_size: int = 50000):
+        """
+        Args:
+            cov: ChainOfVerification que monta as requisições e interpreta os vereditos
+            backend: LocalBatchBackend ou OpenAIBatchBackend
+            max_batch_size: Requisições por envio (a Batch API aceita até 50.000)
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size deve ser pelo menos 1")
+        self.cov = cov
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+
+    @classmethod
+    def from_config(cls, cov: ChainOfVerification, prompts: PromptConfig,
+                    backend: Optional[str] = None) -> "BatchVerifier":
+        """
+        Cria o verificador a partir de cov_configuration.batch_verification
+
+        Args:
+            cov: ChainOfVerification usado na montagem e interpretação
+            prompts: Configuração de prompts
+            backend: "local" ou "openai" (None = o configurado)
+        """
+        config = prompts.get_batch_verification_config()
+        backend = backend or config.get("backend", "local")
+        if backend == "local":
+            runner = LocalBatchBackend(cov.client, max_workers=config.get("max_workers", 16))
+        elif backend == "openai":
+            runner = OpenAIBatchBackend(cov.client,
+                                        completion_window=config.get("completion_window", "24h"),
+                                        poll_interval_s=config.get("poll_interval_s", 30.0),
+                                        timeout_s=config.get("timeout_s"))
+        else:
+            raise ValueError(f"Backend de verificação em lote inválido: {backend}")
+        return cls(cov, runner, max_batch_size=config.get("max_batch_size", 50000))
+
+    @staticmethod
+    def _failed(error: str) -> Dict[str, Any]:
+        """Resultado de uma verificação sem veredito (mantém a resposta inicial)"""
+        return {"has_issues": False, "error": error, "should_regenerate": False}
+
+    def verify(self, items: List[VerificationItem]) -> Dict[str, BatchVerdict]:
+        """
+        Verifica todos os itens, em um ou mais envios ao backend
+
+        Args:
+            items: Verificações a fazer (custom_id único por item)
+
+        Returns:
+            custom_id → veredito (falhas viram resultados com "error", como na verificação online)
+        """
+        if len({item.custom_id for item in items}) != len(items):
+            raise ValueError("custom_id repetido no lote de verificação")
+
+        started = time.perf_counter()
+        verdicts: Dict[str, BatchVerdict] = {}
+        requests: Dict[str, Dict[str, Any]] = {}
+        kinds: Dict[str, str] = {}
+        reservations: Dict[str, Any] = {}
+        for item in items:
+            try:
+                (kinds[item.custom_id], requests[item.custom_id],
+                 reservations[item.custom_id]) = self.cov.build_verification_request(
+                    item.user_input, item.initial_response, item.function_call
+                )
+            except Exception as e:
+                verdicts[item.custom_id] = BatchVerdict(item.custom_id, self._failed(str(e)))
+
+        ids = list(requests)
+        for start in range(0, len(ids), self.max_batch_size):
+            chunk = {custom_id: requests[custom_id] for custom_id in ids[start:start + self.max_batch_size]}
+            try:
+                outcomes = self.backend.run(chunk)
+            except Exception as e:
+                # Envio inteiro falhou (prazo do lote, erro em files/batches): os demais envios seguem
+                log.error("Erro no envio do lote de verificação", event="cov.batch_chunk_error",
+                          backend=self.backend.name, items=len(chunk), error=str(e), error_type=type(e).__name__)
+                outcomes = {custom_id: BatchOutcome(error=f"{type(e).__name__}: {e}") for custom_id in chunk}
+            for custom_id, outcome in outcomes.items():
+                self.cov.settle_budget(reservations[custom_id],
+                                       getattr(outcome.response, "usage", None) if outcome.response else None)
+                verdicts[custom_id] = self._verdict(custom_id, kinds[custom_id], chunk[custom_id], outcome)
+
+        errors = sum(1 for verdict in verdicts.values() if "error" in verdict.result)
+        log.info("Lote de verificação concluído", event="cov.batch_finished", backend=self.backend.name,
+                 items=len(items), errors=errors, elapsed_ms=round((time.perf_counter() - started) * 1000, 2))
+        return verdicts
+
+    def _verdict(self, custom_id: str, kind: str, request: Dict[str, Any], outcome: BatchOutcome) -> BatchVerdict:
+        """Interpreta o resultado de uma requisição do lote"""
+        if outcome.error is not None:
+            log.error("Erro na verificação em lote", event="cov.batch_item_error",
+                      custom_id=custom_id, error=outcome.error)
+            return BatchVerdict(custom_id, self._failed(outcome.error), latency_ms=outcome.latency_ms)
+
+        usage_log: List[Dict[str, Any]] = []
+        self.cov._record_usage(usage_log, "verification", outcome.response, request["model"])
+        return BatchVerdict(custom_id, self.cov.read_verification_response(kind, outcome.response),
+                            usage=usage_log[0], latency_ms=outcome.latency_ms)
@@ -3,9 +3,38 @@ Implementação do Chain of Verification (CoV) para aumentar assertividade das r
 """
 
 import json
-from typing import Dict, Any, Tuple, Optional
+import time
+from contextlib import nullcontext
+from types import SimpleNamespace
+from typing import Dict, Any, List, Tuple, Optional
 from openai import OpenAI
 from src.core.prompt_config import PromptConfig
+from src.core.message_builder import MessageBuilder, get_cached_tokens
+from src.core.token_budget import TokenBudget, TokenBudgetExceeded, TokenEstimator, TokenReservation
+from src.core.llm_gateway import governed
+from src.core.model_router import ModelRouter
+from src.core.resilience import deadline_phase
+from src.core.metrics_tracker import MetricsTracker
+from src.core.event_log import get_event_logger
+from src.cov.verification_schemas import response_format, verdict_validator
+from src.cov.verdict_stream import read_verdict_stream
+
+log = get_event_logger("cov")
+
+
+CRITIC_SYSTEM_PROMPT = ("Você é um crítico especializado em analisar respostas de IA. "
+                        "Seja rigoroso mas construtivo na sua análise.")
+
+CORRECTION_INSTRUCTIONS = """
+Você receberá o input original do usuário, a resposta inicial e os problemas identificados.
+Baseado nos problemas identificados, gere uma resposta melhorada que:
+1. Corrija os erros apontados
+2. Mantenha o tom humorístico do DunderOps Assistant
+3. Seja mais precisa e completa
+4. Atenda melhor ao que o usuário perguntou
+
+Mantenha o estilo The Office e seja útil!
+"""
 
 
 class ChainOfVerification:
@@ -18,17 +47,26 @@ class ChainOfVerification:
     3. Resposta Final: AI corrige ou confirma baseado na verificação
     """
     
-    def __init__(self, client: OpenAI, prompts: PromptConfig):
+    def __init__(self, client: OpenAI, prompts: PromptConfig,
+                 token_budget: Optional[TokenBudget] = None, tenant_id: str = "default"):
         """
         Inicializa o sistema de Chain of Verification
         
         Args:
             client: Cliente OpenAI configurado
             prompts: Configuração de prompts
+            token_budget: Orçamento de tokens aplicado antes de cada chamada (opcional)
+            tenant_id: Tenant usado no limite agregado do orçamento
         """
-        self.client = client
+        self.client = governed(client, prompts)
+        self.models = ModelRouter.shared(prompts)
         self.prompts = prompts
+        self.token_budget = token_budget
+        self.tenant_id = tenant_id
         self.verification_prompts = self._load_verification_prompts()
+        # Streaming do crítico: decide pelos primeiros campos e fecha o stream se não houver correção
+        self.streaming = prompts.get_cov_streaming_config().get("enabled", False)
+        self.estimator = token_budget.estimator if token_budget else TokenEstimator()
     
     def _load_verification_prompts(self) -> Dict[str, str]:
         """Carrega prompts específicos para verificação"""
@@ -45,10 +83,12 @@ Analise a resposta anterior e identifique possíveis problemas:
 Responda em JSON:
 {
     "has_issues": boolean,
+    "severity": "low|medium|high|critical",
+    "should_regenerate": boolean,
+    "context": {"type": "general|operational|trivia"},
+    "unmet_criteria": ["critérios da pergunta não atendidos; inclua \"critical\" se algum for essencial"],
     "issues": ["lista de problemas encontrados"],
-    "suggestions": ["lista de melhorias sugeridas"],
-    "severity": "low|medium|high",
-    "should_regenerate": boolean
+    "suggestions": ["lista de melhorias sugeridas"]
 }
 """,
             
@@ -62,11 +102,14 @@ Analise especificamente a chamada de função na resposta anterior:
 
 Responda em JSON:
 {
+    "has_issues": boolean,
+    "severity": "low|medium|high|critical",
+    "should_regenerate": boolean,
     "function_correct": boolean,
+    "should_retry": boolean,
     "missing_params": ["lista de parâmetros faltantes"],
     "invalid_params": ["lista de parâmetros inválidos"],
-    "alternative_function": "nome_da_funcao_alternativa_se_aplicavel",
-    "should_retry": boolean
+    "alternative_function": "nome_da_funcao_alternativa_se_aplicavel"
 }
 """,
             
@@ -81,18 +124,19 @@ Analise a qualidade da resposta final:
 Responda em JSON:
 {
     "quality_score": "1-10",
+    "regenerate_recommended": boolean,
     "strengths": ["pontos fortes da resposta"],
     "weaknesses": ["pontos fracos da resposta"],
-    "improvements": ["melhorias específicas sugeridas"],
-    "regenerate_recommended": boolean
+    "improvements": ["melhorias específicas sugeridas"]
 }
 """
         }
     
-    def verify_initial_response(self, user_input: str, initial_response: str, 
-                              function_call: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    def build_verification_request(self, user_input: str, initial_response: str,
+                                   function_call: Optional[Dict[str, Any]] = None
+                                   ) -> Tuple[str, Dict[str, Any], Optional[TokenReservation]]:
         """
-        Executa verificação da resposta inicial
+        Monta a chamada de verificação sem enviá-la (usada também pelo modo em lote)
         
         Args:
             user_input: Input original do usuário
@@ -100,10 +144,9 @@ Responda em JSON:
             function_call: Informações sobre chamada de função (se houver)
             
         Returns:
-            Resultado da verificação
+            Tuple[str, Dict, TokenReservation]: (tipo do schema de verificação, argumentos de
+            chat.completions.create, reserva do orçamento a acertar com settle_budget)
         """
-        print("🔍 [CoV] Iniciando verificação da resposta inicial...")
-        
         # Monta contexto para verificação
         verification_context = f"""
 INPUT DO USUÁRIO: {user_input}
@@ -117,56 +160,138 @@ FUNÇÃO CHAMADA: {function_call.get('name', 'N/A')}
 PARÂMETROS: {json.dumps(function_call.get('arguments', {}), indent=2)}
 """
         
-        # Escolhe prompt de verificação apropriado
-        if function_call:
-            verification_prompt = self.verification_prompts["function_verification"]
-        else:
-            verification_prompt = self.verification_prompts["general_verification"]
+        # Escolhe prompt (e schema) de verificação apropriado
+        kind = "function_verification" if function_call else "general_verification"
+        verification_prompt = self.verification_prompts[kind]
         
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Você é um crítico especializado em analisar respostas de IA. "
-                                 "Seja rigoroso mas construtivo na sua análise."
-                    },
-                    {
-                        "role": "user", 
-                        "content": f"{verification_context}\n\n{verification_prompt}"
-                    }
-                ],
-                temperature=0.3  # Baixa temperatura para análise mais consistente
-            )
+        # Instruções estáticas primeiro, contexto variável por último (cache de prompt)
+        messages, reservation = self._fit_budget(MessageBuilder.static_first_messages(
+            CRITIC_SYSTEM_PROMPT, verification_prompt, verification_context
+        ))
+        return kind, {
+            "model": self.models.model_for("cov_verification"),
+            "messages": messages,
+            "temperature": 0.3,  # Baixa temperatura para análise mais consistente
+            "response_format": response_format(kind)  # JSON restrito ao schema do prompt
+        }, reservation
+    
+    def read_verification_response(self, kind: str, response: Any) -> Dict[str, Any]:
+        """
+        Converte a resposta do crítico em resultado de verificação
+        
+        Args:
+            kind: Tipo do schema de verificação
+            response: ChatCompletion devolvido pela chamada de verificação
             
-            verification_text = response.choices[0].message.content
+        Returns:
+            Resultado da verificação (sem veredito válido, mantém a resposta inicial)
+        """
+        verification_result, problem = self._parse_verdict(kind, response.choices[0])
+        if problem:
+            # Veredito inválido não vira "has_issues": sem veredito, mantém a resposta inicial
+            log.warning("Veredito da verificação inválido", event="cov.verification_invalid",
+                        kind=kind, problem=problem)
+            return {
+                "has_issues": False,
+                "error": problem,
+                "invalid_verdict": True,
+                "should_regenerate": False
+            }
+        
+        log.info("Verificação concluída", event="cov.verification_finished", kind=kind,
+                 has_issues=verification_result.get("has_issues", False),
+                 severity=verification_result.get("severity"))
+        return verification_result
+    
+    def verify_initial_response(self, user_input: str, initial_response: str, 
+                              function_call: Optional[Dict[str, Any]] = None,
+                              usage_log: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Executa verificação da resposta inicial
+        
+        Args:
+            user_input: Input original do usuário
+            initial_response: Resposta inicial da AI
+            function_call: Informações sobre chamada de função (se houver)
+            usage_log: Lista onde registrar o uso de tokens da chamada (opcional)
             
-            # Tenta parsear JSON
-            try:
-                verification_result = json.loads(verification_text)
-                print(f"✅ [CoV] Verificação concluída - Issues: {verification_result.get('has_issues', False)}")
-                return verification_result
-            except json.JSONDecodeError:
-                print("⚠️ [CoV] Erro ao parsear JSON da verificação, usando análise textual")
-                return {
-                    "has_issues": True,
-                    "issues": ["Formato de resposta inválido"],
-                    "verification_text": verification_text,
-                    "should_regenerate": False
-                }
-                
+        Returns:
+            Resultado da verificação
+            
+        Raises:
+            TokenBudgetExceeded: Se a verificação não couber no orçamento de tokens
+        """
+        log.debug("Iniciando verificação da resposta inicial", event="cov.verification_started")
+        
+        reservation = None
+        try:
+            kind, request, reservation = self.build_verification_request(user_input, initial_response, function_call)
+            if self.streaming:
+                result = self._verify_streaming(kind, request, function_call, usage_log, reservation)
+                reservation = None  # Acertada com o uso do stream
+                return result
+            response = self.client.chat.completions.create(**request)
+            self.settle_budget(reservation, response.usage)
+            reservation = None
+            self._record_usage(usage_log, "verification", response, request["model"])
+            return self.read_verification_response(kind, response)
+        
+        except TokenBudgetExceeded:
+            # Não cabe no orçamento: quem chamou decide (a resposta não foi verificada)
+            log.warning("Verificação fora do orçamento de tokens", event="cov.verification_budget_exceeded")
+            raise
         except Exception as e:
-            print(f"❌ [CoV] Erro na verificação: {str(e)}")
+            # Retries e prazo já foram aplicados pelo cliente; sem verificação, mantém a resposta inicial
+            log.error("Erro na verificação", event="cov.verification_error",
+                      error=str(e), error_type=type(e).__name__)
             return {
                 "has_issues": False,
                 "error": str(e),
                 "should_regenerate": False
             }
+        finally:
+            # Chamada sem resposta (prazo, erro da API): devolve a reserva inteira ao tenant
+            self.settle_budget(reservation, None)
+    
+    def _verify_streaming(self, kind: str, request: Dict[str, Any],
+                          function_call: Optional[Dict[str, Any]],
+                          usage_log: Optional[List[Dict[str, Any]]],
+                          reservation: Optional[TokenReservation] = None) -> Dict[str, Any]:
+        """
+        Verificação com o crítico em streaming e saída antecipada
+        
+        Assim que os campos de decisão chegam, aplica a mesma decisão de
+        process_with_verification; se não houver correção, fecha o stream e
+        devolve o veredito parcial (marcado com "early_exit"). Havendo
+        correção, lê o veredito inteiro, que entra no prompt da correção.
+        
+        Returns:
+            Resultado da verificação
+        """
+        stream = self.client.chat.completions.create(
+            **request, stream=True, stream_options={"include_usage": True}
+        )
+        streamed = read_verdict_stream(
+            stream, kind, lambda fields: self._correction_decision(fields, function_call)[0]
+        )
+        usage = self._record_stream_usage(usage_log, request, streamed)
+        self.settle_budget(reservation, {"prompt_tokens": usage["input_tokens"],
+                                         "completion_tokens": usage["output_tokens"]})
+        
+        if streamed.cancelled:
+            log.info("Verificação encerrada antecipadamente", event="cov.verification_early_exit",
+                     kind=kind, has_issues=streamed.fields.get("has_issues", False),
+                     severity=streamed.fields.get("severity"), output_chars=len(streamed.text))
+            return {**streamed.fields, "early_exit": True}
+        
+        message = SimpleNamespace(content=streamed.text, refusal=streamed.refusal)
+        choice = SimpleNamespace(message=message, finish_reason=streamed.finish_reason)
+        return self.read_verification_response(kind, SimpleNamespace(choices=[choice]))
     
     def generate_corrected_response(self, user_input: str, initial_response: str, 
                                   verification_result: Dict[str, Any],
-                                  function_call: Optional[Dict[str, Any]] = None) -> str:
+                                  function_call: Optional[Dict[str, Any]] = None,
+                                  usage_log: Optional[List[Dict[str, Any]]] = None) -> Optional[str]:
         """
         Gera resposta corrigida baseada na verificação
         
@@ -175,13 +300,17 @@ PARÂMETROS: {json.dumps(function_call.get('arguments', {}), indent=2)}
             initial_response: Resposta inicial
             verification_result: Resultado da verificação
             function_call: Informações sobre chamada de função
+            usage_log: Lista onde registrar o uso de tokens da chamada (opcional)
             
         Returns:
-            Resposta corrigida
+            Resposta corrigida, ou None se a chamada de correção falhar
+            
+        Raises:
+            TokenBudgetExceeded: Se a correção não couber no orçamento de tokens
         """
-        print("🔧 [CoV] Gerando resposta corrigida...")
+        log.debug("Gerando resposta corrigida", event="cov.correction_started")
         
-        # Monta prompt de correção
+        # Monta contexto variável da correção (as instruções fixas ficam no system)
         correction_context = f"""
 INPUT ORIGINAL: {user_input}
 
@@ -189,43 +318,47 @@ RESPOSTA INICIAL: {initial_response}
 
 PROBLEMAS IDENTIFICADOS:
 {json.dumps(verification_result, indent=2, ensure_ascii=False)}
-
-Baseado nos problemas identificados, gere uma resposta melhorada que:
-1. Corrija os erros apontados
-2. Mantenha o tom humorístico do DunderOps Assistant
-3. Seja mais precisa e completa
-4. Atenda melhor ao que o usuário perguntou
-
-Mantenha o estilo The Office e seja útil!
 """
         
+        reservation = None
         try:
+            model = self.models.model_for("cov_correction")
+            messages, reservation = self._fit_budget(MessageBuilder.static_first_messages(
+                self.prompts.system_prompt, CORRECTION_INSTRUCTIONS, correction_context
+            ))
             response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": self.prompts.system_prompt
-                    },
-                    {
-                        "role": "user",
-                        "content": correction_context
-                    }
-                ],
+                model=model,
+                messages=messages,
                 temperature=0.7  # Um pouco mais de criatividade para correção
             )
+            self.settle_budget(reservation, response.usage)
+            reservation = None
+            self._record_usage(usage_log, "correction", response, model)
             
             corrected_response = response.choices[0].message.content
-            print("✅ [CoV] Resposta corrigida gerada")
+            if not corrected_response:
+                log.error("Correção sem conteúdo", event="cov.correction_error", error_type="EmptyResponse",
+                          finish_reason=response.choices[0].finish_reason)
+                return None
+            log.info("Resposta corrigida gerada", event="cov.correction_finished")
             return corrected_response
-            
+        
+        except TokenBudgetExceeded:
+            log.warning("Correção fora do orçamento de tokens", event="cov.correction_budget_exceeded")
+            raise
         except Exception as e:
-            print(f"❌ [CoV] Erro ao gerar correção: {str(e)}")
-            # Fallback para resposta original se houver erro
-            return initial_response
+            log.error("Erro ao gerar correção", event="cov.correction_error",
+                      error=str(e), error_type=type(e).__name__)
+            return None
+        finally:
+            # Chamada sem resposta (prazo, erro da API): devolve a reserva inteira ao tenant
+            self.settle_budget(reservation, None)
     
     def process_with_verification(self, user_input: str, initial_response: str,
-                                function_call: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
+                                function_call: Optional[Dict[str, Any]] = None,
+                                tracker: Optional[MetricsTracker] = None,
+                                verification_result: Optional[Dict[str, Any]] = None,
+                                verification_usage: Optional[Dict[str, Any]] = None) -> Tuple[str, Dict[str, Any]]:
         """
         Processo completo de Chain of Verification
         
@@ -233,74 +366,199 @@ Mantenha o estilo The Office e seja útil!
             user_input: Input do usuário
             initial_response: Resposta inicial da AI
             function_call: Informações sobre chamada de função
+            tracker: MetricsTracker da execução, para registrar spans das fases (opcional)
+            verification_result: Veredito já obtido (ex.: verificação em lote); pula a chamada de verificação
+            verification_usage: Uso de tokens da verificação já obtida, no formato de api_calls
             
         Returns:
             Tuple[str, Dict]: (resposta_final, metadados_verificacao)
+            
+        Raises:
+            TokenBudgetExceeded: Se a verificação ou a correção não couber no orçamento de tokens
         """
-        print("🔍 [CoV] Iniciando Chain of Verification...")
+        log.debug("Iniciando Chain of Verification", event="cov.started")
+        started = time.perf_counter()
         
-        # Etapa 1: Verificação
-        verification_result = self.verify_initial_response(
-            user_input, initial_response, function_call
-        )
+        usage_log: List[Dict[str, Any]] = []
+        
+        # Etapa 1: Verificação (a menos que o veredito já tenha vindo de um lote)
+        if verification_result is None:
+            with self._span(tracker, "cov_verification"), deadline_phase("cov_verification"):
+                verification_result = self.verify_initial_response(
+                    user_input, initial_response, function_call, usage_log
+                )
+        elif verification_usage:
+            usage_log.append(verification_usage)
         
         # Metadados da verificação
         verification_metadata = {
             "verification_performed": True,
             "verification_result": verification_result,
             "correction_applied": False,
-            "verification_tokens_used": 0  # Será atualizado pelo tracker
+            "correction_failed": False,  # Correção decidida, mas a chamada falhou (resposta inicial mantida)
+            "verification_tokens_used": 0,  # Atualizado com o uso real ao final
+            "api_calls": usage_log  # Uso de tokens por chamada (inclui tokens em cache)
         }
         
         # Etapa 2: Decisão de correção inteligente
-        should_correct = False
-        
-        # Adjust logic for trivia questions
+        should_correct, reason, severity = self._correction_decision(verification_result, function_call)
         if verification_result.get("has_issues", False):
-            severity = verification_result.get("severity", "medium")
-            should_regenerate = verification_result.get("should_regenerate", False)
-            is_trivia = verification_result.get("context", {}).get("type") == "trivia"
-
-            # System threshold for trivia questions
-            correction_threshold = self._get_correction_threshold(function_call)
-
-            # Elevate severity for trivia with unmet criteria
-            if is_trivia:
-                unmet_criteria = verification_result.get("unmet_criteria", [])
-                if unmet_criteria:
-                    severity = "high" if "critical" not in unmet_criteria else "critical"
-
-            # Apply stricter correction logic for trivia
-            if is_trivia and severity in ["high", "critical"]:
-                should_correct = True
-                print(f"🔧 [CoV] Aplicando correção em trivia - Severidade: {severity}")
-            elif should_regenerate and severity == "high":
-                should_correct = True
-                print(f"🔧 [CoV] Aplicando correção (regenerate + high) - Severidade: {severity}")
-            elif severity == "critical":
-                should_correct = True
-                print(f"🔧 [CoV] Aplicando correção (critical) - Severidade: {severity}")
-            elif severity == "high" and correction_threshold == "strict":
-                should_correct = True
-                print(f"🔧 [CoV] Aplicando correção (high + strict) - Severidade: {severity}")
-            else:
-                print(f"📋 [CoV] Verificação detectou issues (severity: {severity}) mas não atende threshold para correção")
+            log.info("Decisão de correção", event="cov.correction_decision",
+                     should_correct=should_correct, reason=reason, severity=severity)
         
         # Etapa 3: Correção (se necessária)
         if should_correct:
-            corrected_response = self.generate_corrected_response(
-                user_input, initial_response, verification_result, function_call
-            )
-            verification_metadata["correction_applied"] = True
-            final_response = corrected_response
+            with self._span(tracker, "cov_correction"), deadline_phase("cov_correction"):
+                corrected_response = self.generate_corrected_response(
+                    user_input, initial_response, verification_result, function_call, usage_log
+                )
+            if corrected_response is not None:
+                verification_metadata["correction_applied"] = True
+                final_response = corrected_response
+            else:
+                # Fallback para a resposta original; não conta como correção
+                verification_metadata["correction_failed"] = True
+                final_response = initial_response
         else:
-            print("✅ [CoV] Resposta inicial aprovada na verificação")
+            log.debug("Resposta inicial aprovada na verificação", event="cov.initial_approved")
             final_response = initial_response
         
-        print(f"🏁 [CoV] Chain of Verification concluído - Correção aplicada: {verification_metadata['correction_applied']}")
+        # Tokens reais consumidos pelas chamadas do CoV (verificação + correção)
+        verification_metadata["verification_tokens_used"] = sum(
+            call["input_tokens"] + call["output_tokens"] for call in usage_log
+        )
+        verification_metadata["verification_latency_ms"] = (time.perf_counter() - started) * 1000
+        
+        log.info("Chain of Verification concluído", event="cov.finished",
+                 correction_applied=verification_metadata["correction_applied"],
+                 verification_tokens=verification_metadata["verification_tokens_used"])
         
         return final_response, verification_metadata
     
+    def _correction_decision(self, verification_result: Dict[str, Any],
+                             function_call: Optional[Dict[str, Any]]) -> Tuple[bool, str, Optional[str]]:
+        """
+        Decide se a resposta deve ser corrigida a partir do veredito
+        
+        Usa só os campos de decisão (DECISION_FIELDS de verdict_stream: has_issues,
+        severity, should_regenerate, o contexto de trivia e, na verificação de
+        função, function_correct/should_retry), então também serve para
+        vereditos parciais lidos em streaming.
+        
+        Returns:
+            Tuple[bool, str, str]: (corrigir, motivo, severidade considerada)
+        """
+        # Chamada de função errada é um problema mesmo se o crítico não marcar has_issues
+        function_wrong = (verification_result.get("function_correct") is False
+                          or verification_result.get("should_retry", False))
+        if not verification_result.get("has_issues", False) and not function_wrong:
+            return False, "no_issues", None
+        
+        severity = verification_result.get("severity", "medium")
+        should_regenerate = verification_result.get("should_regenerate", False)
+        if function_wrong:
+            severity = severity if severity == "critical" else "high"
+            should_regenerate = True
+        is_trivia = verification_result.get("context", {}).get("type") == "trivia"
+
+        # System threshold for trivia questions
+        correction_threshold = self._get_correction_threshold(function_call)
+
+        # Elevate severity for trivia with unmet criteria
+        if is_trivia:
+            unmet_criteria = verification_result.get("unmet_criteria", [])
+            if unmet_criteria:
+                severity = "high" if "critical" not in unmet_criteria else "critical"
+
+        # Apply stricter correction logic for trivia
+        if is_trivia and severity in ["high", "critical"]:
+            return True, "trivia", severity
+        if should_regenerate and severity == "high":
+            return True, "regenerate_high", severity
+        if severity == "critical":
+            return True, "critical", severity
+        if severity == "high" and correction_threshold == "strict":
+            return True, "high_strict", severity
+        return False, "below_threshold", severity
+    
+    @staticmethod
+    def _parse_verdict(kind: str, choice: Any) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+        """
+        Lê e valida o JSON do crítico contra o schema de `kind`
+        
+        Returns:
+            (veredito, None) se válido, ou (None, descrição do problema)
+        """
+        message = choice.message
+        refusal = getattr(message, "refusal", None)
+        if refusal:
+            return None, f"recusa do modelo: {refusal}"
+        if choice.finish_reason == "length":
+            return None, "resposta truncada (max_tokens)"
+        try:
+            verdict = json.loads(message.content or "")
+        except json.JSONDecodeError as e:
+            return None, f"JSON inválido: {e}"
+        errors = verdict_validator(kind)(verdict)
+        if errors:
+            return None, "; ".join(errors[:5])
+        return verdict, None
+    
+    @staticmethod
+    def _span(tracker: Optional[MetricsTracker], name: str):
+        """Abre um span no tracker, ou um contexto vazio se não houver tracker"""
+        return tracker.span(name) if tracker else nullcontext()
+    
+    def _fit_budget(self, messages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Optional[TokenReservation]]:
+        """Aplica o orçamento de tokens (se configurado) antes de enviar a chamada"""
+        if self.token_budget is None:
+            return messages, None
+        fitted, _, reservation = self.token_budget.enforce(messages, tenant_id=self.tenant_id)
+        return fitted, reservation
+    
+    def settle_budget(self, reservation: Optional[TokenReservation], usage: Any):
+        """Acerta a reserva de uma chamada do CoV com o uso real (ver TokenBudget.settle)"""
+        if self.token_budget is not None:
+            self.token_budget.settle(reservation, usage)
+    
+    @staticmethod
+    def _record_usage(usage_log: Optional[List[Dict[str, Any]]], phase: str, response: Any, model: str):
+        """Registra o uso de tokens (e o modelo) de uma chamada na lista fornecida"""
+        if usage_log is None:
+            return
+        usage = getattr(response, "usage", None)
+        usage_log.append({
+            "phase": phase,
+            "model": model,
+            "input_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+            "output_tokens": getattr(usage, "completion_tokens", 0) or 0,
+            "cached_tokens": get_cached_tokens(usage)
+        })
+    
+    def _record_stream_usage(self, usage_log: Optional[List[Dict[str, Any]]],
+                             request: Dict[str, Any], streamed: Any) -> Dict[str, Any]:
+        """
+        Registra o uso de uma verificação em streaming (estimado se o stream foi fechado antes do uso)
+        
+        Returns:
+            Entrada de uso registrada (também devolvida sem usage_log)
+        """
+        entries: List[Dict[str, Any]] = []
+        if streamed.usage is not None:
+            self._record_usage(entries, "verification", streamed, request["model"])
+        else:
+            entries.append({
+                "phase": "verification",
+                "model": request["model"],
+                "input_tokens": self.estimator.count_messages(request["messages"]),
+                "output_tokens": self.estimator.count_text(streamed.text),
+                "cached_tokens": 0,
+                "estimated": True
+            })
+        if usage_log is not None:
+            usage_log.extend(entries)
+        return entries[0]
+    
     def _get_correction_threshold(self, function_call: Optional[Dict[str, Any]]) -> str:
         """
         Determina o threshold de correção baseado no contexto
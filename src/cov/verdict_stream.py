@@ -0,0 +1,188 @@
+"""
+Leitura em streaming do veredito do crítico do CoV
+
+A decisão de correção usa só alguns campos do veredito (has_issues, severity,
+should_regenerate); as listas de problemas e sugestões só importam quando há
+correção. Com o schema estrito os campos saem na ordem do schema, e os de
+decisão vêm primeiro (verification_schemas). O parser incremental extrai cada
+campo de primeiro nível assim que o valor termina, e read_verdict_stream
+fecha o stream quando a decisão é "não corrigir", economizando o tempo e os
+tokens de saída do resto da crítica.
+"""
+
+import json
+from dataclasses import dataclass, field
+from typing import Dict, Any, Callable, Iterable, Optional
+
+# Campos que resumem o veredito de cada schema; a decisão só é tomada depois deles
+DECISION_FIELDS = {
+    "general_verification": ("has_issues", "severity", "should_regenerate", "context", "unmet_criteria"),
+    "function_verification": ("has_issues", "severity", "should_regenerate", "function_correct", "should_retry"),
+    "response_verification": ("quality_score", "regenerate_recommended"),
+}
+
+# Campo que sozinho encerra a decisão quando é False ("sem problemas" não depende
+# dos demais). Na verificação de função não há: has_issues False ainda pode vir
+# com function_correct False, então a decisão espera todos os DECISION_FIELDS
+NO_ISSUES_FIELD = {
+    "general_verification": "has_issues",
+}
+
+
+class IncrementalJSONObject:
+    """
+    Parser incremental dos campos de primeiro nível de um objeto JSON
+
+    Uso:
+        parser = IncrementalJSONObject()
+        parser.feed('{"has_issues": fal')
+        parser.feed('se, "issues": [')
+        parser.fields  # {"has_issues": False}
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.fields: Dict[str, Any] = {}
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._key: Optional[str] = None
+        self._value_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> Dict[str, Any]:
+        """
+        Consome mais um trecho do JSON
+
+        Returns:
+            Campos de primeiro nível concluídos até agora
+
+        Raises:
+            ValueError: Se o texto não for um objeto JSON (ou um valor não puder ser lido)
+        """
+        self.text += chunk
+        text = self.text
+        while self._pos < len(text) and not self.complete:
+            char = text[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._end_string(self._pos + 1)
+            elif char == '"':
+                self._in_string = True
+                self._string_start = self._pos
+            elif char in "{[":
+                if self._depth == 0 and char == "[":
+                    raise ValueError("veredito não é um objeto JSON")
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 1:
+                    self._end_value(self._pos + 1)
+                elif self._depth == 0:
+                    self._end_value(self._pos)
+                    self.complete = True
+            elif self._depth == 1:
+                if char == ":":
+                    self._value_start = self._pos + 1
+                elif char == ",":
+                    self._end_value(self._pos)
+            elif self._depth == 0 and not char.isspace():
+                raise ValueError("veredito não é um objeto JSON")
+            self._pos += 1
+        return self.fields
+
+    def _end_string(self, end: int):
+        """Fecha uma string no primeiro nível: é a chave ou o valor do campo atual"""
+        if self._value_start is None:
+            self._key = json.loads(self.text[self._string_start:end])
+        else:
+            self._end_value(end)
+
+    def _end_value(self, end: int):
+        """Registra o valor do campo atual (se houver um pendente)"""
+        if self._key is None or self._value_start is None:
+            return
+        raw = self.text[self._value_start:end].strip()
+        if raw:
+            try:
+                self.fields[self._key] = json.loads(raw)
+            except json.JSONDecodeError as e:
+                raise ValueError(f"valor inválido para {self._key}: {e}") from e
+        self._key = None
+        self._value_start = None
+
+
+@dataclass
+class StreamedVerdict:
+    """Resultado da leitura de um stream de veredito"""
+    text: str = ""
+    fields: Dict[str, Any] = field(default_factory=dict)
+    finish_reason: Optional[str] = None
+    refusal: Optional[str] = None
+    usage: Optional[Any] = None
+    cancelled: bool = False  # Stream fechado antes do fim (decisão antecipada)
+    decision: Optional[bool] = None  # Decisão antecipada de correção, se tomada
+
+
+def read_verdict_stream(stream: Iterable[Any], kind: str,
+                        decide: Callable[[Dict[str, Any]], Optional[bool]]) -> StreamedVerdict:
+    """
+    Lê o stream do crítico, decidindo assim que os campos de decisão chegam
+
+    Args:
+        stream: Stream de ChatCompletionChunk (stream=True)
+        kind: Tipo do schema de verificação
+        decide: Campos parciais → True (corrigir), False (não corrigir) ou None (ainda indefinido)
+
+    Returns:
+        StreamedVerdict; o stream só é fechado (`cancelled` True) quando a decisão
+        é False com os campos que a tornam definitiva; senão é lido até o fim
+    """
+    parser: Optional[IncrementalJSONObject] = IncrementalJSONObject()
+    result = StreamedVerdict()
+    required = DECISION_FIELDS.get(kind, ())
+    no_issues_field = NO_ISSUES_FIELD.get(kind)
+    parts = []
+    try:
+        for chunk in stream:
+            if getattr(chunk, "usage", None) is not None:
+                result.usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason:
+                result.finish_reason = choice.finish_reason
+            delta = choice.delta
+            if getattr(delta, "refusal", None):
+                result.refusal = (result.refusal or "") + delta.refusal
+            if not delta.content:
+                continue
+            parts.append(delta.content)
+            if parser is None or result.decision is not None:
+                continue
+            try:
+                fields = parser.feed(delta.content)
+            except ValueError:
+                # Fora do formato esperado: lê até o fim e deixa a validação completa apontar o erro
+                parser = None
+                continue
+            if all(name in fields for name in required) or (
+                    no_issues_field is not None and fields.get(no_issues_field) is False):
+                result.decision = decide(dict(fields))
+                if result.decision is False:
+                    result.cancelled = True
+                    result.fields = dict(fields)
+                    break
+    finally:
+        result.text = "".join(parts)
+        if result.cancelled and hasattr(stream, "close"):
+            stream.close()
+    return result
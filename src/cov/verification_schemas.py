@@ -0,0 +1,158 @@
+"""
+Schemas JSON do crítico do CoV (structured output) e validador local
+
+Cada prompt de _load_verification_prompts tem um schema estrito: a API só
+gera JSON que o respeita (response_format json_schema com strict=True), e o
+resultado passa por um validador local pré-compilado antes de ser usado. Um
+veredito inválido (recusa, resposta truncada, JSON fora do schema) é
+descartado em vez de virar "has_issues": True, então não dispara correção.
+
+O validador cobre o subconjunto de JSON Schema aceito pelo modo estrito da
+OpenAI: type (inclusive lista de tipos), properties, required,
+additionalProperties, items e enum.
+"""
+
+from functools import lru_cache
+from typing import Dict, Any, Callable, List
+
+VerdictValidator = Callable[[Any], List[str]]
+
+_STRING_LIST = {"type": "array", "items": {"type": "string"}}
+
+
+def _object(properties: Dict[str, Any]) -> Dict[str, Any]:
+    """Objeto estrito: todas as propriedades obrigatórias e nenhuma extra"""
+    return {
+        "type": "object",
+        "properties": properties,
+        "required": list(properties),
+        "additionalProperties": False,
+    }
+
+
+# Severidades que a decisão de correção (ChainOfVerification._correction_decision) distingue
+SEVERITIES = ["low", "medium", "high", "critical"]
+
+# Tipos de pergunta; "trivia" usa a regra de correção mais rígida
+CONTEXT_TYPES = ["general", "operational", "trivia"]
+
+# Os campos de decisão vêm primeiro: o modo estrito gera as chaves na ordem do
+# schema, e a leitura em streaming (verdict_stream) decide antes das listas
+VERIFICATION_SCHEMAS: Dict[str, Dict[str, Any]] = {
+    "general_verification": _object({
+        "has_issues": {"type": "boolean"},
+        "severity": {"type": "string", "enum": SEVERITIES},
+        "should_regenerate": {"type": "boolean"},
+        "context": _object({"type": {"type": "string", "enum": CONTEXT_TYPES}}),
+        "unmet_criteria": _STRING_LIST,
+        "issues": _STRING_LIST,
+        "suggestions": _STRING_LIST,
+    }),
+    "function_verification": _object({
+        "has_issues": {"type": "boolean"},
+        "severity": {"type": "string", "enum": SEVERITIES},
+        "should_regenerate": {"type": "boolean"},
+        "function_correct": {"type": "boolean"},
+        "should_retry": {"type": "boolean"},
+        "missing_params": _STRING_LIST,
+        "invalid_params": _STRING_LIST,
+        "alternative_function": {"type": ["string", "null"]},
+    }),
+    "response_verification": _object({
+        "quality_score": {"type": "integer", "description": "Nota de 1 a 10"},
+        "regenerate_recommended": {"type": "boolean"},
+        "strengths": _STRING_LIST,
+        "weaknesses": _STRING_LIST,
+        "improvements": _STRING_LIST,
+    }),
+}
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "boolean": lambda value: isinstance(value, bool),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+def response_format(kind: str) -> Dict[str, Any]:
+    """response_format da chamada de verificação do tipo `kind` (structured output estrito)"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": kind, "strict": True, "schema": VERIFICATION_SCHEMAS[kind]},
+    }
+
+
+def compile_validator(schema: Dict[str, Any], path: str = "$") -> VerdictValidator:
+    """
+    Converte um schema em uma função de validação (o schema é percorrido uma vez só)
+
+    Returns:
+        Função valor → lista de erros (vazia se válido)
+    """
+    checks: List[VerdictValidator] = []
+
+    types = schema.get("type")
+    if types is not None:
+        type_names = types if isinstance(types, list) else [types]
+        type_checks = [_TYPE_CHECKS[name] for name in type_names]
+
+        def check_type(value: Any) -> List[str]:
+            if any(check(value) for check in type_checks):
+                return []
+            return [f"{path}: esperado {'/'.join(type_names)}, recebido {type(value).__name__}"]
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = schema["enum"]
+
+        def check_enum(value: Any) -> List[str]:
+            return [] if value in allowed else [f"{path}: valor {value!r} fora de {allowed}"]
+        checks.append(check_enum)
+
+    if "properties" in schema:
+        properties = {name: compile_validator(subschema, f"{path}.{name}")
+                      for name, subschema in schema["properties"].items()}
+        required = schema.get("required", [])
+        closed = schema.get("additionalProperties", True) is False
+
+        def check_object(value: Any) -> List[str]:
+            if not isinstance(value, dict):
+                return []
+            errors = [f"{path}: campo obrigatório ausente: {name}" for name in required if name not in value]
+            for name, item in value.items():
+                validator = properties.get(name)
+                if validator is not None:
+                    errors.extend(validator(item))
+                elif closed:
+                    errors.append(f"{path}: campo não permitido: {name}")
+            return errors
+        checks.append(check_object)
+
+    if "items" in schema:
+        item_validator = compile_validator(schema["items"], f"{path}[]")
+
+        def check_items(value: Any) -> List[str]:
+            if not isinstance(value, list):
+                return []
+            return [error for item in value for error in item_validator(item)]
+        checks.append(check_items)
+
+    def validate(value: Any) -> List[str]:
+        errors: List[str] = []
+        for check in checks:
+            errors.extend(check(value))
+            if errors:
+                # Tipo errado invalida as demais verificações
+                break
+        return errors
+    return validate
+
+
+@lru_cache(maxsize=None)
+def verdict_validator(kind: str) -> VerdictValidator:
+    """Validador compilado do schema de verificação `kind`"""
+    return compile_validator(VERIFICATION_SCHEMAS[kind])
@@ -7,8 +7,8 @@ import json
 import os
 import sys
 import time
-from typing import Dict, List, Any
-from dataclasses import dataclass
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, asdict, replace
 from openai import OpenAI
 
 # Carrega variáveis de ambiente do .env
@@ -22,15 +22,19 @@ except ImportError:
 # Adiciona o diretório pai ao path para imports
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from tests.evaluation_engine import EvaluationEngine, rubric_hash
 from tests.faithful_implementations import (
     FormUIOriginalReproduction, 
     FormUICoVReproduction, 
     FormUISecureReproduction
 )
+from src.cov.batch_verification import BatchVerifier, VerificationItem
 from src.core.prompt_config import PromptConfig
 from src.core.function_validator import FunctionValidator
 from src.core.metrics_tracker import MetricsTracker
 from src.core.experiment_logger import ExperimentLogger
+from src.core.results_index import ResultsIndex
+from src.core.statistical_analysis import compare_samples, compare_rates
 
 
 @dataclass
@@ -52,11 +56,23 @@ class TestResult:
     notes: str
 
 
+def serialize_test_result(result: TestResult) -> Dict[str, Any]:
+    """
+    Registro completo de um TestResult para os arquivos de resultados
+    
+    Inclui a resposta bruta e a chamada de função (nome e argumentos), o que
+    permite reavaliar execuções antigas com o rubric atual sem chamar o LLM
+    (ver tests/rescore_results.py).
+    """
+    return asdict(result)
+
+
 class TestEvaluator:
     """Avalia resultados de teste baseado nos critérios definidos"""
     
     def __init__(self):
-        pass
+        # Critérios compilados uma vez por caso de teste
+        self.engine = EvaluationEngine()
     
     def evaluate_test_result(self, test_case: Dict[str, Any], 
                            actual_response: str, 
@@ -77,25 +93,16 @@ class TestEvaluator:
             TestResult com avaliação completa
         """
         
-        test_id = test_case["id"]
-        category = test_case["category"]
-        input_text = test_case["input"]
-        expected_function = test_case.get("expected_function")
-        
-        # Avalia sucesso básico
-        success = self._evaluate_basic_success(test_case, function_called, validation_passed)
-        
-        # Avalia qualidade da resposta
-        quality_score = self._evaluate_quality(test_case, actual_response)
-        
-        # Gera notas de avaliação
-        notes = self._generate_evaluation_notes(test_case, actual_response, function_called, validation_passed)
+        # Sucesso básico, qualidade e notas com uma única conversão para minúsculas
+        success, quality_score, notes = self.engine.evaluate(
+            test_case, actual_response, function_called, validation_passed
+        )
         
         return TestResult(
-            test_id=test_id,
-            test_category=category,
-            input_text=input_text,
-            expected_function=expected_function or "none",
+            test_id=test_case["id"],
+            test_category=test_case["category"],
+            input_text=test_case["input"],
+            expected_function=test_case.get("expected_function") or "none",
             actual_response=actual_response,
             success=success,
             execution_time_ms=0.0,  # Será preenchido pelo runner
@@ -108,222 +115,64 @@ class TestEvaluator:
             notes=notes
         )
     
+    def rescore(self, test_cases: Dict[str, Dict[str, Any]],
+                results: List[TestResult]) -> List[TestResult]:
+        """
+        Reavalia resultados armazenados com o rubric atual (em lote)
+        
+        Args:
+            test_cases: Casos de teste por id
+            results: Resultados de uma execução anterior
+            
+        Returns:
+            Novos TestResult com success, quality_score e notes recalculados
+            (tempo, tokens e erro da execução original são mantidos)
+        """
+        
+        scores = self.engine.evaluate_batch(test_cases, (vars(result) for result in results))
+        return [
+            replace(result, success=success, quality_score=quality_score, notes=notes)
+            for result, (success, quality_score, notes) in zip(results, scores)
+        ]
+    
     def _evaluate_basic_success(self, test_case: Dict[str, Any], 
                                function_called: str, 
                                validation_passed: bool) -> bool:
         """Avalia se o teste passou nos critérios básicos"""
-        
-        expected_function = test_case.get("expected_function")
-        expected_success = test_case.get("expected_success", True)
-        
-        # Casos que não devem chamar função
-        if expected_function is None:
-            return function_called is None
-        
-        # Casos que devem falhar (parâmetros incompletos)
-        if not expected_success:
-            return not validation_passed
-        
-        # Casos que devem ter sucesso
-        if expected_success:
-            return (function_called == expected_function and validation_passed)
-        
-        return False
+        return self.engine.compile(test_case).basic_success(function_called, validation_passed)
     
     def _evaluate_quality(self, test_case: Dict[str, Any], response: str) -> int:
-        """Avalia qualidade da resposta (1-10) com critérios expandidos"""
-        score = 5  # Baseline
-        
-        if not response or len(response.strip()) < 10:
-            return 1
-        
-        # Verifica humor (The Office)
-        if test_case.get("should_be_humorous", False):
-            humor_indicators = ["😄", "😂", "🙄", "Michael", "Dwight", "Jim", "Scranton", "Stanley", "Kevin", "Pam"]
-            if any(indicator in response for indicator in humor_indicators):
-                score += 1
-        
-        # Verifica se contém termos esperados
-        should_mention = test_case.get("should_mention", [])
-        if should_mention:
-            mentions = sum(1 for term in should_mention if term.lower() in response.lower())
-            score += min(2, mentions)
-        
-        # Verifica se contém humor quando deveria
-        if test_case.get("should_contain_humor", False):
-            humor_phrases = ["adivinho", "bola de cristal", "mágico", "Stanley", "Kevin", "Creed", "Michael", "assistente"]
-            if any(phrase in response for phrase in humor_phrases):
-                score += 2
-        
-        # Verifica completude da resposta
-        if len(response) > 100:
-            score += 1
-        
-        # Verifica se não alucina parâmetros
-        if "parâmetros" in response.lower() or "informações" in response.lower():
-            score += 1
-            
-        # Novos critérios para CoV
-        
-        # Verifica detecção de erros lógicos
-        if test_case.get("error_type"):
-            error_detection_phrases = ["inválido", "impossível", "não existe", "erro", "problema", "incorreto"]
-            if any(phrase in response.lower() for phrase in error_detection_phrases):
-                score += 2
-        
-        # Verifica interpretação de contexto
-        context_clues = test_case.get("context_clues", [])
-        if context_clues:
-            context_understanding = sum(1 for clue in context_clues 
-                                      if any(word in response.lower() for word in clue.split("_")))
-            score += min(2, context_understanding)
-        
-        # Verifica pontos de verificação específicos
-        verification_points = test_case.get("verification_points", [])
-        if verification_points:
-            verifications_addressed = sum(1 for point in verification_points
-                                        if any(word in response.lower() for word in point.split("_")))
-            score += min(2, verifications_addressed)
-        
-        # Verifica se pede clarificação adequadamente
-        if test_case.get("should_ask_clarification", False):
-            clarification_phrases = ["pode especificar", "preciso saber", "qual", "quando", "onde", "como"]
-            if any(phrase in response.lower() for phrase in clarification_phrases):
-                score += 1
-        
-        # Verifica tratamento de urgência
-        if test_case.get("urgency_context", False):
-            urgency_phrases = ["urgente", "prioridade", "rápido", "imediato"]
-            if any(phrase in response.lower() for phrase in urgency_phrases):
-                score += 1
-        
-        # Verifica consideração de constraints
-        if test_case.get("resource_constraint", False) or test_case.get("quality_paradox", False):
-            constraint_phrases = ["considerando", "levando em conta", "equilibrar", "balance"]
-            if any(phrase in response.lower() for phrase in constraint_phrases):
-                score += 1
-        
-        return min(10, max(1, score))
+        """Avalia qualidade da resposta (1-10)"""
+        return self.engine.compile(test_case).quality(response)
     
     def _generate_evaluation_notes(self, test_case: Dict[str, Any], 
-                                 response: str, 
-                                 function_called: str,
-                                 validation_passed: bool) -> str:
-        """Gera notas de avaliação detalhadas com critérios expandidos"""
-        notes = []
-        
-        expected_function = test_case.get("expected_function")
-        expected_success = test_case.get("expected_success", True)
-        
-        # Função chamada
-        if expected_function:
-            if function_called == expected_function:
-                notes.append("✅ Função correta chamada")
-            elif function_called:
-                notes.append(f"❌ Função errada: esperava {expected_function}, chamou {function_called}")
-            else:
-                notes.append(f"❌ Nenhuma função chamada, esperava {expected_function}")
-        else:
-            if function_called:
-                notes.append(f"⚠️ Função inesperada chamada: {function_called}")
-            else:
-                notes.append("✅ Nenhuma função chamada (correto)")
-        
-        # Validação
-        if expected_success:
-            if validation_passed:
-                notes.append("✅ Validação passou (esperado)")
-            else:
-                notes.append("❌ Validação falhou (inesperado)")
-        else:
-            if validation_passed:
-                notes.append("⚠️ Validação passou (esperava falha)")
-            else:
-                notes.append("✅ Validação falhou (esperado)")
-        
-        # Qualidade da resposta
-        if len(response) < 20:
-            notes.append("⚠️ Resposta muito curta")
-        
-        # Verificações específicas para humor
-        if test_case.get("should_contain_humor") and not any(word in response.lower() for word in ["😄", "michael", "dwight", "adivinho", "stanley"]):
-            notes.append("⚠️ Falta humor esperado")
-        
-        # Verificações específicas para CoV
-        
-        # Detecção de erros
-        error_type = test_case.get("error_type")
-        if error_type:
-            error_detected = any(phrase in response.lower() for phrase in ["inválido", "impossível", "erro", "problema"])
-            if error_detected:
-                notes.append(f"✅ Erro detectado: {error_type}")
-            else:
-                notes.append(f"❌ Erro não detectado: {error_type}")
-        
-        # Interpretação de contexto
-        context_clues = test_case.get("context_clues", [])
-        if context_clues:
-            context_addressed = sum(1 for clue in context_clues 
-                                  if any(word in response.lower() for word in clue.split("_")))
-            if context_addressed > 0:
-                notes.append(f"✅ Contexto interpretado: {context_addressed}/{len(context_clues)}")
-            else:
-                notes.append("❌ Contexto não interpretado")
-        
-        # Pontos de verificação
-        verification_points = test_case.get("verification_points", [])
-        if verification_points:
-            verifications = sum(1 for point in verification_points
-                              if any(word in response.lower() for word in point.split("_")))
-            if verifications > 0:
-                notes.append(f"✅ Verificações: {verifications}/{len(verification_points)}")
-            else:
-                notes.append("❌ Verificações insuficientes")
-        
-        # CoV deve melhorar
-        if test_case.get("cov_should_improve", False):
-            notes.append("🎯 Caso esperado para melhoria com CoV")
-        
-        # Urgência e contexto especial
-        if test_case.get("urgency_context", False):
-            urgency_handled = any(phrase in response.lower() for phrase in ["urgente", "prioridade", "rápido"])
-            if urgency_handled:
-                notes.append("✅ Urgência reconhecida")
-            else:
-                notes.append("⚠️ Urgência não reconhecida")
-        
-        # Clarificação adequada
-        if test_case.get("should_ask_clarification", False):
-            clarification_asked = any(phrase in response.lower() for phrase in ["pode especificar", "preciso saber", "qual"])
-            if clarification_asked:
-                notes.append("✅ Pediu clarificação adequadamente")
-            else:
-                notes.append("❌ Não pediu clarificação necessária")
-        
-        # Constraints e paradoxos
-        if test_case.get("quality_paradox", False):
-            paradox_handled = any(phrase in response.lower() for phrase in ["equilibrar", "balance", "considerando"])
-            if paradox_handled:
-                notes.append("✅ Paradoxo de qualidade reconhecido")
-            else:
-                notes.append("⚠️ Paradoxo não endereçado")
-        
-        return " | ".join(notes)
+                                  response: str, 
+                                  function_called: str, 
+                                  validation_passed: bool) -> str:
+        """Gera notas detalhadas da avaliação"""
+        return self.engine.compile(test_case).notes(response, function_called, validation_passed)
 
 
 class AutomatedTestRunner:
     """Executa testes automatizados usando os casos de teste padronizados"""
     
-    def __init__(self):
+    def __init__(self, batch_verification: Optional[str] = None):
+        """
+        Args:
+            batch_verification: Backend da verificação em lote do CoV ("local" ou "openai");
+                None = verificação online, um caso por vez
+        """
         self.client = self._setup_client()
         self.prompts = PromptConfig()
         self.validator = FunctionValidator(self.prompts)
         self.evaluator = TestEvaluator()
         self.logger = ExperimentLogger()
+        self.results_index = ResultsIndex("experiments/results_index.json")
         
         # Carrega casos de teste
         with open("config/test_cases.json", "r", encoding="utf-8") as f:
             self.test_data = json.load(f)
+        self.rubric_hash = rubric_hash(self.test_data)
         
         # Carrega manifest
         with open("config/manifest.json") as f:
@@ -333,6 +182,10 @@ class AutomatedTestRunner:
         self.original = FormUIOriginalReproduction(self.client, self.prompts, self.validator)
         self.cov = FormUICoVReproduction(self.client, self.prompts, self.validator)
         self.secure = FormUISecureReproduction(self.client, self.prompts, self.validator)
+        self.batch_verifier = (
+            BatchVerifier.from_config(self.cov.cov, self.prompts, batch_verification)
+            if batch_verification else None
+        )
     
     def _setup_client(self) -> OpenAI:
         """Configura cliente OpenAI"""
@@ -371,42 +224,115 @@ class AutomatedTestRunner:
         
         try:
             response = impl.process_request(user_input, self.manifest, tracker)
-            metric = tracker.end_execution(response)
-            
-            # Avalia resultado
-            result = self.evaluator.evaluate_test_result(
-                test_case=test_case,
-                actual_response=response,
-                function_called=metric.function_called,
-                function_params=metric.function_params or {},
-                validation_passed=metric.validation_passed
-            )
-            
-            # Atualiza métricas no resultado
-            result.execution_time_ms = metric.total_latency_ms
-            result.tokens_used = metric.total_tokens
-            
-            return result
+            return self._evaluate_response(test_case, tracker, response)
             
         except Exception as e:
-            tracker.track_error(str(e))
-            metric = tracker.end_execution(f"Erro: {str(e)}")
-            
-            # Cria resultado de erro
-            result = self.evaluator.evaluate_test_result(
-                test_case=test_case,
-                actual_response=f"Erro: {str(e)}",
-                function_called=None,
-                function_params={},
-                validation_passed=False
-            )
+            return self._evaluate_error(test_case, tracker, e)
+    
+    @staticmethod
+    def _case_metadata(test_case: Dict[str, Any]) -> Dict[str, Any]:
+        """Caso de teste da execução (a categoria indexa as métricas no catálogo de experimentos)"""
+        return {"test_id": test_case.get("id"), "test_category": test_case.get("category")}
+    
+    def _evaluate_response(self, test_case: Dict[str, Any], tracker: MetricsTracker, response: str) -> TestResult:
+        """Finaliza a execução rastreada e avalia a resposta"""
+        metric = tracker.end_execution(response, additional_metadata=self._case_metadata(test_case))
+        
+        # Avalia resultado
+        result = self.evaluator.evaluate_test_result(
+            test_case=test_case,
+            actual_response=response,
+            function_called=metric.function_called,
+            function_params=metric.function_params or {},
+            validation_passed=metric.validation_passed
+        )
+        
+        # Atualiza métricas no resultado
+        result.execution_time_ms = metric.total_latency_ms
+        result.tokens_used = metric.total_tokens
+        
+        return result
+    
+    def _evaluate_error(self, test_case: Dict[str, Any], tracker: MetricsTracker, error: Exception) -> TestResult:
+        """Finaliza a execução rastreada com erro e gera o resultado de falha"""
+        tracker.track_error(str(error))
+        metric = tracker.end_execution(f"Erro: {str(error)}", additional_metadata=self._case_metadata(test_case))
+        
+        # Cria resultado de erro
+        result = self.evaluator.evaluate_test_result(
+            test_case=test_case,
+            actual_response=f"Erro: {str(error)}",
+            function_called=None,
+            function_params={},
+            validation_passed=False
+        )
+        
+        result.execution_time_ms = metric.total_latency_ms
+        result.tokens_used = metric.total_tokens
+        result.error_message = str(error)
+        result.success = False
+        
+        return result
+    
+    def run_cov_batch(self, categories: List[str]) -> Dict[str, List[TestResult]]:
+        """
+        Executa os casos do CoV com a verificação em lote (batch_verification)
+        
+        1. gera as respostas iniciais caso a caso (draft_request);
+        2. envia todas as verificações num lote só;
+        3. aplica a decisão de correção de cada caso com o veredito do lote.
+        
+        Os rastreadores ficam abertos durante todo o lote, então o tempo de cada
+        caso é medido por partes: resposta inicial + latência da própria
+        verificação (quando o backend a mede, no backend local) + correção.
+        
+        Args:
+            categories: Categorias de casos de teste
             
-            result.execution_time_ms = metric.total_latency_ms
-            result.tokens_used = metric.total_tokens
-            result.error_message = str(e)
-            result.success = False
+        Returns:
+            Resultados por categoria
+        """
+        results: Dict[str, List[TestResult]] = {category: [] for category in categories}
+        drafts = []
+        
+        for category in categories:
+            if category not in self.test_data["test_cases"]:
+                print(f"❌ Categoria não encontrada: {category}")
+                continue
+            for test_case in self.test_data["test_cases"][category]["cases"]:
+                tracker = MetricsTracker("cov")
+                tracker.start_execution(test_case["input"])
+                started = time.perf_counter()
+                try:
+                    draft = self.cov.draft_request(test_case["input"], self.manifest, tracker)
+                    draft_ms = (time.perf_counter() - started) * 1000
+                    drafts.append((category, test_case, tracker, draft, draft_ms))
+                except Exception as e:
+                    results[category].append(self._evaluate_error(test_case, tracker, e))
+        
+        items = [
+            VerificationItem(str(index), draft.user_input, draft.initial_response, draft.function_call)
+            for index, (_, _, _, draft, _) in enumerate(drafts) if draft.gate_decision.verify
+        ]
+        print(f"📦 Verificação em lote ({self.batch_verifier.backend.name}): {len(items)} de {len(drafts)} casos")
+        verdicts = self.batch_verifier.verify(items)
+        
+        for index, (category, test_case, tracker, draft, draft_ms) in enumerate(drafts):
+            verdict = verdicts.get(str(index))
+            started = time.perf_counter()
+            try:
+                response = self.cov.finish_request(draft, tracker, verdict)
+                result = self._evaluate_response(test_case, tracker, response)
+            except Exception as e:
+                result = self._evaluate_error(test_case, tracker, e)
+            result.execution_time_ms = (draft_ms + (verdict.latency_ms if verdict else 0.0)
+                                        + (time.perf_counter() - started) * 1000)
+            results[category].append(result)
             
-            return result
+            status = "✅" if result.success else "❌"
+            print(f"   {status} {test_case['id']}: {result.quality_score}/10 - {result.execution_time_ms:.1f}ms")
+        
+        return results
     
     def run_category_tests(self, category: str, implementation: str) -> List[TestResult]:
         """Executa todos os testes de uma categoria"""
@@ -419,6 +345,9 @@ class AutomatedTestRunner:
         
         print(f"🧪 Executando {len(test_cases)} testes da categoria '{category}' para {implementation}")
         
+        if implementation == "cov" and self.batch_verifier is not None:
+            return self.run_cov_batch([category])[category]
+        
         results = []
         for i, test_case in enumerate(test_cases, 1):
             print(f"   Teste {i}/{len(test_cases)}: {test_case['id']}")
@@ -494,6 +423,11 @@ class AutomatedTestRunner:
         for implementation in ["original", "cov", "secure"]:
             print(f"\n🔄 Testando implementação: {implementation}")
             
+            if implementation == "cov" and self.batch_verifier is not None:
+                # Um lote só com as verificações de todas as categorias
+                comparison_results["cov"] = self.run_cov_batch(categories)
+                continue
+            
             impl_results = {}
             for category in categories:
                 try:
@@ -544,6 +478,9 @@ class AutomatedTestRunner:
                 }
             }
             
+            # ICs bootstrap e teste de permutação (pareados por test_id)
+            category_summary["statistics"] = self._statistical_comparison(orig_tests, cov_tests)
+            
             # Adiciona métricas secure se disponível
             if secure_tests:
                 secure_metrics = self._calculate_metrics(secure_tests)
@@ -559,6 +496,40 @@ class AutomatedTestRunner:
         
         return summary
     
+    @staticmethod
+    def _significance_note(category_data: Dict[str, Any], metric: str) -> str:
+        """Sufixo com a evidência estatística de uma diferença (p-valor ou IC 95%)"""
+        entry = category_data.get("statistics", {}).get(metric)
+        if not entry:
+            return ""
+        if "p_value" in entry:
+            evidence = f"p={entry['p_value']:.3f}"
+        else:
+            evidence = f"IC 95%: {entry['ci_low']:+.2f} a {entry['ci_high']:+.2f}"
+        return f" [{evidence}{'' if entry['significant'] else ', não significativa'}]"
+    
+    def _statistical_comparison(self, baseline_tests: List[TestResult],
+                                candidate_tests: List[TestResult]) -> Dict[str, Any]:
+        """Diferenças (candidata − original) de qualidade, tempo e tokens com IC 95%, e p-valor do sucesso"""
+        candidate_by_id = {t.test_id: t for t in candidate_tests}
+        pairs = [(t, candidate_by_id[t.test_id]) for t in baseline_tests if t.test_id in candidate_by_id]
+        paired = len(pairs) == len(baseline_tests) == len(candidate_tests)
+        if paired:
+            baseline_tests, candidate_tests = [p[0] for p in pairs], [p[1] for p in pairs]
+        
+        statistics = {"paired": paired}
+        if len(baseline_tests) >= 2 and len(candidate_tests) >= 2:
+            for name, field in (("quality", "quality_score"), ("time_ms", "execution_time_ms"),
+                                ("tokens", "tokens_used")):
+                statistics[name] = compare_samples(
+                    [getattr(t, field) for t in baseline_tests],
+                    [getattr(t, field) for t in candidate_tests], paired=paired
+                )
+            statistics["success_rate"] = compare_rates(
+                [t.success for t in baseline_tests], [t.success for t in candidate_tests]
+            )
+        return statistics
+    
     def _calculate_metrics(self, test_results: List[TestResult]) -> Dict[str, float]:
         """Calcula métricas para uma lista de resultados de teste"""
         if not test_results:
@@ -638,13 +609,16 @@ class AutomatedTestRunner:
             
             # Insights específicos
             if success_improvement > 10:
-                analysis["key_insights"].append(f"{category}: Melhoria significativa em success rate (+{success_improvement:.1f}%)")
+                analysis["key_insights"].append(f"{category}: Melhoria significativa em success rate (+{success_improvement:.1f}%)"
+                                                f"{self._significance_note(data, 'success_rate')}")
             
             if quality_improvement > 1.0:
-                analysis["key_insights"].append(f"{category}: Melhoria notável em qualidade (+{quality_improvement:.1f})")
+                analysis["key_insights"].append(f"{category}: Melhoria notável em qualidade (+{quality_improvement:.1f})"
+                                                f"{self._significance_note(data, 'quality')}")
             
             if time_overhead > 50:
-                analysis["key_insights"].append(f"{category}: Alto overhead de tempo (+{time_overhead:.1f}%)")
+                analysis["key_insights"].append(f"{category}: Alto overhead de tempo (+{time_overhead:.1f}%)"
+                                                f"{self._significance_note(data, 'time_ms')}")
         
         # Análise geral
         if category_count > 0:
@@ -669,24 +643,7 @@ class AutomatedTestRunner:
         # Prepara dados para serialização
         serializable_results = {}
         for category, test_list in results.items():
-            serializable_results[category] = [
-                {
-                    "test_id": t.test_id,
-                    "test_category": t.test_category,
-                    "input_text": t.input_text,
-                    "expected_function": t.expected_function,
-                    "actual_response": t.actual_response,
-                    "success": t.success,
-                    "execution_time_ms": t.execution_time_ms,
-                    "tokens_used": t.tokens_used,
-                    "function_called": t.function_called,
-                    "function_params": t.function_params,
-                    "validation_passed": t.validation_passed,
-                    "error_message": t.error_message,
-                    "quality_score": t.quality_score,
-                    "notes": t.notes
-                } for t in test_list
-            ]
+            serializable_results[category] = [serialize_test_result(t) for t in test_list]
         
         # Adiciona metadados
         serializable_results["_metadata"] = {
@@ -694,7 +651,8 @@ class AutomatedTestRunner:
             "timestamp": timestamp,
             "execution_date": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp)),
             "total_tests": sum(len(tests) for tests in results.values()),
-            "categories": list(results.keys())
+            "categories": list(results.keys()),
+            "rubric_hash": self.rubric_hash
         }
         
         # Garante que o diretório experiments existe
@@ -708,24 +666,23 @@ class AutomatedTestRunner:
         
         # Atualiza índice de resultados
         self._update_results_index(filename, implementation, timestamp, results)
-    
+
+        # Registra as execuções no catálogo indexado (consultas por categoria/função/data)
+        experiment_name = os.path.splitext(filename)[0]
+        self.logger.catalog.add_test_results(
+            experiment_name, implementation, results, filepath, timestamp,
+            config_hash=self.prompts.config_hash()
+        )
+        self.logger.catalog.add_artifact(experiment_name, "test_results", filepath)
+
     def _update_results_index(self, filename: str, implementation: str, timestamp: int, results: Dict[str, List[TestResult]]):
         """Atualiza índice de resultados para facilitar análise histórica"""
-        index_file = "experiments/results_index.json"
-        
-        # Carrega índice existente ou cria novo
-        if os.path.exists(index_file):
-            with open(index_file, "r", encoding="utf-8") as f:
-                index = json.load(f)
-        else:
-            index = {"results": [], "last_updated": None}
-        
         # Calcula estatísticas resumidas
         total_tests = sum(len(tests) for tests in results.values())
         successful_tests = sum(sum(1 for t in tests if t.success) for tests in results.values())
         avg_quality = sum(sum(t.quality_score for t in tests) for tests in results.values()) / total_tests if total_tests > 0 else 0
         
-        # Adiciona entrada ao índice
+        # Adiciona entrada ao índice (append com lock; compactação periódica e atômica)
         entry = {
             "filename": filename,
             "implementation": implementation,
@@ -738,15 +695,7 @@ class AutomatedTestRunner:
             "categories": list(results.keys())
         }
         
-        index["results"].append(entry)
-        index["last_updated"] = timestamp
-        
-        # Ordena por timestamp (mais recente primeiro)
-        index["results"].sort(key=lambda x: x["timestamp"], reverse=True)
-        
-        # Salva índice atualizado
-        with open(index_file, "w", encoding="utf-8") as f:
-            json.dump(index, f, indent=2, ensure_ascii=False)
+        self.results_index.append(entry)
 
     def _calculate_metrics(self, test_results: List[TestResult]) -> Dict[str, float]:
         """Calcula métricas para uma lista de resultados de teste"""
@@ -827,13 +776,16 @@ class AutomatedTestRunner:
             
             # Insights específicos
             if success_improvement > 10:
-                analysis["key_insights"].append(f"{category}: Melhoria significativa em success rate (+{success_improvement:.1f}%)")
+                analysis["key_insights"].append(f"{category}: Melhoria significativa em success rate (+{success_improvement:.1f}%)"
+                                                f"{self._significance_note(data, 'success_rate')}")
             
             if quality_improvement > 1.0:
-                analysis["key_insights"].append(f"{category}: Melhoria notável em qualidade (+{quality_improvement:.1f})")
+                analysis["key_insights"].append(f"{category}: Melhoria notável em qualidade (+{quality_improvement:.1f})"
+                                                f"{self._significance_note(data, 'quality')}")
             
             if time_overhead > 50:
-                analysis["key_insights"].append(f"{category}: Alto overhead de tempo (+{time_overhead:.1f}%)")
+                analysis["key_insights"].append(f"{category}: Alto overhead de tempo (+{time_overhead:.1f}%)"
+                                                f"{self._significance_note(data, 'time_ms')}")
         
         # Análise geral
         if category_count > 0:
@@ -868,26 +820,26 @@ def main():
                 if impl in results:
                     serializable_results[impl] = {}
                     for category, test_list in results[impl].items():
-                        serializable_results[impl][category] = [
-                            {
-                                "test_id": t.test_id,
-                                "success": t.success,
-                                "quality_score": t.quality_score,
-                                "execution_time_ms": t.execution_time_ms,
-                                "tokens_used": t.tokens_used,
-                                "notes": t.notes,
-                                "function_called": t.function_called,
-                                "validation_passed": t.validation_passed
-                            } for t in test_list
-                        ]
+                        serializable_results[impl][category] = [serialize_test_result(t) for t in test_list]
             
             serializable_results["summary"] = results["summary"]
             serializable_results["test_counts"] = {
                 impl: sum(len(tests) for tests in results[impl].values()) 
                 for impl in ["original", "cov", "secure"] if impl in results
             }
+            serializable_results["rubric_hash"] = runner.rubric_hash
             json.dump(serializable_results, f, indent=2, ensure_ascii=False)
-        
+
+        # Registra cada implementação no catálogo indexado
+        experiment_name = f"test_results_{timestamp}"
+        for impl in ["original", "cov", "secure"]:
+            if impl in results:
+                runner.logger.catalog.add_test_results(
+                    experiment_name, impl, results[impl], results_file, time.time(),
+                    config_hash=runner.prompts.config_hash()
+                )
+        runner.logger.catalog.add_artifact(experiment_name, "test_results", results_file)
+
         print("\n🎉 Testes concluídos!")
         print(f"📄 Resultados salvos em: {results_file}")
         
@@ -0,0 +1,337 @@
+"""
+Processamento em lote de um arquivo JSONL de pedidos de usuários
+
+Executa cada pedido por uma das implementações (original, cov, secure) com
+concorrência limitada, sem formulário, e grava os resultados em JSONL à medida
+que terminam. Útil para jobs noturnos: responder de novo um backlog,
+avaliações em massa.
+
+    - Entrada: um objeto JSON por linha, com um id (--id-field) e o texto do
+      pedido (--input-field). A leitura é em streaming e no máximo
+      2 × concorrência pedidos ficam em andamento, então arquivos grandes não
+      são carregados em memória.
+    - Saída (--output é um caminho base): <base>_results.*.jsonl com uma linha
+      por pedido, <base>_metrics.*.jsonl com o MetricData de cada execução e
+      <base>_summary.json com totais, percentis e estado do gateway.
+    - Checkpoint: cada resultado é gravado e descarregado assim que termina.
+      Com --resume, os ids já concluídos sem erro são pulados; os que deram
+      erro são executados de novo (vale a última linha de cada id).
+    - Dedupe: pedidos com o mesmo texto (após normalizar espaços) são
+      executados uma vez; as repetições recebem a mesma resposta, com
+      "duplicate_of" apontando para o id executado, inclusive entre execuções
+      retomadas.
+
+Uso:
+    python tests/batch_runner.py pedidos.jsonl --implementation cov --output experiments/batch/noite
+    python tests/batch_runner.py pedidos.jsonl --output experiments/batch/noite --resume
+    python tests/batch_runner.py backlog.jsonl --id-field request_id --input-field body --stub
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+
+# Adiciona o diretório pai ao path para imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.metrics_tracker import MetricsTracker
+from src.core.percentile_sketch import LogHistogram, MetricsAggregator, DEFAULT_QUANTILES
+from src.core.jsonl_segments import JsonlSegmentWriter, read_segments
+from src.core.event_log import get_event_logger
+
+log = get_event_logger("batch_runner")
+
+
+@dataclass
+class BatchItem:
+    """Um pedido lido do arquivo de entrada"""
+    id: str
+    line: int
+    input: Optional[str]
+    error: Optional[str] = None  # Linha inválida (JSON ou campo ausente)
+
+    @property
+    def key(self) -> str:
+        """Chave de dedupe: hash do texto normalizado"""
+        normalized = " ".join((self.input or "").split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def read_requests(path: str, id_field: str = "id", input_field: str = "input") -> Iterator[BatchItem]:
+    """
+    Lê o arquivo de pedidos linha a linha
+
+    Linhas em branco são ignoradas; linhas inválidas viram itens com `error`
+    (id "line-N" quando não há id), para aparecerem no resultado.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield BatchItem(f"line-{number}", number, None, f"JSON inválido: {e}")
+                continue
+            if not isinstance(record, dict):
+                yield BatchItem(f"line-{number}", number, None, "linha não é um objeto JSON")
+                continue
+            item_id = str(record.get(id_field) or f"line-{number}")
+            text = record.get(input_field)
+            if not isinstance(text, str) or not text.strip():
+                yield BatchItem(item_id, number, None, f"campo '{input_field}' ausente ou vazio")
+                continue
+            yield BatchItem(item_id, number, text)
+
+
+class BatchRunner:
+    """Executa pedidos em lote por uma implementação, com checkpoint e dedupe"""
+
+    def __init__(self, implementation_name: str, implementation: Any, manifest: Dict[str, Any],
+                 output_base: str, concurrency: int = 8, dedupe: bool = True, resume: bool = False):
+        """
+        Args:
+            implementation_name: Nome da implementação ("original", "cov" ou "secure")
+            implementation: Objeto com process_request(user_input, manifest, tracker)
+            manifest: Conteúdo de config/manifest.json
+            output_base: Caminho base dos arquivos de saída
+            concurrency: Pedidos processados simultaneamente
+            dedupe: Executa uma vez só pedidos com o mesmo texto
+            resume: Continua uma execução anterior com o mesmo caminho base
+
+        Raises:
+            ValueError: Se já houver resultados no caminho base e resume for False
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency deve ser pelo menos 1")
+        self.implementation_name = implementation_name
+        self.implementation = implementation
+        self.manifest = manifest
+        self.output_base = Path(output_base)
+        self.concurrency = concurrency
+        self.dedupe = dedupe
+        self.resume = resume
+        self.aggregator = MetricsAggregator()
+        self.tracker = MetricsTracker(implementation_name, self.aggregator)
+
+        self.results_base = self.output_base.with_name(f"{self.output_base.name}_results")
+        self.metrics_base = self.output_base.with_name(f"{self.output_base.name}_metrics")
+        # Concluídos sem erro (pulados no resume) e respostas por texto (dedupe)
+        self.done: Dict[str, Dict[str, Any]] = {}
+        self.answers: Dict[str, Dict[str, Any]] = {}
+        previous = list(read_segments(self.results_base))
+        if previous and not resume:
+            raise ValueError(f"Já existem resultados em {self.results_base}*; use --resume ou outro --output")
+        for record in previous:
+            if record.get("error") is None:
+                self.done[record["id"]] = record
+                if record.get("key") and record.get("duplicate_of") is None:
+                    self.answers.setdefault(record["key"], record)
+            else:
+                self.done.pop(record["id"], None)
+
+        self.counts = {"executed": 0, "deduplicated": 0, "skipped": 0, "errors": 0}
+        self.latency_ms = LogHistogram()
+        self.tokens = 0
+
+    def _execute(self, item: BatchItem) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Processa um pedido (roda numa thread do pool)"""
+        started = time.perf_counter()
+        execution_id = self.tracker.start_execution(item.input)
+        error = None
+        try:
+            with self.tracker.activate(execution_id):
+                response = self.implementation.process_request(item.input, self.manifest, self.tracker)
+        except Exception as e:
+            self.tracker.track_error(str(e), execution_id=execution_id)
+            response, error = None, f"{type(e).__name__}: {e}"
+        metric = self.tracker.end_execution(response if error is None else f"Erro: {error}",
+                                            execution_id=execution_id)
+        result = self._result(item, response, error)
+        result.update({
+            "execution_id": execution_id,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 2),
+            "tokens": metric.total_tokens,
+            "function_called": metric.function_called,
+            "correction_made": metric.correction_made,
+        })
+        return result, metric.to_dict()
+
+    def _result(self, item: BatchItem, response: Optional[str], error: Optional[str],
+                duplicate_of: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "id": item.id,
+            "line": item.line,
+            "implementation": self.implementation_name,
+            "key": item.key if item.input is not None else None,
+            "input": item.input,
+            "response": response,
+            "error": error,
+            "duplicate_of": duplicate_of,
+            "completed_at": time.time(),
+        }
+
+    def _duplicate(self, item: BatchItem, original: Dict[str, Any]) -> Dict[str, Any]:
+        """Resultado de um pedido repetido, copiado da execução original"""
+        self.counts["deduplicated"] += 1
+        return self._result(item, original["response"], original["error"], duplicate_of=original["id"])
+
+    def run(self, items: Iterator[BatchItem]) -> Dict[str, Any]:
+        """
+        Processa todos os pedidos e grava resultados, métricas e resumo
+
+        Returns:
+            Resumo da execução (também salvo em <base>_summary.json)
+        """
+        started = time.perf_counter()
+        in_flight: Dict[Future, BatchItem] = {}
+        waiting: Dict[str, List[BatchItem]] = {}  # Repetições de um texto ainda em execução
+
+        log.info("Iniciando lote", event="batch.started", implementation=self.implementation_name,
+                 concurrency=self.concurrency, resumed=len(self.done))
+        with JsonlSegmentWriter(self.results_base, append=self.resume) as results, \
+                JsonlSegmentWriter(self.metrics_base, append=self.resume) as metrics, \
+                ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="batch") as pool:
+
+            def write(result: Dict[str, Any]):
+                results.write(result)
+                if result["error"] is not None:
+                    self.counts["errors"] += 1
+
+            def drain(block_until_below: int):
+                while len(in_flight) >= block_until_below and in_flight:
+                    finished, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        item = in_flight.pop(future)
+                        result, metric = future.result()
+                        self.counts["executed"] += 1
+                        self.latency_ms.add(result["latency_ms"])
+                        self.tokens += result["tokens"]
+                        metrics.write(metric)
+                        write(result)
+                        if result["error"] is None:
+                            self.answers[item.key] = result
+                        for duplicate in waiting.pop(item.key, []):
+                            write(self._duplicate(duplicate, result))
+
+            for item in items:
+                if item.id in self.done:
+                    self.counts["skipped"] += 1
+                    continue
+                if item.error is not None:
+                    write(self._result(item, None, item.error))
+                    continue
+                if self.dedupe:
+                    if item.key in self.answers:
+                        write(self._duplicate(item, self.answers[item.key]))
+                        continue
+                    if item.key in waiting:
+                        waiting[item.key].append(item)
+                        continue
+                    waiting[item.key] = []
+                in_flight[pool.submit(self._execute, item)] = item
+                # Entrada em streaming: no máximo 2 × concorrência pedidos em andamento
+                drain(self.concurrency * 2)
+            drain(1)
+
+        elapsed = time.perf_counter() - started
+        summary = self._summary(elapsed)
+        with open(self.output_base.with_name(f"{self.output_base.name}_summary.json"), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, ensure_ascii=False)
+        log.info("Lote concluído", event="batch.finished", elapsed_s=round(elapsed, 2), **self.counts)
+        return summary
+
+    def _summary(self, elapsed_s: float) -> Dict[str, Any]:
+        client = getattr(self.implementation, "client", None)
+        governor = getattr(client, "governor", None)
+        resilience = getattr(client, "resilience", None)
+        return {
+            "implementation": self.implementation_name,
+            "results": f"{self.results_base}.*.jsonl",
+            "metrics": f"{self.metrics_base}.*.jsonl",
+            "elapsed_s": elapsed_s,
+            "concurrency": self.concurrency,
+            "dedupe": self.dedupe,
+            **self.counts,
+            "resumed_done": len(self.done),
+            "throughput": self.counts["executed"] / elapsed_s if elapsed_s > 0 else 0,
+            "latency_ms": self.latency_ms.summary(tuple(DEFAULT_QUANTILES)),
+            "tokens": self.tokens,
+            "phases": self.aggregator.summarize(),
+            "gateway": governor.stats() if governor is not None else None,
+            "resilience": resilience.stats() if resilience is not None else None,
+        }
+
+
+def main():
+    """Linha de comando do processamento em lote"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Processa um JSONL de pedidos por uma implementação")
+    parser.add_argument("input", help="Arquivo JSONL de pedidos")
+    parser.add_argument("--implementation", default="original", choices=["original", "cov", "secure"])
+    parser.add_argument("--output", help="Caminho base da saída (padrão: experiments/batch/<entrada>_<impl>)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Pedidos simultâneos")
+    parser.add_argument("--id-field", default="id", help="Campo com o id do pedido")
+    parser.add_argument("--input-field", default="input", help="Campo com o texto do pedido")
+    parser.add_argument("--resume", action="store_true", help="Continua uma execução anterior")
+    parser.add_argument("--no-dedupe", action="store_true", help="Executa também pedidos repetidos")
+    parser.add_argument("--stub", action="store_true", help="Usa o cliente local em vez da API")
+    parser.add_argument("--stub-latency", type=float, default=400, help="Latência mediana do stub (ms)")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    from tests.load_generator import build_implementations
+
+    if args.stub:
+        from tests.stub_client import StubChatClient
+        client = StubChatClient(latency_ms=args.stub_latency, seed=args.seed)
+    else:
+        # Carrega variáveis de ambiente do .env
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
+        from openai import OpenAI
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            print("❌ OPENAI_API_KEY não configurada (use --stub para o cliente local)")
+            return
+        client = OpenAI(api_key=api_key)
+
+    with open("config/manifest.json") as f:
+        manifest = json.load(f)
+    implementation = build_implementations(client, [args.implementation])[args.implementation]
+    if args.stub and getattr(implementation, "verification_gate", None) is not None:
+        # Correções simuladas pelo stub não devem ir para o estado persistido do gate do CoV
+        implementation.verification_gate.state_file = None
+
+    output = args.output or f"experiments/batch/{Path(args.input).stem}_{args.implementation}"
+    try:
+        runner = BatchRunner(args.implementation, implementation, manifest, output,
+                             concurrency=args.concurrency, dedupe=not args.no_dedupe, resume=args.resume)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+
+    print(f"📦 Lote: {args.input} → {output} ({args.implementation}, concorrência {args.concurrency}"
+          f"{', stub' if args.stub else ''})")
+    summary = runner.run(read_requests(args.input, args.id_field, args.input_field))
+    latency = summary["latency_ms"]
+    print(f"   Executados: {summary['executed']} | repetidos: {summary['deduplicated']} | "
+          f"pulados (resume): {summary['skipped']} | erros: {summary['errors']}")
+    print(f"   Latência p50/p99: {latency.get('p50', 0):.0f}/{latency.get('p99', 0):.0f}ms | "
+          f"tokens: {summary['tokens']} | {summary['throughput']:.2f} pedidos/s em {summary['elapsed_s']:.1f}s")
+    print(f"📄 Resultados em: {summary['results']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,6 @@ Sistema de comparação entre implementação original e Chain of Verification
 import json
 import os
 import sys
-import time
 from typing import List, Dict, Any
 from openai import OpenAI
 
@@ -141,7 +140,8 @@ class ComparisonRunner:
         print(f"🎯 INICIANDO EXPERIMENTO: {experiment_name}")
         print(f"📋 Casos de teste: {len(test_cases)}")
         
-        session = ExperimentSession(experiment_name, self.logger)
+        session = ExperimentSession(experiment_name, self.logger,
+                                    config_hash=self.prompts.config_hash())
         
         for i, test_case in enumerate(test_cases, 1):
             print(f"\n{'='*20} CASO {i}/{len(test_cases)} {'='*20}")
@@ -156,9 +156,6 @@ class ComparisonRunner:
                 if results["cov"]["success"]:
                     session.add_cov_metric(results["cov"]["metric"])
                 
-                # Pausa entre testes para evitar rate limiting
-                time.sleep(1)
-                
             except Exception as e:
                 print(f"❌ Erro no caso de teste {i}: {str(e)}")
         
@@ -0,0 +1,47 @@
+"""
+Configuração compartilhada dos testes unitários
+"""
+
+import logging
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from src.core.event_log import ROOT_LOGGER_NAME  # noqa: E402
+from src.core.prompt_config import PromptConfig  # noqa: E402
+
+
+class _EventCollector(logging.Handler):
+    """Guarda os registros emitidos pelos loggers de eventos"""
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.records = []
+
+    def emit(self, record: logging.LogRecord):
+        self.records.append(record)
+
+    def named(self, event: str) -> list:
+        return [record for record in self.records if getattr(record, "event", None) == event]
+
+
+@pytest.fixture
+def prompts() -> PromptConfig:
+    """Configuração do repositório (caminho absoluto, independente do diretório atual)"""
+    return PromptConfig(str(ROOT / "config" / "prompts.json"))
+
+
+@pytest.fixture
+def events():
+    """Eventos estruturados emitidos durante o teste (o logger raiz de eventos não propaga)"""
+    collector = _EventCollector()
+    logger = logging.getLogger(ROOT_LOGGER_NAME)
+    logger.addHandler(collector)
+    try:
+        yield collector
+    finally:
+        logger.removeHandler(collector)
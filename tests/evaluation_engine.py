@@ -0,0 +1,264 @@
+"""
+Motor de avaliação compilado para os casos de teste
+
+Os critérios de cada caso de teste (termos esperados, pistas de contexto,
+pontos de verificação, listas de frases) são compilados uma única vez em
+matchers (uma regex de alternância literal por grupo de frases). Cada resposta
+é convertida para minúsculas uma única vez e avaliada contra os matchers já
+prontos, o que permite reavaliar milhares de respostas armazenadas em lote.
+
+As regras são exatamente as do TestEvaluator original: mesma pontuação, mesmas
+notas, mesma distinção entre comparações com e sem diferenciar maiúsculas.
+"""
+
+import hashlib
+import json
+import re
+from functools import lru_cache
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+
+def rubric_hash(test_data: Dict[str, Any]) -> str:
+    """Hash curto e estável dos casos de teste e critérios (identifica o rubric que gerou as notas)"""
+    canonical = json.dumps(test_data, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class PhraseMatcher:
+    """Equivalente compilado de `any(phrase in text for phrase in phrases)`"""
+
+    __slots__ = ("phrases", "_regex")
+
+    def __init__(self, phrases: Sequence[str]):
+        self.phrases = tuple(phrases)
+        # Frases mais longas primeiro; uma frase vazia casa com qualquer texto, como em `"" in text`
+        alternatives = sorted(set(self.phrases), key=len, reverse=True)
+        self._regex = re.compile("|".join(map(re.escape, alternatives))) if alternatives else None
+
+    def matches(self, text: str) -> bool:
+        return self._regex is not None and self._regex.search(text) is not None
+
+
+@lru_cache(maxsize=None)
+def phrase_matcher(phrases: Tuple[str, ...]) -> PhraseMatcher:
+    """Matcher compartilhado para um grupo de frases (compilado uma vez por processo)"""
+    return PhraseMatcher(phrases)
+
+
+def _count_matching(matchers: Sequence[PhraseMatcher], text: str) -> int:
+    return sum(1 for matcher in matchers if matcher.matches(text))
+
+
+# Grupos de frases do rubric (iguais aos do TestEvaluator original)
+HUMOR_INDICATORS = phrase_matcher(("😄", "😂", "🙄", "Michael", "Dwight", "Jim", "Scranton", "Stanley", "Kevin", "Pam"))
+HUMOR_PHRASES = phrase_matcher(("adivinho", "bola de cristal", "mágico", "Stanley", "Kevin", "Creed", "Michael", "assistente"))
+PARAMETER_TERMS = phrase_matcher(("parâmetros", "informações"))
+ERROR_DETECTION = phrase_matcher(("inválido", "impossível", "não existe", "erro", "problema", "incorreto"))
+CLARIFICATION = phrase_matcher(("pode especificar", "preciso saber", "qual", "quando", "onde", "como"))
+URGENCY = phrase_matcher(("urgente", "prioridade", "rápido", "imediato"))
+CONSTRAINTS = phrase_matcher(("considerando", "levando em conta", "equilibrar", "balance"))
+
+# Grupos usados nas notas (subconjuntos mais estritos, como no original)
+NOTE_HUMOR = phrase_matcher(("😄", "michael", "dwight", "adivinho", "stanley"))
+NOTE_ERROR_DETECTION = phrase_matcher(("inválido", "impossível", "erro", "problema"))
+NOTE_URGENCY = phrase_matcher(("urgente", "prioridade", "rápido"))
+NOTE_CLARIFICATION = phrase_matcher(("pode especificar", "preciso saber", "qual"))
+NOTE_PARADOX = phrase_matcher(("equilibrar", "balance", "considerando"))
+
+
+class CompiledCriteria:
+    """Critérios de um caso de teste, pré-processados para avaliação repetida"""
+
+    __slots__ = ("source", "expected_function", "expected_success", "should_be_humorous",
+                 "mention_matchers", "should_contain_humor", "error_type", "context_matchers",
+                 "verification_matchers", "should_ask_clarification", "urgency_context",
+                 "considers_constraints", "quality_paradox", "cov_should_improve")
+
+    def __init__(self, test_case: Dict[str, Any]):
+        self.source = test_case
+        self.expected_function = test_case.get("expected_function")
+        self.expected_success = test_case.get("expected_success", True)
+        self.should_be_humorous = test_case.get("should_be_humorous", False)
+        self.mention_matchers = [phrase_matcher((term.lower(),)) for term in test_case.get("should_mention", [])]
+        self.should_contain_humor = test_case.get("should_contain_humor", False)
+        self.error_type = test_case.get("error_type")
+        # Pistas/pontos "a_b_c" casam se qualquer uma das palavras aparecer
+        self.context_matchers = [phrase_matcher(tuple(clue.split("_")))
+                                 for clue in test_case.get("context_clues", [])]
+        self.verification_matchers = [phrase_matcher(tuple(point.split("_")))
+                                      for point in test_case.get("verification_points", [])]
+        self.should_ask_clarification = test_case.get("should_ask_clarification", False)
+        self.urgency_context = test_case.get("urgency_context", False)
+        self.quality_paradox = test_case.get("quality_paradox", False)
+        self.considers_constraints = test_case.get("resource_constraint", False) or self.quality_paradox
+        self.cov_should_improve = test_case.get("cov_should_improve", False)
+
+    def basic_success(self, function_called: Optional[str], validation_passed: bool) -> bool:
+        """Se o teste passou nos critérios básicos"""
+        # Casos que não devem chamar função
+        if self.expected_function is None:
+            return function_called is None
+        # Casos que devem falhar (parâmetros incompletos)
+        if not self.expected_success:
+            return not validation_passed
+        return function_called == self.expected_function and validation_passed
+
+    def quality(self, response: str, lowered: Optional[str] = None) -> int:
+        """Qualidade da resposta (1-10)"""
+        if not response or len(response.strip()) < 10:
+            return 1
+        lowered = response.lower() if lowered is None else lowered
+        score = 5  # Baseline
+
+        if self.should_be_humorous and HUMOR_INDICATORS.matches(response):
+            score += 1
+        if self.mention_matchers:
+            score += min(2, _count_matching(self.mention_matchers, lowered))
+        if self.should_contain_humor and HUMOR_PHRASES.matches(response):
+            score += 2
+        if len(response) > 100:
+            score += 1
+        if PARAMETER_TERMS.matches(lowered):
+            score += 1
+        if self.error_type and ERROR_DETECTION.matches(lowered):
+            score += 2
+        if self.context_matchers:
+            score += min(2, _count_matching(self.context_matchers, lowered))
+        if self.verification_matchers:
+            score += min(2, _count_matching(self.verification_matchers, lowered))
+        if self.should_ask_clarification and CLARIFICATION.matches(lowered):
+            score += 1
+        if self.urgency_context and URGENCY.matches(lowered):
+            score += 1
+        if self.considers_constraints and CONSTRAINTS.matches(lowered):
+            score += 1
+
+        return min(10, max(1, score))
+
+    def notes(self, response: str, function_called: Optional[str], validation_passed: bool,
+              lowered: Optional[str] = None) -> str:
+        """Notas de avaliação detalhadas"""
+        lowered = response.lower() if lowered is None else lowered
+        notes = []
+
+        # Função chamada
+        if self.expected_function:
+            if function_called == self.expected_function:
+                notes.append("✅ Função correta chamada")
+            elif function_called:
+                notes.append(f"❌ Função errada: esperava {self.expected_function}, chamou {function_called}")
+            else:
+                notes.append(f"❌ Nenhuma função chamada, esperava {self.expected_function}")
+        else:
+            if function_called:
+                notes.append(f"⚠️ Função inesperada chamada: {function_called}")
+            else:
+                notes.append("✅ Nenhuma função chamada (correto)")
+
+        # Validação
+        if self.expected_success:
+            notes.append("✅ Validação passou (esperado)" if validation_passed
+                         else "❌ Validação falhou (inesperado)")
+        else:
+            notes.append("⚠️ Validação passou (esperava falha)" if validation_passed
+                         else "✅ Validação falhou (esperado)")
+
+        if len(response) < 20:
+            notes.append("⚠️ Resposta muito curta")
+
+        if self.should_contain_humor and not NOTE_HUMOR.matches(lowered):
+            notes.append("⚠️ Falta humor esperado")
+
+        if self.error_type:
+            if NOTE_ERROR_DETECTION.matches(lowered):
+                notes.append(f"✅ Erro detectado: {self.error_type}")
+            else:
+                notes.append(f"❌ Erro não detectado: {self.error_type}")
+
+        if self.context_matchers:
+            context_addressed = _count_matching(self.context_matchers, lowered)
+            if context_addressed > 0:
+                notes.append(f"✅ Contexto interpretado: {context_addressed}/{len(self.context_matchers)}")
+            else:
+                notes.append("❌ Contexto não interpretado")
+
+        if self.verification_matchers:
+            verifications = _count_matching(self.verification_matchers, lowered)
+            if verifications > 0:
+                notes.append(f"✅ Verificações: {verifications}/{len(self.verification_matchers)}")
+            else:
+                notes.append("❌ Verificações insuficientes")
+
+        if self.cov_should_improve:
+            notes.append("🎯 Caso esperado para melhoria com CoV")
+
+        if self.urgency_context:
+            notes.append("✅ Urgência reconhecida" if NOTE_URGENCY.matches(lowered)
+                         else "⚠️ Urgência não reconhecida")
+
+        if self.should_ask_clarification:
+            notes.append("✅ Pediu clarificação adequadamente" if NOTE_CLARIFICATION.matches(lowered)
+                         else "❌ Não pediu clarificação necessária")
+
+        if self.quality_paradox:
+            notes.append("✅ Paradoxo de qualidade reconhecido" if NOTE_PARADOX.matches(lowered)
+                         else "⚠️ Paradoxo não endereçado")
+
+        return " | ".join(notes)
+
+    def evaluate(self, response: str, function_called: Optional[str],
+                 validation_passed: bool) -> Tuple[bool, int, str]:
+        """Sucesso, qualidade e notas de uma resposta (minúsculas calculadas uma vez)"""
+        lowered = response.lower() if response else response
+        return (self.basic_success(function_called, validation_passed),
+                self.quality(response, lowered),
+                self.notes(response, function_called, validation_passed, lowered))
+
+
+class EvaluationEngine:
+    """Compila critérios por caso de teste (com cache) e avalia respostas em lote"""
+
+    def __init__(self):
+        self._compiled: Dict[str, CompiledCriteria] = {}
+
+    def compile(self, test_case: Dict[str, Any]) -> CompiledCriteria:
+        """
+        Critérios compilados de um caso de teste
+
+        O cache é por id do caso; se o dicionário do caso for trocado (rubric
+        alterado), os critérios são recompilados.
+        """
+        compiled = self._compiled.get(test_case["id"])
+        if compiled is None or compiled.source is not test_case:
+            compiled = self._compiled[test_case["id"]] = CompiledCriteria(test_case)
+        return compiled
+
+    def evaluate(self, test_case: Dict[str, Any], response: str, function_called: Optional[str],
+                 validation_passed: bool) -> Tuple[bool, int, str]:
+        return self.compile(test_case).evaluate(response, function_called, validation_passed)
+
+    def evaluate_batch(self, test_cases: Dict[str, Dict[str, Any]],
+                       records: Iterable[Dict[str, Any]]) -> List[Tuple[bool, int, str]]:
+        """
+        Avalia respostas armazenadas em lote
+
+        Args:
+            test_cases: Casos de teste por id (rubric atual)
+            records: Registros com test_id, actual_response, function_called e
+                validation_passed ("none" em function_called equivale a None);
+                registros com error_message nunca contam como sucesso
+
+        Returns:
+            (sucesso, qualidade, notas) por registro, na mesma ordem
+        """
+        results = []
+        for record in records:
+            function_called = record.get("function_called")
+            if function_called == "none":
+                function_called = None
+            success, quality, notes = self.compile(test_cases[record["test_id"]]).evaluate(
+                record.get("actual_response") or "", function_called, bool(record.get("validation_passed"))
+            )
+            # Execuções que terminaram em exceção são falhas, como no runner
+            results.append((success and not record.get("error_message"), quality, notes))
+        return results
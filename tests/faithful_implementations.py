@@ -5,7 +5,8 @@ Classes de teste que reproduzem fielmente a implementação dos form_ui principa
 import json
 import sys
 import os
-from typing import Dict, Any
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
 from openai import OpenAI
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -14,17 +15,27 @@ from src.core.functions import schedule_meeting, generate_paper_quote, prank_dwi
 from src.core.prompt_config import PromptConfig
 from src.core.function_validator import FunctionValidator
 from src.cov.chain_of_verification import ChainOfVerification, CoVConfiguration
+from src.cov.adaptive_gating import VerificationGate, GateDecision
+from src.cov.batch_verification import BatchVerdict
 from src.core.metrics_tracker import MetricsTracker
+from src.core.message_builder import MessageBuilder, get_cached_tokens
+from src.core.token_budget import TokenBudget
+from src.core.llm_gateway import governed
+from src.core.model_router import ModelRouter
+from src.core.resilience import begin_request_deadline, deadline_phase
 from src.core.function_intent import detect_function_intent
 
 
 class FormUIOriginalReproduction:
     """Reproduz exatamente a lógica do form_ui.py"""
     
-    def __init__(self, client: OpenAI, prompts: PromptConfig, validator: FunctionValidator):
-        self.client = client
+    def __init__(self, client: OpenAI, prompts: PromptConfig, validator: FunctionValidator,
+                 token_budget: Optional[TokenBudget] = None):
+        self.client = governed(client, prompts)
+        self.models = ModelRouter.shared(prompts)
         self.prompts = prompts
         self.validator = validator
+        self.token_budget = token_budget
         self.LOCAL_FUNCS = {
             "schedule_meeting": schedule_meeting,
             "generate_paper_quote": generate_paper_quote,
@@ -34,24 +45,32 @@ class FormUIOriginalReproduction:
     def process_request(self, user_input: str, manifest: Dict[str, Any], tracker: MetricsTracker) -> str:
         """Reproduz exatamente a lógica do form_ui.py"""
         
+        # Prazo total da requisição, dividido entre as fases
+        begin_request_deadline(self.prompts)
+        
         # Detecta se deve forçar function calling (IGUAL ao form_ui.py)
-        tool_choice = detect_function_intent(user_input)
+        with tracker.span("intent_detection"):
+            tool_choice = detect_function_intent(user_input)
         
         # Primeira chamada à API (IGUAL ao form_ui.py)
-        first = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            tools=manifest["tools"],
-            tool_choice=tool_choice,
-            messages=[
-                {"role": "system", "content": self.prompts.system_prompt},
-                {"role": "user", "content": user_input}
-            ]
-        )
+        message_builder = MessageBuilder(self.prompts, manifest, token_budget=self.token_budget)
+        with tracker.span("first_completion"), deadline_phase("first_completion"), \
+                message_builder.settle_on_error():
+            first = self.client.chat.completions.create(
+                model=self.models.model_for("first_completion"),
+                tools=message_builder.tools,
+                tool_choice=tool_choice,
+                messages=message_builder.initial_messages(user_input)
+            )
         
         # Track API call
+        message_builder.settle(first.usage)
         tracker.track_api_call(
             input_tokens=first.usage.prompt_tokens,
-            output_tokens=first.usage.completion_tokens
+            output_tokens=first.usage.completion_tokens,
+            cached_tokens=get_cached_tokens(first.usage),
+            estimated_input_tokens=message_builder.last_estimated_tokens,
+            model=self.models.model_for("first_completion")
         )
         
         msg = first.choices[0].message
@@ -63,7 +82,8 @@ class FormUIOriginalReproduction:
             args = json.loads(call.function.arguments)
 
             # Valida parâmetros (IGUAL ao form_ui.py)
-            is_valid, humor_message = self.validator.validate_function_params(name, args)
+            with tracker.span("function_validation"):
+                is_valid, humor_message = self.validator.validate_function_params(name, args)
             
             if not is_valid:
                 # Track failed function call
@@ -71,31 +91,28 @@ class FormUIOriginalReproduction:
                 return humor_message
             else:
                 # Executa função (IGUAL ao form_ui.py)
-                function_result = self.LOCAL_FUNCS[name](**args)
+                with tracker.span("function_execution"):
+                    function_result = self.LOCAL_FUNCS[name](**args)
                 
                 # Track successful function call
                 tracker.track_function_call(name, args, function_result, True)
 
                 # Segunda chamada para resposta final (IGUAL ao form_ui.py)
-                second = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": self.prompts.final_system_prompt},
-                        {"role": "user", "content": user_input},
-                        {"role": "assistant", "content": None, "tool_calls": [call]},
-                        {
-                            "role": "tool",
-                            "tool_call_id": call.id,
-                            "name": name,
-                            "content": json.dumps(function_result)
-                        }
-                    ]
-                )
+                with tracker.span("second_completion"), deadline_phase("second_completion"), \
+                        message_builder.settle_on_error():
+                    second = self.client.chat.completions.create(
+                        model=self.models.model_for("second_completion"),
+                        messages=message_builder.tool_result_messages(user_input, call, name, function_result)
+                    )
                 
                 # Track second API call
+                message_builder.settle(second.usage)
                 tracker.track_api_call(
                     input_tokens=second.usage.prompt_tokens,
-                    output_tokens=second.usage.completion_tokens
+                    output_tokens=second.usage.completion_tokens,
+                    cached_tokens=get_cached_tokens(second.usage),
+                    estimated_input_tokens=message_builder.last_estimated_tokens,
+                    model=self.models.model_for("second_completion")
                 )
                 
                 return second.choices[0].message.content
@@ -104,15 +121,28 @@ class FormUIOriginalReproduction:
             return msg.content
 
 
+@dataclass
+class CoVDraft:
+    """Requisição do CoV com a resposta inicial pronta, aguardando a verificação"""
+    user_input: str
+    initial_response: str
+    function_call: Optional[Dict[str, Any]]
+    gate_decision: GateDecision
+
+
 class FormUICoVReproduction:
     """Reproduz exatamente a lógica do form_ui_cov.py"""
     
-    def __init__(self, client: OpenAI, prompts: PromptConfig, validator: FunctionValidator):
-        self.client = client
+    def __init__(self, client: OpenAI, prompts: PromptConfig, validator: FunctionValidator,
+                 token_budget: Optional[TokenBudget] = None):
+        self.client = governed(client, prompts)
+        self.models = ModelRouter.shared(prompts)
         self.prompts = prompts
         self.validator = validator
-        self.cov = ChainOfVerification(client, prompts)
+        self.token_budget = token_budget
+        self.cov = ChainOfVerification(self.client, prompts, token_budget=token_budget)
         self.cov_config = CoVConfiguration()
+        self.verification_gate = VerificationGate.shared(prompts)
         self.LOCAL_FUNCS = {
             "schedule_meeting": schedule_meeting,
             "generate_paper_quote": generate_paper_quote,
@@ -121,24 +151,42 @@ class FormUICoVReproduction:
     
     def process_request(self, user_input: str, manifest: Dict[str, Any], tracker: MetricsTracker) -> str:
         """Reproduz exatamente a lógica do form_ui_cov.py"""
+        draft = self.draft_request(user_input, manifest, tracker)
+        return self.finish_request(draft, tracker)
+    
+    def draft_request(self, user_input: str, manifest: Dict[str, Any], tracker: MetricsTracker) -> CoVDraft:
+        """
+        Gera a resposta inicial e decide se ela será verificada (ETAPA 1 do form_ui_cov.py)
+        
+        Returns:
+            CoVDraft para finish_request (a verificação pode ser feita em lote antes)
+        """
+        
+        # Prazo total da requisição, dividido entre as fases
+        begin_request_deadline(self.prompts)
         
         # ETAPA 1: Gera resposta inicial (IGUAL ao form_ui_cov.py)
-        tool_choice = detect_function_intent(user_input)
+        with tracker.span("intent_detection"):
+            tool_choice = detect_function_intent(user_input)
         
-        first_response = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            tools=manifest["tools"],
-            tool_choice=tool_choice,
-            messages=[
-                {"role": "system", "content": self.prompts.system_prompt},
-                {"role": "user", "content": user_input}
-            ]
-        )
+        message_builder = MessageBuilder(self.prompts, manifest, token_budget=self.token_budget)
+        with tracker.span("first_completion"), deadline_phase("first_completion"), \
+                message_builder.settle_on_error():
+            first_response = self.client.chat.completions.create(
+                model=self.models.model_for("first_completion"),
+                tools=message_builder.tools,
+                tool_choice=tool_choice,
+                messages=message_builder.initial_messages(user_input)
+            )
 
         # Track first API call
+        message_builder.settle(first_response.usage)
         tracker.track_api_call(
             input_tokens=first_response.usage.prompt_tokens,
-            output_tokens=first_response.usage.completion_tokens
+            output_tokens=first_response.usage.completion_tokens,
+            cached_tokens=get_cached_tokens(first_response.usage),
+            estimated_input_tokens=message_builder.last_estimated_tokens,
+            model=self.models.model_for("first_completion")
         )
 
         msg = first_response.choices[0].message
@@ -159,71 +207,108 @@ class FormUICoVReproduction:
             }
 
             # Valida parâmetros (IGUAL ao form_ui_cov.py)
-            is_valid, humor_message = self.validator.validate_function_params(name, args)
+            with tracker.span("function_validation"):
+                is_valid, humor_message = self.validator.validate_function_params(name, args)
             
             if not is_valid:
                 initial_response = humor_message
                 tracker.track_function_call(name, args, None, False)
             else:
                 # Executa função (IGUAL ao form_ui_cov.py)
-                function_result = self.LOCAL_FUNCS[name](**args)
+                with tracker.span("function_execution"):
+                    function_result = self.LOCAL_FUNCS[name](**args)
                 tracker.track_function_call(name, args, function_result, True)
 
                 # Gera resposta baseada no resultado (IGUAL ao form_ui_cov.py)
-                final_response_call = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": self.prompts.final_system_prompt},
-                        {"role": "user", "content": user_input},
-                        {"role": "assistant", "content": None, "tool_calls": [call]},
-                        {
-                            "role": "tool",
-                            "tool_call_id": call.id,
-                            "name": name,
-                            "content": json.dumps(function_result)
-                        }
-                    ]
-                )
+                with tracker.span("second_completion"), deadline_phase("second_completion"), \
+                        message_builder.settle_on_error():
+                    final_response_call = self.client.chat.completions.create(
+                        model=self.models.model_for("second_completion"),
+                        messages=message_builder.tool_result_messages(user_input, call, name, function_result)
+                    )
                 
+                message_builder.settle(final_response_call.usage)
                 tracker.track_api_call(
                     input_tokens=final_response_call.usage.prompt_tokens,
-                    output_tokens=final_response_call.usage.completion_tokens
+                    output_tokens=final_response_call.usage.completion_tokens,
+                    cached_tokens=get_cached_tokens(final_response_call.usage),
+                    estimated_input_tokens=message_builder.last_estimated_tokens,
+                    model=self.models.model_for("second_completion")
                 )
                 
                 initial_response = final_response_call.choices[0].message.content
         else:
             initial_response = msg.content
 
+        gate_decision = self.verification_gate.decide(
+            user_input, function_call_info.get("name") if function_call_info else None, tool_choice
+        )
+        return CoVDraft(user_input, initial_response, function_call_info, gate_decision)
+    
+    def finish_request(self, draft: CoVDraft, tracker: MetricsTracker,
+                       batch_verdict: Optional[BatchVerdict] = None) -> str:
+        """
+        Verifica e corrige a resposta inicial (ETAPA 2 do form_ui_cov.py)
+        
+        Args:
+            draft: Resultado de draft_request
+            tracker: MetricsTracker da execução
+            batch_verdict: Veredito vindo da verificação em lote (None = verifica agora)
+            
+        Returns:
+            Resposta final
+        """
+        if batch_verdict is not None:
+            # A correção roda depois do lote: prazo próprio, não o restante do prazo do rascunho
+            begin_request_deadline(self.prompts)
+        
         # ETAPA 2: Chain of Verification (IGUAL ao form_ui_cov.py)
-        if self.cov_config.should_verify(function_call_info.get("name") if function_call_info else None):
+        if draft.gate_decision.verify:
             tracker.start_verification_phase()
             
-            final_response, verification_metadata = self.cov.process_with_verification(
-                user_input=user_input,
-                initial_response=initial_response,
-                function_call=function_call_info
-            )
+            with tracker.span("verification"), deadline_phase("verification"):
+                final_response, verification_metadata = self.cov.process_with_verification(
+                    user_input=draft.user_input,
+                    initial_response=draft.initial_response,
+                    function_call=draft.function_call,
+                    tracker=tracker,
+                    verification_result=batch_verdict.result if batch_verdict else None,
+                    verification_usage=batch_verdict.usage if batch_verdict else None
+                )
             
-            # Tokens da verificação (IGUAL ao form_ui_cov.py)
-            verification_tokens = len(verification_metadata.get("verification_result", {}).get("issues", [])) * 50
+            # Registra as chamadas de API feitas pelo CoV (IGUAL ao form_ui_cov.py)
+            for api_call in verification_metadata.get("api_calls", []):
+                tracker.track_api_call(
+                    input_tokens=api_call["input_tokens"],
+                    output_tokens=api_call["output_tokens"],
+                    cached_tokens=api_call["cached_tokens"],
+                    model=api_call["model"]
+                )
+            
+            # Tokens reais da verificação (IGUAL ao form_ui_cov.py)
+            verification_tokens = verification_metadata.get("verification_tokens_used", 0)
             
             tracker.end_verification_phase(
                 verification_tokens=verification_tokens,
                 correction_made=verification_metadata.get("correction_applied", False)
             )
+            self.verification_gate.record(draft.gate_decision, verification_metadata)
             
             return final_response
         else:
-            return initial_response
+            return draft.initial_response
 
 
 class FormUISecureReproduction:
     """Reproduz exatamente a lógica do form_ui_secure.py"""
     
-    def __init__(self, client: OpenAI, prompts: PromptConfig, validator: FunctionValidator):
-        self.client = client
+    def __init__(self, client: OpenAI, prompts: PromptConfig, validator: FunctionValidator,
+                 token_budget: Optional[TokenBudget] = None):
+        self.client = governed(client, prompts)
+        self.models = ModelRouter.shared(prompts)
         self.prompts = prompts
         self.validator = validator
+        self.token_budget = token_budget
         # Importar security validator quando necessário
         try:
             from src.security.secure_function_validator import SecureFunctionValidator
@@ -240,27 +325,39 @@ class FormUISecureReproduction:
     def process_request(self, user_input: str, manifest: Dict[str, Any], tracker: MetricsTracker) -> str:
         """Reproduz exatamente a lógica do form_ui_secure.py"""
         
-        # Processamento de segurança do input (simplificado para teste)
-        processed_input = user_input
+        # Prazo total da requisição, dividido entre as fases
+        begin_request_deadline(self.prompts)
+        
+        # Validação de segurança da entrada (IGUAL ao form_ui_secure.py)
+        with tracker.span("security_validation"):
+            is_safe, security_error, processed_input = self.secure_validator.validate_user_input(user_input)
+        if not is_safe:
+            tracker.track_error(security_error)
+            return security_error
         
         # Detecta tool choice (IGUAL ao form_ui_secure.py)
-        tool_choice = detect_function_intent(processed_input)
+        with tracker.span("intent_detection"):
+            tool_choice = detect_function_intent(processed_input)
         
         # Primeira chamada à API (IGUAL ao form_ui_secure.py)
-        first = self.client.chat.completions.create(
-            model="gpt-4o-mini",
-            tools=manifest["tools"],
-            tool_choice=tool_choice,
-            messages=[
-                {"role": "system", "content": self.prompts.system_prompt},
-                {"role": "user", "content": processed_input}
-            ]
-        )
+        message_builder = MessageBuilder(self.prompts, manifest, token_budget=self.token_budget)
+        with tracker.span("first_completion"), deadline_phase("first_completion"), \
+                message_builder.settle_on_error():
+            first = self.client.chat.completions.create(
+                model=self.models.model_for("first_completion"),
+                tools=message_builder.tools,
+                tool_choice=tool_choice,
+                messages=message_builder.initial_messages(processed_input)
+            )
         
         # Track API call
+        message_builder.settle(first.usage)
         tracker.track_api_call(
             input_tokens=first.usage.prompt_tokens,
-            output_tokens=first.usage.completion_tokens
+            output_tokens=first.usage.completion_tokens,
+            cached_tokens=get_cached_tokens(first.usage),
+            estimated_input_tokens=message_builder.last_estimated_tokens,
+            model=self.models.model_for("first_completion")
         )
         
         msg = first.choices[0].message
@@ -273,35 +370,40 @@ class FormUISecureReproduction:
 
             # Usa secure validator se disponível
             validator = getattr(self, 'secure_validator', self.validator)
-            is_valid, humor_message = validator.validate_function_params(name, args)
+            with tracker.span("function_validation"):
+                is_valid, humor_message = validator.validate_function_params(name, args)
             
             if not is_valid:
                 tracker.track_function_call(name, args, None, False)
-                return humor_message
+                final_response = humor_message
             else:
-                function_result = self.LOCAL_FUNCS[name](**args)
+                with tracker.span("function_execution"):
+                    function_result = self.LOCAL_FUNCS[name](**args)
                 tracker.track_function_call(name, args, function_result, True)
 
-                second = self.client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=[
-                        {"role": "system", "content": self.prompts.final_system_prompt},
-                        {"role": "user", "content": processed_input},
-                        {"role": "assistant", "content": None, "tool_calls": [call]},
-                        {
-                            "role": "tool",
-                            "tool_call_id": call.id,
-                            "name": name,
-                            "content": json.dumps(function_result)
-                        }
-                    ]
-                )
+                with tracker.span("second_completion"), deadline_phase("second_completion"), \
+                        message_builder.settle_on_error():
+                    second = self.client.chat.completions.create(
+                        model=self.models.model_for("second_completion"),
+                        messages=message_builder.tool_result_messages(processed_input, call, name, function_result)
+                    )
                 
+                message_builder.settle(second.usage)
                 tracker.track_api_call(
                     input_tokens=second.usage.prompt_tokens,
-                    output_tokens=second.usage.completion_tokens
+                    output_tokens=second.usage.completion_tokens,
+                    cached_tokens=get_cached_tokens(second.usage),
+                    estimated_input_tokens=message_builder.last_estimated_tokens,
+                    model=self.models.model_for("second_completion")
                 )
                 
-                return second.choices[0].message.content
+                final_response = second.choices[0].message.content
         else:
-            return msg.content
+            final_response = msg.content
+        
+        # Validação e sanitização da resposta (IGUAL ao form_ui_secure.py)
+        with tracker.span("security_validation"):
+            is_response_safe, sanitized_response = self.secure_validator.validate_and_sanitize_response(final_response)
+        if not is_response_safe:
+            return "❌ Erro na geração da resposta. Tente reformular sua pergunta."
+        return sanitized_response
@@ -0,0 +1,409 @@
+"""
+Gerador de carga em malha aberta (open-loop) para as implementações
+
+O ComparisonRunner executa um caso por vez, com pausa entre eles: mede só a
+latência de um usuário isolado. Aqui as chegadas seguem um processo
+independente das respostas (Poisson, rajadas ou taxa constante), então quando
+a taxa oferecida passa da capacidade a fila cresce e aparece na medição —
+o tempo de resposta é contado a partir da chegada agendada, sem "coordinated
+omission".
+
+Para cada taxa são registrados throughput, atraso de fila, latência de serviço
+e tempo de resposta (p50/p90/p99/p999), por implementação; uma varredura de
+taxas gera a curva de saturação. Funciona contra a API real ou contra o
+StubChatClient local.
+
+Uso:
+    python tests/load_generator.py --stub --implementations original cov --rates 1 2 4 8 --duration 30
+    python tests/load_generator.py --implementations cov --rates 0.5 1 --process bursty
+"""
+
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence
+
+# Adiciona o diretório pai ao path para imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.prompt_config import PromptConfig
+from src.core.function_validator import FunctionValidator
+from src.core.metrics_tracker import MetricsTracker
+from src.core.percentile_sketch import LogHistogram, MetricsAggregator, DEFAULT_QUANTILES
+from src.core.event_log import get_event_logger
+
+log = get_event_logger("load_generator")
+
+ARRIVAL_PROCESSES = ("poisson", "bursty", "constant")
+
+
+def arrival_times(rate: float, duration_s: float, process: str = "poisson",
+                  burst_period_s: float = 10.0, burst_duty: float = 0.2,
+                  rng: Optional[random.Random] = None) -> List[float]:
+    """
+    Instantes de chegada (segundos desde o início) com taxa média `rate`
+
+    Args:
+        rate: Chegadas por segundo (média)
+        duration_s: Duração da janela de geração
+        process: "poisson" (intervalos exponenciais), "constant" (intervalos
+            fixos) ou "bursty" (Poisson ligado/desligado: toda a carga de cada
+            período chega na fração `burst_duty` inicial, à taxa rate/burst_duty)
+        burst_period_s: Período do ciclo ligado/desligado (bursty)
+        burst_duty: Fração do período com chegadas (bursty)
+        rng: Gerador aleatório (reprodutibilidade)
+
+    Returns:
+        Lista crescente de instantes
+    """
+    if rate <= 0:
+        raise ValueError("rate deve ser positiva")
+    if process not in ARRIVAL_PROCESSES:
+        raise ValueError(f"Processo de chegada inválido: {process}")
+    rng = rng or random.Random()
+
+    if process == "constant":
+        return [i / rate for i in range(int(duration_s * rate))]
+
+    if process == "poisson":
+        times, t = [], rng.expovariate(rate)
+        while t < duration_s:
+            times.append(t)
+            t += rng.expovariate(rate)
+        return times
+
+    if not 0 < burst_duty <= 1:
+        raise ValueError("burst_duty deve estar entre 0 e 1")
+    on_rate, on_length = rate / burst_duty, burst_period_s * burst_duty
+    times = []
+    for start in range(math.ceil(duration_s / burst_period_s)):
+        period_start = start * burst_period_s
+        t = rng.expovariate(on_rate)
+        while t < on_length and period_start + t < duration_s:
+            times.append(period_start + t)
+            t += rng.expovariate(on_rate)
+    return times
+
+
+class WorkloadMix:
+    """Sorteia casos de teste de config/test_cases.json conforme pesos por categoria"""
+
+    def __init__(self, test_data: Dict[str, Any], categories: Optional[Sequence[str]] = None,
+                 weights: Optional[Dict[str, float]] = None, rng: Optional[random.Random] = None):
+        """
+        Args:
+            test_data: Conteúdo de config/test_cases.json
+            categories: Categorias incluídas (padrão: todas)
+            weights: Peso por categoria (padrão: proporcional ao número de casos)
+            rng: Gerador aleatório (reprodutibilidade)
+        """
+        all_categories = test_data["test_cases"]
+        categories = list(categories or all_categories)
+        unknown = [category for category in categories if category not in all_categories]
+        if unknown:
+            raise ValueError(f"Categorias não encontradas: {', '.join(unknown)}")
+        self.cases = {category: all_categories[category]["cases"] for category in categories}
+        self.categories = [category for category in categories if self.cases[category]]
+        weights = weights or {}
+        self.weights = [weights.get(category, len(self.cases[category])) for category in self.categories]
+        self._rng = rng or random.Random()
+
+    def sample(self) -> Dict[str, Any]:
+        category = self._rng.choices(self.categories, weights=self.weights)[0]
+        return self._rng.choice(self.cases[category])
+
+
+@dataclass
+class RequestRecord:
+    """Medição de uma requisição do teste de carga (tempos em ms)"""
+    implementation: str
+    test_id: str
+    category: str
+    scheduled_s: float
+    queue_delay_ms: float
+    service_ms: float
+    response_ms: float
+    tokens: int
+    error: Optional[str] = None
+
+
+class LoadGenerator:
+    """
+    Dispara requisições em malha aberta contra uma ou mais implementações
+
+    Um agendador envia cada chegada no instante previsto para um pool de
+    `concurrency` workers (o equivalente aos processos/threads do servidor);
+    quando todos estão ocupados a requisição espera, e essa espera é o atraso de fila.
+    """
+
+    def __init__(self, implementations: Dict[str, Any], manifest: Dict[str, Any],
+                 workload: WorkloadMix, concurrency: int = 16):
+        """
+        Args:
+            implementations: {nome: objeto com process_request(user_input, manifest, tracker)}
+            manifest: Conteúdo de config/manifest.json
+            workload: Mix de casos de teste
+            concurrency: Requisições processadas simultaneamente
+        """
+        self.implementations = implementations
+        self.manifest = manifest
+        self.workload = workload
+        self.concurrency = concurrency
+
+    def _execute(self, name: str, tracker: MetricsTracker, test_case: Dict[str, Any],
+                 scheduled: float, origin: float) -> RequestRecord:
+        started = time.perf_counter()
+        tracker.start_execution(test_case["input"])
+        error = None
+        try:
+            response = self.implementations[name].process_request(test_case["input"], self.manifest, tracker)
+        except Exception as e:
+            tracker.track_error(str(e))
+            response, error = f"Erro: {str(e)}", type(e).__name__
+        metric = tracker.end_execution(response, additional_metadata={
+            "test_id": test_case["id"], "test_category": test_case.get("category")
+        })
+        finished = time.perf_counter()
+        return RequestRecord(
+            implementation=name,
+            test_id=test_case["id"],
+            category=test_case.get("category", ""),
+            scheduled_s=scheduled,
+            queue_delay_ms=max(0.0, started - origin - scheduled) * 1000,
+            service_ms=(finished - started) * 1000,
+            response_ms=(finished - origin - scheduled) * 1000,
+            tokens=metric.total_tokens,
+            error=error,
+        )
+
+    def run(self, rate: float, duration_s: float, process: str = "poisson",
+            seed: Optional[int] = None, **process_options) -> Dict[str, Any]:
+        """
+        Executa um nível de carga e espera todas as requisições terminarem
+
+        Args:
+            rate: Chegadas por segundo (somando todas as implementações)
+            duration_s: Duração da janela de chegadas
+            process: Processo de chegada (ver arrival_times)
+            seed: Semente das chegadas e da escolha de implementação
+            **process_options: burst_period_s / burst_duty para "bursty"
+
+        Returns:
+            Resumo por implementação (ver summarize) e parâmetros da execução
+        """
+        rng = random.Random(seed)
+        schedule = arrival_times(rate, duration_s, process, rng=rng, **process_options)
+        names = list(self.implementations)
+        aggregator = MetricsAggregator()
+        trackers = {name: MetricsTracker(name, aggregator) for name in names}
+
+        log.info("Iniciando nível de carga", event="load.level_started", rate=rate,
+                 process=process, arrivals=len(schedule), concurrency=self.concurrency)
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="load") as pool:
+            origin = time.perf_counter()
+            for scheduled in schedule:
+                delay = origin + scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                name = rng.choice(names)
+                futures.append(pool.submit(self._execute, name, trackers[name],
+                                           self.workload.sample(), scheduled, origin))
+            records = [future.result() for future in futures]
+        elapsed = time.perf_counter() - origin
+
+        clients = [getattr(impl, "client", None) for impl in self.implementations.values()]
+        governors = {id(governor): governor for governor in (
+            getattr(client, "governor", None) for client in clients
+        ) if governor is not None}
+        callers = {id(caller): caller for caller in (
+            getattr(client, "resilience", None) for client in clients
+        ) if caller is not None}
+        gates = {id(gate): gate for gate in (
+            getattr(impl, "verification_gate", None) for impl in self.implementations.values()
+        ) if gate is not None}
+        return {
+            "offered_rate": rate,
+            "process": process,
+            "duration_s": duration_s,
+            "elapsed_s": elapsed,
+            "concurrency": self.concurrency,
+            "implementations": summarize(records, elapsed, duration_s),
+            "phases": aggregator.summarize(),
+            # Estado do limitador de taxa/concorrência compartilhado (acumulado no processo)
+            "gateway": [governor.stats() for governor in governors.values()],
+            # Retries, prazos esgotados e requisições duplicadas (acumulado no processo)
+            "resilience": [caller.stats() for caller in callers.values()],
+            # Decisões do gate adaptativo do CoV e taxas de correção por grupo
+            "cov_gate": [gate.summary() for gate in gates.values()],
+        }
+
+    def sweep(self, rates: Sequence[float], duration_s: float, process: str = "poisson",
+              seed: Optional[int] = None, **process_options) -> List[Dict[str, Any]]:
+        """Curva de saturação: um run por taxa, na ordem dada"""
+        levels = []
+        for rate in rates:
+            level = self.run(rate, duration_s, process, seed, **process_options)
+            levels.append(level)
+            log.info("Nível de carga concluído", event="load.level_finished", rate=rate,
+                     elapsed_s=round(level["elapsed_s"], 2))
+        return levels
+
+
+def summarize(records: List[RequestRecord], elapsed_s: float, duration_s: float,
+              quantiles: Sequence[float] = DEFAULT_QUANTILES) -> Dict[str, Any]:
+    """
+    Throughput e percentis por implementação
+
+    Args:
+        records: Medições das requisições
+        elapsed_s: Tempo total até a última resposta (base do throughput)
+        duration_s: Janela de chegadas (base da taxa oferecida)
+
+    Returns:
+        {implementação: {"requests", "errors", "error_rate", "offered_rate",
+         "throughput", "queue_delay_ms", "service_ms", "response_ms", "tokens"}};
+        os campos *_ms são resumos de LogHistogram (count/mean/min/max/pXX)
+    """
+    grouped: Dict[str, List[RequestRecord]] = {}
+    for record in records:
+        grouped.setdefault(record.implementation, []).append(record)
+
+    result = {}
+    for name, group in sorted(grouped.items()):
+        histograms = {field: LogHistogram() for field in ("queue_delay_ms", "service_ms", "response_ms", "tokens")}
+        completed = 0
+        for record in group:
+            if record.error is None:
+                completed += 1
+                for field, histogram in histograms.items():
+                    histogram.add(getattr(record, field))
+            else:
+                histograms["queue_delay_ms"].add(record.queue_delay_ms)
+        result[name] = {
+            "requests": len(group),
+            "errors": len(group) - completed,
+            "error_rate": (len(group) - completed) / len(group) * 100 if group else 0,
+            "offered_rate": len(group) / duration_s if duration_s > 0 else 0,
+            "throughput": completed / elapsed_s if elapsed_s > 0 else 0,
+            **{field: histogram.summary(tuple(quantiles)) for field, histogram in histograms.items()},
+        }
+    return result
+
+
+def format_curve(levels: List[Dict[str, Any]]) -> str:
+    """Tabela da curva de saturação (uma linha por taxa e implementação)"""
+    lines = [f"{'taxa':>6} {'impl':<10} {'req':>5} {'thr/s':>7} {'erro%':>6} "
+             f"{'fila p50':>9} {'fila p99':>9} {'resp p50':>9} {'resp p99':>9}"]
+    for level in levels:
+        for name, entry in level["implementations"].items():
+            queue, response = entry["queue_delay_ms"], entry["response_ms"]
+            lines.append(
+                f"{level['offered_rate']:>6.2f} {name:<10} {entry['requests']:>5} {entry['throughput']:>7.2f} "
+                f"{entry['error_rate']:>6.1f} {queue.get('p50', 0):>9.0f} {queue.get('p99', 0):>9.0f} "
+                f"{response.get('p50', 0):>9.0f} {response.get('p99', 0):>9.0f}"
+            )
+    return "\n".join(lines)
+
+
+def build_implementations(client: Any, names: Sequence[str]) -> Dict[str, Any]:
+    """Instancia as reproduções fiéis pedidas (original, cov, secure) com um cliente"""
+    from tests.faithful_implementations import (
+        FormUIOriginalReproduction,
+        FormUICoVReproduction,
+        FormUISecureReproduction
+    )
+
+    prompts = PromptConfig()
+    validator = FunctionValidator(prompts)
+    classes = {
+        "original": FormUIOriginalReproduction,
+        "cov": FormUICoVReproduction,
+        "secure": FormUISecureReproduction,
+    }
+    unknown = [name for name in names if name not in classes]
+    if unknown:
+        raise ValueError(f"Implementação inválida: {', '.join(unknown)}")
+    return {name: classes[name](client, prompts, validator) for name in names}
+
+
+def main():
+    """Linha de comando do teste de carga"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Teste de carga em malha aberta")
+    parser.add_argument("--implementations", nargs="+", default=["original", "cov"],
+                        choices=["original", "cov", "secure"])
+    parser.add_argument("--rates", nargs="+", type=float, default=[1, 2, 4],
+                        help="Chegadas por segundo (uma execução por taxa)")
+    parser.add_argument("--duration", type=float, default=30, help="Segundos de chegadas por taxa")
+    parser.add_argument("--process", default="poisson", choices=ARRIVAL_PROCESSES)
+    parser.add_argument("--burst-period", type=float, default=10.0, help="Período do ciclo (bursty)")
+    parser.add_argument("--burst-duty", type=float, default=0.2, help="Fração do período com chegadas (bursty)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requisições simultâneas")
+    parser.add_argument("--categories", nargs="*", help="Categorias de config/test_cases.json")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--stub", action="store_true", help="Usa o cliente local em vez da API")
+    parser.add_argument("--stub-latency", type=float, default=400, help="Latência mediana do stub (ms)")
+    parser.add_argument("--stub-capacity", type=int, default=None, help="Requisições simultâneas no stub")
+    parser.add_argument("--stub-rpm", type=int, default=None, help="Limite de requisições/minuto do stub")
+    parser.add_argument("--stub-error-rate", type=float, default=0.0, help="Fração de erros 500 do stub")
+    parser.add_argument("--stub-stall-rate", type=float, default=0.0, help="Fração de chamadas travadas do stub")
+    parser.add_argument("--output", help="Arquivo JSON de saída (padrão: experiments/load_tests/)")
+    args = parser.parse_args()
+
+    if args.stub:
+        from tests.stub_client import StubChatClient
+        client = StubChatClient(latency_ms=args.stub_latency, capacity=args.stub_capacity,
+                                rpm_limit=args.stub_rpm, error_rate=args.stub_error_rate,
+                                stall_rate=args.stub_stall_rate, seed=args.seed)
+    else:
+        # Carrega variáveis de ambiente do .env
+        try:
+            from dotenv import load_dotenv
+            load_dotenv()
+        except ImportError:
+            pass
+        from openai import OpenAI
+        api_key = os.environ.get("OPENAI_API_KEY")
+        if not api_key:
+            print("❌ OPENAI_API_KEY não configurada (use --stub para o cliente local)")
+            return
+        client = OpenAI(api_key=api_key)
+
+    with open("config/test_cases.json", "r", encoding="utf-8") as f:
+        test_data = json.load(f)
+    with open("config/manifest.json") as f:
+        manifest = json.load(f)
+
+    workload = WorkloadMix(test_data, args.categories, rng=random.Random(args.seed))
+    implementations = build_implementations(client, args.implementations)
+    if args.stub:
+        # Correções simuladas pelo stub não devem ir para o estado persistido do gate do CoV
+        for impl in implementations.values():
+            if getattr(impl, "verification_gate", None) is not None:
+                impl.verification_gate.state_file = None
+    generator = LoadGenerator(implementations, manifest, workload, args.concurrency)
+    process_options = {"burst_period_s": args.burst_period, "burst_duty": args.burst_duty} \
+        if args.process == "bursty" else {}
+
+    print(f"🚦 Teste de carga: {args.process}, taxas {args.rates}/s, {args.duration:.0f}s por taxa, "
+          f"concorrência {args.concurrency}{' (stub)' if args.stub else ''}")
+    levels = generator.sweep(args.rates, args.duration, args.process, args.seed, **process_options)
+    print(format_curve(levels))
+
+    output = args.output or f"experiments/load_tests/load_{args.process}_{int(time.time())}.json"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"stub": args.stub, "implementations": args.implementations,
+                   "categories": args.categories, "levels": levels}, f, indent=2, ensure_ascii=False)
+    print(f"📄 Curva de saturação salva em: {output}")
+
+
+if __name__ == "__main__":
+    main()
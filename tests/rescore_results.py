@@ -0,0 +1,243 @@
+"""
+Reavaliação offline de resultados armazenados (sem chamar o LLM)
+
+Os arquivos test_results_*.json e cov_evaluation_*.json guardam a resposta
+bruta e a chamada de função de cada caso. Quando o TestEvaluator ou os
+critérios de config/test_cases.json mudam, este módulo aplica o rubric atual
+a todas as execuções históricas, em paralelo (um arquivo por processo), e
+grava as novas notas em experiments/rescored/ — custo zero de API.
+
+Uso:
+    python tests/rescore_results.py                      # todos os resultados em experiments/
+    python tests/rescore_results.py experiments/test_results_cov_1752209889.json --workers 4
+"""
+
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Any, Iterator, List, Optional, Sequence, Tuple, Union
+
+# Adiciona o diretório pai ao path para imports
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tests.evaluation_engine import EvaluationEngine, rubric_hash
+from src.core.experiment_catalog import ExperimentCatalog
+from src.core.event_log import get_event_logger
+
+log = get_event_logger("rescore")
+
+RESULT_PATTERNS = ("test_results_*.json", "cov_evaluation_*.json")
+DEFAULT_OUTPUT_DIR = "experiments/rescored"
+
+# Rubric carregado uma vez por processo de trabalho
+_worker_rubric: Optional[Tuple[Dict[str, Dict[str, Any]], str, EvaluationEngine]] = None
+
+
+def load_rubric(test_cases_path: Union[str, Path] = "config/test_cases.json") -> Tuple[Dict[str, Dict[str, Any]], str]:
+    """
+    Carrega os casos de teste atuais
+
+    Returns:
+        (casos por id, hash do rubric)
+    """
+    with open(test_cases_path, "r", encoding="utf-8") as f:
+        test_data = json.load(f)
+    test_cases = {case["id"]: case
+                  for category in test_data["test_cases"].values()
+                  for case in category["cases"]}
+    return test_cases, rubric_hash(test_data)
+
+
+def stored_runs(data: Dict[str, Any]) -> Iterator[Tuple[str, Dict[str, List[Dict[str, Any]]]]]:
+    """
+    Runs de um arquivo de resultados, nos dois formatos salvos pelo runner
+
+    Yields:
+        (implementação, {categoria: [registros]}) — os registros são os do próprio
+        dicionário, então podem ser atualizados no lugar
+    """
+    if "_metadata" in data:
+        # Um run: {categoria: [resultados], "_metadata": {...}}
+        yield (data["_metadata"].get("implementation", "unknown"),
+               {category: tests for category, tests in data.items() if isinstance(tests, list)})
+    else:
+        # Comparação: {implementação: {categoria: [resultados]}, "summary": {...}}
+        for implementation, categories in data.items():
+            if isinstance(categories, dict) and any(isinstance(tests, list) for tests in categories.values()):
+                yield implementation, {category: tests for category, tests in categories.items()
+                                       if isinstance(tests, list)}
+
+
+def _mean(values: Sequence[float]) -> float:
+    return sum(values) / len(values) if values else 0
+
+
+def rescore_data(data: Dict[str, Any], test_cases: Dict[str, Dict[str, Any]],
+                 engine: EvaluationEngine) -> Dict[str, Dict[str, Any]]:
+    """
+    Reavalia no lugar os registros de um arquivo de resultados
+
+    Registros sem resposta armazenada (arquivos antigos) ou de casos que não
+    existem mais no rubric são mantidos como estão e contados em "skipped".
+
+    Returns:
+        Resumo por implementação: registros reavaliados, ignorados, alterados e
+        taxa de sucesso/qualidade média antes e depois
+    """
+    summary = {}
+    for implementation, categories in stored_runs(data):
+        records = [record for tests in categories.values() for record in tests]
+        scorable = [record for record in records
+                    if "actual_response" in record and record.get("test_id") in test_cases]
+        before = [(record.get("success"), record.get("quality_score"), record.get("notes")) for record in scorable]
+        after = engine.evaluate_batch(test_cases, scorable)
+        for record, (success, quality_score, notes) in zip(scorable, after):
+            record.update(success=success, quality_score=quality_score, notes=notes)
+
+        summary[implementation] = {
+            "rescored": len(scorable),
+            "skipped": len(records) - len(scorable),
+            "changed": sum(1 for old, new in zip(before, after) if tuple(old) != tuple(new)),
+            "success_rate_before": _mean([bool(old[0]) for old in before]) * 100,
+            "success_rate_after": _mean([new[0] for new in after]) * 100,
+            "avg_quality_before": _mean([old[1] or 0 for old in before]),
+            "avg_quality_after": _mean([new[1] for new in after]),
+        }
+    return summary
+
+
+def _init_worker(test_cases_path: str):
+    global _worker_rubric
+    test_cases, rubric = load_rubric(test_cases_path)
+    _worker_rubric = (test_cases, rubric, EvaluationEngine())
+
+
+def _rescore_file(path: str, output_dir: str) -> Dict[str, Any]:
+    """Reavalia um arquivo e grava a versão reavaliada (executado nos processos de trabalho)"""
+    test_cases, rubric, engine = _worker_rubric
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    summary = rescore_data(data, test_cases, engine)
+    if not any(entry["rescored"] for entry in summary.values()):
+        # Arquivo antigo sem respostas armazenadas: nada a gravar
+        return {"source": path, "output": None, "implementations": summary, "runs": {}}
+
+    # O resumo comparativo salvo foi calculado com as notas antigas
+    data.pop("summary", None)
+    data["_rescore"] = {
+        "source": path,
+        "rubric_hash": rubric,
+        "original_rubric_hash": data.get("rubric_hash") or data.get("_metadata", {}).get("rubric_hash"),
+        "rescored_at": time.time(),
+        "implementations": summary,
+    }
+
+    output_path = Path(output_dir) / f"{Path(path).stem}.rescored_{rubric}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+
+    return {
+        "source": path,
+        "output": str(output_path),
+        "implementations": summary,
+        "runs": {implementation: categories for implementation, categories in stored_runs(data)},
+    }
+
+
+def find_result_files(experiments_dir: Union[str, Path] = "experiments") -> List[str]:
+    """Arquivos de resultados salvos pelo runner (não inclui os já reavaliados)"""
+    experiments_dir = Path(experiments_dir)
+    return sorted(str(path) for pattern in RESULT_PATTERNS for path in experiments_dir.glob(pattern))
+
+
+def rescore_files(paths: Sequence[Union[str, Path]],
+                  test_cases_path: Union[str, Path] = "config/test_cases.json",
+                  output_dir: Union[str, Path] = DEFAULT_OUTPUT_DIR,
+                  workers: Optional[int] = None,
+                  catalog: Optional[ExperimentCatalog] = None) -> List[Dict[str, Any]]:
+    """
+    Reavalia arquivos de resultados com o rubric atual
+
+    Args:
+        paths: Arquivos test_results_*.json / cov_evaluation_*.json
+        test_cases_path: Casos de teste (rubric) a aplicar
+        output_dir: Diretório dos arquivos reavaliados
+        workers: Processos paralelos (None = número de CPUs; 1 = no processo atual)
+        catalog: Se informado, registra os runs reavaliados como
+            "<arquivo>@<hash do rubric>"
+
+    Returns:
+        Um resumo por arquivo (origem, saída e contagens por implementação);
+        a saída é None para arquivos sem respostas armazenadas
+    """
+    paths = [str(path) for path in paths]
+    test_cases_path = str(test_cases_path)
+    output_dir = str(output_dir)
+
+    if workers == 1 or len(paths) <= 1:
+        _init_worker(test_cases_path)
+        outcomes = [_rescore_file(path, output_dir) for path in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(test_cases_path,)) as pool:
+            outcomes = list(pool.map(_rescore_file, paths, [output_dir] * len(paths)))
+
+    for outcome in outcomes:
+        runs = outcome.pop("runs")
+        if outcome["output"] is None:
+            continue
+        if catalog is not None:
+            experiment = Path(outcome["output"]).stem.replace(".rescored_", "@")
+            for implementation, results in runs.items():
+                catalog.add_test_results(experiment, implementation, results, outcome["output"], time.time())
+            catalog.add_artifact(experiment, "rescored_results", outcome["output"])
+        log.info("Resultados reavaliados", event="rescore.file", source=outcome["source"],
+                 output=outcome["output"],
+                 rescored=sum(s["rescored"] for s in outcome["implementations"].values()))
+    return outcomes
+
+
+def main():
+    """Linha de comando da reavaliação"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reavalia resultados armazenados com o rubric atual")
+    parser.add_argument("paths", nargs="*", help="Arquivos de resultados (padrão: todos em --dir)")
+    parser.add_argument("--dir", default="experiments", help="Diretório de experimentos")
+    parser.add_argument("--test-cases", default="config/test_cases.json", help="Casos de teste (rubric)")
+    parser.add_argument("--output-dir", default=DEFAULT_OUTPUT_DIR, help="Destino dos arquivos reavaliados")
+    parser.add_argument("--workers", type=int, default=None, help="Processos paralelos")
+    parser.add_argument("--no-catalog", action="store_true", help="Não registra no catálogo")
+    args = parser.parse_args()
+
+    paths = args.paths or find_result_files(args.dir)
+    if not paths:
+        print("Nenhum arquivo de resultados encontrado")
+        return
+
+    catalog = None if args.no_catalog else ExperimentCatalog(Path(args.dir) / "catalog.sqlite")
+    started = time.perf_counter()
+    outcomes = rescore_files(paths, args.test_cases, args.output_dir, args.workers, catalog)
+
+    for outcome in outcomes:
+        print(f"\n📄 {outcome['source']} → {outcome['output'] or 'nada a reavaliar'}")
+        for implementation, summary in outcome["implementations"].items():
+            if not summary["rescored"]:
+                print(f"   {implementation}: sem respostas armazenadas ({summary['skipped']} registros ignorados)")
+                continue
+            print(f"   {implementation}: {summary['rescored']} reavaliados, {summary['changed']} alterados, "
+                  f"{summary['skipped']} ignorados | sucesso {summary['success_rate_before']:.1f}% → "
+                  f"{summary['success_rate_after']:.1f}% | qualidade {summary['avg_quality_before']:.2f} → "
+                  f"{summary['avg_quality_after']:.2f}")
+    print(f"\n⏱️ {len(outcomes)} arquivos em {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
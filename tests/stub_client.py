@@ -0,0 +1,336 @@
+"""
+Cliente local que imita `client.chat.completions.create` do SDK da OpenAI
+
+Serve para testes de carga e experimentos sem custo: devolve objetos
+ChatCompletion reais do SDK (tool calls, JSON da verificação do CoV, texto),
+com latência simulada (lognormal + tempo por token de saída), capacidade
+limitada de requisições simultâneas (para produzir fila e saturação) e,
+opcionalmente, limite de requisições por minuto com erros 429, erros 500,
+chamadas travadas (cauda longa), o timeout por chamada do SDK e respostas
+em streaming (stream=True) que podem ser interrompidas com close().
+"""
+
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Dict, Any, List, Optional
+
+import httpx
+import openai
+from openai.types.chat import ChatCompletion, ChatCompletionChunk
+
+# Latência relativa por modelo (modelos maiores geram mais devagar)
+MODEL_LATENCY_FACTORS = {"gpt-4o": 2.0, "gpt-4o-mini": 1.0}
+
+# Palavras-chave usadas para escolher a função quando o tool_choice força uma chamada
+FUNCTION_KEYWORDS = {
+    "schedule_meeting": ("reunião", "meeting", "agendar"),
+    "generate_paper_quote": ("papel", "paper", "orçamento", "gsm", "folhas"),
+    "prank_dwight": ("pegadinha", "prank", "dwight"),
+}
+
+
+def _example_value(schema: Dict[str, Any]) -> Any:
+    """Valor válido de exemplo para o schema de um parâmetro"""
+    if "enum" in schema:
+        return schema["enum"][0]
+    if schema.get("type") == "integer":
+        return max(schema.get("minimum", 1), 100)
+    if schema.get("type") == "number":
+        return max(schema.get("minimum", 0), 20)
+    if schema.get("format") == "date":
+        return "2024-01-15"
+    if "pattern" in schema:
+        return "14:00"
+    return "vendas"
+
+
+class _StubStream:
+    """
+    Stream de ChatCompletionChunk do stub (stream=True)
+
+    Cada token de saída leva ms_per_output_token; close() interrompe a
+    geração como fechar a conexão com a API, e os tokens não gerados são
+    contados em StubChatClient.cancelled_tokens.
+    """
+
+    def __init__(self, client: "StubChatClient", completion: Dict[str, Any], per_token_s: float,
+                 include_usage: bool):
+        self._client = client
+        self._completion = completion
+        self._per_token_s = per_token_s
+        self._include_usage = include_usage
+        self._total = completion["usage"]["completion_tokens"]
+        self._emitted = 0
+        self._closed = False
+
+    def _chunk(self, choices: List[Dict[str, Any]], usage: Optional[Dict[str, Any]] = None) -> ChatCompletionChunk:
+        return ChatCompletionChunk.model_validate({
+            "id": self._completion["id"], "object": "chat.completion.chunk",
+            "created": self._completion["created"], "model": self._completion["model"],
+            "choices": choices, "usage": usage,
+        })
+
+    def __iter__(self):
+        choice = self._completion["choices"][0]
+        message = choice["message"]
+        if message.get("tool_calls"):
+            deltas = [{"role": "assistant", "tool_calls": [
+                {"index": index, **call} for index, call in enumerate(message["tool_calls"])
+            ]}]
+        else:
+            content = message.get("content") or ""
+            size = max(1, math.ceil(len(content) / self._total))
+            deltas = [{"content": content[start:start + size]} for start in range(0, len(content), size)] \
+                or [{"content": ""}]
+            deltas[0]["role"] = "assistant"
+        per_delta_s = self._per_token_s * self._total / max(1, len(deltas))
+        for delta in deltas:
+            if self._closed:
+                return
+            time.sleep(per_delta_s)
+            self._emitted += self._total / len(deltas)
+            yield self._chunk([{"index": 0, "delta": delta, "finish_reason": None}])
+        yield self._chunk([{"index": 0, "delta": {}, "finish_reason": choice["finish_reason"]}])
+        if self._include_usage:
+            yield self._chunk([], usage=self._completion["usage"])
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        with self._client._recent_lock:
+            self._client.cancelled_streams += 1
+            self._client.cancelled_tokens += max(0, round(self._total - self._emitted))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _Completions:
+    def __init__(self, client: "StubChatClient"):
+        self._client = client
+
+    def create(self, **kwargs) -> Any:
+        return self._client._create(**kwargs)
+
+
+class _Chat:
+    def __init__(self, client: "StubChatClient"):
+        self.completions = _Completions(client)
+
+
+class StubChatClient:
+    """
+    Substituto local do cliente OpenAI (apenas chat.completions.create)
+
+    Exemplo:
+        client = StubChatClient(latency_ms=400, capacity=8)
+        impl = FormUICoVReproduction(client, prompts, validator)
+    """
+
+    def __init__(self, latency_ms: float = 400.0, latency_sigma: float = 0.35,
+                 ms_per_output_token: float = 8.0, output_tokens: int = 60,
+                 capacity: Optional[int] = None, rpm_limit: Optional[int] = None,
+                 issue_rate: float = 0.2, error_rate: float = 0.0, stall_rate: float = 0.0,
+                 stall_factor: float = 10.0, model_latency: Optional[Dict[str, float]] = None,
+                 seed: Optional[int] = None):
+        """
+        Args:
+            latency_ms: Mediana do tempo até o primeiro token
+            latency_sigma: Dispersão (sigma) da lognormal da latência
+            ms_per_output_token: Tempo de geração por token de saída
+            output_tokens: Tamanho médio das respostas em tokens
+            capacity: Requisições atendidas simultaneamente (None = ilimitado);
+                as demais esperam na fila do "servidor"
+            rpm_limit: Requisições por minuto antes de responder 429 (None = sem limite)
+            issue_rate: Fração das verificações do CoV que apontam problemas
+            error_rate: Fração das chamadas que falham com erro 500
+            stall_rate: Fração das chamadas que demoram `stall_factor` vezes mais
+            stall_factor: Multiplicador da latência das chamadas travadas
+            model_latency: Multiplicador da latência por modelo (padrão: MODEL_LATENCY_FACTORS)
+            seed: Semente para resultados reprodutíveis
+        """
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.ms_per_output_token = ms_per_output_token
+        self.output_tokens = output_tokens
+        self.rpm_limit = rpm_limit
+        self.issue_rate = issue_rate
+        self.error_rate = error_rate
+        self.stall_rate = stall_rate
+        self.stall_factor = stall_factor
+        self.model_latency = MODEL_LATENCY_FACTORS if model_latency is None else model_latency
+        self.chat = _Chat(self)
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(capacity) if capacity else None
+        self._recent: deque = deque()
+        self._recent_lock = threading.Lock()
+        self._seen_prefixes: set = set()
+        self.requests = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+        self.timeouts = 0
+        self.cancelled_streams = 0
+        self.cancelled_tokens = 0
+
+    def _random(self) -> float:
+        with self._rng_lock:
+            return self._rng.random()
+
+    def _lognormal(self, median: float) -> float:
+        with self._rng_lock:
+            return self._rng.lognormvariate(math.log(median), self.latency_sigma)
+
+    def _check_rate_limit(self):
+        """Janela deslizante de 60s; acima do limite, responde como a API (429)"""
+        if self.rpm_limit is None:
+            return
+        now = time.monotonic()
+        with self._recent_lock:
+            while self._recent and now - self._recent[0] >= 60:
+                self._recent.popleft()
+            if len(self._recent) >= self.rpm_limit:
+                self.rate_limited += 1  # protegido pelo _recent_lock
+                response = httpx.Response(429, request=self._stub_request(), headers={"retry-after": "1"})
+                raise openai.RateLimitError("Rate limit reached (stub)", response=response, body=None)
+            self._recent.append(now)
+
+    @staticmethod
+    def _stub_request() -> httpx.Request:
+        return httpx.Request("POST", "https://stub.local/v1/chat/completions")
+
+    @staticmethod
+    def _text(messages: List[Dict[str, Any]]) -> str:
+        return " ".join(str(message.get("content") or "") for message in messages)
+
+    def _choose_function(self, messages: List[Dict[str, Any]], tools: List[Dict[str, Any]]) -> Dict[str, Any]:
+        user_text = " ".join(str(m.get("content") or "") for m in messages if m.get("role") == "user").lower()
+        by_name = {tool["function"]["name"]: tool["function"] for tool in tools}
+        for name, keywords in FUNCTION_KEYWORDS.items():
+            if name in by_name and any(keyword in user_text for keyword in keywords):
+                return by_name[name]
+        return tools[0]["function"]
+
+    def _verdict(self, schema: Dict[str, Any], has_issues: Optional[bool] = None) -> Dict[str, Any]:
+        """Veredito do crítico no formato do schema; aponta problemas com probabilidade issue_rate"""
+        if has_issues is None:
+            has_issues = self._random() < self.issue_rate
+        verdict = {}
+        for name, prop in schema["properties"].items():
+            types = prop["type"] if isinstance(prop["type"], list) else [prop["type"]]
+            if "enum" in prop:
+                verdict[name] = "medium" if has_issues and "medium" in prop["enum"] else prop["enum"][0]
+            elif "object" in types:
+                verdict[name] = self._verdict(prop, has_issues)
+            elif "boolean" in types:
+                verdict[name] = (not has_issues) if name == "function_correct" else has_issues
+            elif "array" in types:
+                verdict[name] = ["Resposta incompleta (stub)"] if has_issues else []
+            elif "integer" in types:
+                verdict[name] = 5 if has_issues else 8
+            elif "null" in types:
+                verdict[name] = None
+            else:
+                verdict[name] = "stub"
+        return verdict
+
+    def _message(self, kwargs: Dict[str, Any], completion_tokens: int) -> Dict[str, Any]:
+        messages = kwargs.get("messages", [])
+        tools = kwargs.get("tools")
+        if tools and kwargs.get("tool_choice") == "required":
+            function = self._choose_function(messages, tools)
+            properties = function.get("parameters", {}).get("properties", {})
+            arguments = {name: _example_value(schema) for name, schema in properties.items()}
+            return {"role": "assistant", "content": None, "tool_calls": [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(arguments)},
+            }]}
+        response_format = kwargs.get("response_format") or {}
+        if response_format.get("type") == "json_schema":
+            # Structured output: veredito que respeita o schema pedido
+            schema = response_format["json_schema"]["schema"]
+            return {"role": "assistant", "content": json.dumps(self._verdict(schema))}
+        system = next((str(m.get("content")) for m in messages if m.get("role") == "system"), "")
+        if "crítico" in system:
+            # Verificação do CoV: responde o JSON esperado pelo crítico
+            has_issues = self._random() < self.issue_rate
+            return {"role": "assistant", "content": json.dumps({
+                "has_issues": has_issues,
+                "issues": ["Resposta incompleta (stub)"] if has_issues else [],
+                "severity": "medium" if has_issues else "none",
+                "should_regenerate": has_issues,
+            })}
+        return {"role": "assistant",
+                "content": "Resposta simulada do DunderOps Assistant. " + "papel " * max(0, completion_tokens - 6)}
+
+    def _create(self, **kwargs) -> Any:
+        with self._recent_lock:
+            self.requests += 1
+        self._check_rate_limit()
+
+        messages = kwargs.get("messages", [])
+        prompt_tokens = max(1, len(self._text(messages)) // 4)
+        completion_tokens = max(1, int(self._lognormal(self.output_tokens)))
+        system = next((str(m.get("content")) for m in messages if m.get("role") == "system"), "")
+        cached_tokens = 0
+        with self._recent_lock:
+            if system in self._seen_prefixes and prompt_tokens >= 1024:
+                # Cache de prompt do provedor: prefixo repetido, em blocos de 128 tokens
+                cached_tokens = (len(system) // 4) // 128 * 128
+            self._seen_prefixes.add(system)
+
+        first_token_s = self._lognormal(self.latency_ms) / 1000
+        factor = self.model_latency.get(kwargs.get("model"), 1.0)
+        if self._random() < self.stall_rate:
+            factor *= self.stall_factor
+        per_token_s = self.ms_per_output_token / 1000 * factor
+        # Com stream, a chamada retorna no primeiro token e o resto sai pelo iterador
+        service_s = first_token_s * factor
+        if not kwargs.get("stream"):
+            service_s += completion_tokens * per_token_s
+        # Como o SDK: com `timeout`, desiste da chamada ao estourar o tempo
+        timeout = kwargs.get("timeout")
+        timed_out = isinstance(timeout, (int, float)) and service_s > timeout
+        if timed_out:
+            service_s = timeout
+        if self._slots is not None:
+            with self._slots:
+                time.sleep(service_s)
+        else:
+            time.sleep(service_s)
+
+        if timed_out:
+            with self._recent_lock:
+                self.timeouts += 1
+            raise openai.APITimeoutError(request=self._stub_request())
+        if self._random() < self.error_rate:
+            with self._recent_lock:
+                self.server_errors += 1
+            response = httpx.Response(500, request=self._stub_request())
+            raise openai.InternalServerError("Internal server error (stub)", response=response, body=None)
+
+        message = self._message(kwargs, completion_tokens)
+        completion = {
+            "id": f"chatcmpl-stub-{uuid.uuid4().hex[:12]}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": kwargs.get("model", "gpt-4o-mini"),
+            "choices": [{"index": 0, "message": message,
+                         "finish_reason": "tool_calls" if message.get("tool_calls") else "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens,
+                      "prompt_tokens_details": {"cached_tokens": cached_tokens}},
+        }
+        if kwargs.get("stream"):
+            include_usage = bool((kwargs.get("stream_options") or {}).get("include_usage"))
+            return _StubStream(self, completion, per_token_s, include_usage)
+        return ChatCompletion.model_validate(completion)
@@ -0,0 +1,140 @@
+"""
+Testes do gating adaptativo da verificação do CoV
+"""
+
+import atexit
+import json
+
+import pytest
+
+from src.core.metrics_tracker import MetricData
+from src.cov.adaptive_gating import VerificationGate, feature_keys, request_features
+from src.cov.chain_of_verification import CoVConfiguration
+
+QUOTE = "Orçamento de 500 folhas A4"
+
+
+@pytest.fixture
+def make_gate():
+    gates = []
+
+    def make(**options):
+        options.setdefault("exploration_rate", 0.0)
+        options.setdefault("min_samples", 5)
+        options.setdefault("seed", 0)
+        # Custo fixo de 0,4 por verificação de 400 tokens: fácil de comparar com o benefício
+        options.setdefault("token_cost_per_1k", 1.0)
+        options.setdefault("latency_cost_per_s", 0.0)
+        gate = VerificationGate(**options)
+        gates.append(gate)
+        return gate
+
+    yield make
+    for gate in gates:
+        # O flush de encerramento gravaria no diretório temporário já removido
+        atexit.unregister(gate.flush)
+
+
+def _metadata(corrected=False, tokens=400, latency_ms=1500.0, **extra):
+    return {"correction_applied": corrected, "verification_tokens_used": tokens,
+            "verification_latency_ms": latency_ms, **extra}
+
+
+def _train(gate, corrected, count=10, user_input=QUOTE, function="generate_paper_quote", **metadata):
+    for _ in range(count):
+        decision = gate.decide(user_input, function, "required")
+        gate.observe(decision.features, corrected, metadata.get("tokens", 400),
+                     metadata.get("latency_ms", 1500.0))
+
+
+def test_request_features_and_keys_go_from_specific_to_general():
+    features = request_features(QUOTE, "generate_paper_quote", "required")
+    assert features == {"function": "generate_paper_quote", "intent": "forced", "length": "short",
+                        "numbers": "digits"}
+    assert feature_keys(features) == ["generate_paper_quote|forced|short|digits",
+                                      "generate_paper_quote|forced", "generate_paper_quote", "*"]
+    assert request_features("oi " * 40, None, "auto")["length"] == "long"
+
+
+def test_cold_start_verifies_and_learned_rates_drive_the_decision(make_gate):
+    gate = make_gate()
+    assert gate.decide(QUOTE, "generate_paper_quote", "required").reason == "cold_start"
+
+    _train(gate, corrected=False)
+    skipped = gate.decide(QUOTE, "generate_paper_quote", "required")
+    assert (skipped.verify, skipped.reason) == (False, "skip")
+    assert skipped.stats_key == "generate_paper_quote|forced|short|digits"
+    assert skipped.expected_cost > skipped.expected_benefit
+
+    _train(gate, corrected=True, count=30)
+    assert gate.decide(QUOTE, "generate_paper_quote", "required").reason == "benefit"
+
+
+def test_sparse_group_falls_back_to_more_general_statistics(make_gate):
+    gate = make_gate()
+    _train(gate, corrected=False)
+    decision = gate.decide("Orçamento de papel, por favor", "generate_paper_quote", "required")
+    assert decision.stats_key == "generate_paper_quote|forced"
+
+
+def test_exploration_and_static_priority(make_gate):
+    gate = make_gate(exploration_rate=1.0)
+    _train(gate, corrected=False)
+    assert gate.decide(QUOTE, "generate_paper_quote", "required").reason == "explore"
+
+    config = CoVConfiguration()
+    config.function_specific_config["prank_dwight"]["correction_priority"] = "low"
+    low = make_gate(cov_config=config)
+    assert low.decide("Pegadinha no Dwight", "prank_dwight").reason == "priority"
+    assert make_gate(enabled=False).decide(QUOTE, "generate_paper_quote").reason == "disabled"
+
+
+def test_record_ignores_failed_verifications_and_corrections(make_gate):
+    gate = make_gate()
+    decision = gate.decide(QUOTE, "generate_paper_quote", "required")
+    gate.record(decision, _metadata(verification_result={"error": "timeout"}))
+    gate.record(decision, _metadata(corrected=False, correction_failed=True))
+    assert gate.stats == {}
+
+    gate.record(decision, _metadata(corrected=True))
+    assert gate.summary()["groups"]["*"]["correction_rate"] == 1.0
+
+
+def test_state_is_saved_periodically_and_flushed(make_gate, tmp_path):
+    state = tmp_path / "gate_state.json"
+    gate = make_gate(state_file=str(state), save_interval_s=3600)
+    decision = gate.decide(QUOTE, "generate_paper_quote", "required")
+    gate.record(decision, _metadata())
+    assert not state.exists()
+
+    gate.flush()
+    with open(state, encoding="utf-8") as f:
+        assert json.load(f)["stats"]["*"]["verifications"] == 1
+
+    eager = make_gate(state_file=str(tmp_path / "eager.json"), save_interval_s=0)
+    eager.record(decision, _metadata())
+    assert (tmp_path / "eager.json").exists()
+
+
+def test_state_round_trip_and_corrupt_file(make_gate, tmp_path):
+    gate = make_gate()
+    _train(gate, corrected=True, count=3)
+    gate.save(str(tmp_path / "state.json"))
+    restored = make_gate(state_file=str(tmp_path / "state.json"))
+    assert restored.summary()["groups"] == gate.summary()["groups"]
+
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_text("{nao json", encoding="utf-8")
+    assert make_gate(state_file=str(corrupt)).stats == {}
+
+
+def test_warm_start_uses_only_verified_executions(make_gate):
+    def metric(verified, corrected=False):
+        return MetricData(execution_id="x", timestamp="2026-01-01T00:00:00", implementation_type="cov",
+                          user_input=QUOTE, function_called="generate_paper_quote",
+                          verification_used=verified, correction_made=corrected,
+                          verification_tokens=300, verification_latency_ms=900.0)
+
+    gate = make_gate()
+    assert gate.warm_start([metric(True, True), metric(True), metric(False)]) == 2
+    assert gate.summary()["groups"]["generate_paper_quote"]["correction_rate"] == pytest.approx(0.5, abs=0.01)
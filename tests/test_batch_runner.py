@@ -0,0 +1,110 @@
+"""
+Testes do processamento em lote: leitura, dedupe, erros e retomada
+"""
+
+import json
+import threading
+import time
+
+import pytest
+
+from src.core.jsonl_segments import read_segments
+from tests.batch_runner import BatchRunner, read_requests
+
+
+class _EchoImplementation:
+    """Responde com o texto do pedido; falha nos pedidos listados em `failing`"""
+
+    def __init__(self, failing=(), delay_s=0.0):
+        self.failing = set(failing)
+        self.delay_s = delay_s
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def process_request(self, user_input, manifest, tracker):
+        with self._lock:
+            self.calls.append(user_input)
+        time.sleep(self.delay_s)
+        if user_input in self.failing:
+            raise RuntimeError("serviço indisponível")
+        tracker.track_api_call(10, 5)
+        return f"resposta: {user_input}"
+
+
+def _write_requests(path, records):
+    lines = [record if isinstance(record, str) else json.dumps(record, ensure_ascii=False) for record in records]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _results(base):
+    # Vale a última linha de cada id
+    return {record["id"]: record for record in read_segments(base.with_name(f"{base.name}_results"))}
+
+
+def test_read_requests_turns_invalid_lines_into_error_items(tmp_path):
+    path = _write_requests(tmp_path / "pedidos.jsonl", [
+        {"id": "a", "input": "oi"}, "", "{quebrado", "[1, 2]", {"id": "b"}, {"input": "sem id"},
+        {"request_id": 7, "body": "outro campo"},
+    ])
+    items = list(read_requests(path))
+    assert [(item.id, item.line, item.error is None) for item in items] == [
+        ("a", 1, True), ("line-3", 3, False), ("line-4", 4, False), ("b", 5, False), ("line-6", 6, True),
+        ("line-7", 7, False)]
+    assert "JSON inválido" in items[1].error
+    renamed = list(read_requests(path, id_field="request_id", input_field="body"))
+    assert (renamed[-1].id, renamed[-1].input) == ("7", "outro campo")
+
+
+def test_run_deduplicates_equal_inputs_and_records_errors(tmp_path):
+    path = _write_requests(tmp_path / "pedidos.jsonl", [
+        {"id": str(i), "input": text} for i, text in enumerate(
+            ["Orçamento de papel", "  Orçamento   de papel ", "falha", "Pegadinha", "Orçamento de papel"])
+    ] + ["{quebrado"])
+    implementation = _EchoImplementation(failing={"falha"}, delay_s=0.01)
+    base = tmp_path / "saida" / "noite"
+    summary = BatchRunner("original", implementation, {}, str(base), concurrency=4).run(read_requests(path))
+
+    assert sorted(implementation.calls) == ["Orçamento de papel", "Pegadinha", "falha"]
+    assert (summary["executed"], summary["deduplicated"], summary["errors"]) == (3, 2, 2)
+    results = _results(base)
+    assert len(results) == 6
+    assert results["1"]["duplicate_of"] == results["4"]["duplicate_of"] == "0"
+    assert results["1"]["response"] == "resposta: Orçamento de papel"
+    assert results["2"]["error"] == "RuntimeError: serviço indisponível"
+    assert results["line-6"]["error"].startswith("JSON inválido")
+    assert results["0"]["tokens"] == 15
+    assert summary["tokens"] == 30 and summary["latency_ms"]["count"] == 3
+    with open(base.with_name("noite_summary.json"), encoding="utf-8") as f:
+        assert json.load(f)["executed"] == 3
+    assert len(list(read_segments(base.with_name("noite_metrics")))) == 3
+
+
+def test_resume_skips_completed_ids_and_retries_errors(tmp_path):
+    path = _write_requests(tmp_path / "pedidos.jsonl", [
+        {"id": "a", "input": "Orçamento"}, {"id": "b", "input": "falha"}])
+    base = tmp_path / "noite"
+    BatchRunner("original", _EchoImplementation(failing={"falha"}), {}, str(base)).run(read_requests(path))
+    with pytest.raises(ValueError):
+        BatchRunner("original", _EchoImplementation(), {}, str(base))
+
+    extended = _write_requests(tmp_path / "mais.jsonl", [
+        {"id": "a", "input": "Orçamento"}, {"id": "b", "input": "falha"}, {"id": "c", "input": " Orçamento"}])
+    implementation = _EchoImplementation()
+    summary = BatchRunner("original", implementation, {}, str(base), resume=True).run(read_requests(extended))
+
+    assert implementation.calls == ["falha"]
+    assert (summary["skipped"], summary["executed"], summary["deduplicated"]) == (1, 1, 1)
+    results = _results(base)
+    assert results["b"]["error"] is None
+    assert results["c"]["duplicate_of"] == "a"
+
+
+def test_dedupe_can_be_disabled_and_concurrency_is_validated(tmp_path):
+    path = _write_requests(tmp_path / "pedidos.jsonl", [{"id": str(i), "input": "igual"} for i in range(3)])
+    implementation = _EchoImplementation()
+    summary = BatchRunner("original", implementation, {}, str(tmp_path / "noite"), dedupe=False).run(
+        read_requests(path))
+    assert (summary["executed"], summary["deduplicated"]) == (3, 0)
+    with pytest.raises(ValueError):
+        BatchRunner("original", implementation, {}, str(tmp_path / "outra"), concurrency=0)
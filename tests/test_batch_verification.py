@@ -0,0 +1,203 @@
+"""
+Testes da verificação do CoV em lote (backends local e Batch API)
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.cov.batch_verification import (
+    BATCH_ENDPOINT, BatchOutcome, BatchVerifier, LocalBatchBackend, OpenAIBatchBackend, VerificationItem
+)
+from src.core.token_budget import TokenBudget
+from src.cov.chain_of_verification import ChainOfVerification
+from tests.stub_client import StubChatClient
+
+QUOTE_CALL = {"name": "generate_paper_quote", "arguments": {"paper_size": "A4", "quantity": 500}}
+
+
+class _RecordingBackend:
+    """Backend que guarda os envios e devolve um erro por requisição"""
+
+    name = "recording"
+
+    def __init__(self):
+        self.chunks = []
+
+    def run(self, requests):
+        self.chunks.append(list(requests))
+        return {custom_id: BatchOutcome(error="indisponível") for custom_id in requests}
+
+
+class _FlakyBackend(_RecordingBackend):
+    """Backend cujo primeiro envio falha inteiro (como um lote que estoura o prazo)"""
+
+    def run(self, requests):
+        self.chunks.append(list(requests))
+        if len(self.chunks) == 1:
+            raise TimeoutError("Lote batch-1 não concluiu")
+        return {custom_id: BatchOutcome(error="indisponível") for custom_id in requests}
+
+
+class _FailingCompletions:
+    def create(self, **kwargs):
+        raise RuntimeError("conexão recusada")
+
+
+class _FakeBatchClient:
+    """Files e batches da OpenAI em memória: o lote conclui após `polls` consultas"""
+
+    def __init__(self, polls=2, status="completed", lines=None, error_lines=None):
+        self.polls = polls
+        self.final_status = status
+        self.files_by_id = {"out": "\n".join(lines or []), "err": "\n".join(error_lines or [])}
+        self.uploaded = None
+        self.retrieved = 0
+        self.cancelled = []
+        self.files = SimpleNamespace(create=self._upload, content=self._content)
+        self.batches = SimpleNamespace(create=self._create, retrieve=self._retrieve, cancel=self.cancelled.append)
+
+    def _upload(self, file, purpose):
+        self.uploaded = (file, purpose)
+        return SimpleNamespace(id="file-in")
+
+    def _content(self, file_id):
+        return SimpleNamespace(text=self.files_by_id[file_id])
+
+    def _batch(self, status):
+        done = status in ("completed", "failed", "expired", "cancelled")
+        return SimpleNamespace(id="batch-1", status=status, output_file_id="out" if done else None,
+                               error_file_id="err" if done else None)
+
+    def _create(self, input_file_id, endpoint, completion_window):
+        assert (input_file_id, endpoint) == ("file-in", BATCH_ENDPOINT)
+        return self._batch("validating")
+
+    def _retrieve(self, batch_id):
+        self.retrieved += 1
+        return self._batch(self.final_status if self.retrieved >= self.polls else "in_progress")
+
+
+def _completion_line(custom_id, verdict):
+    body = {"id": "c", "object": "chat.completion", "created": 0, "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(verdict)}}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 20, "total_tokens": 120}}
+    return json.dumps({"custom_id": custom_id, "response": {"status_code": 200, "body": body}})
+
+
+def _general_verdict(has_issues):
+    return {"has_issues": has_issues, "severity": "critical" if has_issues else "low",
+            "should_regenerate": has_issues, "context": {"type": "general"},
+            "unmet_criteria": [], "issues": ["errado"] if has_issues else [], "suggestions": []}
+
+
+@pytest.fixture
+def stub():
+    return StubChatClient(latency_ms=1, ms_per_output_token=0, issue_rate=1.0, seed=0)
+
+
+@pytest.fixture
+def cov(prompts, stub):
+    return ChainOfVerification(stub, prompts)
+
+
+def _items(count=3):
+    return [VerificationItem(str(i), f"pergunta {i}", "resposta inicial",
+                             QUOTE_CALL if i % 2 else None) for i in range(count)]
+
+
+def test_local_backend_returns_one_verdict_per_item(cov):
+    verifier = BatchVerifier(cov, LocalBatchBackend(cov.client, max_workers=2))
+    verdicts = verifier.verify(_items())
+    assert set(verdicts) == {"0", "1", "2"}
+    assert "function_correct" in verdicts["1"].result and "function_correct" not in verdicts["0"].result
+    assert all(verdict.result["has_issues"] for verdict in verdicts.values())
+    assert verdicts["0"].usage["phase"] == "verification"
+    assert verdicts["0"].latency_ms > 0
+
+
+def test_precomputed_verdict_skips_the_verification_call(cov, stub):
+    usage = {"phase": "verification", "model": "gpt-4o-mini", "input_tokens": 100, "output_tokens": 20,
+             "cached_tokens": 0}
+    _, metadata = cov.process_with_verification("pergunta", "resposta inicial",
+                                                verification_result=_general_verdict(True),
+                                                verification_usage=usage)
+    assert metadata["correction_applied"] is True
+    assert stub.requests == 1  # só a correção
+    assert metadata["api_calls"][0] is usage
+    assert metadata["verification_tokens_used"] > 120
+
+
+def test_failed_calls_keep_the_initial_response(cov, events):
+    backend = LocalBatchBackend(SimpleNamespace(chat=SimpleNamespace(completions=_FailingCompletions())))
+    verdicts = BatchVerifier(cov, backend).verify(_items(2))
+    assert verdicts["0"].result == {"has_issues": False, "error": "RuntimeError: conexão recusada",
+                                    "should_regenerate": False}
+    assert verdicts["0"].usage is None
+    assert len(events.named("cov.batch_item_error")) == 2
+
+
+def test_items_are_split_by_max_batch_size_and_ids_must_be_unique(cov):
+    backend = _RecordingBackend()
+    BatchVerifier(cov, backend, max_batch_size=2).verify(_items(5))
+    assert backend.chunks == [["0", "1"], ["2", "3"], ["4"]]
+    with pytest.raises(ValueError):
+        BatchVerifier(cov, backend).verify(_items(2) + _items(1))
+    with pytest.raises(ValueError):
+        BatchVerifier(cov, backend, max_batch_size=0)
+    with pytest.raises(ValueError):
+        LocalBatchBackend(cov.client, max_workers=0)
+
+
+def test_openai_backend_uploads_polls_and_reads_results(cov):
+    error_line = json.dumps({"custom_id": "1", "response": {"status_code": 400,
+                                                            "body": {"error": {"message": "modelo inválido"}}}})
+    client = _FakeBatchClient(polls=3, lines=[_completion_line("0", _general_verdict(True))],
+                              error_lines=[error_line])
+    sleeps = []
+    backend = OpenAIBatchBackend(client, poll_interval_s=5, sleep=sleeps.append)
+    verdicts = BatchVerifier(cov, backend).verify(_items(3))
+
+    (name, content), purpose = client.uploaded
+    lines = [json.loads(line) for line in content.decode("utf-8").splitlines()]
+    assert (name, purpose) == ("cov_verification.jsonl", "batch")
+    assert [line["custom_id"] for line in lines] == ["0", "1", "2"]
+    assert all(line["url"] == BATCH_ENDPOINT and line["method"] == "POST" for line in lines)
+    assert sleeps == [5, 5, 5]
+
+    assert verdicts["0"].result == _general_verdict(True)
+    assert verdicts["0"].usage["input_tokens"] == 100
+    assert verdicts["1"].result["error"] == "status 400: modelo inválido"
+    assert verdicts["2"].result["error"] == "sem resultado no lote (status completed)"
+
+
+def test_openai_backend_cancels_after_timeout(cov):
+    client = _FakeBatchClient(polls=10**6)
+    backend = OpenAIBatchBackend(client, timeout_s=0, sleep=lambda s: None)
+    with pytest.raises(TimeoutError):
+        backend.run({"0": {"model": "gpt-4o-mini"}})
+    assert client.cancelled == ["batch-1"]
+
+
+def test_from_config_selects_the_backend(cov, prompts):
+    local = BatchVerifier.from_config(cov, prompts)
+    assert isinstance(local.backend, LocalBatchBackend) and local.backend.max_workers == 16
+    remote = BatchVerifier.from_config(cov, prompts, backend="openai")
+    assert isinstance(remote.backend, OpenAIBatchBackend) and remote.backend.timeout_s == 86400
+    with pytest.raises(ValueError):
+        BatchVerifier.from_config(cov, prompts, backend="fila")
+
+
+def test_failed_chunk_settles_its_reservations_and_later_chunks_still_run(prompts, stub, events):
+    budget = TokenBudget(max_tenant_tokens=100_000, reserved_output_tokens=800)
+    cov = ChainOfVerification(stub, prompts, token_budget=budget, tenant_id="t")
+    backend = _FlakyBackend()
+    verdicts = BatchVerifier(cov, backend, max_batch_size=2).verify(_items(3))
+
+    assert backend.chunks == [["0", "1"], ["2"]]
+    assert verdicts["0"].result["error"] == "TimeoutError: Lote batch-1 não concluiu"
+    assert verdicts["2"].result["error"] == "indisponível"
+    assert budget.tenant_usage("t") == 0
+    assert len(events.named("cov.batch_chunk_error")) == 1
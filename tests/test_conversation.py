@@ -0,0 +1,139 @@
+"""
+Testes da memória de sessões: chaves, persistência e compactação do histórico
+"""
+
+import json
+
+import pytest
+
+from src.core.conversation import SUMMARY_HEADER, ConversationSession, SessionMemory, extractive_summary
+from src.core.token_budget import TokenEstimator
+
+
+@pytest.fixture
+def estimator():
+    # Heurística fixa: os testes não dependem de o tiktoken estar instalado
+    estimator = TokenEstimator()
+    estimator._encoding = None
+    return estimator
+
+
+@pytest.fixture
+def memory(tmp_path, estimator):
+    return SessionMemory(str(tmp_path), estimator=estimator)
+
+
+QUOTE_CALL = {"name": "generate_paper_quote", "arguments": {"sheets": 500, "paper_size": "A4"},
+              "result": {"total": 12.5, "itens": ["A4"] * 200}}
+
+
+def test_similar_codes_get_separate_sessions(memory):
+    # Chaves por hash do código: variações de acento não colidem
+    assert memory.session_key("José") != memory.session_key("Josá")
+    memory.record_turn(memory.load("José"), "oi", "olá, José")
+    assert memory.exists("José")
+    assert not memory.exists("Josá")
+    assert memory.load("Josá").turns == []
+    assert not memory.exists("")
+
+
+def test_new_session_ids_are_random_and_unknown_ids_do_not_exist(memory):
+    first, second = SessionMemory.new_session_id(), SessionMemory.new_session_id()
+    assert first != second and len(first) >= 20
+    assert not memory.exists(first)
+
+
+def test_turns_are_persisted_and_reloaded(memory, tmp_path, estimator):
+    session = memory.load("codigo")
+    memory.record_turn(session, "Orçamento de 500 folhas A4", "Total de R$ 12,50", tool_calls=[QUOTE_CALL])
+
+    reloaded = SessionMemory(str(tmp_path), estimator=estimator).load("codigo")
+    assert reloaded.to_dict() == session.to_dict()
+    call = reloaded.turns[0].tool_calls[0]
+    assert len(call["result"]) <= memory.max_tool_payload_chars + 1 and call["result"].endswith("…")
+
+    messages = memory.history_messages(reloaded)
+    assert [message["role"] for message in messages] == ["user", "assistant"]
+    assert messages[1]["content"].startswith('[função generate_paper_quote({"paper_size":"A4","sheets":500})')
+    assert messages[1]["content"].endswith("Total de R$ 12,50")
+
+
+def test_forget_removes_cache_and_file(memory, tmp_path):
+    memory.record_turn(memory.load("codigo"), "oi", "olá")
+    memory.forget("codigo")
+    assert not memory.exists("codigo")
+    assert list(tmp_path.iterdir()) == []
+    memory.forget("codigo")
+
+
+def test_session_cache_is_bounded_and_reloads_from_disk(tmp_path, estimator):
+    memory = SessionMemory(str(tmp_path), estimator=estimator, max_cached_sessions=2)
+    for code in ("a", "b", "c"):
+        memory.record_turn(memory.load(code), f"pergunta {code}", "resposta")
+    memory.load("b")  # "b" passa a ser a mais recente; a sessão nova "d" desloca "c"
+    memory.record_turn(memory.load("d"), "pergunta d", "resposta")
+
+    assert len(memory._sessions) == 2
+    assert set(memory._sessions) == {memory.session_key("b"), memory.session_key("d")}
+    assert memory.exists("a")
+    assert memory.load("a").turns[0].user == "pergunta a"
+    with pytest.raises(ValueError):
+        SessionMemory(None, max_cached_sessions=0)
+
+
+def test_corrupt_session_file_starts_over(memory, tmp_path, events):
+    (tmp_path / f"{memory.session_key('codigo')}.json").write_text("{quebrado", encoding="utf-8")
+    assert memory.load("codigo").turns == []
+    assert len(events.named("conversation.load_error")) == 1
+
+
+def test_history_is_compacted_into_a_summary_keeping_recent_turns(estimator, events):
+    memory = SessionMemory(None, history_token_budget=200, keep_recent_turns=2, summary_token_budget=60,
+                           estimator=estimator)
+    session = memory.load("codigo")
+    for i in range(8):
+        memory.record_turn(session, f"pergunta {i} " + "p" * 120, f"resposta {i} " + "r" * 120)
+        assert memory.history_tokens(session) <= 200 + 60
+
+    assert session.summarized_turns > 0
+    assert session.summarized_turns + len(session.turns) == 8
+    assert session.turns[-1].user.startswith("pergunta 7")
+    assert len(session.turns) >= 2
+    assert estimator.count_text(session.summary) <= 60
+    history = memory.history_messages(session)
+    assert history[0]["role"] == "system" and history[0]["content"].startswith(SUMMARY_HEADER)
+    assert events.named("conversation.compacted")
+
+
+def test_compaction_leaves_a_stable_prefix_between_compactions(estimator):
+    memory = SessionMemory(None, estimator=estimator)
+    session = memory.load("codigo")
+    snapshots = []
+    for i in range(30):
+        memory.record_turn(session, f"pergunta {i} " + "p" * 200, f"resposta {i} " + "r" * 200)
+        snapshots.append((session.summarized_turns, memory.history_messages(session)))
+
+    compactions = sorted({folded for folded, _ in snapshots} - {0})
+    assert len(compactions) >= 2
+    # Entre compactações o histórico só cresce no final, por vários turnos seguidos
+    stable = 0
+    for (folded, before), (folded_after, after) in zip(snapshots, snapshots[1:]):
+        if folded == folded_after:
+            assert after[:len(before)] == before
+            stable += 1
+    assert stable >= 3 * len(compactions)
+
+
+def test_extractive_summary_lists_questions_functions_and_answers():
+    session = ConversationSession.from_dict({"session_id": "s", "turns": [
+        {"user": "Orçamento de 500 folhas", "assistant": "Total R$ 12,50", "tool_calls": [QUOTE_CALL]}]})
+    summary = extractive_summary("- linha antiga", session.turns)
+    assert summary.splitlines()[0] == "- linha antiga"
+    assert summary.splitlines()[1] == ('- Usuário: Orçamento de 500 folhas | generate_paper_quote('
+                                       + json.dumps(QUOTE_CALL["arguments"], sort_keys=True, separators=(",", ":"))
+                                       + ') | Assistente: Total R$ 12,50')
+
+
+def test_invalid_compaction_ratio_is_rejected():
+    with pytest.raises(ValueError):
+        SessionMemory(None, compact_to_ratio=0)
@@ -0,0 +1,86 @@
+"""
+Testes do motor de avaliação compilado
+"""
+
+import json
+
+import pytest
+
+from tests.conftest import ROOT
+from tests.evaluation_engine import EvaluationEngine, PhraseMatcher, rubric_hash
+
+
+@pytest.fixture(scope="module")
+def test_data():
+    with open(ROOT / "config" / "test_cases.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("text", ["", "reunião urgente", "sem nada", "Michael e Dwight", "a+b (c)"])
+def test_phrase_matcher_matches_substring_semantics(text):
+    phrases = ("urgente", "Michael", "a+b", "(c)", "reunião u")
+    assert PhraseMatcher(phrases).matches(text) == any(phrase in text for phrase in phrases)
+    assert PhraseMatcher(()).matches(text) is False
+    assert PhraseMatcher(("",)).matches(text) is True
+
+
+def test_basic_success_rules():
+    engine = EvaluationEngine()
+    direct = engine.compile({"id": "direto", "expected_function": None})
+    assert direct.basic_success(None, False) and not direct.basic_success("prank_dwight", True)
+
+    incomplete = engine.compile({"id": "incompleto", "expected_function": "schedule_meeting",
+                                 "expected_success": False})
+    assert incomplete.basic_success("schedule_meeting", False)
+    assert not incomplete.basic_success("schedule_meeting", True)
+
+    complete = engine.compile({"id": "completo", "expected_function": "schedule_meeting"})
+    assert complete.basic_success("schedule_meeting", True)
+    assert not complete.basic_success("generate_paper_quote", True)
+
+
+def test_quality_scores_rubric_terms():
+    engine = EvaluationEngine()
+    case = {"id": "orcamento", "expected_function": "generate_paper_quote",
+            "should_mention": ["Folhas", "A4", "preço"], "error_type": "quantidade_invalida"}
+    compiled = engine.compile(case)
+    assert compiled.quality("curta") == 1
+    # 5 base + 2 (termos, limitado) + 2 (erro detectado)
+    assert compiled.quality("Valor inválido de folhas A4 e preço") == 9
+    assert compiled.quality("Resposta neutra sem termos") == 5
+
+
+def test_notes_and_batch_evaluation():
+    engine = EvaluationEngine()
+    cases = {"t1": {"id": "t1", "expected_function": "prank_dwight", "urgency_context": True}}
+    success, quality, notes = engine.evaluate(cases["t1"], "Pegadinha urgente no Dwight preparada!",
+                                              "prank_dwight", True)
+    assert success and quality >= 6
+    assert "✅ Função correta chamada" in notes and "✅ Urgência reconhecida" in notes
+
+    records = [{"test_id": "t1", "actual_response": "Pegadinha urgente!", "function_called": "prank_dwight",
+                "validation_passed": True},
+               {"test_id": "t1", "actual_response": None, "function_called": "none",
+                "validation_passed": False},
+               {"test_id": "t1", "actual_response": "Pegadinha urgente!", "function_called": "prank_dwight",
+                "validation_passed": True, "error_message": "timeout"}]
+    batch = engine.evaluate_batch(cases, records)
+    assert [result[0] for result in batch] == [True, False, False]
+    assert "❌ Nenhuma função chamada" in batch[1][2]
+
+
+def test_compiled_criteria_are_cached_per_case_object(test_data):
+    engine = EvaluationEngine()
+    case = next(iter(test_data["test_cases"].values()))["cases"][0]
+    assert engine.compile(case) is engine.compile(case)
+    assert engine.compile(dict(case)) is not engine.compile(case)
+
+
+def test_every_configured_case_compiles_and_rubric_hash_is_stable(test_data):
+    engine = EvaluationEngine()
+    for category in test_data["test_cases"].values():
+        for case in category["cases"]:
+            success, quality, _ = engine.evaluate(case, "resposta genérica qualquer do assistente", None, False)
+            assert 1 <= quality <= 10
+    assert rubric_hash(test_data) == rubric_hash(json.loads(json.dumps(test_data)))
+    assert len(rubric_hash(test_data)) == 16
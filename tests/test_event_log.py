@@ -0,0 +1,92 @@
+"""
+Testes do log de eventos estruturado
+"""
+
+import io
+import json
+import logging
+
+import pytest
+
+from src.core import event_log
+from src.core.event_log import (
+    JsonLineFormatter, SamplingFilter, configure_event_logging, dropped_events, get_event_logger
+)
+
+
+def _record(level=logging.INFO, event="teste.evento", **fields):
+    record = logging.LogRecord("dunderops.teste", level, __file__, 1, "mensagem %s", ("ok",), None)
+    record.event = event
+    record.fields = fields
+    return record
+
+
+@pytest.fixture
+def sink(tmp_path):
+    """Sink em arquivo temporário; restaura a configuração padrão no fim"""
+    path = tmp_path / "events.jsonl"
+
+    def read():
+        event_log.shutdown_event_logging()
+        return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+    configure_event_logging(level="DEBUG", path=str(path))
+    try:
+        yield read
+    finally:
+        configure_event_logging()
+
+
+def test_formatter_writes_one_json_object_per_record():
+    payload = json.loads(JsonLineFormatter().format(_record(tokens=3, nome="José")))
+    assert payload["level"] == "INFO"
+    assert payload["event"] == "teste.evento"
+    assert payload["message"] == "mensagem ok"
+    assert payload["tokens"] == 3 and payload["nome"] == "José"
+
+
+def test_sampling_filter_never_drops_warnings():
+    dropping = SamplingFilter(default_rate=0.0, sample_rates={"teste.mantido": 1.0})
+    assert not dropping.filter(_record())
+    assert dropping.filter(_record(event="teste.mantido"))
+    assert dropping.filter(_record(level=logging.WARNING))
+    assert SamplingFilter().filter(_record())
+
+
+def test_events_are_written_by_background_listener(sink):
+    log = get_event_logger("teste")
+    log.info("Chamada registrada", event="teste.chamada", tokens=10)
+    log.debug("Detalhe", event="teste.detalhe")
+    log.error("Falhou", event="teste.erro", error="boom")
+
+    lines = sink()
+    assert [line["event"] for line in lines] == ["teste.chamada", "teste.detalhe", "teste.erro"]
+    assert lines[0]["logger"] == "dunderops.teste" and lines[0]["tokens"] == 10
+    assert lines[2]["level"] == "ERROR" and lines[2]["error"] == "boom"
+
+
+def test_events_below_level_are_skipped():
+    stream = io.StringIO()
+    configure_event_logging(level="WARNING", stream=stream)
+    try:
+        get_event_logger("teste").info("Ignorado", event="teste.ignorado")
+        get_event_logger("teste").warning("Mantido", event="teste.mantido")
+        event_log.shutdown_event_logging()
+        events = [json.loads(line)["event"] for line in stream.getvalue().splitlines()]
+        assert events == ["teste.mantido"]
+    finally:
+        configure_event_logging()
+
+
+def test_full_queue_drops_and_counts_events():
+    configure_event_logging(level="INFO", stream=io.StringIO(), queue_size=1)
+    try:
+        # Para a thread de escrita para a fila encher
+        event_log._listener.stop()
+        log = get_event_logger("teste")
+        for _ in range(5):
+            log.info("Evento", event="teste.fila")
+        assert dropped_events() == 4
+    finally:
+        event_log._listener = None
+        configure_event_logging()
@@ -0,0 +1,113 @@
+"""
+Testes do catálogo SQLite de experimentos
+"""
+
+import json
+import time
+from datetime import datetime
+
+import pytest
+
+from src.core.experiment_catalog import ExperimentCatalog, metric_row, parse_time
+from src.core.jsonl_segments import JsonlSegmentWriter
+from src.core.metrics_tracker import MetricData
+
+
+def _metric(latency_ms, function=None, error=False, timestamp="2026-01-01T10:00:00", category=None):
+    return MetricData(execution_id="x", timestamp=timestamp, implementation_type="cov", user_input="oi",
+                      final_response="resposta completa", function_called=function,
+                      total_latency_ms=latency_ms, total_tokens=100, error_occurred=error,
+                      additional_metadata={"test_category": category} if category else {})
+
+
+@pytest.fixture
+def catalog(tmp_path):
+    return ExperimentCatalog(tmp_path / "catalog.sqlite")
+
+
+def test_parse_time_accepts_epoch_iso_and_relative():
+    assert parse_time(None) is None
+    assert parse_time(12.5) == 12.5
+    assert parse_time("2026-01-15") == datetime(2026, 1, 15).timestamp()
+    assert parse_time("2h") == pytest.approx(time.time() - 7200, abs=5)
+    with pytest.raises(ValueError):
+        parse_time("ontem")
+
+
+def test_success_counts_direct_answers_and_excludes_errors():
+    assert metric_row(_metric(10), 0)["success"] == 1
+    assert metric_row(_metric(10, function="prank_dwight"), 0)["success"] == 1
+    assert metric_row(_metric(10, error=True), 0)["success"] == 0
+    assert metric_row(_metric(10).to_dict(), 0)["ts"] == datetime(2026, 1, 1, 10).timestamp()
+
+
+def test_metric_category_comes_from_the_test_case_metadata(catalog):
+    catalog.add_metrics("exp1", "cov", [_metric(100, category="complete_params"), _metric(300),
+                                        _metric(200, category="direct_responses")], source="a")
+    catalog.add_metrics("exp1", "original", [_metric(80)], source="b", category="load_test")
+
+    rows = catalog.aggregate(group_by="category")
+    assert {row["category"]: row["count"] for row in rows} == {
+        None: 1, "complete_params": 1, "direct_responses": 1, "load_test": 1}
+    assert [row["latency_ms"] for row in catalog.executions(category="complete_params")] == [100.0]
+
+
+def test_aggregate_groups_filters_and_percentiles(catalog):
+    catalog.add_metrics("exp1", "cov", [_metric(100, "generate_paper_quote"), _metric(300, "generate_paper_quote"),
+                                        _metric(50, error=True)], source="a")
+    catalog.add_metrics("exp1", "original", [_metric(80)], source="b")
+
+    rows = catalog.aggregate(group_by="implementation", quantiles=(0.5,))
+    assert [row["implementation"] for row in rows] == ["cov", "original"]
+    cov = rows[0]
+    assert cov["count"] == 3
+    assert cov["success_rate"] == pytest.approx(200 / 3)
+    assert cov["latency_ms_p50"] == 100.0
+
+    quotes = catalog.aggregate(implementation="cov", function="generate_paper_quote")
+    assert quotes[0]["count"] == 2 and quotes[0]["avg_latency_ms"] == 200.0
+    assert len(catalog.executions(success=False)) == 1
+    assert catalog.executions(since="2026-01-02") == []
+
+    with pytest.raises(ValueError):
+        catalog.aggregate(group_by="user_input")
+    with pytest.raises(ValueError):
+        catalog.aggregate(metric="1; DROP TABLE executions")
+
+
+def test_registering_same_run_replaces_executions(catalog):
+    catalog.add_metrics("exp1", "cov", [_metric(100), _metric(200)], source="a")
+    catalog.add_metrics("exp1", "cov", [_metric(300)], source="a")
+    assert catalog.stats()["executions"] == 1
+    assert catalog.experiments()[0]["runs"] == 1
+
+
+def test_remove_experiment_cascades_and_returns_artifacts(catalog, tmp_path):
+    catalog.add_metrics("exp1", "cov", [_metric(100)], source="a")
+    catalog.add_artifact("exp1", "report", tmp_path / "exp1_report.txt")
+    assert catalog.remove_experiment("exp1") == [str(tmp_path / "exp1_report.txt")]
+    assert catalog.stats() == {"experiments": 0, "runs": 0, "executions": 0, "artifacts": 0}
+
+
+def test_index_directory_reads_results_segments_and_artifacts(catalog, tmp_path):
+    experiments = tmp_path / "experiments"
+    (experiments / "reports").mkdir(parents=True)
+    (experiments / "reports" / "exp1_report.txt").write_text("relatório", encoding="utf-8")
+    results = {"function_calling": [{"test_id": "t1", "success": True, "execution_time_ms": 120.0,
+                                     "tokens_used": 300, "quality_score": 0.9}],
+               "_metadata": {"implementation": "cov", "timestamp": 1_700_000_000}}
+    (experiments / "test_results_exp1.json").write_text(json.dumps(results), encoding="utf-8")
+    with JsonlSegmentWriter(experiments / "raw_data" / "exp1_cov_metrics", max_segment_bytes=10) as writer:
+        for latency in (100, 200, 300):
+            writer.write(_metric(latency).to_dict())
+
+    counts = catalog.index_directory(experiments)
+    assert counts == {"runs": 2, "artifacts": 5}
+    # Resultados de teste são registrados pelo nome do arquivo; segmentos, pelo prefixo do experimento
+    assert catalog.aggregate(experiment="test_results_exp1", category="function_calling")[0]["count"] == 1
+    assert catalog.aggregate(experiment="exp1", implementation="cov")[0]["count"] == 3
+    assert {artifact["kind"] for artifact in catalog.artifacts("exp1")} == {"raw_metrics", "report"}
+
+    # Reindexar não duplica execuções
+    catalog.index_directory(experiments)
+    assert catalog.stats()["executions"] == 4
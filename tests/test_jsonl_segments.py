@@ -0,0 +1,78 @@
+"""
+Testes dos segmentos JSONL append-only
+"""
+
+import gzip
+
+import pytest
+
+from src.core.jsonl_segments import JsonlSegmentWriter, read_jsonl, read_segments, segment_paths
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_records_round_trip(tmp_path, compression):
+    base = tmp_path / "raw" / "exp"
+    records = [{"execution_id": f"e{i}", "user_input": "Orçamento ç", "tokens": i} for i in range(5)]
+    with JsonlSegmentWriter(base, compression=compression) as writer:
+        for record in records:
+            writer.write(record)
+    assert writer.records_written == 5
+    assert list(read_segments(base)) == records
+
+
+def test_rotation_creates_ordered_segments(tmp_path):
+    base = tmp_path / "exp"
+    with JsonlSegmentWriter(base, max_segment_bytes=40) as writer:
+        for i in range(6):
+            writer.write({"i": i, "texto": "x" * 30})
+    paths = segment_paths(base)
+    assert len(paths) == 6 and paths == writer.segments
+    assert [path.name for path in paths[:2]] == ["exp.00000.jsonl", "exp.00001.jsonl"]
+    assert [record["i"] for record in read_segments(base)] == list(range(6))
+
+
+def test_rerun_replaces_previous_segments(tmp_path):
+    base = tmp_path / "exp"
+    with JsonlSegmentWriter(base, max_segment_bytes=20) as writer:
+        for i in range(4):
+            writer.write({"run": 1, "i": i})
+    with JsonlSegmentWriter(base) as writer:
+        writer.write({"run": 2})
+    assert list(read_segments(base)) == [{"run": 2}]
+    assert len(segment_paths(base)) == 1
+
+
+@pytest.mark.parametrize("compression", [None, "gzip"])
+def test_append_resumes_last_segment(tmp_path, compression):
+    base = tmp_path / "exp"
+    with JsonlSegmentWriter(base, compression=compression) as writer:
+        writer.write({"i": 0})
+    with JsonlSegmentWriter(base, compression=compression, append=True) as writer:
+        writer.write({"i": 1})
+    assert [record["i"] for record in read_segments(base)] == [0, 1]
+    assert len(segment_paths(base)) == 1
+
+
+def test_segment_paths_do_not_match_other_prefixes(tmp_path):
+    with JsonlSegmentWriter(tmp_path / "exp") as writer:
+        writer.write({"de": "exp"})
+    with JsonlSegmentWriter(tmp_path / "exp_cov") as writer:
+        writer.write({"de": "exp_cov"})
+    assert list(read_segments(tmp_path / "exp")) == [{"de": "exp"}]
+    assert segment_paths(tmp_path / "inexistente" / "exp") == []
+
+
+def test_truncated_segments_yield_complete_records(tmp_path):
+    plain = tmp_path / "plain.00000.jsonl"
+    plain.write_text('{"i":0}\n{"i":1}\n{"i":', encoding="utf-8")
+    assert list(read_jsonl(plain)) == [{"i": 0}, {"i": 1}]
+
+    compressed = tmp_path / "gz.00000.jsonl.gz"
+    data = gzip.compress(b'{"i":0}\n{"i":1}\n')
+    compressed.write_bytes(data[:-6])  # sem o trailer
+    assert list(read_jsonl(compressed))[:1] == [{"i": 0}]
+
+
+def test_invalid_compression_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        JsonlSegmentWriter(tmp_path / "exp", compression="bz2")
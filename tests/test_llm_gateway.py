@@ -0,0 +1,154 @@
+"""
+Testes do controle de taxa e de concorrência das chamadas ao LLM
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from src.core.llm_gateway import (
+    AdaptiveConcurrency, GovernedClient, RateGovernor, RateLimiter, TokenBucket
+)
+from src.core.resilience import Deadline, DeadlineExceeded
+
+
+def _response(total_tokens=100):
+    return SimpleNamespace(usage=SimpleNamespace(total_tokens=total_tokens))
+
+
+def _rate_limit_error(retry_after="2"):
+    request = httpx.Request("POST", "https://stub.local/v1/chat/completions")
+    response = httpx.Response(429, request=request, headers={"retry-after": retry_after})
+    return openai.RateLimitError("Rate limit", response=response, body=None)
+
+
+def _governor(**concurrency):
+    return RateGovernor(limiter=RateLimiter(requests_per_minute=None, tokens_per_minute=None),
+                        concurrency=AdaptiveConcurrency(**concurrency))
+
+
+def test_token_bucket_reserves_and_refunds():
+    bucket = TokenBucket(per_minute=60, burst_seconds=2)  # 1 ficha/s, capacidade 2
+    now = time.monotonic()
+    assert bucket.reserve(2, now) == 0
+    assert bucket.reserve(1, now) == pytest.approx(1.0)
+    bucket.adjust(1, now)
+    assert bucket.level == pytest.approx(0)
+    assert bucket.reserve(1, now + 0.5) == pytest.approx(0.5)
+    with pytest.raises(ValueError):
+        TokenBucket(0)
+
+
+def test_rate_limiter_refunds_reservation_past_the_deadline():
+    limiter = RateLimiter(requests_per_minute=60, tokens_per_minute=None, burst_seconds=1)
+    assert limiter.acquire(10) == 0
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(10, timeout=0.05)
+    assert limiter.requests.level == pytest.approx(0, abs=0.1)  # a reserva recusada foi devolvida
+    assert limiter.waited_s == 0
+
+
+def test_rate_limiter_settles_tokens_and_pauses():
+    limiter = RateLimiter(requests_per_minute=None, tokens_per_minute=600, burst_seconds=10)  # 100 fichas
+    limiter.acquire(80)
+    limiter.settle(reserved_tokens=80, actual_tokens=30)
+    assert limiter.tokens.level == pytest.approx(70, abs=1)
+    limiter.pause(10)
+    with pytest.raises(DeadlineExceeded):
+        limiter.acquire(1, timeout=0.05)
+
+
+def test_adaptive_concurrency_waits_until_timeout_or_release():
+    concurrency = AdaptiveConcurrency(initial=1, minimum=1, maximum=4)
+    concurrency.acquire()
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        concurrency.acquire(timeout=0.05)
+    assert 0.04 <= time.monotonic() - started < 1
+
+    threading.Timer(0.05, concurrency.release).start()
+    concurrency.acquire(timeout=2)
+    assert concurrency.in_flight == 1
+
+
+def test_adaptive_concurrency_aimd():
+    concurrency = AdaptiveConcurrency(initial=4, minimum=1, maximum=8, decrease_interval_s=0)
+    for _ in range(20):
+        concurrency.on_success(100)
+    assert concurrency.limit > 4
+    grown = concurrency.limit
+    concurrency.on_overload()
+    assert concurrency.limit == pytest.approx(grown / 2)
+    concurrency.on_success(10_000)  # latência recente muito acima da referência
+    assert concurrency.limit < grown / 2
+    with pytest.raises(ValueError):
+        AdaptiveConcurrency(initial=0)
+
+
+def test_governor_call_settles_usage_and_counts():
+    governor = _governor()
+    requests = []
+    response = governor.call(lambda **request: requests.append(request) or _response(),
+                             {"messages": [{"role": "user", "content": "oi"}], "max_tokens": 50})
+    assert response.usage.total_tokens == 100
+    assert requests == [{"messages": [{"role": "user", "content": "oi"}], "max_tokens": 50}]
+    assert governor.stats()["calls"] == 1 and governor.concurrency.in_flight == 0
+
+
+def test_governor_deadline_on_concurrency_wait_releases_rate_reservation(events):
+    governor = RateGovernor(limiter=RateLimiter(requests_per_minute=60, tokens_per_minute=None,
+                                                burst_seconds=2),
+                            concurrency=AdaptiveConcurrency(initial=1))
+    governor.concurrency.acquire()  # outra chamada ocupa a única vaga
+    with pytest.raises(DeadlineExceeded):
+        governor.call(lambda **request: _response(), {"messages": []}, Deadline(0.05, name="first_completion"))
+    assert governor.deadline_exceeded == 1
+    assert governor.limiter.requests.level == pytest.approx(2, abs=0.1)
+    assert events.named("llm_gateway.deadline_exceeded")[0].fields["stage"] == "concurrency"
+
+
+def test_governor_start_deadline_does_not_send_and_frees_slot():
+    governor = _governor(initial=1)
+    sent = []
+
+    def start(request):
+        raise DeadlineExceeded("fila consumiu o prazo")
+
+    with pytest.raises(DeadlineExceeded):
+        governor.call(lambda **request: sent.append(request), {"messages": []}, start=start)
+    assert sent == [] and governor.deadline_exceeded == 1
+    assert governor.concurrency.in_flight == 0
+
+
+def test_governor_pauses_on_provider_rate_limit():
+    governor = _governor(initial=4)
+
+    def create(**request):
+        raise _rate_limit_error("3")
+
+    with pytest.raises(openai.RateLimitError):
+        governor.call(create, {"messages": []})
+    assert governor.rate_limited == 1
+    assert governor.concurrency.limit == 2
+    assert governor.limiter._paused_until - time.monotonic() == pytest.approx(3, abs=0.5)
+    assert governor.concurrency.in_flight == 0
+
+
+def test_governed_client_routes_create_and_passes_other_attributes():
+    calls = []
+    completions = SimpleNamespace(create=lambda **request: calls.append(request) or _response(), other="x")
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions), api_key="k")
+    governed_client = GovernedClient(client, _governor())
+
+    governed_client.chat.completions.create(model="gpt-4o-mini", messages=[])
+    assert calls == [{"model": "gpt-4o-mini", "messages": []}]
+    assert governed_client.api_key == "k" and governed_client.chat.completions.other == "x"
+    assert governed_client.governor.calls == 1
+
+
+def test_shared_governor_is_per_config(prompts):
+    assert RateGovernor.shared(prompts) is RateGovernor.shared(prompts)
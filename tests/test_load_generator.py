@@ -0,0 +1,106 @@
+"""
+Testes do gerador de carga em malha aberta e do cliente simulado
+"""
+
+import json
+import random
+
+import openai
+import pytest
+
+from src.core.function_validator import FunctionValidator
+from tests.conftest import ROOT
+from tests.faithful_implementations import FormUIOriginalReproduction
+from tests.load_generator import LoadGenerator, RequestRecord, WorkloadMix, arrival_times, summarize
+from tests.stub_client import StubChatClient
+
+
+@pytest.fixture(scope="module")
+def test_data():
+    with open(ROOT / "config" / "test_cases.json", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize("process", ["poisson", "bursty", "constant"])
+def test_arrival_times_have_the_requested_mean_rate(process):
+    times = arrival_times(50, 100, process, rng=random.Random(1))
+    assert times == sorted(times)
+    assert all(0 <= t < 100 for t in times)
+    assert len(times) == pytest.approx(5000, rel=0.05)
+
+
+def test_bursty_arrivals_only_happen_in_the_on_window():
+    times = arrival_times(10, 50, "bursty", burst_period_s=10, burst_duty=0.2, rng=random.Random(2))
+    assert all(t % 10 < 2 for t in times)
+    with pytest.raises(ValueError):
+        arrival_times(0, 10)
+    with pytest.raises(ValueError):
+        arrival_times(1, 10, "uniforme")
+
+
+def test_workload_mix_respects_categories_and_weights(test_data):
+    mix = WorkloadMix(test_data, categories=["direct_responses", "complete_params"],
+                      weights={"complete_params": 0}, rng=random.Random(3))
+    direct_ids = {case["id"] for case in test_data["test_cases"]["direct_responses"]["cases"]}
+    assert all(mix.sample()["id"] in direct_ids for _ in range(50))
+    with pytest.raises(ValueError):
+        WorkloadMix(test_data, categories=["inexistente"])
+
+
+def test_summarize_separates_queue_delay_and_errors():
+    records = [RequestRecord("cov", "t", "c", 0.0, queue_delay_ms=q, service_ms=100, response_ms=100 + q,
+                             tokens=50) for q in (0, 10, 20)]
+    records.append(RequestRecord("cov", "t", "c", 0.0, 500, 5, 505, 0, error="APITimeoutError"))
+    summary = summarize(records, elapsed_s=2.0, duration_s=1.0)["cov"]
+    assert (summary["requests"], summary["errors"], summary["error_rate"]) == (4, 1, 25.0)
+    assert summary["offered_rate"] == 4 and summary["throughput"] == 1.5
+    assert summary["service_ms"]["count"] == 3
+    assert summary["queue_delay_ms"]["count"] == 4  # espera na fila conta também para as que falharam
+
+
+def test_stub_client_answers_like_the_sdk():
+    client = StubChatClient(latency_ms=1, ms_per_output_token=0, seed=0)
+    response = client.chat.completions.create(model="gpt-4o-mini",
+                                              messages=[{"role": "user", "content": "oi"}])
+    assert response.choices[0].message.content.startswith("Resposta simulada")
+    assert response.usage.completion_tokens > 0
+
+    tools = [{"type": "function", "function": {"name": "prank_dwight", "parameters": {
+        "type": "object", "properties": {"prank_type": {"type": "string", "enum": ["gelatina"]}}}}}]
+    call = client.chat.completions.create(model="gpt-4o-mini", tools=tools, tool_choice="required",
+                                          messages=[{"role": "user", "content": "pegadinha"}])
+    arguments = json.loads(call.choices[0].message.tool_calls[0].function.arguments)
+    assert arguments == {"prank_type": "gelatina"}
+
+
+def test_stub_client_rate_limit_errors_and_timeouts():
+    limited = StubChatClient(latency_ms=1, ms_per_output_token=0, rpm_limit=1)
+    limited.chat.completions.create(messages=[])
+    with pytest.raises(openai.RateLimitError):
+        limited.chat.completions.create(messages=[])
+    assert limited.rate_limited == 1
+
+    failing = StubChatClient(latency_ms=1, ms_per_output_token=0, error_rate=1.0)
+    with pytest.raises(openai.InternalServerError):
+        failing.chat.completions.create(messages=[])
+
+    slow = StubChatClient(latency_ms=200, latency_sigma=0.01, ms_per_output_token=0)
+    with pytest.raises(openai.APITimeoutError):
+        slow.chat.completions.create(messages=[], timeout=0.01)
+    assert slow.timeouts == 1
+
+
+def test_load_generator_runs_a_level_against_the_stub(prompts, test_data):
+    client = StubChatClient(latency_ms=2, ms_per_output_token=0, seed=4)
+    implementation = FormUIOriginalReproduction(client, prompts, FunctionValidator(prompts))
+    with open(ROOT / "config" / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    generator = LoadGenerator({"original": implementation}, manifest,
+                              WorkloadMix(test_data, rng=random.Random(5)), concurrency=4)
+
+    level = generator.run(rate=100, duration_s=0.2, process="constant", seed=6)
+    summary = level["implementations"]["original"]
+    assert summary["requests"] == 20
+    assert summary["errors"] == 0
+    assert summary["response_ms"]["count"] == 20
+    assert "original" in level["phases"]
@@ -0,0 +1,86 @@
+"""
+Testes do MessageBuilder: prefixo estável e ordem das mensagens
+"""
+
+from types import SimpleNamespace
+
+from src.core.message_builder import MessageBuilder, canonical_json, canonicalize_tools, get_cached_tokens
+from src.core.token_budget import TokenBudget
+
+
+def _tool(name, **properties):
+    return {"type": "function", "function": {"name": name, "parameters": {"type": "object", "properties": properties}}}
+
+
+def test_canonical_json_is_independent_of_key_order():
+    assert canonical_json({"b": 1, "a": "ç"}) == canonical_json({"a": "ç", "b": 1}) == '{"a":"ç","b":1}'
+
+
+def test_canonicalize_tools_sorts_by_name_and_keys():
+    tools = [_tool("zeta", y={"type": "string"}, x={"type": "integer"}), _tool("alpha")]
+    canonical = canonicalize_tools(tools)
+    assert [tool["function"]["name"] for tool in canonical] == ["alpha", "zeta"]
+    assert list(canonical[1]["function"]["parameters"]["properties"]) == ["x", "y"]
+    assert canonical_json(canonicalize_tools(list(reversed(tools)))) == canonical_json(canonical)
+
+
+def test_get_cached_tokens_accepts_objects_dicts_and_old_sdks():
+    assert get_cached_tokens(None) == 0
+    assert get_cached_tokens(SimpleNamespace(prompt_tokens=10)) == 0
+    assert get_cached_tokens(SimpleNamespace(prompt_tokens_details=SimpleNamespace(cached_tokens=7))) == 7
+    assert get_cached_tokens({"prompt_tokens_details": {"cached_tokens": 5}}) == 5
+
+
+def test_initial_messages_keep_static_prefix_first(prompts):
+    builder = MessageBuilder(prompts, {"tools": [_tool("b"), _tool("a")]})
+    history = [{"role": "user", "content": "antes"}, {"role": "assistant", "content": "ok"}]
+    first = builder.initial_messages("pergunta 1", history)
+    second = builder.initial_messages("pergunta 2", history)
+
+    assert first[0] == {"role": "system", "content": prompts.system_prompt}
+    assert first[1:3] == history
+    assert first[-1] == {"role": "user", "content": "pergunta 1"}
+    assert first[:-1] == second[:-1]
+    assert [tool["function"]["name"] for tool in builder.tools] == ["a", "b"]
+
+
+def test_tool_result_messages_pair_call_and_result(prompts):
+    builder = MessageBuilder(prompts)
+    call = SimpleNamespace(id="call_1", function=SimpleNamespace(name="prank_dwight", arguments="{}"))
+    messages = builder.tool_result_messages("pergunta", call, "prank_dwight", {"b": 2, "a": 1})
+
+    assert messages[0]["content"] == prompts.final_system_prompt
+    assert messages[-2] == {"role": "assistant", "content": None, "tool_calls": [call]}
+    assert messages[-1] == {"role": "tool", "tool_call_id": "call_1", "name": "prank_dwight",
+                            "content": '{"a":1,"b":2}'}
+
+
+def test_static_first_messages_put_variable_context_last():
+    messages = MessageBuilder.static_first_messages("persona", "  instruções  ", "  contexto  ")
+    assert messages == [{"role": "system", "content": "persona\n\ninstruções"},
+                        {"role": "user", "content": "contexto"}]
+
+
+def test_budget_reservation_is_settled_with_actual_usage(prompts):
+    budget = TokenBudget(max_tenant_tokens=100_000, reserved_output_tokens=800)
+    builder = MessageBuilder(prompts, token_budget=budget, tenant_id="t")
+    builder.initial_messages("pergunta")
+    assert builder.last_estimated_tokens > 0
+    assert budget.tenant_usage("t") == builder.last_estimated_tokens + 800
+
+    builder.settle(SimpleNamespace(prompt_tokens=120, completion_tokens=30))
+    assert budget.tenant_usage("t") == 150
+    assert builder.last_reservation is None
+
+
+def test_failed_call_returns_the_whole_reservation(prompts):
+    budget = TokenBudget(max_tenant_tokens=100_000, reserved_output_tokens=800)
+    builder = MessageBuilder(prompts, token_budget=budget, tenant_id="t")
+    try:
+        with builder.settle_on_error():
+            builder.initial_messages("pergunta")
+            raise TimeoutError("prazo esgotado")
+    except TimeoutError:
+        pass
+    assert budget.tenant_usage("t") == 0
+    assert builder.last_reservation is None
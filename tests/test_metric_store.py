@@ -0,0 +1,123 @@
+"""
+Testes do MetricStore colunar
+"""
+
+import numpy as np
+import pytest
+
+from src.core.metric_store import MetricStore
+from src.core.metrics_tracker import MetricData, MetricsAnalyzer
+
+
+def _metrics():
+    return [
+        MetricData(execution_id="e1", timestamp="2026-01-01T10:00:00", implementation_type="original",
+                   user_input="Orçamento de 500 folhas", final_response="Aqui está o orçamento completo",
+                   function_called="generate_paper_quote", function_params={"sheets": 500},
+                   function_result={"total": 12.5, "itens": ["A4"]}, total_latency_ms=120.5,
+                   api_calls_count=2, total_input_tokens=300, total_output_tokens=80, total_tokens=380,
+                   validation_passed=True, has_function_call=True,
+                   spans=[{"name": "first_completion", "start_us": 0.0, "duration_us": 90000.0,
+                           "depth": 0, "parent": None, "error": False}],
+                   phase_latency_ms={"first_completion": 90.0},
+                   model_usage={"gpt-4o-mini": {"calls": 2, "input_tokens": 300,
+                                                "output_tokens": 80, "cached_tokens": 0}},
+                   additional_metadata={"tentativa": 1}),
+        MetricData(execution_id="e2", timestamp="2026-01-01T10:00:05", implementation_type="cov",
+                   user_input="Oi, Michael", final_response="Olá! That's what she said.",
+                   total_latency_ms=400.0, api_calls_count=3, total_tokens=900, verification_used=True,
+                   verification_latency_ms=150.0, correction_made=True, spans=[],
+                   phase_latency_ms={}),
+        MetricData(execution_id="e3", timestamp="2026-01-01T10:00:09", implementation_type="cov",
+                   user_input="Erro", final_response="", total_latency_ms=50.0, error_occurred=True,
+                   error_message="timeout", response_complete=False),
+    ]
+
+
+def test_rows_round_trip_to_metric_data():
+    metrics = _metrics()
+    store = MetricStore.from_metrics(metrics)
+    assert len(store) == 3
+    assert store.to_metrics() == metrics
+    with pytest.raises(IndexError):
+        store.row(3)
+
+
+def test_columns_masks_and_aggregates():
+    store = MetricStore.from_metrics(_metrics())
+    assert store.column("total_tokens").tolist() == [380, 900, 0]
+    assert store.column("function_called").tolist() == ["generate_paper_quote", None, None]
+    assert store.column("function_result")[0] == {"total": 12.5, "itens": ["A4"]}
+
+    cov = store.mask(implementation_type="cov")
+    assert cov.tolist() == [False, True, True]
+    assert store.mean("total_latency_ms", cov) == 225.0
+    assert store.rate("correction_made", cov) == 50.0
+    assert store.success_rate() == pytest.approx(200 / 3)
+    assert store.mean("total_latency_ms", store.mask(implementation_type="inexistente")) == 0.0
+    assert store.phase_means() == {"first_completion": 90.0}
+    assert np.isnan(store.phase_column("first_completion")[1])
+    assert store.model_usage()["gpt-4o-mini"]["calls"] == 2
+    with pytest.raises(KeyError):
+        store.column("nao_existe")
+
+
+def test_analyzer_gives_same_comparison_for_lists_and_stores():
+    metrics = _metrics()
+    original = [metric for metric in metrics if metric.implementation_type == "original"]
+    cov = [metric for metric in metrics if metric.implementation_type == "cov"]
+    from_lists = MetricsAnalyzer.compare_implementations(original, cov)
+    from_stores = MetricsAnalyzer.compare_implementations(MetricStore.from_metrics(original),
+                                                          MetricStore.from_metrics(cov))
+    from_lists["summary"].pop("timestamp")
+    from_stores["summary"].pop("timestamp")
+    assert from_lists == from_stores
+
+
+def test_segment_save_and_open_round_trip(tmp_path):
+    metrics = _metrics()
+    store = MetricStore.from_metrics(metrics)
+    path = store.save(tmp_path / "exp_cov_metrics.mseg", metadata={"experiment": "exp"})
+
+    opened = MetricStore.open(path)
+    assert opened.metadata == {"experiment": "exp"}
+    assert len(opened) == 3
+    assert opened.to_metrics() == metrics
+    assert opened.column("total_latency_ms").tolist() == store.column("total_latency_ms").tolist()
+    assert opened.mean("total_latency_ms", opened.mask(implementation_type="cov")) == 225.0
+    assert opened.phase_means() == store.phase_means()
+    assert not opened.column("total_tokens").flags.writeable  # view sobre o mmap
+
+
+def test_append_after_open_copies_columns(tmp_path):
+    metrics = _metrics()
+    opened = MetricStore.open(MetricStore.from_metrics(metrics[:2]).save(tmp_path / "a.mseg"))
+    opened.append(metrics[2])
+    assert opened.to_metrics() == metrics
+
+
+def test_empty_store_round_trip_and_invalid_file(tmp_path):
+    opened = MetricStore.open(MetricStore().save(tmp_path / "vazio.mseg"))
+    assert len(opened) == 0 and opened.to_metrics() == []
+
+    invalid = tmp_path / "invalido.mseg"
+    invalid.write_bytes(b"nao e um segmento")
+    with pytest.raises(ValueError):
+        MetricStore.open(invalid)
+
+
+def test_close_releases_the_mapping(tmp_path, events):
+    path = MetricStore.from_metrics(_metrics()).save(tmp_path / "a.mseg", metadata={"experiment": "exp"})
+    with MetricStore.open(path) as opened:
+        assert len(opened) == 3
+    assert opened._mmap is None
+    assert len(opened) == 0 and opened.metadata == {"experiment": "exp"}
+    assert events.named("metric_store.close_deferred") == []
+    MetricStore.from_metrics(_metrics()[:1]).save(path)  # os.replace sobre o arquivo liberado
+    opened.close()
+
+    held = MetricStore.open(path)
+    latency = held.column("total_latency_ms")
+    held.close()
+    assert latency.tolist() == [120.5]
+    assert len(events.named("metric_store.close_deferred")) == 1
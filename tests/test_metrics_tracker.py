@@ -0,0 +1,139 @@
+"""
+Testes do MetricsTracker: spans por fase e execuções concorrentes
+"""
+
+import threading
+import time
+
+import pytest
+
+from src.core.metrics_tracker import MetricsAnalyzer, MetricsTracker
+
+
+def test_spans_record_nesting_and_phase_latency():
+    tracker = MetricsTracker("original")
+    tracker.start_execution("pergunta")
+    with tracker.span("first_completion"):
+        with tracker.span("security_validation"):
+            time.sleep(0.002)
+    with tracker.span("security_validation"):
+        pass
+    metric = tracker.end_execution("resposta completa o bastante")
+
+    assert [span["name"] for span in metric.spans] == ["first_completion", "security_validation",
+                                                        "security_validation"]
+    outer, inner, sibling = metric.spans
+    assert (outer["depth"], outer["parent"]) == (0, None)
+    assert (inner["depth"], inner["parent"]) == (1, "first_completion")
+    assert (sibling["depth"], sibling["parent"]) == (0, None)
+    assert outer["duration_us"] >= inner["duration_us"] >= 2000
+    assert metric.phase_latency_ms["security_validation"] == pytest.approx(
+        (inner["duration_us"] + sibling["duration_us"]) / 1000)
+
+
+def test_span_marks_error_and_does_not_swallow_exception():
+    tracker = MetricsTracker("original")
+    tracker.start_execution("pergunta")
+    with pytest.raises(RuntimeError):
+        with tracker.span("function_execution"):
+            raise RuntimeError("falhou")
+    metric = tracker.end_execution("resposta completa o bastante")
+    assert metric.spans[0]["error"] is True
+
+
+def test_span_without_active_execution_is_a_no_op():
+    tracker = MetricsTracker("original")
+    with tracker.span("first_completion") as span:
+        assert span is not None
+
+
+def test_average_phase_latency_and_chrome_trace():
+    tracker = MetricsTracker("original")
+    metrics = []
+    for _ in range(2):
+        tracker.start_execution("pergunta")
+        with tracker.span("first_completion"):
+            pass
+        metrics.append(tracker.end_execution("resposta completa o bastante"))
+
+    averages = MetricsAnalyzer.average_phase_latency(metrics)
+    assert set(averages) == {"first_completion"}
+
+    trace = MetricsAnalyzer.to_chrome_trace(metrics)
+    names = [event["name"] for event in trace["traceEvents"] if event["ph"] == "X"]
+    assert names.count("execution") == 2
+    assert names.count("first_completion") == 2
+
+
+def test_concurrent_executions_are_tracked_separately():
+    tracker = MetricsTracker("original")
+    first = tracker.start_execution("pergunta 1")
+    second = tracker.start_execution("pergunta 2")
+    assert set(tracker.active_executions()) == {first, second}
+
+    tracker.track_api_call(10, 5, execution_id=first)
+    tracker.track_api_call(100, 50, cached_tokens=20, model="gpt-4o-mini", execution_id=second)
+    tracker.track_api_call(1, 1)  # contexto atual: a última iniciada
+
+    one = tracker.end_execution("resposta completa o bastante", execution_id=first)
+    two = tracker.end_execution("resposta completa o bastante", execution_id=second)
+    assert (one.api_calls_count, one.total_tokens) == (1, 15)
+    assert (two.api_calls_count, two.total_tokens, two.total_cached_tokens) == (2, 152, 20)
+    assert two.model_usage == {"gpt-4o-mini": {"calls": 1, "input_tokens": 100,
+                                               "output_tokens": 50, "cached_tokens": 20}}
+    assert tracker.active_executions() == []
+
+
+def test_activate_sets_execution_for_other_threads():
+    tracker = MetricsTracker("original")
+    execution_id = tracker.start_execution("pergunta")
+    tracker.start_execution("outra")
+
+    def work():
+        with tracker.activate(execution_id):
+            tracker.track_error("falhou na thread")
+
+    thread = threading.Thread(target=work)
+    thread.start()
+    thread.join()
+    metric = tracker.end_execution("resposta completa o bastante", execution_id=execution_id)
+    assert metric.error_occurred and metric.error_message == "falhou na thread"
+
+
+def test_duplicate_and_double_finish_raise():
+    tracker = MetricsTracker("original")
+    execution_id = tracker.start_execution("pergunta", execution_id="fixo")
+    with pytest.raises(ValueError):
+        tracker.start_execution("pergunta", execution_id="fixo")
+    tracker.end_execution("resposta completa o bastante", execution_id=execution_id)
+    with pytest.raises(ValueError):
+        tracker.end_execution("resposta", execution_id=execution_id)
+
+
+def test_record_without_active_execution_is_dropped_with_warning(events):
+    tracker = MetricsTracker("original")
+    tracker.track_api_call(10, 5)
+    tracker.start_execution("a")
+    tracker.start_execution("b")
+    # Duas execuções e nenhum id no contexto de outra thread: não há como escolher
+    thread = threading.Thread(target=tracker.track_function_call, args=("f", {}, None, True))
+    thread.start()
+    thread.join()
+
+    warnings = events.named("metrics.no_active_execution")
+    assert [record.fields["operation"] for record in warnings] == ["api_call", "function_call"]
+
+
+def test_abandoned_executions_are_evicted(events, monkeypatch):
+    tracker = MetricsTracker("original", max_active_executions=2, stale_after_s=60)
+    tracker.start_execution("a", execution_id="a")
+    tracker.start_execution("b", execution_id="b")
+    tracker.start_execution("c", execution_id="c")
+    assert tracker.active_executions() == ["b", "c"]
+
+    later = time.perf_counter_ns() + 120 * 10**9
+    monkeypatch.setattr("src.core.metrics_tracker.time.perf_counter_ns", lambda: later)
+    tracker.start_execution("d", execution_id="d")
+    assert tracker.active_executions() == ["d"]
+    assert tracker.evicted == 3
+    assert len(events.named("metrics.execution_evicted")) == 3
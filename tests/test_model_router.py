@@ -0,0 +1,62 @@
+"""
+Testes do roteamento de modelo por fase
+"""
+
+import json
+from contextvars import copy_context
+
+from src.core.function_validator import FunctionValidator
+from src.core.metric_store import MetricStore
+from src.core.metrics_tracker import MetricData, MetricsTracker
+from src.core.model_router import DEFAULT_MODEL, ModelRouter
+from tests.conftest import ROOT
+from tests.faithful_implementations import FormUIOriginalReproduction
+from tests.stub_client import StubChatClient
+
+QUOTE = "Gerar orçamento para 1000 folhas de papel A4 120gsm"
+
+
+def test_unrouted_phases_use_the_default_model():
+    router = ModelRouter(phase_models={"cov_correction": "gpt-4o"})
+    assert router.model_for("cov_correction") == "gpt-4o"
+    assert router.model_for("cov_verification") == DEFAULT_MODEL
+    assert router.models() == {"default": DEFAULT_MODEL, "cov_correction": "gpt-4o"}
+
+
+def test_routes_come_from_the_configuration_and_are_shared(prompts):
+    router = ModelRouter.from_config(prompts)
+    assert router.model_for("cov_verification") == "gpt-4o-mini"
+    assert router.model_for("cov_correction") == "gpt-4o"
+    assert ModelRouter.shared(prompts) is ModelRouter.shared(prompts)
+
+
+def test_each_call_is_accounted_to_its_routed_model(prompts):
+    client = StubChatClient(latency_ms=1, ms_per_output_token=0, seed=1)
+    implementation = FormUIOriginalReproduction(client, prompts, FunctionValidator(prompts))
+    implementation.models = ModelRouter("gpt-4o-mini", {"second_completion": "gpt-4o"})
+    tracker = MetricsTracker("original")
+    tracker.start_execution(QUOTE)
+    with open(ROOT / "config" / "manifest.json", encoding="utf-8") as f:
+        manifest = json.load(f)
+    # O prazo da requisição fica no contexto isolado e não vaza para outros testes
+    response = copy_context().run(implementation.process_request, QUOTE, manifest, tracker)
+    metric = tracker.end_execution(response)
+
+    assert metric.function_called == "generate_paper_quote"
+    assert {model: usage["calls"] for model, usage in metric.model_usage.items()} == {
+        "gpt-4o-mini": 1, "gpt-4o": 1}
+
+
+def test_store_sums_model_usage_per_model():
+    def metric(execution_id, usage):
+        return MetricData(execution_id=execution_id, timestamp="2026-01-01T10:00:00",
+                          implementation_type="cov", user_input="oi", model_usage=usage)
+
+    store = MetricStore.from_metrics([
+        metric("a", {"gpt-4o-mini": {"calls": 2, "input_tokens": 100}}),
+        metric("b", {"gpt-4o-mini": {"calls": 1, "input_tokens": 50}, "gpt-4o": {"calls": 1, "input_tokens": 70}}),
+        metric("c", None),
+    ])
+    assert store.model_usage() == {"gpt-4o-mini": {"calls": 3, "input_tokens": 150},
+                                   "gpt-4o": {"calls": 1, "input_tokens": 70}}
+    assert store.row(2).model_usage is None
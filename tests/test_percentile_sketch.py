@@ -0,0 +1,115 @@
+"""
+Testes dos sketches de percentis (LogHistogram e MetricsAggregator)
+"""
+
+import math
+import random
+
+import pytest
+
+from src.core.metrics_tracker import MetricData
+from src.core.percentile_sketch import LogHistogram, MetricsAggregator, quantile_label
+
+QUANTILES = (0.0, 0.1, 0.5, 0.9, 0.99, 0.999, 1.0)
+
+
+def _exact(values, q):
+    ordered = sorted(values)
+    return ordered[math.floor(q * (len(ordered) - 1))]
+
+
+def _metric(implementation, latency_ms, function=None, phases=None):
+    return MetricData(execution_id="x", timestamp="2026-01-01T00:00:00", implementation_type=implementation,
+                      user_input="oi", total_latency_ms=latency_ms, total_tokens=100,
+                      function_called=function, phase_latency_ms=phases)
+
+
+def test_quantile_label():
+    assert [quantile_label(q) for q in (0.5, 0.9, 0.99, 0.999)] == ["p50", "p90", "p99", "p999"]
+
+
+@pytest.mark.parametrize("accuracy", [0.01, 0.05])
+def test_quantiles_respect_relative_accuracy(accuracy):
+    rng = random.Random(7)
+    values = [rng.lognormvariate(6, 1.2) for _ in range(20_000)]
+    histogram = LogHistogram(relative_accuracy=accuracy)
+    for value in values:
+        histogram.add(value)
+
+    for q in QUANTILES:
+        exact = _exact(values, q)
+        assert abs(histogram.quantile(q) - exact) <= accuracy * exact * 1.0001
+    # Os extremos nunca extrapolam os valores observados
+    assert min(values) <= histogram.quantile(0.0) and histogram.quantile(1.0) <= max(values)
+    assert histogram.mean == pytest.approx(sum(values) / len(values))
+
+
+def test_zero_values_and_empty_histogram():
+    histogram = LogHistogram()
+    assert histogram.quantile(0.5) == 0.0
+    assert histogram.summary()["count"] == 0
+    for value in [0, 0, 0, 10, 20]:
+        histogram.add(value)
+    assert histogram.quantile(0.5) == 0.0
+    assert histogram.quantile(1.0) == pytest.approx(20, rel=0.01)
+    with pytest.raises(ValueError):
+        histogram.quantile(1.5)
+
+
+def test_merge_matches_single_histogram_and_checks_accuracy():
+    rng = random.Random(3)
+    values = [rng.expovariate(1 / 300) for _ in range(5000)]
+    whole, left, right = LogHistogram(), LogHistogram(), LogHistogram()
+    for index, value in enumerate(values):
+        whole.add(value)
+        (left if index % 2 else right).add(value)
+    left.merge(right)
+
+    assert left.count == whole.count
+    assert left._buckets == whole._buckets
+    assert left.percentiles() == whole.percentiles()
+    with pytest.raises(ValueError):
+        left.merge(LogHistogram(relative_accuracy=0.05))
+
+
+def test_collapse_keeps_high_tail_and_bounds_memory():
+    histogram = LogHistogram(relative_accuracy=0.01, max_buckets=64)
+    values = [1.01 ** i for i in range(2000)]
+    for value in values:
+        histogram.add(value)
+    assert len(histogram._buckets) <= 64
+    assert histogram.quantile(0.999) == pytest.approx(_exact(values, 0.999), rel=0.01)
+
+
+def test_histogram_round_trip():
+    histogram = LogHistogram()
+    for value in [1.5, 20, 300, 4000]:
+        histogram.add(value)
+    restored = LogHistogram.from_dict(histogram.to_dict())
+    assert restored.summary() == histogram.summary()
+    assert LogHistogram.from_dict(LogHistogram().to_dict()).summary()["count"] == 0
+
+
+def test_aggregator_groups_by_implementation_function_and_phase():
+    aggregator = MetricsAggregator().add_all([
+        _metric("original", 100, "prank_dwight", {"first_completion": 60.0}),
+        _metric("original", 300),
+        _metric("cov", 500, phases={"verification": 200.0}),
+    ])
+    summary = aggregator.summarize()
+
+    assert set(summary) == {"original", "cov"}
+    assert summary["original"]["overall"]["latency_ms"]["count"] == 2
+    assert set(summary["original"]["functions"]) == {"prank_dwight", "none"}
+    assert summary["original"]["phases"]["first_completion"]["max"] == 60.0
+    assert aggregator.get("cov", scope="phase", name="verification").count == 1
+
+
+def test_aggregator_merge_and_round_trip():
+    first = MetricsAggregator().add_all([_metric("original", 100), _metric("original", 200)])
+    second = MetricsAggregator().add_all([_metric("original", 400)])
+    first.merge(second)
+    assert first.get("original").count == 3
+
+    restored = MetricsAggregator.from_dict(first.to_dict())
+    assert restored.summarize() == first.summarize()
@@ -0,0 +1,67 @@
+"""
+Testes da reavaliação offline de resultados armazenados
+"""
+
+import json
+
+from src.core.experiment_catalog import ExperimentCatalog
+from tests.conftest import ROOT
+from tests.evaluation_engine import EvaluationEngine
+from tests.rescore_results import load_rubric, rescore_data, rescore_files, stored_runs
+
+TEST_CASES = ROOT / "config" / "test_cases.json"
+
+CASES = {"t1": {"id": "t1", "expected_function": "prank_dwight"}}
+
+
+def _record(test_id="t1", **fields):
+    record = {"test_id": test_id, "function_called": "prank_dwight", "validation_passed": True,
+              "actual_response": "Pegadinha preparada para o Dwight!", "success": False,
+              "quality_score": 1, "notes": "antiga", "execution_time_ms": 100.0, "tokens_used": 50}
+    record.update(fields)
+    return record
+
+
+def test_stored_runs_reads_single_run_and_comparison_formats():
+    single = {"direct": [_record()], "_metadata": {"implementation": "cov"}}
+    comparison = {"original": {"direct": [_record()]}, "cov": {"direct": []}, "summary": {"x": 1}}
+    assert [implementation for implementation, _ in stored_runs(single)] == ["cov"]
+    assert [implementation for implementation, _ in stored_runs(comparison)] == ["original", "cov"]
+
+
+def test_rescore_data_updates_records_in_place_and_skips_old_ones():
+    data = {"direct": [_record(), _record(test_id="removido"), {"test_id": "t1", "success": True}],
+            "_metadata": {"implementation": "cov"}}
+    summary = rescore_data(data, CASES, EvaluationEngine())["cov"]
+
+    assert (summary["rescored"], summary["skipped"], summary["changed"]) == (1, 2, 1)
+    assert summary["success_rate_before"] == 0 and summary["success_rate_after"] == 100
+    record = data["direct"][0]
+    assert record["success"] is True and record["quality_score"] > 1
+    assert record["execution_time_ms"] == 100.0  # medições do run original são mantidas
+    assert data["direct"][2] == {"test_id": "t1", "success": True}
+
+
+def test_load_rubric_indexes_cases_by_id():
+    test_cases, rubric = load_rubric(TEST_CASES)
+    assert "complete_meeting_01" in test_cases and len(rubric) == 16
+
+
+def test_rescore_files_writes_output_and_registers_catalog(tmp_path):
+    test_cases, rubric = load_rubric(TEST_CASES)
+    case_id = next(iter(test_cases))
+    stored = tmp_path / "test_results_cov_1.json"
+    stored.write_text(json.dumps({"meeting": [_record(case_id)], "_metadata": {"implementation": "cov"}}),
+                      encoding="utf-8")
+    old = tmp_path / "test_results_cov_0.json"
+    old.write_text(json.dumps({"meeting": [{"test_id": case_id}], "_metadata": {"implementation": "cov"}}),
+                   encoding="utf-8")
+    catalog = ExperimentCatalog(tmp_path / "catalog.sqlite")
+
+    outcomes = rescore_files([stored, old], TEST_CASES, tmp_path / "rescored", workers=1, catalog=catalog)
+    assert outcomes[1]["output"] is None
+    output = tmp_path / "rescored" / f"test_results_cov_1.rescored_{rubric}.json"
+    assert outcomes[0]["output"] == str(output)
+    with open(output, encoding="utf-8") as f:
+        assert json.load(f)["_rescore"]["rubric_hash"] == rubric
+    assert catalog.experiments()[0]["name"] == f"test_results_cov_1@{rubric}"
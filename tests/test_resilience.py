@@ -0,0 +1,176 @@
+"""
+Testes de prazos, retries e hedging das chamadas ao LLM
+"""
+
+import random
+import threading
+import time
+from contextvars import copy_context
+
+import httpx
+import openai
+import pytest
+
+from src.core import resilience
+from src.core.resilience import (
+    Deadline, DeadlineExceeded, Hedger, ResilientCaller, RetryPolicy, begin_request_deadline,
+    current_deadline, deadline_phase
+)
+
+
+def _error(cls=openai.InternalServerError, status=500):
+    request = httpx.Request("POST", "https://stub.local/v1/chat/completions")
+    return cls("erro (stub)", response=httpx.Response(status, request=request), body=None)
+
+
+def _caller(max_attempts=3, hedger=None, attempt_timeout_s=30.0):
+    return ResilientCaller(RetryPolicy(max_attempts=max_attempts, backoff_base_s=0.001, backoff_cap_s=0.001,
+                                       attempt_timeout_s=attempt_timeout_s, rng=random.Random(0)),
+                           hedger=hedger)
+
+
+def _send(results, sent=None, queue_s=0.0, service_s=0.0):
+    """Função de envio como a do governador: fila, start(), envio"""
+    results = list(results)
+    lock = threading.Lock()
+
+    def send(request, start):
+        time.sleep(queue_s)
+        request = start(request)
+        with lock:
+            result = results.pop(0) if len(results) > 1 else results[0]
+        if sent is not None:
+            sent.append(request)
+        time.sleep(service_s if not callable(service_s) else service_s())
+        if isinstance(result, Exception):
+            raise result
+        return result
+    return send
+
+
+def _in_context(fn):
+    """Roda num contexto isolado para que o prazo não vaze para outros testes"""
+    return copy_context().run(fn)
+
+
+def _with_deadline(deadline, fn):
+    """Executa fn com `deadline` como prazo ativo (num contexto isolado)"""
+    def run():
+        resilience._current_deadline.set(deadline)
+        return fn()
+    return _in_context(run)
+
+
+def test_phase_deadline_is_share_of_total_capped_by_remaining():
+    deadline = Deadline(10, {"verification": 0.3})
+    assert deadline.phase("verification").remaining() == pytest.approx(3, abs=0.05)
+    assert deadline.phase("outra").remaining() == pytest.approx(10, abs=0.05)
+    short = Deadline(1, {"verification": 0.3}, request_total_s=10)
+    assert short.phase("verification").remaining() == pytest.approx(1, abs=0.05)
+    assert Deadline(0).expired
+
+
+def test_request_deadline_and_phases_are_context_scoped(prompts):
+    def scenario():
+        deadline = begin_request_deadline(prompts, seconds=5)
+        assert current_deadline() is deadline
+        with deadline_phase("first_completion") as phase:
+            assert current_deadline() is phase and phase.name == "first_completion"
+        assert current_deadline() is deadline
+
+    _in_context(scenario)
+    assert current_deadline() is None
+    with deadline_phase("first_completion") as phase:
+        assert phase is None
+
+
+def test_retry_policy_backoff_and_retryable_errors():
+    policy = RetryPolicy(backoff_base_s=0.5, backoff_cap_s=2.0, rng=random.Random(1))
+    assert all(0 <= policy.backoff(1) <= 0.5 for _ in range(50))
+    assert all(0 <= policy.backoff(10) <= 2.0 for _ in range(50))
+    assert RetryPolicy.is_retryable(_error())
+    assert RetryPolicy.is_retryable(_error(openai.RateLimitError, 429))
+    assert RetryPolicy.is_retryable(_error(openai.APIStatusError, 409))
+    assert not RetryPolicy.is_retryable(_error(openai.BadRequestError, 400))
+    assert not RetryPolicy.is_retryable(ValueError("bug"))
+    with pytest.raises(ValueError):
+        RetryPolicy(max_attempts=0)
+
+
+def test_transient_errors_are_retried_until_success():
+    caller = _caller()
+    sent = []
+    assert caller.call(_send([_error(), _error(), "ok"], sent), {"model": "m"}) == "ok"
+    assert len(sent) == 3 and caller.retries == 2
+    assert all(request["timeout"] == 30.0 for request in sent)
+
+
+def test_permanent_errors_and_last_attempt_are_raised():
+    caller = _caller()
+    sent = []
+    with pytest.raises(openai.BadRequestError):
+        caller.call(_send([_error(openai.BadRequestError, 400)], sent), {})
+    assert len(sent) == 1
+
+    with pytest.raises(openai.InternalServerError):
+        caller.call(_send([_error()], sent), {})
+    assert len(sent) == 4 and caller.retries == 2
+
+
+def test_attempt_timeout_is_recomputed_after_the_queue():
+    caller = _caller()
+    sent = []
+
+    _with_deadline(Deadline(1.0, name="first_completion"),
+                   lambda: caller.call(_send(["ok"], sent, queue_s=0.3), {"timeout": 5}))
+    assert 0.6 < sent[0]["timeout"] <= 0.71
+
+
+def test_deadline_consumed_in_queue_or_before_retry_raises():
+    caller = _caller()
+    sent = []
+    with pytest.raises(DeadlineExceeded):
+        _with_deadline(Deadline(0.05, name="verification"),
+                       lambda: caller.call(_send(["ok"], sent, queue_s=0.1), {}))
+    assert sent == []
+
+    slow_retry = ResilientCaller(RetryPolicy(backoff_base_s=5, backoff_cap_s=5, rng=random.Random(3)))
+    with pytest.raises(DeadlineExceeded):
+        _with_deadline(Deadline(0.2, name="verification"), lambda: slow_retry.call(_send([_error()]), {}))
+    assert slow_retry.deadline_exceeded == 1 and slow_retry.retries == 0
+
+
+def _trained_hedger(threshold_s=0.05):
+    hedger = Hedger(quantile=0.5, min_samples=5, max_ratio=1.0)
+    for _ in range(5):
+        hedger.record("m", threshold_s)
+    return hedger
+
+
+def test_slow_primary_gets_a_hedge_that_wins():
+    caller = _caller(hedger=_trained_hedger())
+    durations = iter([1.0, 0.0])
+    sent = []
+    started = time.monotonic()
+    assert caller.call(_send(["ok"], sent, service_s=lambda: next(durations)), {"model": "m"}) == "ok"
+    assert time.monotonic() - started < 0.9
+    assert len(sent) == 2
+    stats = caller.stats()
+    assert (stats["hedged"], stats["hedge_wins"]) == (1, 1)
+
+
+def test_primary_waiting_in_queue_is_not_hedged():
+    caller = _caller(hedger=_trained_hedger())
+    sent = []
+    assert caller.call(_send(["ok"], sent, queue_s=0.15), {"model": "m"}) == "ok"
+    assert len(sent) == 1 and caller.stats()["hedged"] == 0
+
+
+def test_streams_and_cold_models_are_not_hedged():
+    hedger = _trained_hedger()
+    assert hedger.threshold_s("outro") is None
+    caller = _caller(hedger=hedger)
+    sent = []
+    caller.call(_send(["ok"], sent, service_s=0.1), {"model": "m", "stream": True})
+    assert len(sent) == 1 and hedger.hedged == 0
+    assert Hedger(enabled=False).threshold_s("m") is None
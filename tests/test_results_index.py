@@ -0,0 +1,94 @@
+"""
+Testes do índice de resultados append-only
+"""
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Process
+
+from src.core.results_index import ResultsIndex
+
+
+def _entry(timestamp, implementation="cov", filename=None):
+    return {"filename": filename or f"test_results_{timestamp}.json", "implementation": implementation,
+            "timestamp": timestamp, "success_rate": 90.0}
+
+
+def _append_many(path, worker, count):
+    index = ResultsIndex(path, compact_bytes=2048)
+    for i in range(count):
+        index.append(_entry(worker * 1000 + i, filename=f"w{worker}_{i}.json"))
+
+
+def test_append_load_and_latest(tmp_path):
+    index = ResultsIndex(tmp_path / "results_index.json")
+    assert index.load() == {"results": [], "last_updated": None}
+    index.append(_entry(1, "original"))
+    index.append(_entry(3, "cov"))
+    index.append(_entry(2, "cov"))
+
+    loaded = index.load()
+    assert [entry["timestamp"] for entry in loaded["results"]] == [3, 2, 1]
+    assert loaded["last_updated"] == 3
+    assert [entry["timestamp"] for entry in index.latest("cov", limit=1)] == [3]
+    assert not index.path.exists()  # só o log foi escrito
+
+
+def test_compact_writes_snapshot_and_empties_log(tmp_path):
+    index = ResultsIndex(tmp_path / "results_index.json")
+    for timestamp in range(5):
+        index.append(_entry(timestamp))
+    assert index.compact() == 5
+    assert index.log_path.stat().st_size == 0
+    with open(index.path, encoding="utf-8") as f:
+        assert len(json.load(f)["results"]) == 5
+
+    index.append(_entry(10))
+    assert len(index.load()["results"]) == 6
+
+
+def test_duplicate_keys_and_partial_lines_are_tolerated(tmp_path):
+    index = ResultsIndex(tmp_path / "results_index.json")
+    index.append(_entry(1))
+    index.compact()
+    # Compactação interrompida: o mesmo registro ainda está no log, seguido de uma linha parcial
+    with open(index.log_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(_entry(1)) + "\n" + '{"filename": "parcial')
+    assert len(index.load()["results"]) == 1
+
+
+def test_append_after_torn_write_keeps_the_new_entry(tmp_path):
+    index = ResultsIndex(tmp_path / "results_index.json", compact_bytes=0)
+    index.append(_entry(1))
+    with open(index.log_path, "a", encoding="utf-8") as f:
+        f.write('{"filename": "parcial", "pad": "' + "x" * 5000)
+    index.append(_entry(2))
+    assert [entry["timestamp"] for entry in index.load()["results"]] == [2, 1]
+
+    # Log só com a linha parcial: é descartado inteiro
+    index.log_path.write_text('{"filename": "parcial', encoding="utf-8")
+    index.append(_entry(3))
+    assert index.log_path.read_text(encoding="utf-8") == json.dumps(_entry(3), separators=(",", ":")) + "\n"
+
+
+def test_automatic_compaction_by_log_size(tmp_path):
+    index = ResultsIndex(tmp_path / "results_index.json", compact_bytes=300)
+    for timestamp in range(10):
+        index.append(_entry(timestamp))
+    assert index.path.exists()
+    assert index.log_path.stat().st_size < 300
+    assert len(index.load()["results"]) == 10
+
+
+def test_concurrent_writers_lose_no_entries(tmp_path):
+    path = tmp_path / "results_index.json"
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda worker: _append_many(path, worker, 25), range(4)))
+
+    processes = [Process(target=_append_many, args=(path, worker, 25)) for worker in range(4, 7)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    assert len(ResultsIndex(path).load()["results"]) == 7 * 25
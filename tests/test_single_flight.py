@@ -0,0 +1,197 @@
+"""
+Testes da coalescência de requisições idênticas (single-flight)
+"""
+
+import threading
+import time
+from contextvars import copy_context
+
+import pytest
+
+from src.core import resilience
+from src.core.resilience import Deadline, DeadlineExceeded
+from src.core.single_flight import SingleFlight, SingleFlightError
+from src.core.token_budget import TokenBudgetExceeded
+
+
+class _KeywordOnlyError(Exception):
+    """Como os erros de status do SDK: só aceita argumentos nomeados"""
+
+    def __init__(self, *, status):
+        super().__init__(f"status {status}")
+        self.status = status
+
+
+def _wait_for(condition, timeout_s=2.0):
+    limit = time.monotonic() + timeout_s
+    while not condition():
+        assert time.monotonic() < limit, "condição não atingida a tempo"
+        time.sleep(0.001)
+
+
+def _coalesce(flight, fn, waiters=3, deadline=None, waiter_fn=pytest.fail):
+    """
+    Roda uma líder (bloqueada até todas as outras estarem esperando) e `waiters` requisições iguais,
+    que executam `waiter_fn` se o resultado da líder não for compartilhado
+
+    Returns:
+        (resultado da líder, resultados das demais); cada resultado é FlightOutcome ou exceção
+    """
+    key = flight.key("cov", "Orçamento de papel")
+    release = threading.Event()
+    outcomes = {}
+
+    def leader_fn():
+        release.wait(2)
+        return fn()
+
+    def call(name, target, call_deadline=None):
+        try:
+            outcomes[name] = flight.do(key, target, deadline=call_deadline)
+        except BaseException as e:
+            outcomes[name] = e
+
+    leader = threading.Thread(target=call, args=("leader", leader_fn))
+    leader.start()
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+    others = [threading.Thread(target=call, args=(i, waiter_fn, deadline)) for i in range(waiters)]
+    for thread in others:
+        thread.start()
+    _wait_for(lambda: flight.coalesced == waiters)
+    if deadline is not None:
+        for thread in others:
+            thread.join()
+    release.set()
+    for thread in [leader] + others:
+        thread.join()
+    return outcomes.pop("leader"), [outcomes[i] for i in range(waiters)]
+
+
+def test_key_normalizes_spaces_and_case_but_not_mode_or_history():
+    flight = SingleFlight()
+    assert flight.key("cov", "  Orçamento   DE papel ") == flight.key("cov", "orçamento de papel")
+    assert flight.key("cov", "oi") != flight.key("original", "oi")
+    assert flight.key("cov", "oi", [{"role": "user", "content": "antes"}]) != flight.key("cov", "oi")
+    strict = SingleFlight(case_sensitive=True)
+    assert strict.key("cov", "Oi") != strict.key("cov", "oi")
+
+
+def test_identical_concurrent_requests_share_one_execution():
+    flight = SingleFlight()
+    calls = []
+    leader, waiters = _coalesce(flight, lambda: calls.append(1) or "resposta")
+
+    assert calls == [1]
+    assert (leader.value, leader.leader, leader.waiters) == ("resposta", True, 3)
+    assert all(outcome.value == "resposta" and not outcome.leader for outcome in waiters)
+    assert all(outcome.wait_ms > 0 for outcome in waiters)
+    assert flight.stats() == {"leaders": 1, "coalesced": 3, "max_waiters": 3, "in_flight": 0}
+
+    # Nada fica guardado: a próxima requisição executa de novo
+    assert flight.do(flight.key("cov", "Orçamento de papel"), lambda: "nova").leader
+
+
+def test_waiters_get_their_own_copy_of_the_leader_exception():
+    original = ValueError("parâmetro inválido", 42)
+
+    def fail():
+        raise original
+
+    leader, waiters = _coalesce(SingleFlight(), fail, waiters=2)
+    assert leader is original
+    first, second = waiters
+    assert type(first) is ValueError and first.args == original.args
+    assert first is not original and first is not second
+    assert first.__cause__ is original and second.__cause__ is original
+
+
+def test_exceptions_that_cannot_be_copied_become_single_flight_errors():
+    original = _KeywordOnlyError(status=429)
+
+    def fail():
+        raise original
+
+    _, (waiter,) = _coalesce(SingleFlight(), fail, waiters=1)
+    assert isinstance(waiter, SingleFlightError)
+    assert "_KeywordOnlyError: status 429" in str(waiter)
+    assert waiter.__cause__ is original
+
+
+def test_waiter_gives_up_at_its_own_deadline():
+    flight = SingleFlight()
+    leader, (waiter,) = _coalesce(flight, lambda: "resposta", waiters=1,
+                                  deadline=Deadline(0.02, name="first_completion"))
+    assert isinstance(waiter, DeadlineExceeded)
+    assert "first_completion" in str(waiter)
+    assert (leader.value, leader.waiters) == ("resposta", 0)
+
+
+def test_waiter_uses_the_active_request_deadline_by_default():
+    flight = SingleFlight()
+    key = flight.key("cov", "oi")
+    release = threading.Event()
+    leader = threading.Thread(target=flight.do, args=(key, lambda: release.wait(2)))
+    leader.start()
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+
+    def wait_with_active_deadline():
+        resilience._current_deadline.set(Deadline(0.02, name="request"))
+        return flight.do(key, pytest.fail)
+
+    with pytest.raises(DeadlineExceeded):
+        copy_context().run(wait_with_active_deadline)
+    release.set()
+    leader.join()
+
+
+def test_disabled_flight_always_executes(prompts):
+    flight = SingleFlight(enabled=False)
+    calls = []
+    for _ in range(2):
+        assert flight.do("chave", lambda: calls.append(1) or "ok").leader
+    assert len(calls) == 2
+    assert SingleFlight.shared(prompts) is SingleFlight.shared(prompts)
+    assert SingleFlight.from_config(prompts).enabled
+
+
+@pytest.mark.parametrize("error", [
+    TokenBudgetExceeded("Tenant 'session:A' excederia o limite"),
+    DeadlineExceeded("Prazo da fase 'first_completion' esgotado"),
+])
+def test_tenant_scoped_failures_are_not_shared(error):
+    def fail():
+        raise error
+
+    flight = SingleFlight()
+    calls = []
+    leader, waiters = _coalesce(flight, fail, waiters=2,
+                                waiter_fn=lambda: calls.append(1) or "resposta própria")
+    assert leader is error
+    assert len(calls) == 2
+    assert all(outcome.value == "resposta própria" and outcome.leader for outcome in waiters)
+    assert all(outcome.wait_ms > 0 for outcome in waiters)
+
+
+def test_values_rejected_by_shareable_are_not_shared():
+    flight = SingleFlight()
+    error_value = {"response": "orçamento esgotado", "error": True}
+    key = flight.key("original", "Orçamento de papel")
+    release = threading.Event()
+    outcomes = {}
+
+    def call(name, fn):
+        outcomes[name] = flight.do(key, fn, shareable=lambda value: not value["error"])
+
+    leader = threading.Thread(target=call, args=("leader", lambda: release.wait(2) and error_value))
+    leader.start()
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+    waiter = threading.Thread(target=call, args=("waiter", lambda: {"response": "ok", "error": False}))
+    waiter.start()
+    _wait_for(lambda: flight.coalesced == 1)
+    release.set()
+    leader.join()
+    waiter.join()
+
+    assert (outcomes["leader"].value, outcomes["leader"].waiters) == (error_value, 0)
+    assert outcomes["waiter"].value == {"response": "ok", "error": False}
+    assert outcomes["waiter"].leader
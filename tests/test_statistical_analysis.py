@@ -0,0 +1,97 @@
+"""
+Testes da comparação estatística (bootstrap, permutação e tamanho de amostra)
+"""
+
+import numpy as np
+import pytest
+
+from src.core.metric_store import MetricStore
+from src.core.metrics_tracker import MetricData
+from src.core.statistical_analysis import (
+    _bootstrap_means, bootstrap_mean_difference, compare_rates, compare_stores, effective_resamples,
+    minimum_detectable_effect, permutation_test_proportions, sample_size_for_means,
+    sample_size_for_proportions
+)
+
+
+def _store(implementation, latencies, errors=()):
+    return MetricStore.from_metrics(
+        MetricData(execution_id=str(i), timestamp="2026-01-01T10:00:00", implementation_type=implementation,
+                   user_input=f"pergunta {i}", final_response="resposta completa",
+                   total_latency_ms=float(latency), total_tokens=100 + i, error_occurred=i in errors)
+        for i, latency in enumerate(latencies)
+    )
+
+
+def test_bootstrap_means_match_resampled_means():
+    columns = np.arange(10, dtype=float)[:, None]
+    means = _bootstrap_means(columns, 2000, np.random.default_rng(0))
+    assert means.shape == (2000, 1)
+    assert means.min() >= 0 and means.max() <= 9
+    assert means.mean() == pytest.approx(4.5, abs=0.1)
+
+
+def test_clear_difference_is_significant_and_reproducible():
+    rng = np.random.default_rng(1)
+    baseline = rng.normal(100, 10, 200)
+    candidate = baseline + 30 + rng.normal(0, 5, 200)
+    result = bootstrap_mean_difference(baseline, candidate, paired=True, n_resamples=2000, seed=42)
+    assert result["significant"]
+    assert result["ci_low"] < result["difference"] < result["ci_high"]
+    assert 25 < result["ci_low"] and result["ci_high"] < 35
+    assert result["relative_pct"] == pytest.approx(result["difference"] / baseline.mean() * 100)
+    assert bootstrap_mean_difference(baseline, candidate, paired=True, n_resamples=2000, seed=42) == result
+
+
+def test_noise_is_not_significant_and_pairing_is_validated():
+    rng = np.random.default_rng(2)
+    result = bootstrap_mean_difference(rng.normal(100, 10, 100), rng.normal(100, 10, 100),
+                                       n_resamples=2000, seed=0)
+    assert result["ci_low"] < 0 < result["ci_high"]
+    with pytest.raises(ValueError):
+        bootstrap_mean_difference([1, 2, 3], [1, 2], paired=True)
+    with pytest.raises(ValueError):
+        bootstrap_mean_difference([1], [1, 2])
+
+
+def test_zero_baseline_has_no_relative_change():
+    result = bootstrap_mean_difference([0, 0, 0], [1, 2, 3], n_resamples=1000, seed=0)
+    assert result["relative_pct"] is None
+
+
+def test_effective_resamples_is_bounded():
+    assert effective_resamples(10_000, 100) == 10_000
+    assert effective_resamples(10_000, 10**9) == 1000
+
+
+def test_permutation_test_detects_rate_difference():
+    different = permutation_test_proportions([True] * 20 + [False] * 80, [True] * 80 + [False] * 20, seed=0)
+    assert different["difference_pp"] == pytest.approx(60.0)
+    assert different["p_value"] < 0.001
+    same = permutation_test_proportions([True, False] * 50, [False, True] * 50, seed=0)
+    assert same["p_value"] > 0.9
+    assert compare_rates([True] * 10, [True] * 10)["sample_size"]["required_n"] is None
+
+
+def test_sample_size_helpers():
+    # Fórmula clássica: 2 * (1.96 + 0.84)^2 ≈ 15.7 → 16 por grupo para efeito de 1 desvio padrão
+    assert sample_size_for_means(10, 10) == 16
+    assert sample_size_for_means(10, 10, paired=True) == 8
+    assert sample_size_for_means(10, 0) is None
+    assert minimum_detectable_effect(10, 16) == pytest.approx(9.9, abs=0.1)
+    assert minimum_detectable_effect(10, 0) == float("inf")
+    assert 290 < sample_size_for_proportions(0.5, 0.6) < 400
+    assert sample_size_for_proportions(0.5, 0.5) is None
+
+
+def test_compare_stores_detects_pairing_and_omits_small_samples():
+    original = _store("original", [100, 110, 120, 130])
+    cov = _store("cov", [150, 160, 170, 180], errors={3})
+    result = compare_stores(original, cov, n_resamples=1000, seed=0)
+    assert result["paired"]
+    assert result["latency_ms"]["difference"] == 50.0
+    assert result["success_rate"]["difference_pp"] == pytest.approx(-25.0)
+
+    unpaired = compare_stores(original, _store("cov", [150, 160, 170]), n_resamples=1000, seed=0)
+    assert not unpaired["paired"]
+    assert set(compare_stores(_store("original", [1]), cov)) == {"paired", "confidence"}
@@ -0,0 +1,143 @@
+"""
+Testes do orçamento de tokens: estimativa, compactação, reservas por tenant e acerto
+"""
+
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from src.core import token_budget as token_budget_module
+from src.core.token_budget import (
+    TRUNCATION_MARKER, TokenBudget, TokenBudgetExceeded, TokenEstimator
+)
+
+
+@pytest.fixture
+def estimator():
+    # Heurística fixa: os testes não dependem de o tiktoken estar instalado
+    estimator = TokenEstimator()
+    estimator._encoding = None
+    return estimator
+
+
+def _call(call_id, name="generate_paper_quote"):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": '{"sheets": 500}'}}
+
+
+def test_count_text_heuristic_counts_utf8_bytes(estimator):
+    assert estimator.count_text("") == 0
+    assert estimator.count_text(None) == 0
+    assert estimator.count_text("abcd") == 1
+    assert estimator.count_text("çççç") == 2  # 8 bytes
+
+
+def test_truncate_text_keeps_head_and_tail(estimator):
+    text = "INICIO " + "x" * 4000 + " FIM"
+    truncated = estimator.truncate_text(text, 100)
+    assert estimator.count_text(truncated) <= 100
+    assert truncated.startswith("INICIO")
+    assert truncated.endswith("FIM")
+    assert TRUNCATION_MARKER in truncated
+    assert estimator.truncate_text("curto", 100) == "curto"
+
+
+def test_count_messages_includes_tool_calls_and_tools(estimator):
+    plain = [{"role": "user", "content": "oi"}]
+    with_call = plain + [{"role": "assistant", "content": None, "tool_calls": [_call("c1")]}]
+    tools = [{"type": "function", "function": {"name": "f"}}]
+    assert estimator.count_messages(with_call) > estimator.count_messages(plain)
+    assert estimator.count_messages(plain, tools) > estimator.count_messages(plain)
+
+
+def test_fit_messages_truncates_largest_variable_content_but_not_system(estimator):
+    budget = TokenBudget(max_request_tokens=300, estimator=estimator)
+    system = "s" * 400
+    messages = [{"role": "system", "content": system},
+                {"role": "user", "content": "pergunta curta"},
+                {"role": "user", "content": "y" * 4000}]
+    fitted, estimated = budget.fit_messages(messages)
+    assert estimated <= 300
+    assert fitted[0]["content"] == system
+    assert fitted[1]["content"] == "pergunta curta"
+    assert TRUNCATION_MARKER in fitted[2]["content"]
+    assert messages[2]["content"] == "y" * 4000  # a entrada não é alterada
+
+
+def test_fit_messages_keeps_tool_call_and_result_together(estimator):
+    budget = TokenBudget(max_request_tokens=250, estimator=estimator)
+    call = _call("call_1")
+    messages = [{"role": "system", "content": "sistema"},
+                {"role": "user", "content": "orçamento de 500 folhas"},
+                {"role": "assistant", "content": None, "tool_calls": [call]},
+                {"role": "tool", "tool_call_id": "call_1", "name": "generate_paper_quote", "content": "r" * 4000}]
+    fitted, _ = budget.fit_messages(messages)
+    assert len(fitted) == len(messages)
+    assert fitted[2]["tool_calls"] == [call]
+    assert fitted[3]["tool_call_id"] == "call_1"
+    assert TRUNCATION_MARKER in fitted[3]["content"]
+
+
+def test_fit_messages_rejects_orphan_tool_result(estimator):
+    budget = TokenBudget(estimator=estimator)
+    messages = [{"role": "user", "content": "oi"},
+                {"role": "tool", "tool_call_id": "call_x", "content": "{}"}]
+    with pytest.raises(ValueError):
+        budget.fit_messages(messages)
+
+
+def test_fit_messages_fails_when_static_prefix_does_not_fit(estimator):
+    budget = TokenBudget(max_request_tokens=50, estimator=estimator)
+    with pytest.raises(TokenBudgetExceeded):
+        budget.fit_messages([{"role": "system", "content": "s" * 1000}, {"role": "user", "content": "oi"}])
+
+
+def test_reserve_charges_input_plus_reserved_output_and_enforces_limit():
+    budget = TokenBudget(max_tenant_tokens=2000, reserved_output_tokens=800)
+    budget.reserve("a", 100)
+    assert budget.tenant_usage("a") == 900
+    budget.reserve("a", 100)
+    with pytest.raises(TokenBudgetExceeded):
+        budget.reserve("a", 100)
+    # Tenants são independentes
+    budget.reserve("b", 100)
+    assert budget.tenant_usage("b") == 900
+
+
+def test_settle_replaces_reservation_with_actual_usage():
+    budget = TokenBudget(max_tenant_tokens=3000, reserved_output_tokens=800)
+    for _ in range(10):
+        reservation = budget.reserve("a", 100)
+        budget.settle(reservation, SimpleNamespace(prompt_tokens=90, completion_tokens=40))
+    assert budget.tenant_usage("a") == 1300
+
+    reservation = budget.reserve("a", 100)
+    budget.settle(reservation, {"prompt_tokens": 10, "completion_tokens": 5})
+    assert budget.tenant_usage("a") == 1315
+
+    reservation = budget.reserve("a", 100)
+    budget.settle(reservation, None)  # chamada falhou: reserva devolvida
+    assert budget.tenant_usage("a") == 1315
+    budget.settle(None, None)
+
+
+def test_window_expiry_and_sweep_forget_idle_tenants(monkeypatch):
+    budget = TokenBudget(max_tenant_tokens=10_000, tenant_window_seconds=1)
+    budget.reserve("antigo", 10)
+    now = time.monotonic()
+    monkeypatch.setattr(token_budget_module.time, "monotonic", lambda: now + 5)
+    assert budget.tenant_usage("antigo") == 0
+
+    monkeypatch.setattr(token_budget_module, "SWEEP_EVERY", 1)
+    budget.reserve("novo", 10)
+    assert "antigo" not in budget._tenant_usage
+    assert "novo" in budget._tenant_usage
+
+
+def test_enforce_returns_fitted_messages_estimate_and_reservation(estimator):
+    budget = TokenBudget(max_tenant_tokens=10_000, reserved_output_tokens=100, estimator=estimator)
+    messages = [{"role": "user", "content": "oi"}]
+    fitted, estimated, reservation = budget.enforce(messages, tenant_id="t")
+    assert fitted == messages
+    assert estimated == estimator.count_messages(messages)
+    assert reservation.tenant_id == "t" and reservation.tokens == estimated + 100
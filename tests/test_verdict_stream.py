@@ -0,0 +1,135 @@
+"""
+Testes da leitura em streaming do veredito do crítico
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.cov.chain_of_verification import ChainOfVerification
+from src.cov.verdict_stream import IncrementalJSONObject, read_verdict_stream
+from tests.stub_client import StubChatClient
+
+QUOTE_CALL = {"name": "generate_paper_quote", "arguments": {"paper_size": "A4", "quantity": 500}}
+
+
+class _Stream:
+    """Stream de chunks no formato do SDK; registra quanto foi lido e se foi fechado"""
+
+    def __init__(self, text, size=7, usage=None):
+        self.pieces = [text[i:i + size] for i in range(0, len(text), size)]
+        self.usage = usage
+        self.read = 0
+        self.closed = False
+
+    def __iter__(self):
+        for piece in self.pieces:
+            self.read += 1
+            delta = SimpleNamespace(content=piece, refusal=None)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=None, refusal=None),
+                                                       finish_reason="stop")], usage=None)
+        yield SimpleNamespace(choices=[], usage=self.usage)
+
+    def close(self):
+        self.closed = True
+
+
+def _general(has_issues, severity="low"):
+    return json.dumps({"has_issues": has_issues, "severity": severity, "should_regenerate": has_issues,
+                       "context": {"type": "general"}, "unmet_criteria": [],
+                       "issues": ["x" * 200] if has_issues else [], "suggestions": ["y" * 200]})
+
+
+def _function(has_issues, function_correct):
+    return json.dumps({"has_issues": has_issues, "severity": "low", "should_regenerate": False,
+                       "function_correct": function_correct, "should_retry": False,
+                       "missing_params": ["quantity"], "invalid_params": [], "alternative_function": None})
+
+
+@pytest.fixture
+def cov(prompts):
+    return ChainOfVerification(StubChatClient(latency_ms=1, ms_per_output_token=0, seed=0), prompts)
+
+
+def _decide(cov, function_call=None):
+    return lambda fields: cov._correction_decision(fields, function_call)[0]
+
+
+@pytest.mark.parametrize("size", [1, 3, 1000])
+def test_parser_reads_top_level_fields_across_chunk_boundaries(size):
+    verdict = {"has_issues": True, "note": 'chave "}" e [colchete]\\n', "context": {"type": "trivia"},
+               "items": [1, [2, {"a": None}]], "score": -7.5, "alternative": None}
+    text = json.dumps(verdict, ensure_ascii=False)
+    parser = IncrementalJSONObject()
+    for start in range(0, len(text), size):
+        parser.feed(text[start:start + size])
+    assert parser.complete
+    assert parser.fields == verdict
+
+
+def test_parser_exposes_fields_as_soon_as_each_value_ends():
+    parser = IncrementalJSONObject()
+    assert parser.feed('{"has_issues": fal') == {}
+    assert parser.feed('se, "severity": "lo') == {"has_issues": False}
+    assert parser.feed('w", "issues": [') == {"has_issues": False, "severity": "low"}
+    assert not parser.complete
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1}]', 'ok {"a": 1}', '{"a": tru e}'])
+def test_parser_rejects_non_objects_and_invalid_values(text):
+    with pytest.raises(ValueError):
+        IncrementalJSONObject().feed(text)
+
+
+def test_general_verdict_without_issues_closes_the_stream_early(cov):
+    stream = _Stream(_general(False))
+    streamed = read_verdict_stream(stream, "general_verification", _decide(cov))
+    assert (streamed.cancelled, streamed.decision) == (True, False)
+    assert stream.closed and stream.read < len(stream.pieces)
+    assert streamed.fields == {"has_issues": False}
+    assert streamed.text == "".join(stream.pieces[:stream.read])
+
+
+def test_general_verdict_with_correction_is_read_to_the_end(cov):
+    text = _general(True, severity="critical")
+    stream = _Stream(text, usage=SimpleNamespace(prompt_tokens=10, completion_tokens=90))
+    streamed = read_verdict_stream(stream, "general_verification", _decide(cov))
+    assert (streamed.cancelled, streamed.decision) == (False, True)
+    assert not stream.closed
+    assert streamed.text == text
+    assert streamed.finish_reason == "stop"
+    assert streamed.usage.completion_tokens == 90
+
+
+def test_function_verdict_waits_for_function_correct(cov):
+    # has_issues False não basta: function_correct False ainda exige correção
+    wrong = read_verdict_stream(_Stream(_function(False, False)), "function_verification",
+                                _decide(cov, QUOTE_CALL))
+    assert (wrong.cancelled, wrong.decision) == (False, True)
+    assert json.loads(wrong.text)["function_correct"] is False
+
+    stream = _Stream(_function(False, True))
+    right = read_verdict_stream(stream, "function_verification", _decide(cov, QUOTE_CALL))
+    assert (right.cancelled, right.decision) == (True, False)
+    assert set(right.fields) == {"has_issues", "severity", "should_regenerate", "function_correct",
+                                 "should_retry"}
+
+
+def test_malformed_stream_is_read_whole_for_full_validation(cov):
+    stream = _Stream('não é json {"has_issues": false}')
+    streamed = read_verdict_stream(stream, "general_verification", _decide(cov))
+    assert (streamed.cancelled, streamed.decision) == (False, None)
+    assert streamed.text == 'não é json {"has_issues": false}'
+
+
+def test_streaming_verification_exits_early_against_the_stub(prompts):
+    stub = StubChatClient(latency_ms=1, ms_per_output_token=0, issue_rate=0.0, seed=0)
+    cov = ChainOfVerification(stub, prompts)
+    cov.streaming = True
+    usage_log = []
+    result = cov.verify_initial_response("Quem é o gerente regional?", "Michael Scott", usage_log=usage_log)
+    assert result["early_exit"] is True and result["has_issues"] is False
+    assert stub.cancelled_streams == 1
+    assert usage_log[0]["phase"] == "verification"
@@ -0,0 +1,124 @@
+"""
+Testes dos schemas do crítico do CoV e da leitura de vereditos
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from src.core.token_budget import TokenBudget
+from src.cov.chain_of_verification import ChainOfVerification
+from src.cov.verification_schemas import (
+    SEVERITIES, VERIFICATION_SCHEMAS, compile_validator, response_format, verdict_validator
+)
+from tests.stub_client import StubChatClient
+
+QUOTE_CALL = {"name": "generate_paper_quote", "arguments": {"paper_size": "A4", "quantity": 500}}
+
+
+@pytest.fixture
+def cov(prompts):
+    return ChainOfVerification(StubChatClient(latency_ms=1, seed=0), prompts)
+
+
+class _FailingCompletions:
+    def create(self, **kwargs):
+        raise RuntimeError("conexão recusada")
+
+
+def _function_verdict(**fields):
+    verdict = {"has_issues": False, "severity": "low", "should_regenerate": False, "function_correct": True,
+               "should_retry": False, "missing_params": [], "invalid_params": [], "alternative_function": None}
+    verdict.update(fields)
+    return verdict
+
+
+def _choice(content, finish_reason="stop", refusal=None):
+    return SimpleNamespace(message=SimpleNamespace(content=content, refusal=refusal), finish_reason=finish_reason)
+
+
+def test_schemas_are_strict_objects():
+    for kind, schema in VERIFICATION_SCHEMAS.items():
+        assert schema["additionalProperties"] is False
+        assert schema["required"] == list(schema["properties"])
+        assert response_format(kind)["json_schema"] == {"name": kind, "strict": True, "schema": schema}
+
+
+def test_validator_reports_type_enum_required_extra_and_item_errors():
+    validate = verdict_validator("function_verification")
+    assert validate(_function_verdict()) == []
+    assert validate(_function_verdict(alternative_function="prank_dwight")) == []
+    assert validate(_function_verdict(severity="none")) == ["$.severity: valor 'none' fora de " + str(SEVERITIES)]
+    assert validate(_function_verdict(has_issues="sim")) == ["$.has_issues: esperado boolean, recebido str"]
+    assert validate(_function_verdict(missing_params=["quantity", 3])) == [
+        "$.missing_params[]: esperado string, recebido int"]
+    assert validate(_function_verdict(extra=1)) == ["$: campo não permitido: extra"]
+
+    incomplete = _function_verdict()
+    del incomplete["should_retry"]
+    assert validate(incomplete) == ["$: campo obrigatório ausente: should_retry"]
+    assert validate([]) == ["$: esperado object, recebido list"]
+
+    integer = compile_validator({"type": "integer"})
+    assert integer(True) == ["$: esperado integer, recebido bool"]
+    assert integer(7) == []
+
+
+def test_every_schema_severity_is_handled_by_the_correction_decision(cov):
+    decisions = {severity: cov._correction_decision(
+        {"has_issues": True, "severity": severity, "should_regenerate": True}, None) for severity in SEVERITIES}
+    assert [decision[2] for decision in decisions.values()] == SEVERITIES
+    assert decisions["low"][0] is False and decisions["medium"][0] is False
+    assert decisions["high"][:2] == (True, "regenerate_high")
+    assert decisions["critical"][:2] == (True, "critical")
+
+
+def test_wrong_function_is_corrected_even_without_has_issues(cov):
+    verdict = _function_verdict(function_correct=False)
+    assert verdict_validator("function_verification")(verdict) == []
+    assert cov._correction_decision(verdict, QUOTE_CALL) == (True, "regenerate_high", "high")
+    assert cov._correction_decision(_function_verdict(should_retry=True, severity="critical"),
+                                    QUOTE_CALL) == (True, "critical", "critical")
+    assert cov._correction_decision(_function_verdict(), QUOTE_CALL) == (False, "no_issues", None)
+
+
+@pytest.mark.parametrize("choice, problem", [
+    (_choice(None, refusal="não posso"), "recusa do modelo"),
+    (_choice('{"has_issues": tr', finish_reason="length"), "resposta truncada"),
+    (_choice("não é json"), "JSON inválido"),
+    (_choice(json.dumps({"has_issues": True})), "campo obrigatório ausente"),
+])
+def test_invalid_verdicts_keep_the_initial_response(cov, events, choice, problem):
+    result = cov.read_verification_response("function_verification", SimpleNamespace(choices=[choice]))
+    assert result["invalid_verdict"] is True
+    assert (result["has_issues"], result["should_regenerate"]) == (False, False)
+    assert problem in result["error"]
+    assert cov._correction_decision(result, QUOTE_CALL)[0] is False
+    assert len(events.named("cov.verification_invalid")) == 1
+
+
+def test_valid_verdict_is_returned_as_is(cov):
+    verdict = _function_verdict(has_issues=True, severity="medium", missing_params=["gsm"])
+    response = SimpleNamespace(choices=[_choice(json.dumps(verdict))])
+    assert cov.read_verification_response("function_verification", response) == verdict
+
+
+@pytest.mark.parametrize("has_issues", [False, True])
+def test_stub_verdicts_respect_every_schema(has_issues):
+    client = StubChatClient(seed=0)
+    for kind, schema in VERIFICATION_SCHEMAS.items():
+        assert verdict_validator(kind)(client._verdict(schema, has_issues)) == []
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_failed_critic_and_correction_calls_return_their_reservations(prompts, streaming):
+    budget = TokenBudget(max_tenant_tokens=100_000, reserved_output_tokens=800)
+    client = SimpleNamespace(chat=SimpleNamespace(completions=_FailingCompletions()))
+    cov = ChainOfVerification(client, prompts, token_budget=budget, tenant_id="t")
+    cov.streaming = streaming
+
+    result = cov.verify_initial_response("pergunta", "resposta inicial", QUOTE_CALL)
+    assert result["error"] == "conexão recusada"
+    assert cov.generate_corrected_response("pergunta", "resposta inicial", result) is None
+    assert budget.tenant_usage("t") == 0